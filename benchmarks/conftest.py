@@ -0,0 +1,53 @@
+import logging
+
+import pytest
+
+from benchmarks.synthetic import create_users, generate_vault
+from core.data_models import User
+from db.database import DatabaseManager
+
+# Vault sizes (total entries across all users) benchmarked when none are given
+DEFAULT_SIZES: tuple[int, ...] = (1_000,)
+
+# Sizes the suite is designed around; the larger ones take minutes to generate
+KNOWN_SIZES: tuple[int, ...] = (1_000, 100_000, 1_000_000)
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption('--vault-size', action='append', type=int, default=None,
+                     help=f'vault size to benchmark, may be repeated (suite sizes: {", ".join(map(str, KNOWN_SIZES))})')
+    parser.addoption('--vault-users', type=int, default=8, help='number of users the synthetic vault is spread over')
+    parser.addoption('--attachment-mib', type=int, default=64,
+                     help='size in MiB of the file the attachment benchmarks encrypt and decrypt (1024 for the 1 GiB figures)')
+
+
+def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
+    if 'vault' in metafunc.fixturenames:
+        sizes = metafunc.config.getoption('--vault-size') or list(DEFAULT_SIZES)
+        metafunc.parametrize('vault', sizes, indirect=True, ids=[f'{size}entries' for size in sizes], scope='session')
+
+
+# Keep log formatting out of the measurements
+@pytest.fixture(scope='session', autouse=True)
+def quiet_logging():
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+# A populated in-memory vault, built once per size for the whole session
+@pytest.fixture(scope='session')
+def vault(request: pytest.FixtureRequest):
+    db = DatabaseManager(':memory:')
+    users = create_users(db, request.config.getoption('--vault-users'))
+    generate_vault(db, users, request.param)
+    yield db, users
+    db.close()
+
+
+# An empty database with a single user for write benchmarks
+@pytest.fixture
+def empty_vault() -> tuple[DatabaseManager, User]:
+    db = DatabaseManager(':memory:')
+    user = create_users(db, 1)[0]
+    return db, user
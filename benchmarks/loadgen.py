@@ -0,0 +1,241 @@
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from core.data_models import User
+from core.vault import Vault
+from db.database import DatabaseManager
+from util.enums import InsertStatus, RemoveStatus
+
+OPERATIONS: tuple[str, ...] = ('signin', 'add', 'lookup', 'list', 'delete')
+DEFAULT_MIX: str = 'signin=1,add=4,lookup=8,list=2,delete=1'
+SERVICES: tuple[str, ...] = ('GitHub', 'Gmail', 'Slack', 'AWS', 'Jira', 'Zoom', 'Stripe', 'Discord')
+
+
+@dataclass
+class LoadConfig:
+    db_path: str
+    users: int
+    mix: dict[str, int]
+    workers: int
+    mode: str
+    duration: float
+    timeout: float
+    seed: int
+
+
+@dataclass
+class WorkerResult:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: {op: [] for op in OPERATIONS})
+    errors: dict[str, int] = field(default_factory=lambda: {op: 0 for op in OPERATIONS})
+    lock_errors: int = 0
+
+
+class LockErrorCounter(logging.Handler):
+    # DatabaseManager logs and swallows most sqlite errors, so lock waits are counted from its log records
+    def __init__(self) -> None:
+        super().__init__(logging.ERROR)
+        self.counts: dict[int, int] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if 'database is locked' in record.getMessage():
+            thread_id = record.thread or 0
+            self.counts[thread_id] = self.counts.get(thread_id, 0) + 1
+
+
+# Parses an operation mix such as 'add=4,lookup=8' into weights
+def parse_mix(text: str) -> dict[str, int]:
+    mix: dict[str, int] = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f'Unknown operation \'{name}\' (expected one of {", ".join(OPERATIONS)})')
+        mix[name] = int(weight) if weight else 1
+    if not any(mix.values()):
+        raise ValueError('Operation mix must have at least one non-zero weight')
+    return mix
+
+
+# Returns the master password used for a generated user
+def user_password(index: int) -> str:
+    return f'LoadUser{index}Password!@#'
+
+
+# Creates the database file and the generated users
+def prepare_database(config: LoadConfig) -> None:
+    db = DatabaseManager(config.db_path, timeout=config.timeout)
+    vault = Vault(db)
+    for i in range(config.users):
+        if db.get_user_from_username(f'loaduser{i}') is None:
+            _ = vault.create_user(f'loaduser{i}', user_password(i))
+    db.close()
+
+
+# Runs one operation against the vault, returning False when it failed
+def run_operation(op: str, vault: Vault, user: User, index: int, rng: random.Random) -> bool:
+    database = vault.database
+    match op:
+        case 'signin':
+            found = database.get_user_from_username(user.username)
+            return found is not None and vault.check_master_password(found, user_password(index))
+        case 'add':
+            service = rng.choice(SERVICES)
+            return vault.add_login(user, service, f'account{rng.randrange(1_000_000)}', f'pw-{rng.random()}') == InsertStatus.SUCCESS
+        case 'lookup':
+            _ = database.get_logins_from_name(user.id, rng.choice(SERVICES))
+            return True
+        case 'list':
+            for login in database.get_user_logins(user.id):
+                _ = vault.encryption.decrypt_password(user.master_hash, login.password_encrypted)
+            return True
+        case 'delete':
+            logins = database.get_logins_from_name(user.id, rng.choice(SERVICES))
+            if not logins:
+                return True
+            return database.delete_login(rng.choice(logins).id) == RemoveStatus.SUCCESS
+        case _:
+            raise ValueError(f'Unknown operation \'{op}\'')
+
+
+# Runs operations from one worker until the deadline
+def run_worker(config: LoadConfig, worker_id: int, deadline: float) -> WorkerResult:
+    rng = random.Random(config.seed + worker_id)
+    db = DatabaseManager(config.db_path, timeout=config.timeout)
+    vault = Vault(db)
+    users = [db.get_user_from_username(f'loaduser{i}') for i in range(config.users)]
+    ops = list(config.mix)
+    weights = [config.mix[op] for op in ops]
+    result = WorkerResult()
+
+    try:
+        while time.monotonic() < deadline:
+            op = rng.choices(ops, weights)[0]
+            index = rng.randrange(config.users)
+            user = users[index]
+            assert user is not None
+
+            start = time.perf_counter()
+            try:
+                ok = run_operation(op, vault, user, index, rng)
+            except sqlite3.OperationalError as e:
+                ok = False
+                if 'locked' in str(e):
+                    result.lock_errors += 1
+                    db.conn.rollback()
+            result.latencies[op].append(time.perf_counter() - start)
+            if not ok:
+                result.errors[op] += 1
+    finally:
+        db.close()
+
+    return result
+
+
+# Runs one worker in a child process, counting lock errors logged there
+def run_process_worker(config: LoadConfig, worker_id: int, deadline: float) -> WorkerResult:
+    counter = install_lock_counter()
+    result = run_worker(config, worker_id, deadline)
+    result.lock_errors += sum(counter.counts.values())
+    return result
+
+
+# Attaches a lock error counter to the database logger
+def install_lock_counter() -> LockErrorCounter:
+    counter = LockErrorCounter()
+    db_logger = logging.getLogger('db.database')
+    db_logger.addHandler(counter)
+    db_logger.setLevel(logging.ERROR)
+    return counter
+
+
+# Runs the whole soak test and merges the per-worker results
+def run_load(config: LoadConfig) -> tuple[WorkerResult, float]:
+    prepare_database(config)
+    merged = WorkerResult()
+
+    start = time.monotonic()
+    deadline = start + config.duration
+    if config.mode == 'thread':
+        counter = install_lock_counter()
+        with ThreadPoolExecutor(config.workers) as pool:
+            results = list(pool.map(lambda worker_id: run_worker(config, worker_id, deadline), range(config.workers)))
+        merged.lock_errors += sum(counter.counts.values())
+        logging.getLogger('db.database').removeHandler(counter)
+    else:
+        # time.monotonic is system-wide on the platforms we run on, so children share the deadline
+        with ProcessPoolExecutor(config.workers) as pool:
+            futures = [pool.submit(run_process_worker, config, worker_id, deadline) for worker_id in range(config.workers)]
+            results = [future.result() for future in futures]
+    elapsed = time.monotonic() - start
+
+    for result in results:
+        for op in OPERATIONS:
+            merged.latencies[op].extend(result.latencies[op])
+            merged.errors[op] += result.errors[op]
+        merged.lock_errors += result.lock_errors
+    return merged, elapsed
+
+
+# Returns the p50, p95 and p99 latencies in milliseconds
+def percentiles(latencies: list[float]) -> tuple[float, float, float]:
+    if not latencies:
+        return 0.0, 0.0, 0.0
+    if len(latencies) == 1:
+        return (latencies[0] * 1000,) * 3
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+
+# Formats the soak test report
+def format_report(result: WorkerResult, elapsed: float) -> str:
+    total = sum(len(latencies) for latencies in result.latencies.values())
+    lines = [
+        f'{total} operations in {elapsed:.1f}s ({total / elapsed:,.1f} ops/s), {result.lock_errors} \'database is locked\' errors',
+        f'{"Operation":<10} {"Count":>8} {"Errors":>7} {"Ops/s":>10} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}',
+    ]
+    for op in OPERATIONS:
+        latencies = result.latencies[op]
+        if not latencies:
+            continue
+        p50, p95, p99 = percentiles(latencies)
+        lines.append(f'{op:<10} {len(latencies):>8} {result.errors[op]:>7} {len(latencies) / elapsed:>10,.1f} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f}')
+    return '\n'.join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Multi-user load generator and soak test for the vault database')
+    _ = parser.add_argument('--db', help='database file to drive (default: a fresh temporary file)')
+    _ = parser.add_argument('--users', type=int, default=10)
+    _ = parser.add_argument('--mix', default=DEFAULT_MIX, help=f'operation weights (default: {DEFAULT_MIX})')
+    _ = parser.add_argument('--workers', type=int, default=4)
+    _ = parser.add_argument('--mode', choices=('thread', 'process'), default='thread')
+    _ = parser.add_argument('--duration', type=float, default=30.0, help='soak duration in seconds')
+    _ = parser.add_argument('--timeout', type=float, default=5.0, help='sqlite busy timeout in seconds')
+    _ = parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config = LoadConfig(
+            db_path=args.db or os.path.join(tmp_dir, 'load.db'),
+            users=args.users,
+            mix=parse_mix(args.mix),
+            workers=args.workers,
+            mode=args.mode,
+            duration=args.duration,
+            timeout=args.timeout,
+            seed=args.seed,
+        )
+        result, elapsed = run_load(config)
+        print(format_report(result, elapsed))
+
+
+if __name__ == '__main__':
+    main()
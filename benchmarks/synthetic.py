@@ -0,0 +1,112 @@
+import array
+import itertools
+import os
+import random
+import sys
+
+from core.audit_log import FIELDS, PARTITION_SECONDS, _partition_name
+from core.data_models import User
+from core.encryption import EncryptionManager
+from db.database import DatabaseManager
+
+# Distinct ciphertexts generated per user, reused round-robin for every entry
+TOKEN_POOL_SIZE: int = 64
+
+# Rows inserted per executemany call while generating
+INSERT_BATCH: int = 10_000
+
+SERVICES: tuple[str, ...] = (
+    'GitHub', 'Gmail', 'Twitter', 'Slack', 'AWS', 'Azure', 'Jira', 'Figma',
+    'Notion', 'Dropbox', 'Zoom', 'Stripe', 'Heroku', 'Netflix', 'Spotify', 'Discord',
+)
+
+
+# Creates the users with real scrypt-derived keys so their entries decrypt
+def create_users(db: DatabaseManager, count: int) -> list[User]:
+    encryption = EncryptionManager()
+    users: list[User] = []
+    for i in range(count):
+        salt, key = encryption.hash_master_password(f'BenchPassword{i}!@#')
+        _ = db.insert_user(f'benchuser{i}', key, salt)
+        user = db.get_user_from_username(f'benchuser{i}')
+        assert user is not None
+        users.append(user)
+    return users
+
+
+# Fills the vault with the given number of entries spread evenly over the users
+def generate_vault(db: DatabaseManager, users: list[User], entries: int) -> None:
+    encryption = EncryptionManager()
+    pools = {
+        user.id: [encryption.encrypt_password(user.master_hash, f'password-{user.id}-{i}') for i in range(TOKEN_POOL_SIZE)]
+        for user in users
+    }
+
+    def rows():
+        for i in range(entries):
+            user = users[i % len(users)]
+            yield (user.id, f'{SERVICES[i % len(SERVICES)]}-{i // len(SERVICES) % 1000}', f'account{i}', pools[user.id][i % TOKEN_POOL_SIZE])
+
+    iterator = rows()
+    while batch := list(itertools.islice(iterator, INSERT_BATCH)):
+        _ = db.conn.executemany('INSERT INTO vault_entries (user_id, service_name, username, password_encrypted) VALUES (?, ?, ?, ?)', batch)
+    db.conn.commit()
+
+
+
+# Tags every nth of the user's entries and files every nth into a folder, starting from different
+# entries so the two sets barely overlap
+def organise_vault(db: DatabaseManager, user: User, tag: str, folder: str, every: int) -> None:
+    ids = [row[0] for row in db.conn.execute('SELECT id FROM vault_entries WHERE user_id = ? ORDER BY id', (user.id,))]
+    _ = db.conn.execute('INSERT OR IGNORE INTO tags (user_id, name) VALUES (?, ?)', (user.id, tag))
+    _ = db.conn.execute('INSERT OR IGNORE INTO folders (user_id, name) VALUES (?, ?)', (user.id, folder))
+    tag_id: int = db.conn.execute('SELECT id FROM tags WHERE user_id = ? AND name = ?', (user.id, tag)).fetchone()[0]
+    folder_id: int = db.conn.execute('SELECT id FROM folders WHERE user_id = ? AND name = ?', (user.id, folder)).fetchone()[0]
+    _ = db.conn.executemany('INSERT OR IGNORE INTO entry_tags (tag_id, entry_id) VALUES (?, ?)', [(tag_id, i) for i in ids[::every]])
+    _ = db.conn.executemany('UPDATE vault_entries SET folder_id = ? WHERE id = ?', [(folder_id, i) for i in ids[1::every]])
+    db.conn.commit()
+
+
+# Gives every nth of the user's entries a 90-day rotation policy, with last changes spread evenly
+# over the past 180 days so about half of them are overdue and the rest fall due over the next 90
+def schedule_rotation(db: DatabaseManager, user: User, every: int, now: int) -> None:
+    ids = [row[0] for row in db.conn.execute('SELECT id FROM vault_entries WHERE user_id = ? ORDER BY id', (user.id,))]
+    scheduled = ids[::every]
+    rows = []
+    for i, entry_id in enumerate(scheduled):
+        updated_at = now - 180 * 86400 * i // len(scheduled)
+        rows.append((updated_at, updated_at + 90 * 86400, entry_id))
+    _ = db.conn.executemany('UPDATE vault_entries SET updated_at = ?, rotation_days = 90, expires_at = ? WHERE id = ?', rows)
+    db.conn.commit()
+
+
+# Gives every nth of the user's entries a text URL field and a hidden PIN field, each value
+# encrypted on its own like the vault does
+def add_custom_fields(db: DatabaseManager, user: User, every: int) -> None:
+    encryption = EncryptionManager()
+    url = encryption.encrypt_password(user.master_hash, 'https://example.com/login')
+    pin = encryption.encrypt_password(user.master_hash, '4321')
+    ids = [row[0] for row in db.conn.execute('SELECT id FROM vault_entries WHERE user_id = ? ORDER BY id', (user.id,))]
+    rows = [(entry_id, user.id, name, kind, value) for entry_id in ids[::every] for name, kind, value in (('URL', 1, url), ('PIN', 2, pin))]
+    _ = db.conn.executemany('INSERT OR IGNORE INTO entry_fields (entry_id, user_id, name, kind, value_encrypted) VALUES (?, ?, ?, ?, ?)', rows)
+    db.conn.commit()
+
+
+# Writes an audit log of the given number of events spread evenly over consecutive days from
+# first_day (days since the epoch), written straight to the partition files. Users are drawn
+# from 1..users and entries from 1..entries, so each is matched by about 1/users or 1/entries of the log
+def generate_audit_log(directory: str, events: int, days: int, users: int, entries: int, first_day: int) -> None:
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(0)
+    per_day = events // days
+    for day in range(first_day, first_day + days):
+        start = day * PARTITION_SECONDS
+        fields = array.array('I', bytes(per_day * FIELDS * 4))
+        fields[0::FIELDS] = array.array('I', sorted(rng.randrange(start, start + PARTITION_SECONDS) for _ in range(per_day)))
+        fields[1::FIELDS] = array.array('I', (rng.randint(1, users) for _ in range(per_day)))
+        fields[2::FIELDS] = array.array('I', (rng.randint(1, entries) for _ in range(per_day)))
+        fields[3::FIELDS] = array.array('I', (rng.randint(1, 6) for _ in range(per_day)))
+        if sys.byteorder == 'big':
+            fields.byteswap()
+        with open(os.path.join(directory, _partition_name(day)), 'wb') as f:
+            fields.tofile(f)
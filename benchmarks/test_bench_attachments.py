@@ -0,0 +1,63 @@
+import os
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from benchmarks.synthetic import create_users
+from core.data_models import User
+from core.vault import Vault
+from db.database import DatabaseManager
+from util.enums import InsertStatus
+
+MIB: int = 1024 * 1024
+
+
+# A file of random bytes, --attachment-mib in size, written once for the module
+@pytest.fixture(scope='module')
+def attachment_file(request: pytest.FixtureRequest, tmp_path_factory: pytest.TempPathFactory) -> str:
+    path = str(tmp_path_factory.mktemp('attachments') / 'attachment.bin')
+    block = os.urandom(MIB)
+    with open(path, 'wb') as f:
+        for _ in range(request.config.getoption('--attachment-mib')):
+            _ = f.write(block)
+    return path
+
+
+# A vault in a file, as attachments are too large to benchmark in memory, with one login to attach to
+@pytest.fixture
+def file_vault(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'vault.db'))
+    user = create_users(db, 1)[0]
+    _ = db.insert_login(user.id, 'Files', 'bench', b'encrypted')
+    yield Vault(db), user
+    db.close()
+
+
+# Records the throughput of the fastest round; there are no timings to record when benchmarking is disabled
+def record_throughput(benchmark: BenchmarkFixture, size: int) -> None:
+    benchmark.extra_info['bytes'] = size
+    if benchmark.stats is not None:
+        benchmark.extra_info['mib_per_second'] = round(size / MIB / benchmark.stats.stats.min, 1)
+
+
+# Benchmark reading, encrypting and storing a file as an attachment
+def test_attach_file(benchmark: BenchmarkFixture, file_vault: tuple[Vault, User], attachment_file: str) -> None:
+    vault, user = file_vault
+
+    status = benchmark.pedantic(vault.add_attachment, args=(user, 'Files', attachment_file), rounds=3)
+    record_throughput(benchmark, os.path.getsize(attachment_file))
+
+    assert status == InsertStatus.SUCCESS
+
+
+# Benchmark decrypting an attachment back to a file
+def test_export_attachment(benchmark: BenchmarkFixture, file_vault: tuple[Vault, User], attachment_file: str, tmp_path) -> None:
+    vault, user = file_vault
+    _ = vault.add_attachment(user, 'Files', attachment_file)
+    attachment = vault.database.get_attachments(user.id, vault.database.get_logins_from_name(user.id, 'Files')[0].id)[0]
+
+    status = benchmark.pedantic(vault.export_attachment, args=(user, attachment, str(tmp_path / 'exported.bin')), rounds=3)
+    record_throughput(benchmark, attachment.size)
+
+    assert status == InsertStatus.SUCCESS
+    assert os.path.getsize(tmp_path / 'exported.bin') == attachment.size
@@ -0,0 +1,64 @@
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from benchmarks.synthetic import generate_audit_log
+from core.audit_log import PARTITION_SECONDS, AuditLog, AuditQueryResult
+
+# Size of the synthetic audit log: two million events over a month, from 8 users and 100,000 logins
+AUDIT_EVENTS: int = 2_000_000
+AUDIT_DAYS: int = 30
+AUDIT_USERS: int = 8
+AUDIT_ENTRIES: int = 100_000
+
+# 1 March 2026, in days since the epoch
+FIRST_DAY: int = 20513
+
+# Queries should finish within this, even the slowest round
+TARGET_SECONDS: float = 1.0
+
+
+# The synthetic audit log, generated once for the module
+@pytest.fixture(scope='module')
+def audit_log(tmp_path_factory: pytest.TempPathFactory) -> AuditLog:
+    directory = str(tmp_path_factory.mktemp('audit'))
+    generate_audit_log(directory, AUDIT_EVENTS, AUDIT_DAYS, AUDIT_USERS, AUDIT_ENTRIES, FIRST_DAY)
+    return AuditLog(directory)
+
+
+# Runs a query and records whether its slowest round met the target; that is left to the report
+# rather than asserted, as it depends on the machine
+def run_query(benchmark: BenchmarkFixture, audit_log: AuditLog, **filters: int) -> AuditQueryResult:
+    result = benchmark.pedantic(audit_log.query, kwargs=dict(filters, limit=50), rounds=5, warmup_rounds=1)
+    benchmark.extra_info['matches'] = result.total
+    benchmark.extra_info['target_seconds'] = TARGET_SECONDS
+    if benchmark.stats is not None:
+        benchmark.extra_info['met_target'] = benchmark.stats.stats.max < TARGET_SECONDS
+    return result
+
+
+# Benchmark every event of one user, about an eighth of the log
+def test_query_user(benchmark: BenchmarkFixture, audit_log: AuditLog) -> None:
+    result = run_query(benchmark, audit_log, user_id=1)
+    assert result.total > AUDIT_EVENTS // AUDIT_USERS // 2
+
+# Benchmark every event about one login
+def test_query_entry(benchmark: BenchmarkFixture, audit_log: AuditLog) -> None:
+    result = run_query(benchmark, audit_log, entry_id=42)
+    assert all(record.entry_id == 42 for record in result.records)
+
+# Benchmark a week of the log, cutting through partitions at both ends
+def test_query_time_range(benchmark: BenchmarkFixture, audit_log: AuditLog) -> None:
+    since = (FIRST_DAY + 10) * PARTITION_SECONDS + 3600
+    result = run_query(benchmark, audit_log, since=since, until=since + 7 * PARTITION_SECONDS)
+    assert result.total > 0
+
+# Benchmark one user's events in a time range
+def test_query_user_time_range(benchmark: BenchmarkFixture, audit_log: AuditLog) -> None:
+    since = (FIRST_DAY + 10) * PARTITION_SECONDS + 3600
+    result = run_query(benchmark, audit_log, user_id=3, since=since, until=since + 7 * PARTITION_SECONDS)
+    assert all(record.user_id == 3 for record in result.records)
+
+# Benchmark counting the whole log
+def test_query_all(benchmark: BenchmarkFixture, audit_log: AuditLog) -> None:
+    result = run_query(benchmark, audit_log)
+    assert result.total == AUDIT_EVENTS // AUDIT_DAYS * AUDIT_DAYS
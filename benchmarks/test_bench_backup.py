@@ -0,0 +1,39 @@
+import itertools
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from core.data_models import User
+from db.backup import SnapshotResult, create_snapshot, dedup_report
+from db.database import DatabaseManager
+
+
+# A copy of the shared vault in a file of its own, so the logins the benchmark writes don't leak into other tests
+@pytest.fixture
+def backup_vault(vault: tuple[DatabaseManager, list[User]], tmp_path):
+    shared, users = vault
+    db = DatabaseManager(str(tmp_path / 'vault.db'))
+    shared.conn.backup(db.conn)
+    yield db, users
+    db.close()
+
+
+# Benchmark an incremental snapshot after a small write, the common case once a first full snapshot exists.
+# The deduplication saving is recorded alongside the timings
+def test_incremental_snapshot(benchmark: BenchmarkFixture, backup_vault: tuple[DatabaseManager, list[User]], tmp_path) -> None:
+    db, users = backup_vault
+    backup_dir = str(tmp_path / 'backups')
+    _ = create_snapshot(db, backup_dir)
+    counter = itertools.count()
+
+    def snapshot() -> SnapshotResult:
+        _ = db.insert_login(users[0].id, f'Backup{next(counter)}', 'account', b'encrypted')
+        return create_snapshot(db, backup_dir)
+
+    result = benchmark.pedantic(snapshot, rounds=5)
+    report = dedup_report(backup_dir)
+    benchmark.extra_info['snapshot_bytes'] = result.size
+    benchmark.extra_info['new_bytes'] = result.new_bytes
+    benchmark.extra_info['dedup_saved_bytes'] = report.saved_bytes
+
+    assert result.new_chunks < result.chunk_count
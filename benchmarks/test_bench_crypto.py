@@ -0,0 +1,81 @@
+import base64
+import tracemalloc
+from typing import Callable
+
+import pytest
+from cryptography.fernet import Fernet
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from core.encryption import EncryptionManager, SessionKey
+from core.secret_buffer import SecretBuffer
+
+PASSWORD: str = 'correct-horse-battery-staple'
+
+
+@pytest.fixture(scope='module')
+def encryption() -> EncryptionManager:
+    return EncryptionManager()
+
+
+@pytest.fixture(scope='module')
+def key(encryption: EncryptionManager) -> bytes:
+    return encryption.hash_master_password('BenchMaster123!@#')[1]
+
+
+# Benchmark the original scrypt key derivation (see test_bench_kdf.py for the others)
+def test_derive_key(benchmark: BenchmarkFixture, encryption: EncryptionManager) -> None:
+    _ = benchmark(encryption.derive_key, 'BenchMaster123!@#', b'sixteen_byte_sal')
+
+# Benchmark encrypting a typical password
+def test_encrypt_password(benchmark: BenchmarkFixture, encryption: EncryptionManager, key: bytes) -> None:
+    _ = benchmark(encryption.encrypt_password, key, PASSWORD)
+
+# Benchmark decrypting a typical password
+def test_decrypt_password(benchmark: BenchmarkFixture, encryption: EncryptionManager, key: bytes) -> None:
+    token = encryption.encrypt_password(key, PASSWORD)
+    result = benchmark(encryption.decrypt_password, key, token)
+
+    assert result == PASSWORD.encode()
+
+
+# Returns the peak bytes Python allocates during one call, measured after a warm-up call
+def peak_allocation(func: Callable[[], object]) -> int:
+    _ = func()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        _ = func()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+# Benchmark decrypting into a wipeable buffer with a signed-in session's key, recording the peak
+# Python allocation per call against building a Fernet for every call, as before sessions kept one
+def test_decrypt_allocations(benchmark: BenchmarkFixture, encryption: EncryptionManager, key: bytes) -> None:
+    session_key = SessionKey(key)
+    token = encryption.encrypt_password(key, PASSWORD)
+
+    def decrypt() -> None:
+        with encryption.decrypt_password(session_key, token):
+            pass
+
+    peak = peak_allocation(decrypt)
+    baseline_peak = peak_allocation(lambda: Fernet(base64.urlsafe_b64encode(key)).decrypt(token))
+    benchmark(decrypt)
+    benchmark.extra_info['peak_bytes'] = peak
+    benchmark.extra_info['baseline_peak_bytes'] = baseline_peak
+    assert peak < baseline_peak
+
+# Benchmark encrypting from a wipeable buffer with a session's key, recording the peak Python
+# allocation per call against building a Fernet for every call
+def test_encrypt_allocations(benchmark: BenchmarkFixture, encryption: EncryptionManager, key: bytes) -> None:
+    session_key = SessionKey(key)
+    password = SecretBuffer.from_str(PASSWORD)
+
+    peak = peak_allocation(lambda: encryption.encrypt_password(session_key, password))
+    baseline_peak = peak_allocation(lambda: Fernet(base64.urlsafe_b64encode(key)).encrypt(PASSWORD.encode()))
+    _ = benchmark(encryption.encrypt_password, session_key, password)
+    benchmark.extra_info['peak_bytes'] = peak
+    benchmark.extra_info['baseline_peak_bytes'] = baseline_peak
+    assert peak < baseline_peak
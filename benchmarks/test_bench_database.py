@@ -0,0 +1,107 @@
+import itertools
+import time
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from benchmarks.synthetic import add_custom_fields, organise_vault, schedule_rotation
+from core.data_models import User
+from db.database import DatabaseManager
+from util.enums import InsertStatus
+
+
+# Benchmark inserting a single login
+def test_insert_login(benchmark: BenchmarkFixture, empty_vault: tuple[DatabaseManager, User]) -> None:
+    db, user = empty_vault
+    counter = itertools.count()
+
+    def insert() -> InsertStatus:
+        return db.insert_login(user.id, f'Service{next(counter)}', 'account', b'encrypted')
+
+    assert benchmark(insert) == InsertStatus.SUCCESS
+
+# Benchmark fetching every login for one user as the vault grows
+def test_get_user_logins(benchmark: BenchmarkFixture, vault: tuple[DatabaseManager, list[User]]) -> None:
+    db, users = vault
+    logins = benchmark(db.get_user_logins, users[0].id)
+
+    assert logins
+
+# Benchmark looking up logins by service name as the vault grows
+def test_get_logins_from_name(benchmark: BenchmarkFixture, vault: tuple[DatabaseManager, list[User]]) -> None:
+    db, users = vault
+    service_name = db.get_user_logins(users[0].id)[0].service_name
+    logins = benchmark(db.get_logins_from_name, users[0].id, service_name)
+
+    assert logins
+
+# The first user's vault with 1% of its entries tagged 'work' and 1% filed under 'Archive'
+@pytest.fixture
+def organised_vault(vault: tuple[DatabaseManager, list[User]]) -> tuple[DatabaseManager, User]:
+    db, users = vault
+    organise_vault(db, users[0], 'work', 'Archive', 100)
+    return db, users[0]
+
+# Benchmark listing the logins with a tag; should stay in single-digit milliseconds at 100k entries
+def test_filter_logins_by_tag(benchmark: BenchmarkFixture, organised_vault: tuple[DatabaseManager, User]) -> None:
+    db, user = organised_vault
+    logins = benchmark(db.filter_logins, user.id, 'work')
+
+    assert logins
+    benchmark.extra_info['matches'] = len(logins)
+
+# Benchmark combining a folder with a name prefix
+def test_filter_logins_by_folder_and_prefix(benchmark: BenchmarkFixture, organised_vault: tuple[DatabaseManager, User]) -> None:
+    db, user = organised_vault
+    prefix = db.get_user_logins(user.id)[0].service_name[:3]
+    logins = benchmark(db.filter_logins, user.id, None, 'Archive', prefix)
+
+    benchmark.extra_info['matches'] = len(logins)
+
+# The first user's vault with a rotation policy on 1% of its entries, half of them overdue
+@pytest.fixture
+def rotating_vault(vault: tuple[DatabaseManager, list[User]]) -> tuple[DatabaseManager, User, int]:
+    db, users = vault
+    now = int(time.time())
+    schedule_rotation(db, users[0], 100, now)
+    return db, users[0], now
+
+# Benchmark the sign-in count of passwords due within a week; one pass over the due-date index
+def test_count_due_logins(benchmark: BenchmarkFixture, rotating_vault: tuple[DatabaseManager, User, int]) -> None:
+    db, user, now = rotating_vault
+    due, overdue = benchmark(db.count_due_logins, user.id, now + 7 * 86400, now)
+
+    assert due >= overdue > 0
+    benchmark.extra_info['due'] = due
+
+# Benchmark listing the passwords due within a week, most overdue first
+def test_get_due_logins(benchmark: BenchmarkFixture, rotating_vault: tuple[DatabaseManager, User, int]) -> None:
+    db, user, now = rotating_vault
+    logins = benchmark(db.get_due_logins, user.id, now + 7 * 86400)
+
+    assert logins
+    benchmark.extra_info['matches'] = len(logins)
+
+# The first user's vault with custom fields on a tenth of its entries
+@pytest.fixture
+def fielded_vault(vault: tuple[DatabaseManager, list[User]]) -> tuple[DatabaseManager, User, list[int]]:
+    db, users = vault
+    add_custom_fields(db, users[0], 10)
+    return db, users[0], [login.id for login in db.get_user_logins(users[0].id)]
+
+# Benchmark fetching the fields of every login in the user's vault, as listing does; one query
+# however many logins there are
+def test_get_login_fields(benchmark: BenchmarkFixture, fielded_vault: tuple[DatabaseManager, User, list[int]]) -> None:
+    db, user, entry_ids = fielded_vault
+    fields = benchmark(db.get_login_fields, user.id, entry_ids)
+
+    assert fields
+    benchmark.extra_info['logins'] = len(entry_ids)
+    benchmark.extra_info['fields'] = sum(len(entry_fields) for entry_fields in fields.values())
+
+# Benchmark reading a single field by name, as showing one does
+def test_get_login_field(benchmark: BenchmarkFixture, fielded_vault: tuple[DatabaseManager, User, list[int]]) -> None:
+    db, user, entry_ids = fielded_vault
+    field = benchmark(db.get_login_field, user.id, entry_ids[0], 'pin')
+
+    assert field is not None
@@ -0,0 +1,18 @@
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from core.password_generator import PasswordPolicy, generate_batch, generate_passphrase, generate_password
+
+
+# Benchmark generating a single password with the default policy
+def test_generate_password(benchmark: BenchmarkFixture) -> None:
+    assert len(benchmark(generate_password)) == 20
+
+# Benchmark bulk generation; divide the mean by 100,000 for per-password cost
+def test_generate_batch(benchmark: BenchmarkFixture) -> None:
+    passwords = benchmark(generate_batch, PasswordPolicy(), 100_000)
+
+    assert len(passwords) == 100_000
+
+# Benchmark generating a diceware passphrase
+def test_generate_passphrase(benchmark: BenchmarkFixture) -> None:
+    assert benchmark(generate_passphrase).count('-') == 5
@@ -0,0 +1,32 @@
+import os
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from core.kdf import Kdf, parse_kdf
+
+PASSWORD: bytes = b'BenchMaster123!@#'
+SALT: bytes = b'sixteen_byte_sal'
+
+# KDFs compared: the original scrypt and a costlier scrypt, then Argon2id at the RFC 9106 memory
+# and pass count with 1 to 8 lanes, and the OWASP minimum (19 MiB, 2 passes, 1 lane). On a host
+# with several cores, more lanes fill the same memory in less wall-clock time
+SPECS: tuple[str, ...] = (
+    'scrypt$n=16384,r=8,p=1',
+    'scrypt$n=65536,r=8,p=1',
+    'argon2id$m=65536,t=3,p=1',
+    'argon2id$m=65536,t=3,p=2',
+    'argon2id$m=65536,t=3,p=4',
+    'argon2id$m=65536,t=3,p=8',
+    'argon2id$m=19456,t=2,p=1',
+)
+
+
+# Benchmark deriving one master key with each KDF and parameter set
+@pytest.mark.parametrize('spec', SPECS)
+def test_derive(benchmark: BenchmarkFixture, spec: str) -> None:
+    kdf: Kdf = parse_kdf(spec)
+    key = benchmark.pedantic(kdf.derive, args=(PASSWORD, SALT), rounds=5, warmup_rounds=1)
+
+    assert len(key) == 32
+    benchmark.extra_info['cpus'] = os.cpu_count()
@@ -0,0 +1,68 @@
+import os
+import sqlite3
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from core.data_models import User
+from core.lookup_snapshot import LookupSnapshot, write_lookup_snapshot
+from core.vault import Vault
+from db.database import DatabaseManager
+from db.statements import STATEMENTS
+
+
+# The benchmark vault copied to a database file, the first user's lookup snapshot, and a service name to look up
+@pytest.fixture
+def lookup_files(vault: tuple[DatabaseManager, list[User]], tmp_path) -> tuple[str, str, User, str]:
+    db, users = vault
+    db_path = str(tmp_path / 'vault.db')
+    target = sqlite3.connect(db_path)
+    db.conn.backup(target)
+    target.close()
+
+    snapshot_path = write_lookup_snapshot(Vault(db), users[0], str(tmp_path / 'lookup'))
+    service_name = db.get_user_logins(users[0].id)[-1].service_name
+    return db_path, snapshot_path, users[0], service_name
+
+
+# Benchmark a scripted read from the snapshot: open and map the file, look up one service, close it
+def test_snapshot_lookup_cold(benchmark: BenchmarkFixture, lookup_files: tuple[str, str, User, str]) -> None:
+    _, path, user, service_name = lookup_files
+
+    def lookup() -> list[tuple[str | None, bytes]]:
+        with LookupSnapshot(path) as snapshot:
+            return snapshot.lookup(user.master_hash, service_name)
+
+    assert benchmark(lookup)
+    benchmark.extra_info['snapshot_bytes'] = os.path.getsize(path)
+
+# Benchmark a lookup in a snapshot that is already open
+def test_snapshot_lookup_warm(benchmark: BenchmarkFixture, lookup_files: tuple[str, str, User, str]) -> None:
+    _, path, user, service_name = lookup_files
+
+    with LookupSnapshot(path) as snapshot:
+        assert benchmark(snapshot.lookup, user.master_hash, service_name)
+
+# Benchmark the same read through SQLite: connect to the database file, run the query, close it.
+# A bare connection, since opening a DatabaseManager also checks the schema and migrations
+def test_sqlite_lookup_cold(benchmark: BenchmarkFixture, lookup_files: tuple[str, str, User, str]) -> None:
+    db_path, _, user, service_name = lookup_files
+
+    def lookup() -> list[tuple]:
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute(STATEMENTS['select_logins_by_name'], (user.id, service_name)).fetchall()
+        finally:
+            conn.close()
+
+    assert benchmark(lookup)
+
+# Benchmark the query on a database that is already open
+def test_sqlite_lookup_warm(benchmark: BenchmarkFixture, lookup_files: tuple[str, str, User, str]) -> None:
+    db_path, _, user, service_name = lookup_files
+
+    db = DatabaseManager(db_path)
+    try:
+        assert benchmark(db.get_logins_from_name, user.id, service_name)
+    finally:
+        db.close()
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+MAIN: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+# Text of the first prompt, printed once startup has finished
+PROMPT: bytes = b'Please select a choice'
+
+# Median launch to first prompt the program aims for
+TARGET_SECONDS: float = 0.1
+
+
+# Launches the program in a fresh process and waits for the welcome prompt, then exits it
+def launch_to_prompt(cwd: str, env: dict[str, str]) -> None:
+    process = subprocess.Popen([sys.executable, MAIN], cwd=cwd, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    assert process.stdout is not None and process.stdin is not None
+    output = b''
+    while PROMPT not in output:
+        chunk = os.read(process.stdout.fileno(), 4096)
+        assert chunk, 'program exited before its first prompt'
+        output += chunk
+    _ = process.communicate(b'4\n')
+
+
+# Benchmark a cold start, from launching the process to the first prompt, outside the repository
+# with an existing vault. The warm-up launch creates the vault, and bytecode caching is left on, as
+# it is for an installed copy. Whether the median met the target is recorded rather than asserted,
+# as it depends on the machine; compare against a stored baseline to catch regressions
+def test_cold_start(benchmark: BenchmarkFixture, tmp_path) -> None:
+    env = dict(os.environ, XDG_DATA_HOME=str(tmp_path / 'data'), XDG_STATE_HOME=str(tmp_path / 'state'))
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    benchmark.pedantic(launch_to_prompt, args=(str(tmp_path), env), rounds=10, warmup_rounds=1)
+
+    assert os.path.exists(tmp_path / 'data' / 'cosmicc' / 'vault.db')
+    benchmark.extra_info['target_seconds'] = TARGET_SECONDS
+    if benchmark.stats is not None:
+        benchmark.extra_info['met_target'] = benchmark.stats.stats.median < TARGET_SECONDS
@@ -0,0 +1,52 @@
+import itertools
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from core.data_models import User
+from core.sync import DirectoryRemote, SyncEngine, SyncResult
+from core.vault import Vault
+from db.database import DatabaseManager
+
+# Logins changed on one device between syncs
+CHANGES: int = 100
+
+
+# Two devices already in sync over a vault of the benchmarked size
+@pytest.fixture
+def synced_devices(vault: tuple[DatabaseManager, list[User]], tmp_path):
+    db, users = vault
+    user = users[0]
+    remote = DirectoryRemote(str(tmp_path / 'remote'))
+    source = Vault(db)
+
+    replica = Vault(DatabaseManager(':memory:'))
+    _ = replica.database.insert_user(user.username, user.master_hash, user.salt, user.kdf)
+    replica_user = replica.database.get_user_from_username(user.username)
+    assert replica_user is not None
+
+    _ = SyncEngine(source).sync(user, remote)
+    _ = SyncEngine(replica).sync(replica_user, remote)
+    yield (source, user), (replica, replica_user), remote
+    replica.database.close()
+
+
+# Benchmark pushing and pulling 100 changed logins. Time and bytes on the wire should stay flat as the vault grows
+def test_sync_changes(benchmark: BenchmarkFixture, synced_devices) -> None:
+    (source, user), (replica, replica_user), remote = synced_devices
+    logins = source.database.get_user_logins(user.id)[:CHANGES]
+    counter = itertools.count()
+
+    def change() -> None:
+        round_id = next(counter)
+        for login in logins:
+            _ = source.database.update_login(user.id, login.id, login.service_name, f'changed{round_id}')
+
+    def sync() -> tuple[SyncResult, SyncResult]:
+        return SyncEngine(source).sync(user, remote), SyncEngine(replica).sync(replica_user, remote)
+
+    pushed, pulled = benchmark.pedantic(sync, setup=change, rounds=5)
+    benchmark.extra_info['bytes_sent'] = pushed.bytes_sent
+    benchmark.extra_info['bytes_received'] = pulled.bytes_received
+
+    assert pushed.pushed == pulled.applied == CHANGES
@@ -0,0 +1,77 @@
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from core.data_models import User
+from core.tui import MetadataIndex, TuiState, render
+from db.database import DatabaseManager
+
+# A redraw has to fit in one 60 Hz frame to feel instant
+FRAME_SECONDS: float = 0.016
+
+
+# A curses window that discards what is drawn, so only the TUI's own work is measured
+class NullScreen:
+    def getmaxyx(self) -> tuple[int, int]:
+        return 50, 120
+
+    def erase(self) -> None:
+        pass
+
+    def addnstr(self, y: int, x: int, text: str, n: int, attr: int = 0) -> None:
+        pass
+
+    def move(self, y: int, x: int) -> None:
+        pass
+
+    def refresh(self) -> None:
+        pass
+
+
+# The metadata of every login in the vault in one index, so it holds the full benchmarked size
+@pytest.fixture
+def metadata(vault: tuple[DatabaseManager, list[User]]) -> list[tuple[int, str, str | None]]:
+    db, users = vault
+    return [row for user in users for row in db.get_login_metadata(user.id)]
+
+
+# Benchmark the first keystroke of a search, which scans every login, and the redraw after it. Whether
+# it fit in a frame is recorded rather than asserted, as that depends on the machine
+def test_first_keystroke(benchmark: BenchmarkFixture, metadata) -> None:
+    screen = NullScreen()
+
+    def setup():
+        index = MetadataIndex(metadata)
+        return (index, TuiState(query='a')), {}
+
+    def keystroke(index: MetadataIndex, state: TuiState) -> None:
+        render(screen, state, index, index.filter(state.query))
+
+    benchmark.pedantic(keystroke, setup=setup, rounds=20)
+    benchmark.extra_info['frame_seconds'] = FRAME_SECONDS
+    if benchmark.stats is not None:
+        benchmark.extra_info['within_frame'] = benchmark.stats.stats.mean < FRAME_SECONDS
+
+
+# Benchmark typing a whole query one keystroke at a time, each narrowing the last matches
+def test_typing(benchmark: BenchmarkFixture, metadata) -> None:
+    screen = NullScreen()
+    query = 'github-1'
+
+    def setup():
+        return (MetadataIndex(metadata),), {}
+
+    def typing(index: MetadataIndex) -> None:
+        state = TuiState()
+        for char in query:
+            state.query += char
+            render(screen, state, index, index.filter(state.query))
+
+    benchmark.pedantic(typing, setup=setup, rounds=20)
+    benchmark.extra_info['keystrokes'] = len(query)
+
+
+# Benchmark building the index from the database after sign-in
+def test_load_index(benchmark: BenchmarkFixture, vault: tuple[DatabaseManager, list[User]]) -> None:
+    db, users = vault
+    index = benchmark(lambda: MetadataIndex(db.get_login_metadata(users[0].id)))
+    assert len(index) > 0
@@ -0,0 +1,22 @@
+import contextlib
+import io
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from core.data_models import User
+from core.vault import Vault
+from db.database import DatabaseManager
+
+
+# Benchmark decrypting and formatting one user's whole vault
+def test_list_logins(benchmark: BenchmarkFixture, vault: tuple[DatabaseManager, list[User]]) -> None:
+    db, users = vault
+    service = Vault(db)
+
+    def list_logins() -> str:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            service.list_logins(users[0])
+        return output.getvalue()
+
+    assert 'Service:' in benchmark(list_logins)
@@ -0,0 +1,115 @@
+import os
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
+
+from core.secret_buffer import SecretBuffer
+from util.lazy_import import lazy_import
+
+# Loaded on first use, like the rest of cryptography (see core/encryption.py). AESGCM.decrypt_into needs
+# cryptography 47 or later
+aead = lazy_import('cryptography.hazmat.primitives.ciphers.aead')
+exceptions = lazy_import('cryptography.exceptions')
+
+# Plaintext bytes per chunk. Each chunk is a row of its own, so storing or saving an attachment
+# holds about one chunk in memory however large the file is
+CHUNK_SIZE: int = 256 * 1024
+
+# Bytes AES-GCM adds to each chunk
+TAG_SIZE: int = 16
+
+# Random bytes of each attachment's nonces; a 4-byte chunk counter and a last-chunk flag make up the rest
+NONCE_PREFIX_SIZE: int = 7
+
+# The counter's limit: 2^32 chunks of CHUNK_SIZE is 1 PiB
+MAX_CHUNKS: int = 2**32
+
+
+class CorruptAttachment(ValueError):
+    # An attachment whose chunks don't authenticate: the wrong key, or chunks that were changed,
+    # reordered, dropped or cut off at the end
+    pass
+
+
+# Returns the nonce of a chunk: the attachment's prefix, the chunk's position and whether it is the last
+def _nonce(nonce_prefix: bytes, index: int, last: bool) -> bytes:
+    return nonce_prefix + index.to_bytes(4, 'big') + (b'\x01' if last else b'\x00')
+
+
+# Returns how many chunks a file of the given size is split into. An empty file is one empty chunk,
+# so even it ends with a chunk marked last
+def chunk_count(size: int, chunk_size: int = CHUNK_SIZE) -> int:
+    return max(1, -(-size // chunk_size))
+
+
+# Encrypts the first size bytes of source chunk by chunk with AES-256-GCM, following the STREAM
+# construction (Hoang et al., "Online Authenticated-Encryption and its Nonce-Reuse Misuse-Resistance"):
+# each chunk's nonce carries its position and whether it is the last, so chunks can't be reordered,
+# dropped or truncated without failing authentication. Yields the encrypted chunks in order. The
+# plaintext is read into one buffer that is wiped at the end. Raises ValueError if source ends early
+def encrypt_chunks(key: bytes, nonce_prefix: bytes, source: BinaryIO, size: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    count = chunk_count(size, chunk_size)
+    if count > MAX_CHUNKS:
+        raise ValueError(f'Attachments are limited to {MAX_CHUNKS} chunks')
+
+    cipher = aead.AESGCM(key)
+    with SecretBuffer(min(size, chunk_size)) as buffer:
+        view = memoryview(buffer)
+        for index in range(count):
+            length = min(chunk_size, size - index * chunk_size)
+            filled = 0
+            while filled < length:
+                read = source.readinto(view[filled:length])
+                if not read:
+                    raise ValueError(f'The file ended after {index * chunk_size + filled} of {size} bytes')
+                filled += read
+            yield cipher.encrypt(_nonce(nonce_prefix, index, index == count - 1), view[:length], None)
+        view.release()
+
+
+# Encrypts a buffer already in memory, such as a note, the same way. Chunks are encrypted from
+# views of it, so no other plaintext copy is made
+def encrypt_buffer(key: bytes, nonce_prefix: bytes, data: bytes | bytearray, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    cipher = aead.AESGCM(key)
+    view = memoryview(data)
+    count = chunk_count(len(view), chunk_size)
+    for index in range(count):
+        yield cipher.encrypt(_nonce(nonce_prefix, index, index == count - 1), view[index * chunk_size:(index + 1) * chunk_size], None)
+    view.release()
+
+
+# Decrypts the chunks of an attachment in order, yielding each chunk's plaintext. Every yielded
+# chunk is a view of one buffer that is overwritten by the next chunk and wiped at the end, so use
+# (or copy) each before asking for the next. Raises CorruptAttachment if a chunk fails to
+# authenticate or the last one is missing
+def decrypt_chunks(key: bytes, nonce_prefix: bytes, chunks: Iterable[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[memoryview]:
+    cipher = aead.AESGCM(key)
+    with SecretBuffer(chunk_size) as buffer:
+        view = memoryview(buffer)
+        # Each chunk is only known to be the last once the next is asked for, so stay one chunk behind
+        pending: bytes | None = None
+        index = 0
+        for chunk in chunks:
+            if pending is not None:
+                yield _decrypt_chunk(cipher, nonce_prefix, index, False, pending, view)
+                index += 1
+            pending = chunk
+        if pending is None:
+            raise CorruptAttachment('The attachment has no chunks')
+        yield _decrypt_chunk(cipher, nonce_prefix, index, True, pending, view)
+        view.release()
+
+
+def _decrypt_chunk(cipher: 'aead.AESGCM', nonce_prefix: bytes, index: int, last: bool, chunk: bytes, view: memoryview) -> memoryview:
+    length = len(chunk) - TAG_SIZE
+    if not 0 <= length <= len(view):
+        raise CorruptAttachment(f'Chunk {index} has the wrong size')
+    try:
+        _ = cipher.decrypt_into(_nonce(nonce_prefix, index, last), chunk, None, view[:length])
+    except exceptions.InvalidTag:
+        raise CorruptAttachment(f'Chunk {index} failed to authenticate') from None
+    return view[:length]
+
+
+# Returns a new random nonce prefix for an attachment
+def new_nonce_prefix() -> bytes:
+    return os.urandom(NONCE_PREFIX_SIZE)
@@ -0,0 +1,186 @@
+import array
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from util.enums import AuditEvent
+from util.paths import data_dir
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Default directory of the audit partitions
+AUDIT_DIR: str = os.path.join(data_dir(), 'audit')
+
+# Every record is four little-endian u32 fields: timestamp, user id, entry id (0 when the event
+# isn't about one login) and event
+FIELDS: int = 4
+RECORD_SIZE: int = FIELDS * 4
+
+# Each UTC day of events goes to its own partition file
+PARTITION_SECONDS: int = 86400
+PARTITION_SUFFIX: str = '.audit'
+
+# Records buffered before they are written out without waiting for a flush
+FLUSH_RECORDS: int = 256
+
+# Events whose entry id is a shared collection entry's, which are numbered apart from logins
+SHARED_EVENTS: frozenset[int] = frozenset((AuditEvent.SHARED_REVEAL.value, AuditEvent.SHARED_ADD.value))
+
+
+@dataclass
+class AuditRecord:
+    timestamp: int
+    user_id: int
+    entry_id: int
+    event: AuditEvent
+
+
+@dataclass
+class AuditQueryResult:
+    # Every match is counted, but only the newest are returned
+    total: int
+    records: list[AuditRecord]
+
+
+# Returns the partition file name of a day number (days since the epoch)
+def _partition_name(day: int) -> str:
+    return time.strftime('%Y%m%d', time.gmtime(day * PARTITION_SECONDS)) + PARTITION_SUFFIX
+
+
+# Reads a partition into a flat array of u32 fields. A record cut short by a crash mid-write is dropped
+def _read_partition(path: str) -> array.array:
+    with open(path, 'rb') as f:
+        data = f.read()
+    fields = array.array('I')
+    fields.frombytes(memoryview(data)[:len(data) - len(data) % RECORD_SIZE])
+    if sys.byteorder == 'big':
+        fields.byteswap()
+    return fields
+
+
+# Returns the positions of the records in one partition that pass the filters. Each filter
+# scans a single column sliced out at C speed, and later filters only look at earlier matches.
+# An entry id matches logins, or shared collection entries when shared is set
+def _match(fields: array.array, user_id: int | None, entry_id: int | None, since: int | None, until: int | None,
+           shared: bool = False) -> list[int] | range:
+    positions: list[int] | range = range(len(fields) // FIELDS)
+    for column, wanted in ((2, entry_id), (1, user_id)):
+        if wanted is None:
+            continue
+        values = fields[column::FIELDS]
+        if isinstance(positions, range):
+            positions = [i for i, value in enumerate(values) if value == wanted]
+        else:
+            positions = [i for i in positions if values[i] == wanted]
+
+    if entry_id is not None:
+        events = fields[3::FIELDS]
+        positions = [i for i in positions if (events[i] in SHARED_EVENTS) == shared]
+
+    if since is not None or until is not None:
+        low = since if since is not None else 0
+        high = until if until is not None else 2**32
+        timestamps = fields[0::FIELDS]
+        if isinstance(positions, range):
+            positions = [i for i, value in enumerate(timestamps) if low <= value < high]
+        else:
+            positions = [i for i in positions if low <= timestamps[i] < high]
+    return positions
+
+
+class AuditLog:
+    # An append-only trail of who signed in and which logins they revealed, added, updated or
+    # deleted. Events are fixed-width binary records in one file per UTC day, so a query skips
+    # whole days outside its time range and filters the rest column by column. Records are
+    # buffered and appended in one write when the CLI finishes an action, rather than costing
+    # a write per event
+    def __init__(self, directory: str = AUDIT_DIR) -> None:
+        self.directory: str = directory
+        self._lock: threading.Lock = threading.Lock()
+        self._pending: dict[int, bytearray] = {}
+        self._pending_count: int = 0
+
+    # Buffers an event, writing the buffer out once it is full
+    def record(self, event: AuditEvent, user_id: int, entry_id: int | None = None, timestamp: int | None = None) -> None:
+        timestamp = int(time.time()) if timestamp is None else timestamp
+        fields = array.array('I', (timestamp, user_id, entry_id or 0, event.value))
+        if sys.byteorder == 'big':
+            fields.byteswap()
+        with self._lock:
+            self._pending.setdefault(timestamp // PARTITION_SECONDS, bytearray()).extend(fields.tobytes())
+            self._pending_count += 1
+            if self._pending_count >= FLUSH_RECORDS:
+                self._flush_locked()
+
+    # Appends the buffered events to their partitions
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for day in list(self._pending):
+                # O_APPEND keeps the records of several processes from overwriting each other
+                fd = os.open(os.path.join(self.directory, _partition_name(day)), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    view = memoryview(self._pending[day])
+                    while view:
+                        view = view[os.write(fd, view):]
+                finally:
+                    os.close(fd)
+                del self._pending[day]
+        except OSError as e:
+            # Whatever wasn't written stays buffered for the next flush
+            logger.error(f'Error writing the audit log to {self.directory}: {e}')
+            return
+        self._pending_count = 0
+
+    # Returns (day, path) of every partition, oldest first
+    def partitions(self) -> list[tuple[int, str]]:
+        if not os.path.isdir(self.directory):
+            return []
+        # Only queries need this, so recording events doesn't load it at startup
+        import calendar
+
+        partitions: list[tuple[int, str]] = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(PARTITION_SUFFIX):
+                continue
+            try:
+                day = calendar.timegm(time.strptime(name.removesuffix(PARTITION_SUFFIX), '%Y%m%d')) // PARTITION_SECONDS
+            except ValueError:
+                logger.warning(f'Skipping {name} in {self.directory}: not an audit partition')
+                continue
+            partitions.append((day, os.path.join(self.directory, name)))
+        return sorted(partitions)
+
+    # Counts the events matching every filter given and returns the newest `limit` of them, oldest
+    # first. since is inclusive and until exclusive, both in epoch seconds. entry_id is a login's id,
+    # or a shared collection entry's when shared is set
+    def query(self, user_id: int | None = None, entry_id: int | None = None, since: int | None = None,
+              until: int | None = None, limit: int | None = None, shared: bool = False) -> AuditQueryResult:
+        self.flush()
+        result = AuditQueryResult(0, [])
+        for day, path in reversed(self.partitions()):
+            start, end = day * PARTITION_SECONDS, (day + 1) * PARTITION_SECONDS
+            if (since is not None and end <= since) or (until is not None and start >= until):
+                continue
+
+            fields = _read_partition(path)
+            # Only partitions the range cuts through need their timestamps checked
+            inside = (since is None or since <= start) and (until is None or end <= until)
+            positions = _match(fields, user_id, entry_id, None if inside else since, None if inside else until, shared)
+            result.total += len(positions)
+
+            wanted = len(positions) if limit is None else min(len(positions), max(0, limit - len(result.records)))
+            for i in reversed(positions[len(positions) - wanted:]):
+                offset = i * FIELDS
+                result.records.append(AuditRecord(fields[offset], fields[offset + 1], fields[offset + 2], AuditEvent(fields[offset + 3])))
+        result.records.reverse()
+        return result
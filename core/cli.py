@@ -1,17 +1,77 @@
-import re
+import os
 import sys
+import time
+from contextlib import nullcontext
 
+from core.attachments import CorruptAttachment
+from core.audit_log import AuditLog
+from core.clipboard import Clipboard
 from core.data_models import User
+from core.kdf import DEFAULT_KDF, Kdf
+from core.kdf_pool import KdfPool
+from core.lookup_snapshot import remove_lookup_snapshot, write_lookup_snapshot
+from core.password_audit import BreachedPasswordIndex, analyze_password
+from core.password_generator import generate_passphrase, generate_password
+from core.totp import TotpSession, parse_totp_secret
 from core.vault import Vault
 from db.database import DatabaseManager
-from util.enums import InsertStatus, RemoveStatus
+from util.enums import AttachmentKind, AuditEvent, FieldKind, InsertStatus, RemoveStatus, SyncStatus
+from util.metrics import metrics
+from util.profiling import ActionProfiler
+
+# Days ahead that a password due for rotation is counted at sign-in and listed in the report
+ROTATION_NOTICE_DAYS: int = 7
+
+# Default days deleted logins and accounts stay in the trash before they are purged
+TRASH_DAYS: int = 30
+
+# Main menu actions in display order, as (action, label)
+MENU_OPTIONS: list[tuple[str, str]] = [
+    ('add', 'Enter a new login'),
+    ('list', 'List all logins'),
+    ('browse', 'Browse logins (full screen, filters as you type)'),
+    ('search', 'List logins by name'),
+    ('update', 'Update a login'),
+    ('history', 'Login history'),
+    ('delete', 'Delete a login'),
+    ('trash', 'Restore a deleted login'),
+    ('codes', 'Show 2FA codes'),
+    ('totp', 'Add a 2FA secret to a login'),
+    ('fields', 'Custom fields (URLs, PINs, security questions...)'),
+    ('attachments', 'Attachments and secure notes'),
+    ('report', 'Security report'),
+    ('reuse', 'Password reuse'),
+    ('rotation', 'Passwords due for rotation'),
+    ('organise', 'Tags, folders and filtering'),
+    ('shared', 'Shared collections'),
+    ('sync', 'Sync with other devices'),
+    ('settings', 'User settings'),
+    ('stats', 'Performance stats'),
+    ('signout', 'Sign out'),
+    ('exit', 'Exit'),
+]
 
 
 class CLIHandler:
-    def __init__(self, db: DatabaseManager) -> None:
+    def __init__(self, db: DatabaseManager, profiler: ActionProfiler | None = None, metrics_file: str | None = None,
+                 kdf_pool: KdfPool | None = None, breach_index: BreachedPasswordIndex | None = None,
+                 sync_remote: str | None = None, clipboard: Clipboard | None = None, lookup_dir: str | None = None,
+                 audit_log: AuditLog | None = None, rotation_notice_days: int = ROTATION_NOTICE_DAYS, kdf: Kdf = DEFAULT_KDF,
+                 trash_days: int = TRASH_DAYS) -> None:
         self.database: DatabaseManager = db
-        self.vault: Vault = Vault(db)
+        self.vault: Vault = Vault(db, kdf_pool, audit_log, kdf)
         self.user: User | None = None
+        self.profiler: ActionProfiler | None = profiler
+        self.metrics_file: str | None = metrics_file
+        self.breach_index: BreachedPasswordIndex | None = breach_index
+        self.totp_session: TotpSession = TotpSession(self.vault.encryption)
+        self.sync_remote: str | None = sync_remote
+        self.clipboard: Clipboard | None = clipboard
+        self.lookup_dir: str | None = lookup_dir
+        self.rotation_notice_days: int = rotation_notice_days
+        self.trash_days: int = trash_days
+        # Database change count when the lookup snapshot was last written
+        self._lookup_changes: int = -1
 
     # Handles registering with user
     def register(self) -> bool:
@@ -42,27 +102,29 @@ class CLIHandler:
 
     # Checks if the password meets the requirements
     def check_password_vaild(self, password: str) -> bool:
-        if len(password) < 15:
+        analysis = analyze_password(password)
+
+        if analysis.length < 15:
             print('Password must be at least 15 characters long. Please try again.')
             return False
 
-        if not re.search(r'[A-Z]', password):
+        if not analysis.has_upper:
             print('Password must contain at least one uppercase letter. Please try again.')
             return False
 
-        if not re.search(r'[a-z]', password):
+        if not analysis.has_lower:
             print('Password must contain at least one lowercase letter. Please try again.')
             return False
 
-        if not re.search(r'\d', password):
+        if not analysis.has_digit:
             print('Password must contain at least one number. Please try again.')
             return False
 
-        if not re.search(r'[!@#$%^&*(),.?:|<>_-]', password):
+        if not analysis.has_special:
             print('Password must contain at least one special character (!@#$%^&*(),.?:|<>_-). Please try again.')
             return False
 
-        if not re.match(r'^[A-Za-z0-9!@#$%^&*(),.?:|<>_-]+$', password):
+        if analysis.has_other:
             print('Password contains invalid characters. Please try again.')
             return False
 
@@ -92,9 +154,17 @@ class CLIHandler:
 
             if self.vault.check_master_password(user, password):
                 print('Password accepted!')
-                self.user = user
+                self.vault.record_event(AuditEvent.SIGN_IN, user)
+                self.flush_audit_log()
+                user = self.vault.upgrade_kdf(user, password)
+                self.user = self.vault.open_session(user)
+                _ = self.vault.backfill_fingerprints(user)
+                self._lookup_changes = -1
+                self.refresh_lookup_snapshot()
                 return True
             else:
+                self.vault.record_event(AuditEvent.SIGN_IN_FAILED, user)
+                self.flush_audit_log()
                 attempts_left = max_attempts - attempt - 1
                 if attempts_left > 0:
                     print(f'Incorrect password. You have {attempts_left} attempt(s) remaining.')
@@ -104,6 +174,20 @@ class CLIHandler:
 
         return False
 
+    # Restores a deleted account from the trash once its master password is given
+    def restore_account(self) -> bool:
+        username = input('Username of the deleted account (or \'exit\' to quit): ').strip()
+        if username == 'exit':
+            return False
+        password = input('Master password of the account: ')
+        status = self.vault.restore_user(username, password)
+        self.flush_audit_log()
+        if status != InsertStatus.SUCCESS:
+            print('No deleted account with that username and password is in the trash.')
+            return False
+        print(f'Account \'{username}\' restored with the logins deleted along with it. You can sign in again.')
+        return True
+
     # Validates and returns non-empty input
     def get_non_empty_input(self, prompt: str, allow_skip: bool = False) -> str | None:
         while True:
@@ -118,44 +202,124 @@ class CLIHandler:
                 continue
             return value
 
+    # Ends the session: forgets the user, wipes their vault key and clears the clipboard and cached TOTP secrets
+    def sign_out(self) -> None:
+        if self.user is not None:
+            self.vault.close_session(self.user)
+        self.user = None
+        self.flush_audit_log()
+        self.totp_session.clear()
+        if self.clipboard is not None:
+            self.clipboard.clear()
+
     # Runs the program and controls the input and output
     def run(self) -> None:
         if self.user is None:
             print('Error: No user signed in.')
             return
 
+        self.show_rotation_summary()
         while True:
             user_choice = self.display_menu()
+            if not self.run_action(user_choice):
+                return
+            self.flush_audit_log()
+            self.refresh_lookup_snapshot()
+
+    # Mentions passwords that are overdue or due soon, from one count over the due-date index
+    def show_rotation_summary(self) -> None:
+        if self.user is None:
+            return
+        now = int(time.time())
+        due, overdue = self.database.count_due_logins(self.user.id, now + self.rotation_notice_days * 86400, now)
+        if due:
+            print(f'\n{due} password(s) due for rotation within {self.rotation_notice_days} days ({overdue} overdue); '
+                  'see \'Passwords due for rotation\'.')
+
+    # Writes out the events the last action added to the audit log
+    def flush_audit_log(self) -> None:
+        if self.vault.audit_log is not None:
+            self.vault.audit_log.flush()
+
+    # Rewrites the lookup snapshot if the last action wrote to the database
+    def refresh_lookup_snapshot(self) -> None:
+        if self.lookup_dir is None or self.user is None or self.database.conn.total_changes == self._lookup_changes:
+            return
+        try:
+            _ = write_lookup_snapshot(self.vault, self.user, self.lookup_dir)
+            self._lookup_changes = self.database.conn.total_changes
+        except (OSError, ValueError) as e:
+            print(f'Could not update the lookup snapshot: {e}')
+
+    # Runs one menu action, returning False once the session should end
+    def run_action(self, user_choice: str) -> bool:
+        if self.user is None:
+            return False
 
+        with self.profiler.profile(user_choice) if self.profiler else nullcontext():
             match user_choice:
-                case '1':
+                case 'add':
                     print('\n--- Adding new login ---')
                     name = self.get_non_empty_input('Service name: ')
                     if name is None:
-                        continue
+                        return True
 
                     username = self.get_non_empty_input('Username: ', allow_skip=True)
-                    password = self.get_non_empty_input('Password: ')
+                    password = self.get_non_empty_input('Password (or \'generate\' / \'passphrase\'): ')
                     if password is None:
-                        continue
+                        return True
+                    if password in ('generate', 'passphrase'):
+                        password = generate_password() if password == 'generate' else generate_passphrase()
+                        self.vault.show_generated_password(password, self.clipboard)
+
+                    reuse_count = self.vault.count_password_reuse(self.user, password)
+                    if reuse_count > 0:
+                        print(f'Warning: this password is already used for {reuse_count} service(s).')
 
-                    status = self.vault.add_login(self.user, name, username, password)
+                    totp_secret = self.get_totp_secret_input(allow_skip=True)
+
+                    status = self.vault.add_login(self.user, name, username, password, totp_secret)
                     if status == InsertStatus.SUCCESS:
                         print('Login added successfully!')
                     else:
                         print('Failed to add login.')
 
-                case '2':
+                case 'list':
                     print('\n--- All Logins ---')
-                    self.vault.list_logins(self.user)
-
-                case '3':
+                    self.vault.list_logins(self.user, self.clipboard)
+
+                case 'browse':
+                    # curses isn't available everywhere (e.g. Windows), so only load it when asked for
+                    try:
+                        from core.tui import run_tui
+                    except ImportError:
+                        print('The full-screen browser needs curses, which is not available here.')
+                        return True
+                    run_tui(self.vault, self.user, self.clipboard)
+
+                case 'search':
                     print('\n--- Search Logins ---')
                     name = self.get_non_empty_input('Service name to search: ')
                     if name is not None:
-                        self.vault.get_login_information(self.user, name)
+                        # Keeps the password out of the scrollback whenever there is a clipboard to use
+                        self.vault.get_login_information(self.user, name, self.clipboard)
+
+                case 'update':
+                    print('\n--- Update Login ---')
+                    name = self.get_non_empty_input('Service name to update: ')
+                    if name is not None:
+                        if self.vault.edit_login(self.user, name, self.clipboard) == InsertStatus.SUCCESS:
+                            print('Login updated successfully!')
+                        else:
+                            print('Failed to update login.')
+
+                case 'history':
+                    print('\n--- Login History ---')
+                    name = self.get_non_empty_input('Service name: ')
+                    if name is not None:
+                        self.vault.show_login_history(self.user, name)
 
-                case '4':
+                case 'delete':
                     print('\n--- Delete Login ---')
                     name = self.get_non_empty_input('Service name to delete: ')
                     if name is not None:
@@ -169,24 +333,119 @@ class CLIHandler:
                         else:
                             print('Deletion cancelled.')
 
-                case '5':
+                case 'trash':
+                    print('\n--- Trash ---')
+                    status = self.vault.restore_from_trash(self.user)
+                    if status == InsertStatus.SUCCESS:
+                        print('Login restored successfully!')
+                    elif status == InsertStatus.ERROR:
+                        print('Failed to restore login.')
+
+                case 'codes':
+                    print('\n--- 2FA Codes ---')
+                    self.show_totp_codes()
+
+                case 'totp':
+                    print('\n--- Add 2FA Secret ---')
+                    name = self.get_non_empty_input('Service name: ')
+                    if name is None:
+                        return True
+                    totp_secret = self.get_totp_secret_input()
+                    if totp_secret is None:
+                        return True
+                    if self.vault.add_totp_secret(self.user, name, totp_secret) == InsertStatus.SUCCESS:
+                        print('2FA secret added successfully!')
+                    else:
+                        print('Failed to add 2FA secret.')
+
+                case 'report':
+                    print('\n--- Security Report ---')
+                    self.vault.security_report(self.user, self.breach_index)
+
+                case 'reuse':
+                    print('\n--- Password Reuse ---')
+                    self.vault.list_password_reuse(self.user)
+
+                case 'fields':
+                    self.manage_fields()
+
+                case 'attachments':
+                    self.manage_attachments()
+
+                case 'rotation':
+                    self.manage_rotation()
+
+                case 'organise':
+                    self.manage_tags()
+
+                case 'shared':
+                    self.manage_collections()
+
+                case 'sync':
+                    print('\n--- Sync ---')
+                    self.sync()
+
+                case 'settings':
                     print('\n--- User Settings ---')
                     self.list_user_settings()
 
-                case '6':
+                case 'stats':
+                    print('\n--- Performance Stats ---')
+                    self.show_stats()
+
+                case 'signout':
                     print('\n--- Sign Out ---')
-                    self.user = None
+                    self.sign_out()
                     print('Signed out successfully.')
-                    return
+                    return False
 
-                case '7':
+                case 'exit':
                     print('Exiting password manager. Goodbye!')
-                    return
+                    self.sign_out()
+                    return False
 
                 case _:
                     pass
 
-    # Displays menu
+        return True
+
+    # Prompts for a base32 TOTP secret or otpauth:// URI until a valid one (or nothing) is given
+    def get_totp_secret_input(self, allow_skip: bool = False) -> str | None:
+        prompt = '2FA secret or otpauth:// URI' + (' (press Enter to skip)' if allow_skip else '') + ': '
+        while True:
+            value = self.get_non_empty_input(prompt, allow_skip=allow_skip)
+            if value is None:
+                return None
+            try:
+                _ = parse_totp_secret(value)
+                return value
+            except ValueError as e:
+                print(f'{e}. Please try again or type \'exit\' to cancel.')
+
+    # Shows the current 2FA codes, refreshing each period until interrupted
+    def show_totp_codes(self) -> None:
+        if self.user is None:
+            return
+
+        # Secrets are decrypted once here; every refresh below only recomputes HMACs
+        self.totp_session.load(self.user, self.database.get_totp_entries(self.user.id))
+        if not self.totp_session.codes():
+            print('You have no logins with 2FA secrets.')
+            return
+
+        print('Press Ctrl+C to return to the menu.')
+        try:
+            while True:
+                codes = self.totp_session.codes()
+                print()
+                for code in codes:
+                    username_display = code.username if code.username else 'N/A'
+                    print(f'{code.code}  {code.service_name} ({username_display})  {code.seconds_remaining:>2}s')
+                time.sleep(min(code.seconds_remaining for code in codes))
+        except KeyboardInterrupt:
+            print()
+
+    # Displays menu and returns the chosen action
     def display_menu(self) -> str:
         if self.user is None:
             return ""
@@ -194,21 +453,370 @@ class CLIHandler:
         print()
         print(f'Welcome {self.user.username}! What would you like to do?')
         print()
-        print('1. Enter a new login')
-        print('2. List all logins')
-        print('3. List logins by name')
-        print('4. Delete a login')
-        print('5. User settings')
-        print('6. Sign out')
-        print('7. Exit')
+        for i, (_, label) in enumerate(MENU_OPTIONS, 1):
+            print(f'{i}. {label}')
         print()
 
         while True:
-            choice = input('\nSelect an option (1-7): ').strip()
-            if choice in ['1', '2', '3', '4', '5', '6', '7']:
-                return choice
+            choice = input(f'\nSelect an option (1-{len(MENU_OPTIONS)}): ').strip()
+            if choice.isdigit() and 1 <= int(choice) <= len(MENU_OPTIONS):
+                return MENU_OPTIONS[int(choice) - 1][0]
             else:
-                print('Invalid choice. Please enter a number between 1 and 7.')
+                print(f'Invalid choice. Please enter a number between 1 and {len(MENU_OPTIONS)}.')
+
+    # Syncs the signed-in user's logins with the sync directory, offering to adopt the
+    # remote vault key if this device registered the same account separately
+    def sync(self) -> None:
+        if self.user is None:
+            return
+        path = self.sync_remote or self.get_non_empty_input('Sync directory: ')
+        if path is None:
+            return
+
+        # Loaded here rather than at startup, as most sessions never sync
+        from core.sync import DirectoryRemote, SyncEngine
+
+        remote = DirectoryRemote(path)
+        engine = SyncEngine(self.vault)
+        result = engine.sync(self.user, remote)
+
+        if result.status == SyncStatus.KEY_MISMATCH:
+            print('This account was synced from another device with a different vault key.')
+            password = input('Enter the master password used on the other device to re-encrypt this vault with its key (or press Enter to cancel): ')
+            if not password:
+                return
+            user = engine.adopt_remote_key(self.user, password, remote)
+            if user is None:
+                print('That password does not unlock the synced account.')
+                return
+            self.vault.close_session(self.user)
+            self.user = self.vault.open_session(user)
+            self.totp_session.clear()
+            result = engine.sync(self.user, remote)
+
+        if result.status == SyncStatus.SUCCESS:
+            print(f'Received {result.pulled} changes ({result.applied} applied) and sent {result.pushed}.')
+        else:
+            print('Sync failed.')
+
+    # Prints latency and counter metrics recorded during this process
+    def show_stats(self) -> None:
+        histograms = metrics.histograms()
+        if not histograms:
+            print('No metrics recorded yet.')
+            return
+
+        print(f'{"Operation":<40} {"Count":>8} {"Avg ms":>9} {"p50 ms":>9} {"p95 ms":>9} {"Max ms":>9}')
+        for name, labels, histogram in histograms:
+            label = name + ''.join(f' {label_value}' for _, label_value in labels)
+            average = histogram.sum / histogram.count * 1000
+            print(f'{label:<40} {histogram.count:>8} {average:>9.3f} {histogram.quantile(0.5) * 1000:>9.3f} '
+                  f'{histogram.quantile(0.95) * 1000:>9.3f} {histogram.max * 1000:>9.3f}')
+
+        for name, labels, value in metrics.counters():
+            label = name + ''.join(f' {label_value}' for _, label_value in labels)
+            print(f'{label:<40} {value:>8}')
+
+        if self.metrics_file is not None:
+            metrics.write_prometheus(self.metrics_file)
+            print(f'\nMetrics written to {self.metrics_file}')
+
+    # Goes through the options for shared collections
+    def manage_collections(self) -> None:
+        if self.user is None:
+            return
+
+        print('\n--- Shared Collections ---')
+        collections = self.database.get_user_collections(self.user.id)
+        for collection in collections:
+            members = ', '.join(username for _, username in self.database.get_collection_members(collection.id))
+            print(f'{collection.name} (members: {members})')
+        print()
+        print('1. List all logins I can see')
+        print('2. Create a collection')
+        print('3. Add a login to a collection')
+        print('4. Add a member to a collection')
+        print('5. Remove a member from a collection')
+        print('6. Back to main menu')
+
+        while True:
+            choice = input('\nSelect an option (1-6): ').strip()
+            if choice in ['1', '2', '3', '4', '5', '6']:
+                break
+            else:
+                print('Invalid choice. Please enter a number between 1 and 6.')
+
+        if choice == '1':
+            print('\n--- All Visible Logins ---')
+            self.vault.list_visible_logins(self.user, self.clipboard)
+            return
+        if choice == '2':
+            name = self.get_non_empty_input('Collection name: ')
+            if name is not None:
+                print('Collection created!' if self.vault.create_collection(self.user, name) is not None else 'Failed to create collection.')
+            return
+        if choice == '6':
+            return
+
+        by_name = {collection.name: collection.id for collection in collections}
+        name = self.get_non_empty_input('Collection name: ')
+        if name is None:
+            return
+        if name not in by_name:
+            print(f'You are not a member of a collection named \'{name}\'.')
+            return
+
+        match choice:
+            case '3':
+                service = self.get_non_empty_input('Service name: ')
+                username = self.get_non_empty_input('Username: ', allow_skip=True)
+                password = self.get_non_empty_input('Password: ')
+                if service is None or password is None:
+                    return
+                status = self.vault.add_collection_login(self.user, by_name[name], service, username, password)
+                print('Login added to collection!' if status == InsertStatus.SUCCESS else 'Failed to add login.')
+            case '4':
+                member = self.get_non_empty_input('Username to add: ')
+                if member is not None:
+                    status = self.vault.add_collection_member(self.user, by_name[name], member)
+                    print(f'\'{member}\' added!' if status == InsertStatus.SUCCESS else 'Failed to add member.')
+            case '5':
+                member = self.get_non_empty_input('Username to remove: ')
+                if member is not None:
+                    status = self.vault.remove_collection_member(self.user, by_name[name], member)
+                    print(f'\'{member}\' removed.' if status == RemoveStatus.SUCCESS else 'Failed to remove member.')
+            case _:
+                pass
+
+    # Adds, shows and removes the custom fields of logins
+    def manage_fields(self) -> None:
+        if self.user is None:
+            return
+
+        print('\n--- Custom Fields ---')
+        print('1. Add or change a field')
+        print('2. Show a field')
+        print('3. Remove a field')
+        print('4. Back to main menu')
+
+        while True:
+            choice = input('\nSelect an option (1-4): ').strip()
+            if choice in ['1', '2', '3', '4']:
+                break
+            else:
+                print('Invalid choice. Please enter a number between 1 and 4.')
+        if choice == '4':
+            return
+
+        service = self.get_non_empty_input('Service name: ')
+        name = self.get_non_empty_input('Field name (e.g. URL, PIN): ') if service is not None else None
+        if service is None or name is None:
+            return
+
+        match choice:
+            case '1':
+                value = self.get_non_empty_input('Value: ')
+                if value is None:
+                    return
+                hidden = input('Hide it in listings, e.g. for a PIN or API key? (yes/no): ').strip().lower() == 'yes'
+                status = self.vault.set_login_field(self.user, service, name, value, FieldKind.HIDDEN if hidden else FieldKind.TEXT)
+                print('Field saved!' if status == InsertStatus.SUCCESS else 'Failed to save field.')
+            case '2':
+                _ = self.vault.show_login_field(self.user, service, name, self.clipboard)
+            case '3':
+                status = self.vault.remove_login_field(self.user, service, name)
+                print('Field removed.' if status == RemoveStatus.SUCCESS else 'Failed to remove field.')
+            case _:
+                pass
+
+    # Attaches files and secure notes to logins, and saves, shows or deletes them
+    def manage_attachments(self) -> None:
+        if self.user is None:
+            return
+
+        print('\n--- Attachments and Secure Notes ---')
+        print('1. Attach a file to a login')
+        print('2. Add a secure note to a login')
+        print('3. Save an attachment to a file')
+        print('4. Show a secure note')
+        print('5. Delete an attachment or note')
+        print('6. Back to main menu')
+
+        while True:
+            choice = input('\nSelect an option (1-6): ').strip()
+            if choice in ['1', '2', '3', '4', '5', '6']:
+                break
+            else:
+                print('Invalid choice. Please enter a number between 1 and 6.')
+        if choice == '6':
+            return
+
+        service = self.get_non_empty_input('Service name: ')
+        if service is None:
+            return
+
+        match choice:
+            case '1':
+                path = self.get_non_empty_input('File to attach: ')
+                if path is not None:
+                    status = self.vault.add_attachment(self.user, service, os.path.expanduser(path))
+                    print('File attached!' if status == InsertStatus.SUCCESS else 'Failed to attach file.')
+            case '2':
+                title = self.get_non_empty_input('Note title: ')
+                if title is None:
+                    return
+                print('Type the note, then a line with just \'.\' to finish:')
+                lines: list[str] = []
+                while (line := input()) != '.':
+                    lines.append(line)
+                status = self.vault.add_note(self.user, service, title, '\n'.join(lines))
+                print('Note added!' if status == InsertStatus.SUCCESS else 'Failed to add note.')
+            case '3':
+                attachment = self.vault.choose_attachment(self.user, service, 'save')
+                if attachment is None:
+                    return
+                path = self.get_non_empty_input('Save to (file or directory): ')
+                if path is None:
+                    return
+                path = os.path.expanduser(path)
+                if os.path.isdir(path):
+                    path = os.path.join(path, attachment.name)
+                if os.path.exists(path) and input(f'\'{path}\' exists. Overwrite it? (yes/no): ').strip().lower() != 'yes':
+                    print('Cancelled.')
+                    return
+                if self.vault.export_attachment(self.user, attachment, path) == InsertStatus.SUCCESS:
+                    print(f'Saved to \'{path}\'.')
+            case '4':
+                attachment = self.vault.choose_attachment(self.user, service, 'show', AttachmentKind.NOTE)
+                if attachment is None:
+                    return
+                try:
+                    with self.vault.read_note(self.user, attachment) as note:
+                        print(f'\n--- {attachment.name} ---\n{note.decode()}')
+                except CorruptAttachment as e:
+                    print(f'Could not read the note: {e}')
+            case '5':
+                attachment = self.vault.choose_attachment(self.user, service, 'delete')
+                if attachment is None:
+                    return
+                if input(f'Are you sure you want to delete \'{attachment.name}\'? (yes/no): ').strip().lower() != 'yes':
+                    print('Deletion cancelled.')
+                    return
+                status = self.vault.remove_attachment(self.user, attachment)
+                print('Deleted.' if status == RemoveStatus.SUCCESS else 'Failed to delete.')
+            case _:
+                pass
+
+    # Lists the passwords due for rotation and sets or removes logins' rotation policies
+    def manage_rotation(self) -> None:
+        if self.user is None:
+            return
+
+        print('\n--- Passwords Due for Rotation ---')
+        self.vault.list_due_logins(self.user, self.rotation_notice_days)
+        print()
+        print('1. Show passwords due within more days')
+        print('2. Set how often a login\'s password should be changed')
+        print('3. Remove a login\'s rotation policy')
+        print('4. Back to main menu')
+
+        while True:
+            choice = input('\nSelect an option (1-4): ').strip()
+            if choice in ['1', '2', '3', '4']:
+                break
+            else:
+                print('Invalid choice. Please enter a number between 1 and 4.')
+
+        match choice:
+            case '1':
+                days = self.get_positive_int('Days ahead: ')
+                if days is not None:
+                    self.vault.list_due_logins(self.user, days)
+            case '2':
+                service = self.get_non_empty_input('Service name: ')
+                if service is None:
+                    return
+                days = self.get_positive_int('Change the password every how many days: ')
+                if days is None:
+                    return
+                status = self.vault.set_rotation_policy(self.user, service, days)
+                print('Rotation policy set!' if status == InsertStatus.SUCCESS else 'Failed to set rotation policy.')
+            case '3':
+                service = self.get_non_empty_input('Service name: ')
+                if service is None:
+                    return
+                status = self.vault.set_rotation_policy(self.user, service, None)
+                print('Rotation policy removed.' if status == InsertStatus.SUCCESS else 'Failed to remove rotation policy.')
+            case _:
+                pass
+
+    # Prompts until a whole number of at least 1 is given; None if the user cancels
+    def get_positive_int(self, prompt: str) -> int | None:
+        while True:
+            value = self.get_non_empty_input(prompt)
+            if value is None:
+                return None
+            if value.isdigit() and int(value) > 0:
+                return int(value)
+            print('Please enter a whole number of at least 1.')
+
+    # Tags logins, files them into folders and lists them by tag, folder and name prefix
+    def manage_tags(self) -> None:
+        if self.user is None:
+            return
+
+        print('\n--- Tags and Folders ---')
+        tags = self.database.get_user_tags(self.user.id)
+        folders = self.database.get_user_folders(self.user.id)
+        if tags:
+            print('Tags: ' + ', '.join(f'{name} ({count})' for name, count in tags))
+        if folders:
+            print('Folders: ' + ', '.join(f'{name} ({count})' for name, count in folders))
+        print()
+        print('1. Filter logins by tag, folder and name')
+        print('2. Tag a login')
+        print('3. Remove a tag from a login')
+        print('4. Move a login to a folder')
+        print('5. Back to main menu')
+
+        while True:
+            choice = input('\nSelect an option (1-5): ').strip()
+            if choice in ['1', '2', '3', '4', '5']:
+                break
+            else:
+                print('Invalid choice. Please enter a number between 1 and 5.')
+
+        match choice:
+            case '1':
+                tag = self.get_non_empty_input('Tag (Enter for any): ', allow_skip=True)
+                folder = self.get_non_empty_input('Folder (Enter for any): ', allow_skip=True)
+                prefix = self.get_non_empty_input('Service name starts with (Enter for any): ', allow_skip=True)
+                print('\n--- Matching Logins ---')
+                self.vault.list_filtered_logins(self.user, tag, folder, prefix, self.clipboard)
+            case '2':
+                service = self.get_non_empty_input('Service name: ')
+                names = self.get_non_empty_input('Tags (comma-separated): ')
+                if service is None or names is None:
+                    return
+                new_tags = [name.strip() for name in names.split(',') if name.strip()]
+                status = self.vault.tag_login(self.user, service, new_tags)
+                print('Login tagged!' if status == InsertStatus.SUCCESS else 'Failed to tag login.')
+            case '3':
+                service = self.get_non_empty_input('Service name: ')
+                tag = self.get_non_empty_input('Tag to remove: ')
+                if service is None or tag is None:
+                    return
+                status = self.vault.untag_login(self.user, service, tag)
+                print('Tag removed.' if status == RemoveStatus.SUCCESS else 'Failed to remove tag.')
+            case '4':
+                service = self.get_non_empty_input('Service name: ')
+                if service is None:
+                    return
+                folder = self.get_non_empty_input('Folder (Enter to take it out of its folder): ', allow_skip=True)
+                status = self.vault.move_login(self.user, service, folder)
+                print('Login moved!' if status == InsertStatus.SUCCESS else 'Failed to move login.')
+            case _:
+                pass
 
     # Goes through the options for use settings
     def list_user_settings(self) -> None:
@@ -231,12 +839,15 @@ class CLIHandler:
         match choice:
             case '1':
                 print('\n--- Delete Account ---')
-                confirm = input(f'Are you sure you want to delete your account \'{self.user.username}\'? This cannot be undone. (yes/no): ').strip().lower()
+                confirm = input(f'Are you sure you want to delete your account \'{self.user.username}\'? It can be restored from the welcome '
+                                f'menu for {self.trash_days} days, then it is removed for good. (yes/no): ').strip().lower()
                 if confirm == 'yes':
                     status = self.vault.remove_user(self.user)
                     if status == RemoveStatus.SUCCESS:
                         print('Account deleted successfully. Goodbye!')
-                        self.user = None
+                        if self.lookup_dir is not None:
+                            remove_lookup_snapshot(self.lookup_dir, self.user.username)
+                        self.sign_out()
                         sys.exit(0)
                     else:
                         print('Failed to delete account.')
@@ -248,6 +859,8 @@ class CLIHandler:
                 if username is not None:
                     status = self.database.update_username(self.user.id, username)
                     if status == InsertStatus.SUCCESS:
+                        if self.lookup_dir is not None:
+                            remove_lookup_snapshot(self.lookup_dir, self.user.username)
                         self.user.username = username
                         print(f'Username changed successfully to \'{username}\'!')
                     else:
@@ -0,0 +1,148 @@
+import base64
+import logging
+import os
+import sys
+import threading
+from abc import ABC, abstractmethod
+
+from util.lazy_import import lazy_import
+from util.paths import data_dir
+
+# Only needed once something is copied, or to look for a clipboard command under a desktop session
+shutil = lazy_import('shutil')
+subprocess = lazy_import('subprocess')
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Seconds a copied password stays on the clipboard
+CLEAR_AFTER: float = 20.0
+
+BACKENDS: tuple[str, ...] = ('auto', 'wl-copy', 'xclip', 'osc52', 'file', 'none')
+
+
+class ClipboardBackend(ABC):
+    # A way of putting text on the clipboard; get_backend picks one by name
+    name: str = ''
+
+    # Puts text on the clipboard
+    @abstractmethod
+    def copy(self, text: str) -> None:
+        ...
+
+    # Empties the clipboard
+    def clear(self) -> None:
+        self.copy('')
+
+
+class CommandBackend(ClipboardBackend):
+    # Pipes the text to a clipboard tool such as wl-copy or xclip
+    def __init__(self, name: str, copy_command: list[str], clear_command: list[str] | None = None) -> None:
+        self.name = name
+        self.copy_command: list[str] = copy_command
+        self.clear_command: list[str] | None = clear_command
+
+    def copy(self, text: str) -> None:
+        _ = subprocess.run(self.copy_command, input=text.encode(), check=True, timeout=5,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def clear(self) -> None:
+        if self.clear_command is None:
+            self.copy('')
+            return
+        _ = subprocess.run(self.clear_command, check=True, timeout=5, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class Osc52Backend(ClipboardBackend):
+    # Sets the clipboard of the terminal itself with an OSC 52 escape sequence, which also
+    # works over SSH. Nothing is printed that would show up in the scrollback
+    name = 'osc52'
+
+    def __init__(self, stream=None) -> None:
+        self.stream = stream or sys.stdout
+
+    def copy(self, text: str) -> None:
+        _ = self.stream.write(f'\x1b]52;c;{base64.b64encode(text.encode()).decode("ascii")}\x07')
+        self.stream.flush()
+
+
+class FileBackend(ClipboardBackend):
+    # Writes the clipboard to a private file; a stand-in for tests and headless machines
+    name = 'file'
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+
+    def copy(self, text: str) -> None:
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            _ = f.write(text)
+
+    # Returns what is currently on the clipboard
+    def read(self) -> str:
+        with open(self.path, 'r') as f:
+            return f.read()
+
+
+# Returns the backend for the given name, or for 'auto' the first one that works here. Returns None if there is none
+def get_backend(name: str = 'auto', path: str | None = None) -> ClipboardBackend | None:
+    match name:
+        case 'wl-copy':
+            return CommandBackend('wl-copy', ['wl-copy'], ['wl-copy', '--clear'])
+        case 'xclip':
+            return CommandBackend('xclip', ['xclip', '-selection', 'clipboard'])
+        case 'osc52':
+            return Osc52Backend()
+        case 'file':
+            return FileBackend(path or os.path.join(data_dir(), 'clipboard.txt'))
+        case 'none':
+            return None
+        case _:
+            if os.environ.get('WAYLAND_DISPLAY') and shutil.which('wl-copy'):
+                return get_backend('wl-copy')
+            if os.environ.get('DISPLAY') and shutil.which('xclip'):
+                return get_backend('xclip')
+            if sys.stdout.isatty():
+                return get_backend('osc52')
+            return None
+
+
+class Clipboard:
+    # Copies secrets through a backend and clears them again after a delay on a timer thread.
+    # Copying again restarts the countdown
+    def __init__(self, backend: ClipboardBackend, clear_after: float = CLEAR_AFTER) -> None:
+        self.backend: ClipboardBackend = backend
+        self.clear_after: float = clear_after
+        self._lock: threading.Lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        # Whether the clipboard holds something we put there, so clear never wipes the user's own copy
+        self._holding: bool = False
+
+    # Copies the text and schedules the clear. Returns False if the backend failed
+    def copy(self, text: str) -> bool:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            try:
+                self.backend.copy(text)
+            except (OSError, subprocess.SubprocessError) as e:
+                logger.error(f'Error copying to the {self.backend.name} clipboard: {e}')
+                return False
+            self._holding = True
+            self._timer = threading.Timer(self.clear_after, self.clear)
+            self._timer.daemon = True
+            self._timer.start()
+            return True
+
+    # Clears what we copied now and cancels any pending clear
+    def clear(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._holding:
+                return
+            self._holding = False
+            try:
+                self.backend.clear()
+            except (OSError, subprocess.SubprocessError) as e:
+                logger.error(f'Error clearing the {self.backend.name} clipboard: {e}')
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
 
+from util.enums import AttachmentKind, FieldKind
+
 
 @dataclass
 class User:
@@ -7,6 +9,8 @@ class User:
     username: str
     master_hash: bytes
     salt: bytes
+    # Spec of the KDF that derived master_hash (see core/kdf.py); None for scrypt from before specs were kept
+    kdf: str | None = None
 
 @dataclass
 class VaultEntry:
@@ -15,3 +19,101 @@ class VaultEntry:
     service_name: str
     username: str
     password_encrypted: bytes
+
+@dataclass
+class TotpEntry:
+    entry_id: int
+    service_name: str
+    username: str | None
+    secret_encrypted: bytes
+
+@dataclass
+class TrashEntry:
+    id: int
+    service_name: str
+    username: str | None
+    deleted_at: int
+
+@dataclass
+class HistoryEntry:
+    id: int
+    entry_id: int
+    changed_fields: int
+    service_name: str | None
+    username: str | None
+    password_encrypted: bytes | None
+    changed_at: int
+
+@dataclass
+class LoginVersion:
+    service_name: str
+    username: str | None
+    password: str
+    changed_at: int | None
+
+@dataclass
+class SyncRow:
+    uid: str
+    service_name: str
+    username: str | None
+    password_encrypted: bytes
+    password_fingerprint: bytes | None
+    totp_secret_encrypted: bytes | None
+    deleted_at: int | None
+    clock: int
+    origin: str
+    # Segments written before logins had dates don't carry these
+    created_at: int | None = None
+    updated_at: int | None = None
+    rotation_days: int | None = None
+    expires_at: int | None = None
+
+@dataclass
+class LoginDates:
+    created_at: int | None
+    updated_at: int | None
+    rotation_days: int | None
+    expires_at: int | None
+
+@dataclass
+class DueLogin:
+    id: int
+    service_name: str
+    username: str | None
+    updated_at: int | None
+    rotation_days: int
+    expires_at: int
+
+@dataclass
+class Attachment:
+    id: int
+    entry_id: int
+    kind: AttachmentKind
+    name: str
+    size: int
+    chunk_size: int
+    wrapped_key: bytes
+    nonce_prefix: bytes
+    created_at: int
+
+@dataclass
+class CustomField:
+    id: int
+    entry_id: int
+    name: str
+    kind: FieldKind
+    value_encrypted: bytes
+
+@dataclass
+class Collection:
+    id: int
+    name: str
+    wrapped_key: bytes
+
+@dataclass
+class VisibleEntry:
+    id: int
+    collection_id: int | None
+    service_name: str
+    username: str | None
+    password_encrypted: bytes
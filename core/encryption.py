@@ -1,9 +1,35 @@
 import base64
+import hashlib
+import hmac
 import os
+import time
 
-from cryptography.exceptions import InvalidKey
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from core.kdf import SALT_SIZE, parse_kdf
+from core.secret_buffer import SecretBuffer
+from util.lazy_import import lazy_import
+from util.metrics import metrics
+
+# cryptography is the slowest import at startup and nothing needs it before the first sign in,
+# so it loads on first use
+fernet = lazy_import('cryptography.fernet')
+
+# Domain separation label for the key that fingerprints stored passwords
+FINGERPRINT_LABEL: bytes = b'cosmicc-password-fingerprint'
+
+# Bytes of HMAC output kept per fingerprint
+FINGERPRINT_SIZE: int = 16
+
+
+class SessionKey(SecretBuffer):
+    # The vault key of a signed-in session. The Fernet built from it is kept for the session, so
+    # each encrypt and decrypt skips encoding the key and setting up AES again. Two threads may both
+    # build it on first use; either result is the same and the last one kept. Wiping zeroes the key
+    # and drops the Fernet, whose own copies of the key are bytes that can't be wiped
+    fernet: 'fernet.Fernet | None' = None
+
+    def wipe(self) -> None:
+        self.fernet = None
+        super().wipe()
 
 
 class EncryptionManager:
@@ -11,52 +37,75 @@ class EncryptionManager:
         pass
 
     # Returns the encrypted password from the key given which should be the master_hash of the user
-    def encrypt_password(self, key: bytes, password: str) -> bytes:
-        key_b64 = base64.urlsafe_b64encode(key)
-        f = Fernet(key_b64)
-        return f.encrypt(password.encode())
-
-    # Returns the decrypted password given the key
-    def decrypt_password(self, key: bytes, encrypted_password: bytes) -> bytes:
-        key_b64 = base64.urlsafe_b64encode(key)
-        f = Fernet(key_b64)
-        return f.decrypt(encrypted_password)
-
-    # Returns just the key/hash for the password and salt given
-    def derive_key(self, password: str, salt: bytes) -> bytes:
-        kdf = Scrypt(
-            salt=salt,
-            length=32,
-            n=2**14,
-            r=8,
-            p=1
-        )
-        return kdf.derive(password.encode())
+    def encrypt_password(self, key: bytes, password: str | SecretBuffer) -> bytes:
+        start = time.perf_counter_ns()
+        token = self._encrypt(key, password.encode() if isinstance(password, str) else password)
+        metrics.observe_ns('encrypt', time.perf_counter_ns() - start)
+        return token
+
+    # Returns a keyed fingerprint of the password for reuse detection; equal passwords in one
+    # vault match, but without the vault key it reveals nothing about the password
+    def fingerprint_password(self, key: bytes, password: str | SecretBuffer) -> bytes:
+        fingerprint_key = hmac.new(key, FINGERPRINT_LABEL, hashlib.sha256).digest()
+        if isinstance(password, str):
+            with SecretBuffer.from_str(password) as plaintext:
+                return hmac.new(fingerprint_key, plaintext, hashlib.sha256).digest()[:FINGERPRINT_SIZE]
+        return hmac.new(fingerprint_key, password, hashlib.sha256).digest()[:FINGERPRINT_SIZE]
+
+    # Returns a new random key, the same size as a derived master key
+    def generate_key(self) -> bytes:
+        return os.urandom(32)
+
+    # Encrypts a key (e.g. a collection key) under another key
+    def wrap_key(self, key: bytes, wrapped: bytes) -> bytes:
+        return self._encrypt(key, wrapped)
+
+    # Decrypts a key wrapped with wrap_key
+    def unwrap_key(self, key: bytes, wrapped_key: bytes) -> SecretBuffer:
+        return self._decrypt(key, wrapped_key)
+
+    # Returns the decrypted password given the key. Wipe it once done, e.g. by using it in a with block
+    def decrypt_password(self, key: bytes, encrypted_password: bytes) -> SecretBuffer:
+        start = time.perf_counter_ns()
+        password = self._decrypt(key, encrypted_password)
+        metrics.observe_ns('decrypt', time.perf_counter_ns() - start)
+        return password
+
+    # Returns the Fernet for a key: the one a session key keeps, or a new one for any other key
+    def _fernet(self, key: bytes) -> 'fernet.Fernet':
+        if type(key) is SessionKey:
+            if key.fernet is None:
+                key.fernet = fernet.Fernet(base64.urlsafe_b64encode(key))
+            return key.fernet
+        return fernet.Fernet(base64.urlsafe_b64encode(key))
+
+    # Encrypts plaintext into a Fernet token. Fernet only takes bytes, so a buffer is copied into a
+    # short-lived bytes object that can't be wiped; the buffer itself stays the caller's to wipe
+    def _encrypt(self, key: bytes, plaintext: bytes) -> bytes:
+        return self._fernet(key).encrypt(plaintext if type(plaintext) is bytes else bytes(plaintext))
+
+    # Authenticates and decrypts a Fernet token into a SecretBuffer. Raises InvalidToken if the key
+    # is wrong or the token was tampered with. Fernet returns the plaintext as bytes, which is
+    # copied into the buffer and dropped straight away; only the buffer can be wiped
+    def _decrypt(self, key: bytes, token: bytes) -> SecretBuffer:
+        return SecretBuffer(self._fernet(key).decrypt(token))
+
+    # Returns just the key/hash for the password and salt given, derived with the KDF of the spec
+    # given (see core/kdf.py); None is the scrypt of accounts from before KDFs were recorded
+    def derive_key(self, password: str, salt: bytes, kdf: str | None = None) -> bytes:
+        with metrics.timer('kdf_derive'):
+            return parse_kdf(kdf).derive(password.encode(), salt)
 
     # Returns the salt and key/hash of the password given
-    def hash_master_password(self, password: str) -> tuple[bytes, bytes]:
-        salt = os.urandom(16)
-        kdf = Scrypt(
-            salt=salt,
-            length=32,
-            n=2**14,
-            r=8,
-            p=1
-        )
-        hash = kdf.derive(password.encode())
-        return salt, hash
+    def hash_master_password(self, password: str, kdf: str | None = None) -> tuple[bytes, bytes]:
+        salt = os.urandom(SALT_SIZE)
+        return salt, self.derive_key(password, salt, kdf)
 
     # Vertifies if the given password matches the stored hash/key
-    def vertify_master_password(self, password: str, salt: bytes, stored_hash: bytes) -> bool:
-        kdf = Scrypt(
-            salt=salt,
-            length=32,
-            n=2**14,
-            r=8,
-            p=1
-        )
-        try:
-            kdf.verify(password.encode(), stored_hash)
+    def vertify_master_password(self, password: str, salt: bytes, stored_hash: bytes, kdf: str | None = None) -> bool:
+        with metrics.timer('kdf_verify'):
+            key = parse_kdf(kdf).derive(password.encode(), salt)
+        if hmac.compare_digest(key, stored_hash):
             return True
-        except InvalidKey:
-            return False
+        metrics.inc('kdf_verify_failures')
+        return False
@@ -0,0 +1,116 @@
+from abc import ABC, abstractmethod
+
+from util.lazy_import import lazy_import
+
+# Loaded on first use, like the rest of cryptography (see core/encryption.py). Argon2id needs cryptography 44 or later
+argon2 = lazy_import('cryptography.hazmat.primitives.kdf.argon2')
+scrypt = lazy_import('cryptography.hazmat.primitives.kdf.scrypt')
+
+# Bytes of every derived vault key
+KEY_SIZE: int = 32
+
+# Bytes of the random salt given to each new key
+SALT_SIZE: int = 16
+
+
+class Kdf(ABC):
+    # A key derivation function with fixed parameters. Each user record stores the spec of the
+    # KDF that derived its key, e.g. 'argon2id$m=65536,t=3,p=4', so the algorithm and its
+    # parameters can change without breaking existing accounts
+    name: str = ''
+
+    # Returns the KDF's parameters by their short names, in spec order
+    @abstractmethod
+    def params(self) -> dict[str, int]:
+        ...
+
+    # Derives a vault key from the password and salt
+    @abstractmethod
+    def derive(self, password: bytes, salt: bytes) -> bytes:
+        ...
+
+    @property
+    def spec(self) -> str:
+        return self.name + '$' + ','.join(f'{name}={value}' for name, value in self.params().items())
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Kdf) and self.spec == other.spec
+
+    def __hash__(self) -> int:
+        return hash(self.spec)
+
+    def __repr__(self) -> str:
+        return f'<Kdf {self.spec}>'
+
+
+class ScryptKdf(Kdf):
+    # Memory-hard but single-threaded in practice: p=1 is what every account before the
+    # registry used, and raising p only repeats the work on the same core
+    name = 'scrypt'
+
+    def __init__(self, n: int = 2**14, r: int = 8, p: int = 1) -> None:
+        self.n: int = n
+        self.r: int = r
+        self.p: int = p
+
+    def params(self) -> dict[str, int]:
+        return {'n': self.n, 'r': self.r, 'p': self.p}
+
+    def derive(self, password: bytes, salt: bytes) -> bytes:
+        return scrypt.Scrypt(salt=salt, length=KEY_SIZE, n=self.n, r=self.r, p=self.p).derive(password)
+
+
+class Argon2idKdf(Kdf):
+    # Argon2id (RFC 9106) with memory in KiB, passes over it, and lanes that can be filled on
+    # separate cores. The defaults are the RFC's second recommended option: 64 MiB, 3 passes, 4 lanes
+    name = 'argon2id'
+
+    def __init__(self, memory: int = 65536, iterations: int = 3, lanes: int = 4) -> None:
+        if lanes < 1 or iterations < 1 or memory < 8 * lanes:
+            raise ValueError(f'Invalid Argon2id parameters (memory {memory} KiB, {iterations} iterations, {lanes} lanes); '
+                             'memory must be at least 8 KiB per lane')
+        self.memory: int = memory
+        self.iterations: int = iterations
+        self.lanes: int = lanes
+
+    def params(self) -> dict[str, int]:
+        return {'m': self.memory, 't': self.iterations, 'p': self.lanes}
+
+    def derive(self, password: bytes, salt: bytes) -> bytes:
+        return argon2.Argon2id(salt=salt, length=KEY_SIZE, iterations=self.iterations, lanes=self.lanes,
+                               memory_cost=self.memory).derive(password)
+
+
+# Every KDF by the name used in specs and on the command line
+KDFS: dict[str, type[Kdf]] = {
+    'scrypt': ScryptKdf,
+    'argon2id': Argon2idKdf,
+}
+
+# Spec parameters by the keyword each KDF takes them as
+PARAM_NAMES: dict[str, dict[str, str]] = {
+    'scrypt': {'n': 'n', 'r': 'r', 'p': 'p'},
+    'argon2id': {'m': 'memory', 't': 'iterations', 'p': 'lanes'},
+}
+
+# The KDF of accounts created before the registry, whose records have no spec
+LEGACY_KDF: Kdf = ScryptKdf()
+
+# The KDF new accounts are created with, and existing ones move to on their next sign-in
+DEFAULT_KDF: Kdf = Argon2idKdf()
+
+
+# Returns the KDF a spec describes; None is an account from before the registry. Raises ValueError
+# for a spec this version doesn't understand
+def parse_kdf(spec: str | None) -> Kdf:
+    if spec is None:
+        return LEGACY_KDF
+    name, _, params = spec.partition('$')
+    if name not in KDFS:
+        raise ValueError(f'Unknown KDF \'{name}\' (expected one of {", ".join(KDFS)})')
+    try:
+        values = dict(param.split('=') for param in params.split(',')) if params else {}
+        return KDFS[name](**{PARAM_NAMES[name][key]: int(value) for key, value in values.items()})
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid KDF spec \'{spec}\': {e}') from e
+
@@ -0,0 +1,47 @@
+import os
+from concurrent.futures import Future
+
+from core.encryption import EncryptionManager
+from util.lazy_import import lazy_import
+from util.metrics import metrics
+
+# Process pools pull in multiprocessing, which is only needed when a pool is actually started
+process = lazy_import('concurrent.futures.process')
+
+
+# Verifies a master password inside a worker process
+def _verify_in_worker(password: str, salt: bytes, stored_hash: bytes, kdf: str | None) -> bool:
+    return EncryptionManager().vertify_master_password(password, salt, stored_hash, kdf)
+
+
+# Does nothing; used to start the worker processes ahead of the first sign in
+def _warm_up() -> None:
+    return None
+
+
+class KdfPool:
+    def __init__(self, workers: int | None = None) -> None:
+        self.workers: int = workers or os.cpu_count() or 1
+        self._executor: 'process.ProcessPoolExecutor' = process.ProcessPoolExecutor(self.workers)
+
+        # Spawn the workers now so the first verification doesn't pay process start-up
+        for future in [self._executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+
+    # Queues a master password verification and returns its future result
+    def submit_verify(self, password: str, salt: bytes, stored_hash: bytes, kdf: str | None = None) -> Future[bool]:
+        return self._executor.submit(_verify_in_worker, password, salt, stored_hash, kdf)
+
+    # Verifies a master password on a worker and waits for the result
+    def verify(self, password: str, salt: bytes, stored_hash: bytes, kdf: str | None = None) -> bool:
+        with metrics.timer('kdf_verify_pooled'):
+            return self.submit_verify(password, salt, stored_hash, kdf).result()
+
+    # Verifies many (password, salt, stored_hash[, kdf]) attempts in parallel, keeping their order
+    def verify_many(self, attempts: list[tuple[str, bytes, bytes] | tuple[str, bytes, bytes, str | None]]) -> list[bool]:
+        futures = [self.submit_verify(*attempt) for attempt in attempts]
+        return [future.result() for future in futures]
+
+    # Stops the worker processes
+    def shutdown(self) -> None:
+        self._executor.shutdown()
@@ -0,0 +1,272 @@
+import hashlib
+import hmac
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from core.data_models import User
+from core.encryption import EncryptionManager
+from core.vault import Vault
+from util.metrics import metrics
+from util.paths import data_dir
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Default directory of the lookup snapshots
+LOOKUP_DIR: str = os.path.join(data_dir(), 'lookup')
+
+MAGIC: bytes = b'CVLS'
+
+# Version 2 added the KDF spec after the salt
+SNAPSHOT_VERSION: int = 2
+
+# HMAC labels for the blind-index key and for the value that confirms a password unlocks the snapshot
+BLIND_INDEX_LABEL: bytes = b'cosmicc-lookup-blind-index'
+KEY_CHECK_LABEL: bytes = b'cosmicc-lookup-key-check'
+
+# Bytes of the blind index kept per service name
+FINGERPRINT_SIZE: int = 16
+
+# Average keys per bucket of the perfect hash. Smaller buckets take more space but place faster
+BUCKET_SIZE: int = 2
+
+# Seeds tried before giving up on building the perfect hash
+MAX_SEEDS: int = 64
+
+# Username length stored for logins without a username
+NO_USERNAME: int = 0xFFFF
+
+# Longest username and password token a record can hold; the record header stores both lengths in
+# 16 bits, and the largest username length is reserved for NO_USERNAME
+MAX_USERNAME_SIZE: int = NO_USERNAME - 1
+MAX_TOKEN_SIZE: int = 0xFFFF
+
+# magic, version, salt length, KDF spec length, seed, key count, bucket count, record size, generated at, key check
+HEADER: struct.Struct = struct.Struct('<4sHHHIIIIQ32s')
+
+# Displacement pair (d0, d1) of each bucket
+DISPLACEMENT: struct.Struct = struct.Struct('<II')
+
+# Blind index of the service name, first record, record count
+SLOT: struct.Struct = struct.Struct(f'<{FINGERPRINT_SIZE}sII')
+
+# Username length, token length; the username and password token follow, padded to the record size
+RECORD_HEADER: struct.Struct = struct.Struct('<HH')
+
+
+# Returns the snapshot file of an account, named by a hash so usernames aren't exposed
+def snapshot_path(directory: str, username: str) -> str:
+    return os.path.join(directory, f'{hashlib.sha256(username.encode()).hexdigest()[:32]}.lookup')
+
+
+# Returns the blind index of a service name: equal names give equal values, but without the
+# vault key the names can't be recovered or guessed from the file
+def blind_index(key: bytes, service_name: str) -> bytes:
+    index_key = hmac.new(key, BLIND_INDEX_LABEL, hashlib.sha256).digest()
+    return hmac.new(index_key, service_name.encode(), hashlib.sha256).digest()[:FINGERPRINT_SIZE]
+
+
+# Returns the value that proves a password derives the snapshot's vault key
+def key_check(key: bytes) -> bytes:
+    return hmac.new(key, KEY_CHECK_LABEL, hashlib.sha256).digest()
+
+
+# Returns the bucket hash and the two slot hashes of a fingerprint under a seed
+def _hashes(fingerprint: bytes, seed: int) -> tuple[int, int, int]:
+    digest = hashlib.blake2b(fingerprint, digest_size=12, key=seed.to_bytes(4, 'little')).digest()
+    return int.from_bytes(digest[:4], 'little'), int.from_bytes(digest[4:8], 'little'), int.from_bytes(digest[8:], 'little')
+
+
+# Builds a minimal perfect hash (compress, hash and displace) over the fingerprints. Every key lands
+# in slot (f1 + d0 * f2 + d1) % n, with (d0, d1) chosen per bucket so no two keys share a slot.
+# Returns the displacements and the key placed in each slot, or None if the seed doesn't work out
+def _build_perfect_hash(fingerprints: list[bytes], seed: int) -> tuple[list[tuple[int, int]], list[int]] | None:
+    n = len(fingerprints)
+    bucket_count = -(-n // BUCKET_SIZE)
+    hashes = [_hashes(fingerprint, seed) for fingerprint in fingerprints]
+    buckets: list[list[int]] = [[] for _ in range(bucket_count)]
+    for key, (h, _, _) in enumerate(hashes):
+        buckets[h % bucket_count].append(key)
+
+    displacements: list[tuple[int, int]] = [(0, 0)] * bucket_count
+    slots: list[int] = [-1] * n
+    singles: list[int] = []
+
+    # Place the largest buckets first, while most slots are still free
+    for bucket in sorted(range(bucket_count), key=lambda b: len(buckets[b]), reverse=True):
+        keys = buckets[bucket]
+        if len(keys) < 2:
+            if keys:
+                singles.append(bucket)
+            continue
+        for attempt in range(n * 8):
+            d0, d1 = divmod(attempt, n)
+            positions = [(hashes[key][1] + d0 * hashes[key][2] + d1) % n for key in keys]
+            if len(set(positions)) == len(positions) and all(slots[position] < 0 for position in positions):
+                break
+        else:
+            return None
+        for key, position in zip(keys, positions):
+            slots[position] = key
+        displacements[bucket] = (d0, d1)
+
+    # A bucket with one key can go straight into any free slot
+    free = (position for position in range(n) if slots[position] < 0)
+    for bucket, position in zip(singles, free):
+        key = buckets[bucket][0]
+        slots[position] = key
+        displacements[bucket] = (0, (position - hashes[key][1]) % n)
+    return displacements, slots
+
+
+# Tries seeds until the perfect hash builds. Returns the seed, the displacements and the key in each slot
+def _find_perfect_hash(fingerprints: list[bytes]) -> tuple[int, list[tuple[int, int]], list[int]]:
+    if not fingerprints:
+        return 0, [], []
+    for seed in range(MAX_SEEDS):
+        built = _build_perfect_hash(fingerprints, seed)
+        if built is not None:
+            return seed, *built
+    raise ValueError(f'Could not build a perfect hash over {len(fingerprints)} service names')
+
+
+# Writes data to path atomically and readable only by the owner
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            _ = f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+# Writes the user's read-only lookup snapshot: a perfect hash over the blind-indexed service names
+# pointing at fixed-size records that hold the still-encrypted password tokens. Returns its path
+def write_lookup_snapshot(vault: Vault, user: User, directory: str) -> str:
+    with metrics.timer('lookup_snapshot_write'):
+        groups: dict[bytes, list[tuple[bytes | None, bytes]]] = {}
+        for login in vault.database.get_user_logins(user.id):
+            username = login.username.encode() if login.username is not None else None
+            if len(username or b'') > MAX_USERNAME_SIZE or len(login.password_encrypted) > MAX_TOKEN_SIZE:
+                # Every record is padded to the largest, so such a login would bloat the whole file as well
+                logger.warning(f'Leaving login {login.id} of user {user.id} out of the lookup snapshot: '
+                               'its username or password is too long for a record')
+                continue
+            groups.setdefault(blind_index(user.master_hash, login.service_name), []).append((username, login.password_encrypted))
+
+        fingerprints = list(groups)
+        seed, displacements, slots = _find_perfect_hash(fingerprints)
+
+        record_size = max((RECORD_HEADER.size + len(username or b'') + len(token)
+                           for records in groups.values() for username, token in records), default=RECORD_HEADER.size)
+        kdf = (user.kdf or '').encode()
+        parts: list[bytes] = [
+            HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(user.salt), len(kdf), seed, len(fingerprints), len(displacements),
+                        record_size, int(time.time()), key_check(user.master_hash)),
+            bytes(user.salt),
+            kdf,
+        ]
+        parts.extend(DISPLACEMENT.pack(d0, d1) for d0, d1 in displacements)
+
+        records: list[bytes] = []
+        for key in slots:
+            fingerprint = fingerprints[key]
+            parts.append(SLOT.pack(fingerprint, len(records), len(groups[fingerprint])))
+            for username, token in groups[fingerprint]:
+                username_len = NO_USERNAME if username is None else len(username)
+                record = RECORD_HEADER.pack(username_len, len(token)) + (username or b'') + token
+                records.append(record.ljust(record_size, b'\x00'))
+        parts.extend(records)
+
+        path = snapshot_path(directory, user.username)
+        _write_atomic(path, b''.join(parts))
+    logger.info(f'Wrote lookup snapshot of user {user.id} with {len(records)} logins')
+    return path
+
+
+# Removes the user's lookup snapshot, if there is one
+def remove_lookup_snapshot(directory: str, username: str) -> None:
+    try:
+        os.remove(snapshot_path(directory, username))
+    except FileNotFoundError:
+        pass
+
+
+class LookupSnapshot:
+    # A lookup snapshot opened through mmap. A lookup reads one displacement, one slot and the
+    # matching records, so it touches a handful of pages however many logins the vault holds
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._file = open(path, 'rb')
+        try:
+            self._map: mmap.mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f'Lookup snapshot \'{path}\' is empty')
+
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError(f'\'{path}\' is not a lookup snapshot')
+        (magic, version, salt_len, kdf_len, self.seed, self.key_count, self.bucket_count,
+         self.record_size, self.generated_at, self.key_check) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f'\'{path}\' is not a version {SNAPSHOT_VERSION} lookup snapshot; sign in once to rewrite it')
+        self.salt: bytes = self._map[HEADER.size:HEADER.size + salt_len]
+        # Empty for accounts still on the original scrypt
+        self.kdf: str | None = self._map[HEADER.size + salt_len:HEADER.size + salt_len + kdf_len].decode() or None
+        self._displacement_offset: int = HEADER.size + salt_len + kdf_len
+        self._slot_offset: int = self._displacement_offset + self.bucket_count * DISPLACEMENT.size
+        self._record_offset: int = self._slot_offset + self.key_count * SLOT.size
+
+    # Derives the vault key from the master password. Returns None if the password is wrong
+    def unlock(self, password: str, encryption: EncryptionManager | None = None) -> bytes | None:
+        key = (encryption or EncryptionManager()).derive_key(password, self.salt, self.kdf)
+        if not hmac.compare_digest(key_check(key), self.key_check):
+            return None
+        return key
+
+    # Returns (username, password token) of every login with exactly this service name
+    def lookup(self, key: bytes, service_name: str) -> list[tuple[str | None, bytes]]:
+        if self.key_count == 0:
+            return []
+        fingerprint = blind_index(key, service_name)
+        h, f1, f2 = _hashes(fingerprint, self.seed)
+        d0, d1 = DISPLACEMENT.unpack_from(self._map, self._displacement_offset + (h % self.bucket_count) * DISPLACEMENT.size)
+        slot = (f1 + d0 * f2 + d1) % self.key_count
+
+        # A name that isn't in the vault still hashes to some slot, so check the fingerprint there
+        stored, first, count = SLOT.unpack_from(self._map, self._slot_offset + slot * SLOT.size)
+        if not hmac.compare_digest(stored, fingerprint):
+            return []
+
+        results: list[tuple[str | None, bytes]] = []
+        for record in range(first, first + count):
+            offset = self._record_offset + record * self.record_size
+            username_len, token_len = RECORD_HEADER.unpack_from(self._map, offset)
+            offset += RECORD_HEADER.size
+            if username_len == NO_USERNAME:
+                username = None
+            else:
+                username = self._map[offset:offset + username_len].decode()
+                offset += username_len
+            results.append((username, self._map[offset:offset + token_len]))
+        return results
+
+    # Unmaps and closes the snapshot file
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> 'LookupSnapshot':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
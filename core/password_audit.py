@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import tempfile
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+
+from core.data_models import VaultEntry
+
+UPPERCASE: frozenset[str] = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+LOWERCASE: frozenset[str] = frozenset('abcdefghijklmnopqrstuvwxyz')
+DIGITS: frozenset[str] = frozenset('0123456789')
+SPECIAL: frozenset[str] = frozenset('!@#$%^&*(),.?:|<>_-')
+
+# Size of each character class, used for the entropy estimate
+CLASS_SIZES: dict[str, int] = {'upper': 26, 'lower': 26, 'digit': 10, 'special': 32, 'other': 100}
+
+# Entropy thresholds in bits for each score (0-4) and their labels
+SCORE_THRESHOLDS: tuple[float, ...] = (40, 60, 80, 128)
+SCORE_LABELS: tuple[str, ...] = ('Very weak', 'Weak', 'Fair', 'Strong', 'Very strong')
+
+# Width of one SHA-1 record in a breach index file
+DIGEST_SIZE: int = 20
+
+
+@dataclass
+class PasswordAnalysis:
+    length: int
+    has_upper: bool
+    has_lower: bool
+    has_digit: bool
+    has_special: bool
+    has_other: bool
+    entropy_bits: float
+    score: int
+
+    @property
+    def label(self) -> str:
+        return SCORE_LABELS[self.score]
+
+
+@dataclass
+class EntryAudit:
+    entry: VaultEntry
+    analysis: PasswordAnalysis
+    reuse_count: int
+    breached: bool
+
+
+@dataclass
+class SecurityReport:
+    entries: list[EntryAudit] = field(default_factory=list)
+    breach_checked: bool = False
+
+    @property
+    def weak(self) -> list[EntryAudit]:
+        return [audit for audit in self.entries if audit.analysis.score < 2]
+
+    @property
+    def reused(self) -> list[EntryAudit]:
+        return [audit for audit in self.entries if audit.reuse_count > 1]
+
+    @property
+    def breached(self) -> list[EntryAudit]:
+        return [audit for audit in self.entries if audit.breached]
+
+
+# Classifies every character of the password in a single pass and scores it
+def analyze_password(password: str) -> PasswordAnalysis:
+    has_upper = has_lower = has_digit = has_special = has_other = False
+    for ch in password:
+        if ch in LOWERCASE:
+            has_lower = True
+        elif ch in UPPERCASE:
+            has_upper = True
+        elif ch in DIGITS:
+            has_digit = True
+        elif ch in SPECIAL:
+            has_special = True
+        else:
+            has_other = True
+
+    pool = (
+        CLASS_SIZES['upper'] * has_upper + CLASS_SIZES['lower'] * has_lower + CLASS_SIZES['digit'] * has_digit
+        + CLASS_SIZES['special'] * has_special + CLASS_SIZES['other'] * has_other
+    )
+    entropy = len(password) * math.log2(pool) if pool else 0.0
+    score = sum(entropy >= threshold for threshold in SCORE_THRESHOLDS)
+
+    return PasswordAnalysis(len(password), has_upper, has_lower, has_digit, has_special, has_other, entropy, score)
+
+
+class BreachedPasswordIndex:
+    # The file is a sorted array of raw 20-byte SHA-1 digests, searched in place through mmap
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        size = os.path.getsize(path)
+        if size % DIGEST_SIZE:
+            raise ValueError(f'Breach index \'{path}\' is not a whole number of {DIGEST_SIZE}-byte digests')
+
+        self.count: int = size // DIGEST_SIZE
+        self._file = open(path, 'rb')
+        self._map: mmap.mmap | None = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    # Returns True if the SHA-1 digest is in the index
+    def contains_digest(self, digest: bytes) -> bool:
+        if self._map is None:
+            return False
+        data = self._map
+        lo, hi = 0, self.count
+
+        # SHA-1 digests are uniformly distributed, so interpolating on the leading
+        # bytes lands within a few records of the target before bisecting
+        target = int.from_bytes(digest[:8], 'big')
+        while hi - lo > 64:
+            lo_key = int.from_bytes(data[lo * DIGEST_SIZE:lo * DIGEST_SIZE + 8], 'big')
+            hi_key = int.from_bytes(data[(hi - 1) * DIGEST_SIZE:(hi - 1) * DIGEST_SIZE + 8], 'big')
+            if target < lo_key or target > hi_key:
+                return False
+            if hi_key == lo_key:
+                break
+            guess = lo + (target - lo_key) * (hi - 1 - lo) // (hi_key - lo_key)
+            record = data[guess * DIGEST_SIZE:(guess + 1) * DIGEST_SIZE]
+            if record == digest:
+                return True
+            if record < digest:
+                lo = guess + 1
+            else:
+                hi = guess
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = data[mid * DIGEST_SIZE:(mid + 1) * DIGEST_SIZE]
+            if record == digest:
+                return True
+            if record < digest:
+                lo = mid + 1
+            else:
+                hi = mid
+        return False
+
+    # Returns True if the password appears in the breach corpus
+    def __contains__(self, password: str) -> bool:
+        return self.contains_digest(hashlib.sha1(password.encode()).digest())
+
+    # Unmaps and closes the index file
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+# Yields SHA-1 digests from lines of hex hashes ("HASH" or "HASH:count") or plaintext passwords
+def _read_digests(lines: Iterable[str], plaintext: bool) -> Iterator[bytes]:
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+        if plaintext:
+            yield hashlib.sha1(line.encode()).digest()
+        else:
+            yield bytes.fromhex(line.split(':', 1)[0])
+
+
+# Builds a sorted, de-duplicated index file with an external merge sort so corpora larger than memory work
+def build_breach_index(source: str, destination: str, plaintext: bool = False, run_size: int = 5_000_000) -> int:
+    runs: list[str] = []
+    written = 0
+    try:
+        with open(source, 'r', encoding='utf-8', errors='replace') as f:
+            digests = _read_digests(f, plaintext)
+            while True:
+                run = sorted(d for _, d in zip(range(run_size), digests))
+                if not run:
+                    break
+                fd, run_path = tempfile.mkstemp(suffix='.run', dir=os.path.dirname(os.path.abspath(destination)))
+                with os.fdopen(fd, 'wb') as out:
+                    _ = out.write(b''.join(run))
+                runs.append(run_path)
+
+        run_files = [open(path, 'rb') for path in runs]
+        try:
+            streams = [iter(lambda f=f: f.read(DIGEST_SIZE), b'') for f in run_files]
+            previous = None
+            with open(destination, 'wb') as out:
+                for digest in heapq.merge(*streams):
+                    if digest != previous:
+                        _ = out.write(digest)
+                        written += 1
+                        previous = digest
+        finally:
+            for f in run_files:
+                f.close()
+    finally:
+        for path in runs:
+            os.remove(path)
+
+    return written
+
+
+# Audits decrypted passwords in one pass each: strength, reuse across entries and breach membership
+def audit_passwords(logins: list[tuple[VaultEntry, str]], breach_index: BreachedPasswordIndex | None = None) -> SecurityReport:
+    report = SecurityReport(breach_checked=breach_index is not None)
+
+    counts: dict[bytes, int] = {}
+    digests: list[bytes] = []
+    for _, password in logins:
+        digest = hashlib.sha1(password.encode()).digest()
+        digests.append(digest)
+        counts[digest] = counts.get(digest, 0) + 1
+
+    for (entry, password), digest in zip(logins, digests):
+        breached = breach_index.contains_digest(digest) if breach_index is not None else False
+        report.entries.append(EntryAudit(entry, analyze_password(password), counts[digest], breached))
+
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Builds a breached-password index for the security report')
+    _ = parser.add_argument('source', help='text file with one SHA-1 hash (optionally HASH:count) per line')
+    _ = parser.add_argument('destination', help='index file to write')
+    _ = parser.add_argument('--plaintext', action='store_true', help='source lines are plaintext passwords')
+    args = parser.parse_args()
+
+    count = build_breach_index(args.source, args.destination, args.plaintext)
+    print(f'Wrote {count} digests to {args.destination}')
+
+
+if __name__ == '__main__':
+    main()
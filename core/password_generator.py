@@ -0,0 +1,161 @@
+import functools
+import itertools
+import os
+import string
+import threading
+from dataclasses import dataclass
+
+from util.metrics import metrics
+
+SPECIAL_CHARACTERS: str = '!@#$%^&*(),.?:|<>_-'
+
+# Characters that are easy to misread or mistype
+AMBIGUOUS_CHARACTERS: frozenset[str] = frozenset('Il1O0o|')
+
+# Bytes fetched from the OS per refill of the random pool
+POOL_SIZE: int = 64 * 1024
+
+WORDLIST_PATH: str = os.path.join(os.path.dirname(__file__), 'wordlist.txt')
+
+
+@dataclass(frozen=True)
+class PasswordPolicy:
+    length: int = 20
+    uppercase: bool = True
+    lowercase: bool = True
+    digits: bool = True
+    special: bool = True
+    exclude_ambiguous: bool = False
+
+    # Returns the character sets enabled by the policy
+    def classes(self) -> list[str]:
+        enabled = [
+            (self.uppercase, string.ascii_uppercase),
+            (self.lowercase, string.ascii_lowercase),
+            (self.digits, string.digits),
+            (self.special, SPECIAL_CHARACTERS),
+        ]
+        classes = [chars for on, chars in enabled if on]
+        if self.exclude_ambiguous:
+            classes = [''.join(ch for ch in chars if ch not in AMBIGUOUS_CHARACTERS) for chars in classes]
+        return classes
+
+    # Returns every character the policy may use
+    def alphabet(self) -> str:
+        return ''.join(self.classes())
+
+    # Raises ValueError if no password can satisfy the policy
+    def validate(self) -> None:
+        classes = self.classes()
+        if not classes:
+            raise ValueError('Password policy must enable at least one character class')
+        if self.length < len(classes):
+            raise ValueError(f'Password length must be at least {len(classes)} to include every enabled character class')
+
+
+class RandomPool:
+    # Serves randomness from a buffer refilled with os.urandom, so each byte doesn't cost a syscall
+    def __init__(self, pool_size: int = POOL_SIZE) -> None:
+        self.pool_size: int = pool_size
+        self._lock: threading.Lock = threading.Lock()
+        self._buffer: bytes = b''
+        self._position: int = 0
+        self._pid: int = os.getpid()
+
+    # Returns n random bytes, never handing the same bytes out twice
+    def read(self, n: int) -> bytes:
+        with self._lock:
+            # A forked child must not reuse the randomness buffered by its parent
+            if self._pid != os.getpid():
+                self._buffer, self._position, self._pid = b'', 0, os.getpid()
+            if self._position + n > len(self._buffer):
+                self._buffer = self._buffer[self._position:] + os.urandom(max(n, self.pool_size))
+                self._position = 0
+            chunk = self._buffer[self._position:self._position + n]
+            self._position += n
+            return chunk
+
+    # Returns a uniform integer in [0, n) by rejection sampling
+    def randbelow(self, n: int) -> int:
+        if n <= 0:
+            raise ValueError('randbelow needs a positive bound')
+        size = max(1, (n - 1).bit_length() + 7 >> 3)
+        limit = (256 ** size // n) * n
+        while True:
+            value = int.from_bytes(self.read(size), 'big')
+            if value < limit:
+                return value % n
+
+    # Returns count characters drawn uniformly from an ASCII alphabet. Bytes at or above
+    # the largest multiple of the alphabet size are dropped rather than wrapped, which
+    # keeps the choice unbiased; bytes.translate does the mapping and dropping in C
+    def choices(self, alphabet: str, count: int) -> str:
+        table, delete, accepted = _translation(alphabet)
+        parts: list[bytes] = []
+        needed = count
+        while needed > 0:
+            # Ask for enough bytes that one round is almost always sufficient
+            chunk = self.read(needed * 256 // accepted + 16).translate(table, delete)
+            parts.append(chunk[:needed])
+            needed -= len(parts[-1])
+        return b''.join(parts).decode('ascii')
+
+
+# Builds the byte translation for an alphabet: (table, bytes to delete, accepted byte count)
+@functools.lru_cache(maxsize=32)
+def _translation(alphabet: str) -> tuple[bytes, bytes, int]:
+    encoded = alphabet.encode('ascii')
+    if not 0 < len(encoded) <= 256:
+        raise ValueError('Alphabet must contain between 1 and 256 ASCII characters')
+    accepted = 256 - 256 % len(encoded)
+    table = bytes(encoded[i % len(encoded)] for i in range(256))
+    return table, bytes(range(accepted, 256)), accepted
+
+
+# Returns the shared pool used when callers don't pass their own
+@functools.cache
+def _default_pool() -> RandomPool:
+    return RandomPool()
+
+
+# Generates one password satisfying the policy
+def generate_password(policy: PasswordPolicy = PasswordPolicy(), pool: RandomPool | None = None) -> str:
+    return generate_batch(policy, 1, pool)[0]
+
+
+# Generates count passwords satisfying the policy. Candidates missing an enabled class are
+# rejected and redrawn, so every valid password stays equally likely
+def generate_batch(policy: PasswordPolicy, count: int, pool: RandomPool | None = None) -> list[str]:
+    policy.validate()
+    pool = pool or _default_pool()
+    alphabet = policy.alphabet()
+    classes = [frozenset(chars) for chars in policy.classes()]
+    length = policy.length
+
+    with metrics.timer('password_generate'):
+        passwords: list[str] = []
+        while len(passwords) < count:
+            missing = count - len(passwords)
+            chars = pool.choices(alphabet, missing * length)
+            candidates = [chars[i:i + length] for i in range(0, missing * length, length)]
+            # One C-level filter pass per class is much cheaper than checking every class per candidate
+            for chars_in_class in classes:
+                candidates = list(itertools.filterfalse(chars_in_class.isdisjoint, candidates))
+            passwords.extend(candidates)
+        return passwords
+
+
+# Returns the bundled diceware word list
+@functools.cache
+def load_wordlist(path: str = WORDLIST_PATH) -> tuple[str, ...]:
+    with open(path, 'r') as f:
+        return tuple(line.strip() for line in f if line.strip() and not line.startswith('#'))
+
+
+# Generates a diceware-style passphrase from the bundled word list
+def generate_passphrase(word_count: int = 6, separator: str = '-', pool: RandomPool | None = None) -> str:
+    if word_count < 1:
+        raise ValueError('Passphrase must have at least one word')
+    pool = pool or _default_pool()
+    words = load_wordlist()
+    return separator.join(words[pool.randbelow(len(words))] for _ in range(word_count))
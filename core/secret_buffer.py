@@ -0,0 +1,32 @@
+class SecretBuffer(bytearray):
+    # A mutable buffer for plaintext secrets (passwords, TOTP secrets, keys) that can be zeroed in
+    # place once it is no longer needed. Immutable str/bytes copies can't be wiped and linger in
+    # freed memory, so secrets stay in one of these for as long as possible. As a bytearray it can be
+    # passed anywhere bytes are accepted without another copy; slice it through a memoryview, since
+    # slicing a bytearray copies
+    #
+    # Use it as a context manager to wipe it on exit:
+    #     with encryption.decrypt_password(key, token) as password:
+    #         ...
+
+    # Encodes text straight into a new buffer
+    @classmethod
+    def from_str(cls, text: str) -> 'SecretBuffer':
+        return cls(text, 'utf-8')
+
+    # Overwrites the contents with zeros. Assigning a slice of the same length writes in place
+    # without reallocating, so views taken earlier stay valid
+    def wipe(self) -> None:
+        self[:] = bytes(len(self))
+
+    def __enter__(self) -> 'SecretBuffer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.wipe()
+
+    # Keep secrets out of logs and tracebacks
+    def __repr__(self) -> str:
+        return f'SecretBuffer(<{len(self)} bytes>)'
+
+    __str__ = __repr__
@@ -0,0 +1,194 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from core.data_models import SyncRow, User
+from core.vault import Vault
+from util.enums import SyncStatus
+from util.metrics import metrics
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# HMAC label for the value that lets devices confirm they share a vault key without revealing it
+KEY_CHECK_LABEL: bytes = b'cosmicc-sync-key-check'
+
+# SyncRow fields holding raw bytes, base64-encoded on the wire
+BINARY_FIELDS: tuple[str, ...] = ('password_encrypted', 'password_fingerprint', 'totp_secret_encrypted')
+
+
+@dataclass
+class SyncResult:
+    status: SyncStatus
+    pulled: int = 0
+    applied: int = 0
+    pushed: int = 0
+    bytes_received: int = 0
+    bytes_sent: int = 0
+
+
+class DirectoryRemote:
+    # A directory shared between devices (a network drive, USB stick or synced folder) standing in
+    # for a sync server. Each account has a metadata file and a set of change segments; every device
+    # only ever appends its own numbered segments, so devices never write the same file
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        os.makedirs(path, exist_ok=True)
+        info_path = os.path.join(path, 'remote.json')
+        if not os.path.exists(info_path):
+            _write_atomic(info_path, json.dumps({'id': uuid.uuid4().hex}).encode())
+        with open(info_path, 'r') as f:
+            self.remote_id: str = json.load(f)['id']
+
+    # Returns the directory of an account, named by a hash so usernames aren't exposed
+    def _account_dir(self, username: str) -> str:
+        return os.path.join(self.path, 'accounts', hashlib.sha256(username.encode()).hexdigest()[:32])
+
+    # Returns the account metadata, or None if no device has synced the account yet
+    def read_account(self, username: str) -> dict[str, Any] | None:
+        try:
+            with open(os.path.join(self._account_dir(username), 'account.json'), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    # Creates the account metadata
+    def write_account(self, username: str, account: dict[str, Any]) -> None:
+        _write_atomic(os.path.join(self._account_dir(username), 'account.json'), json.dumps(account).encode())
+
+    # Returns (device id, sequence number) of every change segment of the account
+    def list_segments(self, username: str) -> list[tuple[str, int]]:
+        directory = os.path.join(self._account_dir(username), 'changes')
+        if not os.path.isdir(directory):
+            return []
+        segments: list[tuple[str, int]] = []
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                device, seq = name.removesuffix('.json').rsplit('-', 1)
+                segments.append((device, int(seq)))
+        return sorted(segments)
+
+    # Returns the contents of a change segment
+    def read_segment(self, username: str, device: str, seq: int) -> bytes:
+        with open(os.path.join(self._account_dir(username), 'changes', f'{device}-{seq:010d}.json'), 'rb') as f:
+            return f.read()
+
+    # Publishes a change segment
+    def write_segment(self, username: str, device: str, seq: int, data: bytes) -> None:
+        _write_atomic(os.path.join(self._account_dir(username), 'changes', f'{device}-{seq:010d}.json'), data)
+
+
+# Writes data to path atomically so other devices never read a partial file
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            _ = f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+# Serialises changed rows for a segment
+def encode_rows(rows: list[SyncRow]) -> bytes:
+    encoded: list[dict[str, Any]] = []
+    for row in rows:
+        fields = asdict(row)
+        for name in BINARY_FIELDS:
+            if fields[name] is not None:
+                fields[name] = base64.b64encode(fields[name]).decode('ascii')
+        encoded.append(fields)
+    return json.dumps(encoded, separators=(',', ':')).encode()
+
+
+# Parses the rows of a segment
+def decode_rows(data: bytes) -> list[SyncRow]:
+    rows: list[SyncRow] = []
+    for fields in json.loads(data):
+        for name in BINARY_FIELDS:
+            if fields[name] is not None:
+                fields[name] = base64.b64decode(fields[name])
+        rows.append(SyncRow(**fields))
+    return rows
+
+
+class SyncEngine:
+    # Syncs one user's logins with a remote. Only rows changed since the last sync travel in either
+    # direction, found through each row's Lamport clock, and they stay encrypted throughout.
+    # Conflicting edits resolve to the change with the higher (clock, device id), so every device
+    # converges on the same row no matter what order segments arrive in. Only the login row itself
+    # syncs; custom fields, attachments, tags and folders stay on the device they were added on
+    def __init__(self, vault: Vault) -> None:
+        self.vault: Vault = vault
+        self.database = vault.database
+
+    # Returns the value that proves a device holds the account's vault key
+    @staticmethod
+    def key_check(key: bytes) -> str:
+        return hmac.new(key, KEY_CHECK_LABEL, hashlib.sha256).hexdigest()
+
+    # Pulls the changes other devices have published, then publishes this device's own
+    def sync(self, user: User, remote: DirectoryRemote) -> SyncResult:
+        account = remote.read_account(user.username)
+        if account is None:
+            remote.write_account(user.username, {'salt': user.salt.hex(), 'kdf': user.kdf, 'key_check': self.key_check(user.master_hash)})
+        elif account['key_check'] != self.key_check(user.master_hash):
+            logger.error(f'Vault key of user {user.id} does not match remote {remote.remote_id}')
+            return SyncResult(SyncStatus.KEY_MISMATCH)
+
+        result = SyncResult(SyncStatus.SUCCESS)
+        device: str = self.database.get_sync_value('device_id')
+        prefix = f'{remote.remote_id}:{user.id}'
+
+        with metrics.timer('sync'):
+            try:
+                for other, seq in remote.list_segments(user.username):
+                    pulled_key = f'{prefix}:pulled:{other}'
+                    if other == device or seq <= self.database.get_sync_value(pulled_key, 0):
+                        continue
+                    data = remote.read_segment(user.username, other, seq)
+                    rows = decode_rows(data)
+                    result.bytes_received += len(data)
+                    result.pulled += len(rows)
+                    result.applied += self.database.apply_changes(user.id, rows, {pulled_key: seq})
+
+                pushed_clock: int = self.database.get_sync_value(f'{prefix}:pushed_clock', 0)
+                rows = self.database.get_changes(user.id, device, pushed_clock)
+                if rows:
+                    seq = self.database.get_sync_value(f'{prefix}:pushed_seq', 0) + 1
+                    data = encode_rows(rows)
+                    remote.write_segment(user.username, device, seq, data)
+                    self.database.set_sync_value(f'{prefix}:pushed_seq', seq)
+                    self.database.set_sync_value(f'{prefix}:pushed_clock', rows[-1].clock)
+                    result.bytes_sent += len(data)
+                    result.pushed += len(rows)
+            except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+                logger.error(f'Error syncing user {user.id} with remote {remote.remote_id}: {e}')
+                result.status = SyncStatus.ERROR
+
+        logger.info(f'Synced user {user.id}: pulled {result.pulled}, applied {result.applied}, pushed {result.pushed}')
+        return result
+
+    # Re-encrypts the vault under the remote account's key when this device registered the same account
+    # separately (same master password, different salt). Returns the updated user, or None if the
+    # password doesn't unlock the remote account
+    def adopt_remote_key(self, user: User, password: str, remote: DirectoryRemote) -> User | None:
+        account = remote.read_account(user.username)
+        if account is None:
+            return None
+        salt = bytes.fromhex(account['salt'])
+        # Accounts published before KDFs were recorded have no 'kdf' and use the original scrypt
+        kdf: str | None = account.get('kdf')
+        key = self.vault.encryption.derive_key(password, salt, kdf)
+        if not hmac.compare_digest(self.key_check(key), account['key_check']):
+            return None
+        return self.vault.rekey(user, key, salt, kdf)
@@ -0,0 +1,123 @@
+import base64
+import binascii
+import hmac
+import struct
+import time
+from dataclasses import dataclass
+
+from core.data_models import TotpEntry, User
+from core.encryption import EncryptionManager
+from util.metrics import metrics
+
+ALGORITHMS: dict[str, str] = {'SHA1': 'sha1', 'SHA256': 'sha256', 'SHA512': 'sha512'}
+
+
+@dataclass(frozen=True)
+class TotpParams:
+    key: bytes
+    digits: int = 6
+    period: int = 30
+    algorithm: str = 'sha1'
+
+
+@dataclass
+class TotpCode:
+    entry_id: int
+    service_name: str
+    username: str | None
+    code: str
+    seconds_remaining: int
+
+
+# Decodes a base32 secret, tolerating spaces, lowercase and missing padding
+def decode_secret(secret: str) -> bytes:
+    cleaned = secret.replace(' ', '').replace('-', '').upper()
+    cleaned += '=' * (-len(cleaned) % 8)
+    try:
+        key = base64.b32decode(cleaned)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError('TOTP secret is not valid base32') from e
+    if not key:
+        raise ValueError('TOTP secret is empty')
+    return key
+
+
+# Parses either a bare base32 secret or an otpauth://totp/ URI
+def parse_totp_secret(secret: str) -> TotpParams:
+    secret = secret.strip()
+    if not secret.lower().startswith('otpauth://'):
+        return TotpParams(decode_secret(secret))
+
+    # urllib.parse is slow to import and only URIs need it
+    from urllib.parse import parse_qs, urlparse
+
+    uri = urlparse(secret)
+    if uri.netloc.lower() != 'totp':
+        raise ValueError('Only otpauth://totp/ URIs are supported')
+    query = {key.lower(): values[0] for key, values in parse_qs(uri.query).items()}
+    if 'secret' not in query:
+        raise ValueError('otpauth URI has no secret')
+
+    algorithm = query.get('algorithm', 'SHA1').upper()
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'Unsupported TOTP algorithm \'{algorithm}\'')
+    digits = int(query.get('digits', 6))
+    period = int(query.get('period', 30))
+    if not 6 <= digits <= 8 or period <= 0:
+        raise ValueError('TOTP digits must be 6-8 and period positive')
+    return TotpParams(decode_secret(query['secret']), digits, period, ALGORITHMS[algorithm])
+
+
+# Computes the RFC 4226 HOTP value for a counter
+def hotp(key: bytes, counter: int, digits: int = 6, algorithm: str = 'sha1') -> str:
+    digest = hmac.new(key, struct.pack('>Q', counter), algorithm).digest()
+    offset = digest[-1] & 0x0F
+    value = struct.unpack_from('>I', digest, offset)[0] & 0x7FFFFFFF
+    return str(value % 10 ** digits).zfill(digits)
+
+
+# Computes the RFC 6238 TOTP code at the given unix time
+def totp(params: TotpParams, timestamp: float | None = None) -> str:
+    now = time.time() if timestamp is None else timestamp
+    return hotp(params.key, int(now) // params.period, params.digits, params.algorithm)
+
+
+class TotpSession:
+    # Holds decrypted TOTP keys for the signed-in user so refreshing codes never re-decrypts
+    def __init__(self, encryption: EncryptionManager) -> None:
+        self.encryption: EncryptionManager = encryption
+        self._entries: dict[int, tuple[TotpEntry, TotpParams]] = {}
+
+    # Decrypts any TOTP secrets not already cached and drops entries that no longer exist
+    def load(self, user: User, entries: list[TotpEntry]) -> None:
+        current = {entry.entry_id for entry in entries}
+        for entry_id in list(self._entries):
+            if entry_id not in current:
+                del self._entries[entry_id]
+
+        for entry in entries:
+            cached = self._entries.get(entry.entry_id)
+            if cached is not None and cached[0].secret_encrypted == entry.secret_encrypted:
+                continue
+            with self.encryption.decrypt_password(user.master_hash, entry.secret_encrypted) as secret:
+                self._entries[entry.entry_id] = (entry, parse_totp_secret(secret.decode()))
+
+    # Computes the current code for every cached entry in one pass
+    def codes(self, timestamp: float | None = None) -> list[TotpCode]:
+        now = time.time() if timestamp is None else timestamp
+        with metrics.timer('totp_codes'):
+            # Entries sharing a period share one counter, so compute it once per period
+            counters: dict[int, int] = {}
+            codes: list[TotpCode] = []
+            for entry, params in self._entries.values():
+                counter = counters.get(params.period)
+                if counter is None:
+                    counter = counters[params.period] = int(now) // params.period
+                code = hotp(params.key, counter, params.digits, params.algorithm)
+                remaining = params.period - int(now) % params.period
+                codes.append(TotpCode(entry.entry_id, entry.service_name, entry.username, code, remaining))
+            return codes
+
+    # Forgets every decrypted key, e.g. on sign out
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,150 @@
+import curses
+import time
+from dataclasses import dataclass
+
+from core.clipboard import Clipboard
+from core.data_models import User
+from core.vault import Vault
+from util.enums import AuditEvent
+from util.metrics import metrics
+
+# Keys that end the TUI: Escape and Ctrl+C/Ctrl+D
+QUIT_KEYS: frozenset[int] = frozenset((27, 3, 4))
+
+BACKSPACE_KEYS: frozenset[int] = frozenset((curses.KEY_BACKSPACE, 127, 8))
+
+ENTER_KEYS: frozenset[int] = frozenset((curses.KEY_ENTER, 10, 13))
+
+
+class MetadataIndex:
+    # Service names and usernames of the user's logins, loaded once and searched in memory,
+    # so filtering never touches the database or decrypts anything
+    def __init__(self, rows: list[tuple[int, str, str | None]]) -> None:
+        rows = sorted(rows, key=lambda row: (row[1].lower(), (row[2] or '').lower()))
+        self.ids: list[int] = [row[0] for row in rows]
+        self.labels: list[str] = [f'{row[1]}  ({row[2] if row[2] else "N/A"})' for row in rows]
+        self._haystack: list[str] = [f'{row[1]}\x00{row[2] or ""}'.lower() for row in rows]
+        # Matches for the current query and each of its prefixes. Typing narrows the previous
+        # matches instead of rescanning, and backspace is a lookup
+        self._matches: dict[str, list[int]] = {'': list(range(len(rows)))}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # Returns the positions of every login whose service name or username contains the query
+    def filter(self, query: str) -> list[int]:
+        query = query.lower()
+        matches = self._matches.get(query)
+        if matches is not None:
+            return matches
+
+        prefix = next(query[:end] for end in range(len(query) - 1, -1, -1) if query[:end] in self._matches)
+        haystack = self._haystack
+        matches = [i for i in self._matches[prefix] if query in haystack[i]]
+
+        # Only the prefixes of the current query can be reused
+        self._matches = {key: value for key, value in self._matches.items() if query.startswith(key)}
+        self._matches[query] = matches
+        return matches
+
+
+@dataclass
+class TuiState:
+    query: str = ''
+    selected: int = 0
+    top: int = 0
+    detail: str = ''
+
+    # Keeps the selection inside the matches and scrolls the window so it stays visible
+    def clamp(self, match_count: int, list_height: int) -> None:
+        self.selected = max(0, min(self.selected, match_count - 1))
+        if self.selected < self.top:
+            self.top = self.selected
+        elif self.selected >= self.top + list_height:
+            self.top = self.selected - list_height + 1
+        self.top = max(0, min(self.top, max(0, match_count - list_height)))
+
+
+# Draws the search line, the visible slice of the matches and the detail line. Only the rows
+# that fit on screen are drawn, however many logins match
+def render(screen: 'curses.window', state: TuiState, index: MetadataIndex, matches: list[int]) -> None:
+    height, width = screen.getmaxyx()
+    list_height = max(1, height - 3)
+    state.clamp(len(matches), list_height)
+
+    screen.erase()
+    screen.addnstr(0, 0, f'Search: {state.query}', width - 1)
+    screen.addnstr(1, 0, f'{len(matches)} of {len(index)} logins  |  Enter: copy password  Esc: back', width - 1, curses.A_DIM)
+    for row, position in enumerate(matches[state.top:state.top + list_height]):
+        attr = curses.A_REVERSE if state.top + row == state.selected else curses.A_NORMAL
+        screen.addnstr(row + 2, 0, index.labels[position].ljust(width - 1), width - 1, attr)
+    if state.detail:
+        screen.addnstr(height - 1, 0, state.detail, width - 1, curses.A_BOLD)
+    screen.move(0, min(len('Search: ') + len(state.query), width - 1))
+    screen.refresh()
+
+
+# Decrypts the highlighted login and copies its password, or reveals it on the detail line if
+# there is no clipboard. The TUI runs on the alternate screen, so nothing reaches the scrollback
+def _open_entry(vault: Vault, user: User, entry_id: int, clipboard: Clipboard | None) -> str:
+    login = vault.database.get_login(user.id, entry_id)
+    if login is None:
+        return 'That login no longer exists.'
+    with vault.encryption.decrypt_password(user.master_hash, login.password_encrypted) as decrypted:
+        password = decrypted.decode()
+    vault.record_event(AuditEvent.REVEAL, user, entry_id)
+    if clipboard is not None and clipboard.copy(password):
+        return f'Password for {login.service_name} copied; it will be cleared in {clipboard.clear_after:.0f} seconds.'
+    return f'Password for {login.service_name}: {password}'
+
+
+# Runs the full-screen browser until the user presses Escape
+def browse(screen: 'curses.window', vault: Vault, user: User, clipboard: Clipboard | None = None) -> None:
+    curses.curs_set(1)
+    # Escape should leave at once rather than after curses waits for the rest of an escape sequence
+    curses.set_escdelay(25)
+    screen.keypad(True)
+    index = MetadataIndex(vault.database.get_login_metadata(user.id))
+    state = TuiState()
+    matches = index.filter('')
+    render(screen, state, index, matches)
+
+    while True:
+        key = screen.getch()
+        start = time.perf_counter_ns()
+        list_height = max(1, screen.getmaxyx()[0] - 3)
+
+        if key in QUIT_KEYS:
+            return
+        elif key in ENTER_KEYS:
+            if matches:
+                state.detail = _open_entry(vault, user, index.ids[matches[state.selected]], clipboard)
+        elif key == curses.KEY_UP:
+            state.selected -= 1
+        elif key == curses.KEY_DOWN:
+            state.selected += 1
+        elif key == curses.KEY_PPAGE:
+            state.selected -= list_height
+        elif key == curses.KEY_NPAGE:
+            state.selected += list_height
+        elif key == curses.KEY_HOME:
+            state.selected = 0
+        elif key == curses.KEY_END:
+            state.selected = len(matches) - 1
+        elif key in BACKSPACE_KEYS:
+            state.query = state.query[:-1]
+            state.selected, state.detail = 0, ''
+        elif 32 <= key < 127:
+            state.query += chr(key)
+            state.selected, state.detail = 0, ''
+        elif key != curses.KEY_RESIZE:
+            continue
+
+        matches = index.filter(state.query)
+        render(screen, state, index, matches)
+        metrics.observe_ns('tui_keystroke', time.perf_counter_ns() - start)
+
+
+# Starts the browser on the alternate screen and restores the terminal afterwards
+def run_tui(vault: Vault, user: User, clipboard: Clipboard | None = None) -> None:
+    curses.wrapper(browse, vault, user, clipboard)
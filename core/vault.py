@@ -1,44 +1,183 @@
-from core.data_models import User, VaultEntry
-from core.encryption import EncryptionManager
+import os
+import sqlite3
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, nullcontext
+from dataclasses import replace
+
+from core.attachments import CHUNK_SIZE, CorruptAttachment, decrypt_chunks, encrypt_buffer, encrypt_chunks, new_nonce_prefix
+from core.audit_log import AuditLog
+from core.data_models import Attachment, CustomField, LoginVersion, User, VaultEntry, VisibleEntry
+from core.clipboard import Clipboard
+from core.encryption import EncryptionManager, SessionKey
+from core.kdf import DEFAULT_KDF, Kdf
+from core.kdf_pool import KdfPool
+from core.password_audit import BreachedPasswordIndex, SecurityReport, audit_passwords
+from core.password_generator import generate_passphrase, generate_password
+from core.secret_buffer import SecretBuffer
+from core.totp import parse_totp_secret
 from db.database import DatabaseManager
-from util.enums import InsertStatus, RemoveStatus
+from util.enums import AttachmentKind, AuditEvent, FieldKind, HistoryField, InsertStatus, RemoveStatus
+from util.lazy_import import lazy_import
+
+# Loaded on first use, like the rest of cryptography (see core/encryption.py)
+fernet = lazy_import('cryptography.fernet')
+
+# Shown in place of a secret that is not printed
+HIDDEN: str = '(hidden)'
 
 
 class Vault:
-    def __init__(self, db: DatabaseManager) -> None:
+    def __init__(self, db: DatabaseManager, kdf_pool: KdfPool | None = None, audit_log: AuditLog | None = None,
+                 kdf: Kdf = DEFAULT_KDF) -> None:
         self.database: DatabaseManager = db
         self.encryption: EncryptionManager = EncryptionManager()
+        self.kdf_pool: KdfPool | None = kdf_pool
+        self.audit_log: AuditLog | None = audit_log
+        # KDF new accounts are created with and existing ones are moved to
+        self.kdf: Kdf = kdf
+
+    # Adds an event to the audit trail, if there is one
+    def record_event(self, event: AuditEvent, user: User, entry_id: int | None = None) -> None:
+        if self.audit_log is not None:
+            self.audit_log.record(event, user.id, entry_id)
+
+    # Records an insert that succeeded as an add of the row it created: a login for ADD, or a
+    # shared collection entry for SHARED_ADD
+    def _record_insert(self, user: User, status: InsertStatus, event: AuditEvent = AuditEvent.ADD) -> InsertStatus:
+        if status == InsertStatus.SUCCESS:
+            self.record_event(event, user, self.database.last_insert_id)
+        return status
 
     # Creates new user
     def create_user(self, username: str, password: str) -> InsertStatus:
-        salt, hash = self.encryption.hash_master_password(password)
-        return self.database.insert_user(username, hash, salt)
+        salt, hash = self.encryption.hash_master_password(password, self.kdf.spec)
+        return self.database.insert_user(username, hash, salt, self.kdf.spec)
+
+    # Returns a copy of the user for a signed-in session, with the vault key in a buffer that
+    # close_session can wipe. The copy keeps the cached user record untouched
+    def open_session(self, user: User) -> User:
+        return replace(user, master_hash=SessionKey(user.master_hash))
+
+    # Zeroes the vault key of a session opened with open_session, and drops the user's cached record,
+    # whose copy of the key is bytes that can't be wiped, so it doesn't outlive the session
+    def close_session(self, user: User) -> None:
+        if isinstance(user.master_hash, SecretBuffer):
+            user.master_hash.wipe()
+        self.database.forget_cached_user(user.id)
+
+    # Decrypts a secret that has to be shown as text. The decrypted buffer is wiped; only the str remains
+    def _decrypt_text(self, key: bytes, encrypted: bytes) -> str:
+        with self.encryption.decrypt_password(key, encrypted) as plaintext:
+            return plaintext.decode()
 
     # Check if the password is the master password of the user given their id
     def check_master_password(self, user: User, password: str) -> bool:
-        return self.encryption.vertify_master_password(password, user.salt, user.master_hash)
+        if self.kdf_pool is not None:
+            return self.kdf_pool.verify(password, user.salt, user.master_hash, user.kdf)
+        return self.encryption.vertify_master_password(password, user.salt, user.master_hash, user.kdf)
+
+    # Moves an account whose key came from another KDF, or the same KDF with other parameters, to
+    # the vault's KDF: derives a new key with a fresh salt and re-encrypts the vault under it. Call
+    # with the master password just checked. Accounts that sync keep their KDF, as every device must
+    # derive the same key. Returns the user to continue with, which is the same one when nothing changed
+    def upgrade_kdf(self, user: User, password: str) -> User:
+        if user.kdf == self.kdf.spec or self.database.has_synced(user.id):
+            return user
+        new_salt, new_key = self.encryption.hash_master_password(password, self.kdf.spec)
+        upgraded = self.rekey(user, new_key, new_salt, self.kdf.spec)
+        if upgraded is None:
+            # The old key still works, so the sign-in goes ahead and the move is retried next time
+            return user
+        return upgraded
 
     # Adds the username and password as a new login to the manager under the name
-    def add_login(self, user: User, service_name: str, username: str | None, password: str) -> InsertStatus:
+    def add_login(self, user: User, service_name: str, username: str | None, password: str, totp_secret: str | None = None) -> InsertStatus:
         encrypted_password = self.encryption.encrypt_password(user.master_hash, password)
-        return self.database.insert_login(user.id, service_name, username, encrypted_password)
+        fingerprint = self.encryption.fingerprint_password(user.master_hash, password)
+        encrypted_totp = self._encrypt_totp_secret(user, totp_secret) if totp_secret else None
+        return self._record_insert(user, self.database.insert_login(user.id, service_name, username, encrypted_password, fingerprint, encrypted_totp))
+
+    # Validates a base32 secret or otpauth:// URI and encrypts it; raises ValueError if invalid
+    def _encrypt_totp_secret(self, user: User, totp_secret: str) -> bytes:
+        _ = parse_totp_secret(totp_secret)
+        return self.encryption.encrypt_password(user.master_hash, totp_secret.strip())
+
+    # Adds a TOTP secret to one of the logins saved under the service name
+    def add_totp_secret(self, user: User, service_name: str, totp_secret: str) -> InsertStatus:
+        logins = self.database.get_logins_from_name(user.id, service_name)
+        if not logins:
+            print(f'No logins found for \'{service_name}\'')
+            return InsertStatus.ERROR
+
+        if len(logins) == 1:
+            login = logins[0]
+        else:
+            login = self._select_login_from_list(logins, 'add the 2FA secret to')
+            if login is None:
+                return InsertStatus.ERROR
+
+        return self.database.set_totp_secret(user.id, login.id, self._encrypt_totp_secret(user, totp_secret))
+
+    # Returns how many of the user's logins already use this password
+    def count_password_reuse(self, user: User, password: str) -> int:
+        fingerprint = self.encryption.fingerprint_password(user.master_hash, password)
+        return self.database.count_password_fingerprint(user.id, fingerprint)
 
-    # Lists all passwords
-    def list_logins(self, user: User) -> None:
+    # Fingerprints logins stored before fingerprints existed, returning how many were updated
+    def backfill_fingerprints(self, user: User) -> int:
+        logins = self.database.get_logins_without_fingerprint(user.id)
+        if not logins:
+            return 0
+
+        fingerprints: list[tuple[int, bytes]] = []
+        for login in logins:
+            with self.encryption.decrypt_password(user.master_hash, login.password_encrypted) as password:
+                fingerprints.append((login.id, self.encryption.fingerprint_password(user.master_hash, password)))
+        _ = self.database.set_password_fingerprints(fingerprints)
+        return len(fingerprints)
+
+    # Prints each group of services sharing a password without decrypting anything
+    def list_password_reuse(self, user: User) -> None:
+        groups = self.database.get_password_reuse_groups(user.id)
+        if not groups:
+            print('No reused passwords found.')
+            return
+
+        for services in groups:
+            print(f'Same password used for {len(services)} logins: {", ".join(services)}')
+
+    # Lists all logins. With a clipboard to copy from, passwords are neither decrypted nor printed
+    def list_logins(self, user: User, clipboard: Clipboard | None = None) -> None:
         logins = self.database.get_user_logins(user.id)
         if not logins:
             print('You have no logins.')
             return
 
+        fields = self.database.get_login_fields(user.id, [login.id for login in logins])
         for login in logins:
-            decrypted_password = self.encryption.decrypt_password(user.master_hash, login.password_encrypted)
             username_display = login.username if login.username else 'N/A'
-            print(f'Service: {login.service_name} | Username: {username_display} | Password: {decrypted_password.decode()}')
+            print(f'Service: {login.service_name} | Username: {username_display} | Password: {self._shown_password(user, login, clipboard)}'
+                  + ''.join(f' | {name}: {value}' for name, value in self._shown_fields(user, fields.get(login.id, []))))
+        self._mention_hidden_passwords(clipboard)
 
     # Deletes user from database
     def remove_user(self, user: User) -> RemoveStatus:
         return self.database.delete_user(user.id)
 
+    # Restores a deleted account that is still in the trash, given its master password, along with
+    # the logins deleted with it
+    def restore_user(self, username: str, password: str) -> InsertStatus:
+        deleted = self.database.get_deleted_user(username)
+        if deleted is None:
+            return InsertStatus.ERROR
+        user, deleted_at = deleted
+        if not self.check_master_password(user, password):
+            self.record_event(AuditEvent.SIGN_IN_FAILED, user)
+            return InsertStatus.ERROR
+        return self.database.restore_user(user.id, deleted_at)
+
     # Helper to select from multiple logins
     def _select_login_from_list(self, logins: list[VaultEntry], action: str) -> VaultEntry | None:
         print(f'\nFound {len(logins)} logins:')
@@ -76,13 +215,21 @@ class Vault:
 
         confirm = input(f'Delete login for \'{service_name}\' (username: {login.username})? (yes/no): ').strip().lower()
         if confirm == 'yes':
-            return self.database.delete_login(login.id)
+            status = self.database.delete_login(login.id)
+            if status == RemoveStatus.SUCCESS:
+                self.record_event(AuditEvent.DELETE, user, login.id)
+            return status
         else:
             print('Deletion cancelled.')
             return RemoveStatus.ERROR
 
-    # Gets the information for a login given the user and service name
-    def get_login_information(self, user: User, service_name: str) -> None:
+    # Gets the information for a login given the user and service name. With a clipboard the
+    # password is copied to it rather than printed
+    def get_login_information(self, user: User, service_name: str, clipboard: Clipboard | None = None) -> None:
+        if clipboard is not None:
+            _ = self.copy_login_password(user, service_name, clipboard)
+            return
+
         logins = self.database.get_logins_from_name(user.id, service_name)
 
         if not logins:
@@ -96,9 +243,584 @@ class Vault:
             if login is None:
                 return
 
-        decrypted_password = self.encryption.decrypt_password(user.master_hash, login.password_encrypted)
+        decrypted_password = self._decrypt_text(user.master_hash, login.password_encrypted)
+        self.record_event(AuditEvent.REVEAL, user, login.id)
         print('\n--- Login Information ---')
         print(f'Service: {login.service_name}')
         print(f'Username: {login.username if login.username else "N/A"}')
-        print(f'Password: {decrypted_password.decode()}')
+        print(f'Password: {decrypted_password}')
+        for name, value in self._shown_fields(user, self.database.get_login_fields(user.id, [login.id]).get(login.id, [])):
+            print(f'{name}: {value}')
+        dates = self.database.get_login_dates(user.id, login.id)
+        if dates is not None:
+            print(f'Created: {_format_date(dates.created_at)}')
+            print(f'Password changed: {_format_date(dates.updated_at)}')
+            if dates.rotation_days is not None:
+                print(f'Rotation: every {dates.rotation_days} days, next due {_format_date(dates.expires_at)}')
+        print()
+
+    # Re-encrypts every secret of the user under a new key and salt, recording kdf as the spec of the KDF
+    # that derived the key (None for the original scrypt). Returns the updated user, or None on failure.
+    # Secrets go from one buffer to the next without ever becoming str, and each buffer is wiped straight after
+    def rekey(self, user: User, new_key: bytes, new_salt: bytes, kdf: str | None = None) -> User | None:
+        entries, history = self.database.get_user_secrets(user.id)
+
+        rekeyed_entries: list[tuple[int, bytes, bytes, bytes | None]] = []
+        for entry_id, password_encrypted, totp_encrypted in entries:
+            totp = None
+            if totp_encrypted is not None:
+                with self.encryption.decrypt_password(user.master_hash, totp_encrypted) as totp_secret:
+                    totp = self.encryption.encrypt_password(new_key, totp_secret)
+            with self.encryption.decrypt_password(user.master_hash, password_encrypted) as password:
+                rekeyed_entries.append((
+                    entry_id,
+                    self.encryption.encrypt_password(new_key, password),
+                    self.encryption.fingerprint_password(new_key, password),
+                    totp,
+                ))
+
+        rekeyed_history: list[tuple[int, bytes]] = []
+        for history_id, password_encrypted in history:
+            with self.encryption.decrypt_password(user.master_hash, password_encrypted) as password:
+                rekeyed_history.append((history_id, self.encryption.encrypt_password(new_key, password)))
+
+        collection_keys: list[tuple[int, bytes]] = []
+        for collection in self.database.get_user_collections(user.id):
+            with self.encryption.unwrap_key(user.master_hash, collection.wrapped_key) as collection_key:
+                collection_keys.append((collection.id, self.encryption.wrap_key(new_key, collection_key)))
+
+        # Attachments keep their own keys, so only those are re-wrapped, never the chunks
+        attachment_keys: list[tuple[int, bytes]] = []
+        for attachment_id, wrapped_key in self.database.get_attachment_keys(user.id):
+            with self.encryption.unwrap_key(user.master_hash, wrapped_key) as attachment_key:
+                attachment_keys.append((attachment_id, self.encryption.wrap_key(new_key, attachment_key)))
+
+        rekeyed_fields: list[tuple[int, bytes]] = []
+        for field_id, value_encrypted in self.database.get_field_secrets(user.id):
+            with self.encryption.decrypt_password(user.master_hash, value_encrypted) as value:
+                rekeyed_fields.append((field_id, self.encryption.encrypt_password(new_key, value)))
+
+        if self.database.rekey_user(user.id, new_key, new_salt, rekeyed_entries, rekeyed_history, collection_keys, kdf,
+                                    attachment_keys, rekeyed_fields) != InsertStatus.SUCCESS:
+            return None
+        return self.database.get_user_from_user_id(user.id)
+
+    # Lists the user's deleted logins and offers to restore one
+    def restore_from_trash(self, user: User) -> InsertStatus | None:
+        trash = self.database.get_trash(user.id)
+        if not trash:
+            print('Your trash is empty.')
+            return None
+
+        for i, entry in enumerate(trash, 1):
+            deleted = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry.deleted_at))
+            print(f'{i}. Service: {entry.service_name} | Username: {entry.username if entry.username else "N/A"} | Deleted: {deleted}')
+
+        while True:
+            choice = input(f'\nSelect a login to restore (1-{len(trash)}) or press Enter to go back: ').strip()
+            if not choice:
+                return None
+            try:
+                idx = int(choice) - 1
+                if 0 <= idx < len(trash):
+                    return self.database.restore_login(user.id, trash[idx].id)
+                print(f'Invalid choice. Please enter a number between 1 and {len(trash)}.')
+            except ValueError:
+                print('Invalid input. Please enter a number.')
+
+    # Replaces a login's fields; a password of None keeps the current one. The previous values go to its history
+    def update_login(self, user: User, login: VaultEntry, service_name: str, username: str | None, password: str | None) -> InsertStatus:
+        if password is None:
+            status = self.database.update_login(user.id, login.id, service_name, username)
+        else:
+            encrypted_password = self.encryption.encrypt_password(user.master_hash, password)
+            fingerprint = self.encryption.fingerprint_password(user.master_hash, password)
+            status = self.database.update_login(user.id, login.id, service_name, username, encrypted_password, fingerprint)
+        if status == InsertStatus.SUCCESS:
+            self.record_event(AuditEvent.UPDATE, user, login.id)
+        return status
+
+    # Rebuilds every version of a login, newest first, by applying the stored deltas backwards
+    # from the current row. Only the history rows' changed fields are decrypted
+    def login_history(self, user: User, login: VaultEntry) -> list[LoginVersion]:
+        service_name, username, password_encrypted = login.service_name, login.username, login.password_encrypted
+        password = self._decrypt_text(user.master_hash, password_encrypted)
+        versions = [LoginVersion(service_name, username, password, None)]
+
+        for change in self.database.get_login_history(user.id, login.id):
+            fields = HistoryField(change.changed_fields)
+            if HistoryField.SERVICE_NAME in fields:
+                service_name = change.service_name or ''
+            if HistoryField.USERNAME in fields:
+                username = change.username
+            if HistoryField.PASSWORD in fields and change.password_encrypted is not None:
+                password = self._decrypt_text(user.master_hash, change.password_encrypted)
+            versions[-1].changed_at = change.changed_at
+            versions.append(LoginVersion(service_name, username, password, None))
+        return versions
+
+    # Prompts for new values for a login, keeping any left blank
+    def edit_login(self, user: User, service_name: str, clipboard: Clipboard | None = None) -> InsertStatus:
+        logins = self.database.get_logins_from_name(user.id, service_name)
+
+        if not logins:
+            print(f'No logins found for \'{service_name}\'')
+            return InsertStatus.ERROR
+
+        if len(logins) == 1:
+            login = logins[0]
+        else:
+            login = self._select_login_from_list(logins, 'update')
+            if login is None:
+                return InsertStatus.ERROR
+
+        new_service = input(f'Service name [{login.service_name}]: ').strip() or login.service_name
+        new_username = input(f'Username [{login.username if login.username else "N/A"}]: ').strip() or login.username
+        password = input('Password (blank to keep, or \'generate\' / \'passphrase\'): ').strip() or None
+        if password in ('generate', 'passphrase'):
+            password = generate_password() if password == 'generate' else generate_passphrase()
+            self.show_generated_password(password, clipboard)
+        return self.update_login(user, login, new_service, new_username, password)
+
+    # Prints the previous versions of a login
+    def show_login_history(self, user: User, service_name: str) -> None:
+        logins = self.database.get_logins_from_name(user.id, service_name)
+
+        if not logins:
+            print(f'No logins found for \'{service_name}\'')
+            return
+
+        if len(logins) == 1:
+            login = logins[0]
+        else:
+            login = self._select_login_from_list(logins, 'view history for')
+            if login is None:
+                return
+
+        versions = self.login_history(user, login)
+        self.record_event(AuditEvent.REVEAL, user, login.id)
+        if len(versions) == 1:
+            print(f'\'{service_name}\' has no previous versions.')
+            return
+
+        print(f'\n--- History for {service_name} ---')
+        for i, version in enumerate(versions):
+            label = 'Current' if i == 0 else f'Version {len(versions) - i}'
+            replaced = time.strftime('%Y-%m-%d %H:%M', time.localtime(version.changed_at)) if version.changed_at else 'now'
+            username_display = version.username if version.username else 'N/A'
+            print(f'{label} (until {replaced}): Service: {version.service_name} | Username: {username_display} | Password: {version.password}')
         print()
+
+    # Shows a password just generated: copied to the clipboard when there is one, printed otherwise
+    def show_generated_password(self, password: str, clipboard: Clipboard | None) -> None:
+        if clipboard is None:
+            print(f'Generated password: {password}')
+        elif clipboard.copy(password):
+            print(f'Generated password copied to the clipboard; it will be cleared in {clipboard.clear_after:.0f} seconds.')
+        else:
+            print('Could not copy the generated password to the clipboard; it is saved with the login.')
+
+    # Copies one login's password to the clipboard without printing it. Only the chosen entry is decrypted
+    def copy_login_password(self, user: User, service_name: str, clipboard: Clipboard) -> bool:
+        logins = self.database.get_logins_from_name(user.id, service_name)
+
+        if not logins:
+            print(f'No logins found for \'{service_name}\'')
+            return False
+
+        if len(logins) == 1:
+            login = logins[0]
+        else:
+            login = self._select_login_from_list(logins, 'copy')
+            if login is None:
+                return False
+
+        decrypted_password = self._decrypt_text(user.master_hash, login.password_encrypted)
+        self.record_event(AuditEvent.REVEAL, user, login.id)
+        if not clipboard.copy(decrypted_password):
+            print('Could not copy to the clipboard.')
+            return False
+
+        print('\n--- Login Information ---')
+        print(f'Service: {login.service_name}')
+        print(f'Username: {login.username if login.username else "N/A"}')
+        print(f'Password copied to the clipboard; it will be cleared in {clipboard.clear_after:.0f} seconds.')
+        print()
+        return True
+
+    # Scores every stored password for strength, reuse and breaches
+    def audit_logins(self, user: User, breach_index: BreachedPasswordIndex | None = None) -> SecurityReport:
+        logins = self.database.get_user_logins(user.id)
+        decrypted = [(login, self._decrypt_text(user.master_hash, login.password_encrypted)) for login in logins]
+        return audit_passwords(decrypted, breach_index)
+
+    # Prints the security report for the user's vault
+    def security_report(self, user: User, breach_index: BreachedPasswordIndex | None = None) -> None:
+        report = self.audit_logins(user, breach_index)
+        if not report.entries:
+            print('You have no logins.')
+            return
+
+        print(f'Checked {len(report.entries)} logins: {len(report.weak)} weak, {len(report.reused)} reused, '
+              + (f'{len(report.breached)} found in breaches' if report.breach_checked else 'breach check unavailable'))
+        print()
+        for audit in report.entries:
+            issues: list[str] = []
+            if audit.analysis.score < 2:
+                issues.append('weak')
+            if audit.reuse_count > 1:
+                issues.append(f'reused in {audit.reuse_count} logins')
+            if audit.breached:
+                issues.append('found in a breach')
+            username_display = audit.entry.username if audit.entry.username else 'N/A'
+            print(f'Service: {audit.entry.service_name} | Username: {username_display} | '
+                  f'Strength: {audit.analysis.label} ({audit.analysis.entropy_bits:.0f} bits)'
+                  + (f' | {", ".join(issues)}' if issues else ''))
+
+    # Creates a shared collection with a fresh key, wrapped for its creator
+    def create_collection(self, user: User, name: str) -> int | None:
+        collection_key = self.encryption.generate_key()
+        return self.database.create_collection(name, user.id, self.encryption.wrap_key(user.master_hash, collection_key))
+
+    # Unwraps the user's collection keys for a with block, by collection id, and wipes them all when it ends
+    @contextmanager
+    def collection_keys(self, user: User) -> Iterator[dict[int, SecretBuffer]]:
+        keys: dict[int, SecretBuffer] = {}
+        try:
+            for collection in self.database.get_user_collections(user.id):
+                keys[collection.id] = self.encryption.unwrap_key(user.master_hash, collection.wrapped_key)
+            yield keys
+        finally:
+            for key in keys.values():
+                key.wipe()
+
+    # Shares a collection the user belongs to with another user by wrapping its key for them
+    def add_collection_member(self, user: User, collection_id: int, member_username: str) -> InsertStatus:
+        member = self.database.get_user_from_username(member_username)
+        with self.collection_keys(user) as keys:
+            collection_key = keys.get(collection_id)
+            if collection_key is None or member is None:
+                return InsertStatus.ERROR
+            return self.database.add_collection_member(collection_id, member.id, self.encryption.wrap_key(member.master_hash, collection_key))
+
+    # Removes a member from a collection the user belongs to
+    def remove_collection_member(self, user: User, collection_id: int, member_username: str) -> RemoveStatus:
+        member = self.database.get_user_from_username(member_username)
+        if all(collection.id != collection_id for collection in self.database.get_user_collections(user.id)) or member is None:
+            return RemoveStatus.ERROR
+        return self.database.remove_collection_member(collection_id, member.id)
+
+    # Adds a login to a collection, encrypted once with the collection key
+    def add_collection_login(self, user: User, collection_id: int, service_name: str, username: str | None, password: str) -> InsertStatus:
+        with self.collection_keys(user) as keys:
+            collection_key = keys.get(collection_id)
+            if collection_key is None:
+                return InsertStatus.ERROR
+            encrypted_password = self.encryption.encrypt_password(collection_key, password)
+        return self._record_insert(user, self.database.insert_collection_login(collection_id, service_name, username, encrypted_password),
+                                   AuditEvent.SHARED_ADD)
+
+    # Returns every login the user can see, personal and shared, with its decrypted password.
+    # Each collection key is unwrapped once however many entries the collection holds
+    def visible_logins(self, user: User, service_name: str | None = None) -> list[tuple[VisibleEntry, str]]:
+        entries = (self.database.get_visible_logins(user.id) if service_name is None
+                   else self.database.get_visible_logins_from_name(user.id, service_name))
+        shared = any(entry.collection_id is not None for entry in entries)
+
+        with self.collection_keys(user) if shared else nullcontext({}) as keys:
+            return [
+                (entry, self._decrypt_text(user.master_hash if entry.collection_id is None else keys[entry.collection_id], entry.password_encrypted))
+                for entry in entries
+            ]
+
+    # Prints every login the user can see, labelling the shared ones with their collection. With a
+    # clipboard to copy from, passwords are neither decrypted nor printed
+    def list_visible_logins(self, user: User, clipboard: Clipboard | None = None) -> None:
+        logins = (self.visible_logins(user) if clipboard is None
+                  else [(entry, HIDDEN) for entry in self.database.get_visible_logins(user.id)])
+        if not logins:
+            print('You have no logins.')
+            return
+
+        names = {collection.id: collection.name for collection in self.database.get_user_collections(user.id)}
+        for entry, password in logins:
+            if clipboard is None:
+                self.record_event(AuditEvent.REVEAL if entry.collection_id is None else AuditEvent.SHARED_REVEAL, user, entry.id)
+            username_display = entry.username if entry.username else 'N/A'
+            collection = f' | Collection: {names[entry.collection_id]}' if entry.collection_id is not None else ''
+            print(f'Service: {entry.service_name} | Username: {username_display} | Password: {password}{collection}')
+        self._mention_hidden_passwords(clipboard)
+
+    # Asks which login under the service name to use when there are several. Returns None if there are none or the user cancels
+    def _choose_login(self, user: User, service_name: str, action: str) -> VaultEntry | None:
+        logins = self.database.get_logins_from_name(user.id, service_name)
+        if not logins:
+            print(f'No logins found for \'{service_name}\'')
+            return None
+        if len(logins) == 1:
+            return logins[0]
+        return self._select_login_from_list(logins, action)
+
+    # Sets how often one of the logins saved under the service name should have its password changed,
+    # or removes its policy when days is None
+    def set_rotation_policy(self, user: User, service_name: str, days: int | None) -> InsertStatus:
+        login = self._choose_login(user, service_name, 'set a rotation policy for')
+        if login is None:
+            return InsertStatus.ERROR
+        return self.database.set_rotation_policy(user.id, login.id, days)
+
+    # Prints the logins whose passwords are overdue or due within the given number of days, most
+    # overdue first. Only the due-date index and the matching rows are read; nothing is decrypted
+    def list_due_logins(self, user: User, within_days: int) -> None:
+        now = int(time.time())
+        logins = self.database.get_due_logins(user.id, now + within_days * 86400)
+        if not logins:
+            print(f'No passwords are due for rotation in the next {within_days} days.')
+            return
+
+        for login in logins:
+            days = (login.expires_at - now) // 86400
+            due = f'overdue by {-days} day(s)' if login.expires_at <= now else f'due in {days} day(s)'
+            username_display = login.username if login.username else 'N/A'
+            print(f'Service: {login.service_name} | Username: {username_display} | Changed: {_format_date(login.updated_at)} '
+                  f'| Every {login.rotation_days} days | {due} ({_format_date(login.expires_at)})')
+
+    # Adds tags to one of the logins saved under the service name
+    def tag_login(self, user: User, service_name: str, tags: list[str]) -> InsertStatus:
+        login = self._choose_login(user, service_name, 'tag')
+        if login is None:
+            return InsertStatus.ERROR
+        return self.database.add_login_tags(user.id, login.id, tags)
+
+    # Removes a tag from one of the logins saved under the service name
+    def untag_login(self, user: User, service_name: str, tag: str) -> RemoveStatus:
+        login = self._choose_login(user, service_name, 'untag')
+        if login is None:
+            return RemoveStatus.ERROR
+        return self.database.remove_login_tag(user.id, login.id, tag)
+
+    # Moves one of the logins saved under the service name into a folder, or out of its folder with None
+    def move_login(self, user: User, service_name: str, folder: str | None) -> InsertStatus:
+        login = self._choose_login(user, service_name, 'move')
+        if login is None:
+            return InsertStatus.ERROR
+        return self.database.set_login_folder(user.id, login.id, folder)
+
+    # Prints the logins matching every filter given, with their tags. With a clipboard to copy from,
+    # passwords are neither decrypted nor printed
+    def list_filtered_logins(self, user: User, tag: str | None = None, folder: str | None = None, prefix: str | None = None,
+                             clipboard: Clipboard | None = None) -> None:
+        logins = self.database.filter_logins(user.id, tag, folder, prefix)
+        if not logins:
+            print('No logins match.')
+            return
+
+        entry_ids = [login.id for login in logins]
+        fields = self.database.get_login_fields(user.id, entry_ids)
+        tags_by_login = self.database.get_tags_by_login(user.id, entry_ids)
+        for login in logins:
+            username_display = login.username if login.username else 'N/A'
+            tags = tags_by_login.get(login.id, [])
+            print(f'Service: {login.service_name} | Username: {username_display} | Password: {self._shown_password(user, login, clipboard)}'
+                  + ''.join(f' | {name}: {value}' for name, value in self._shown_fields(user, fields.get(login.id, [])))
+                  + (f' | Tags: {", ".join(tags)}' if tags else ''))
+        self._mention_hidden_passwords(clipboard)
+
+    # Returns a login's password for a listing: decrypted and recorded as revealed, or a placeholder
+    # when there is a clipboard to copy it from instead
+    def _shown_password(self, user: User, login: VaultEntry, clipboard: Clipboard | None) -> str:
+        if clipboard is not None:
+            return HIDDEN
+        self.record_event(AuditEvent.REVEAL, user, login.id)
+        return self._decrypt_text(user.master_hash, login.password_encrypted)
+
+    # Says how to get at the passwords a listing hid
+    def _mention_hidden_passwords(self, clipboard: Clipboard | None) -> None:
+        if clipboard is not None:
+            print('Passwords are hidden while a clipboard is available; \'List logins by name\' copies one.')
+
+    # Returns (name, value) of each custom field for display. Only text fields are decrypted; hidden
+    # fields stay encrypted and show as a placeholder
+    def _shown_fields(self, user: User, fields: list[CustomField]) -> list[tuple[str, str]]:
+        return [
+            (field.name, self._decrypt_text(user.master_hash, field.value_encrypted) if field.kind == FieldKind.TEXT else HIDDEN)
+            for field in fields
+        ]
+
+    # Adds a custom field to one of the logins saved under the service name, or replaces its field of that name
+    def set_login_field(self, user: User, service_name: str, name: str, value: str, kind: FieldKind = FieldKind.TEXT) -> InsertStatus:
+        login = self._choose_login(user, service_name, 'add the field to')
+        if login is None:
+            return InsertStatus.ERROR
+        status = self.database.set_login_field(user.id, login.id, name, kind, self.encryption.encrypt_password(user.master_hash, value))
+        if status == InsertStatus.SUCCESS:
+            self.record_event(AuditEvent.UPDATE, user, login.id)
+        return status
+
+    # Removes a custom field from one of the logins saved under the service name
+    def remove_login_field(self, user: User, service_name: str, name: str) -> RemoveStatus:
+        login = self._choose_login(user, service_name, 'remove the field from')
+        if login is None:
+            return RemoveStatus.ERROR
+        status = self.database.remove_login_field(user.id, login.id, name)
+        if status == RemoveStatus.SUCCESS:
+            self.record_event(AuditEvent.UPDATE, user, login.id)
+        return status
+
+    # Shows one custom field of one of the logins saved under the service name, copying it to the
+    # clipboard instead of printing it when there is one. Only that field is decrypted
+    def show_login_field(self, user: User, service_name: str, name: str, clipboard: Clipboard | None = None) -> bool:
+        login = self._choose_login(user, service_name, 'view')
+        if login is None:
+            return False
+        field = self.database.get_login_field(user.id, login.id, name)
+        if field is None:
+            print(f'\'{service_name}\' has no field named \'{name}\'.')
+            return False
+
+        value = self._decrypt_text(user.master_hash, field.value_encrypted)
+        self.record_event(AuditEvent.REVEAL, user, login.id)
+        if clipboard is None:
+            print(f'{field.name}: {value}')
+            return True
+        if not clipboard.copy(value):
+            print('Could not copy to the clipboard.')
+            return False
+        print(f'{field.name} copied to the clipboard; it will be cleared in {clipboard.clear_after:.0f} seconds.')
+        return True
+
+    # Attaches a file to one of the logins saved under the service name. The file is read and
+    # encrypted a chunk at a time, so attaching a large file needs no more memory than a small one
+    def add_attachment(self, user: User, service_name: str, path: str) -> InsertStatus:
+        login = self._choose_login(user, service_name, 'attach the file to')
+        if login is None:
+            return InsertStatus.ERROR
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                return self._store_attachment(user, login.id, AttachmentKind.FILE, os.path.basename(path), size,
+                                              lambda key, nonce_prefix: encrypt_chunks(key, nonce_prefix, f, size))
+        except OSError as e:
+            print(f'Could not read \'{path}\': {e.strerror}')
+            return InsertStatus.ERROR
+
+    # Adds a secure note to one of the logins saved under the service name
+    def add_note(self, user: User, service_name: str, title: str, text: str) -> InsertStatus:
+        login = self._choose_login(user, service_name, 'add the note to')
+        if login is None:
+            return InsertStatus.ERROR
+        with SecretBuffer.from_str(text) as note:
+            return self._store_attachment(user, login.id, AttachmentKind.NOTE, title, len(note),
+                                          lambda key, nonce_prefix: encrypt_buffer(key, nonce_prefix, note))
+
+    # Stores an attachment under a new key of its own, wrapped with the vault key, so re-keying the
+    # vault only has to re-wrap the key. encrypt yields the encrypted chunks given the key and nonce prefix
+    def _store_attachment(self, user: User, entry_id: int, kind: AttachmentKind, name: str, size: int,
+                          encrypt: Callable[[bytes, bytes], Iterator[bytes]]) -> InsertStatus:
+        nonce_prefix = new_nonce_prefix()
+        with SecretBuffer(self.encryption.generate_key()) as key:
+            wrapped_key = self.encryption.wrap_key(user.master_hash, key)
+            attachment_id = self.database.insert_attachment(user.id, entry_id, kind, name, size, CHUNK_SIZE, wrapped_key,
+                                                            nonce_prefix, encrypt(key, nonce_prefix))
+        if attachment_id is None:
+            return InsertStatus.ERROR
+        self.record_event(AuditEvent.UPDATE, user, entry_id)
+        return InsertStatus.SUCCESS
+
+    # Lists the files and notes attached to one of the logins saved under the service name and asks
+    # which to use, optionally only those of one kind. Returns None if there are none or the user cancels
+    def choose_attachment(self, user: User, service_name: str, action: str, kind: AttachmentKind | None = None) -> Attachment | None:
+        login = self._choose_login(user, service_name, action)
+        if login is None:
+            return None
+        attachments = [attachment for attachment in self.database.get_attachments(user.id, login.id) if kind in (None, attachment.kind)]
+        if not attachments:
+            print(f'\'{service_name}\' has no {"notes" if kind == AttachmentKind.NOTE else "attachments"}.')
+            return None
+
+        for i, attachment in enumerate(attachments, 1):
+            label = 'Note' if attachment.kind == AttachmentKind.NOTE else 'File'
+            print(f'{i}. {label}: {attachment.name} | {_format_size(attachment.size)} | Added: {_format_date(attachment.created_at)}')
+        while True:
+            choice = input(f'\nSelect which to {action} (1-{len(attachments)}) or \'cancel\': ').strip()
+            if choice == 'cancel':
+                print('Cancelled.')
+                return None
+            if choice.isdigit() and 1 <= int(choice) <= len(attachments):
+                return attachments[int(choice) - 1]
+            print(f'Invalid choice. Please enter a number between 1 and {len(attachments)}.')
+
+    # Decrypts an attachment to a file, a chunk at a time. It is written to a temporary file that
+    # only replaces path once every chunk has authenticated, so a damaged attachment never leaves
+    # partial plaintext behind. The file is readable only by its owner
+    def export_attachment(self, user: User, attachment: Attachment, path: str) -> InsertStatus:
+        directory = os.path.dirname(os.path.abspath(path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        except OSError as e:
+            print(f'Could not write to \'{directory}\': {e.strerror}')
+            return InsertStatus.ERROR
+        try:
+            os.fchmod(fd, 0o600)
+            with os.fdopen(fd, 'wb') as f, self._attachment_key(user, attachment) as key:
+                for chunk in decrypt_chunks(key, attachment.nonce_prefix, self.database.iter_attachment_chunks(attachment.id),
+                                            attachment.chunk_size):
+                    _ = f.write(chunk)
+            os.replace(tmp_path, path)
+        except (OSError, CorruptAttachment, sqlite3.Error) as e:
+            os.remove(tmp_path)
+            print(f'Could not save \'{attachment.name}\': {e}')
+            return InsertStatus.ERROR
+        self.record_event(AuditEvent.REVEAL, user, attachment.entry_id)
+        return InsertStatus.SUCCESS
+
+    # Returns the decrypted text of a note. Wipe it once done, e.g. by using it in a with block.
+    # Raises CorruptAttachment if the note doesn't authenticate
+    def read_note(self, user: User, attachment: Attachment) -> SecretBuffer:
+        # Filled in place, as growing the buffer would leave unwiped copies behind
+        note = SecretBuffer(attachment.size)
+        try:
+            filled = 0
+            with self._attachment_key(user, attachment) as key:
+                for chunk in decrypt_chunks(key, attachment.nonce_prefix, self.database.iter_attachment_chunks(attachment.id),
+                                            attachment.chunk_size):
+                    if filled + len(chunk) > len(note):
+                        raise CorruptAttachment(f'The note is longer than its recorded {attachment.size} bytes')
+                    note[filled:filled + len(chunk)] = chunk
+                    filled += len(chunk)
+            if filled != len(note):
+                raise CorruptAttachment(f'The note is shorter than its recorded {attachment.size} bytes')
+        except BaseException:
+            # Whatever was decrypted before the failure must not outlive it
+            note.wipe()
+            raise
+        self.record_event(AuditEvent.REVEAL, user, attachment.entry_id)
+        return note
+
+    # Unwraps an attachment's key. Raises CorruptAttachment if the vault key doesn't open it
+    def _attachment_key(self, user: User, attachment: Attachment) -> SecretBuffer:
+        try:
+            return self.encryption.unwrap_key(user.master_hash, attachment.wrapped_key)
+        except fernet.InvalidToken:
+            raise CorruptAttachment(f'The key of \'{attachment.name}\' doesn\'t open with this vault key') from None
+
+    # Deletes an attachment or note
+    def remove_attachment(self, user: User, attachment: Attachment) -> RemoveStatus:
+        status = self.database.delete_attachment(user.id, attachment.id)
+        if status == RemoveStatus.SUCCESS:
+            self.record_event(AuditEvent.UPDATE, user, attachment.entry_id)
+        return status
+
+
+# Formats a size in bytes for display
+def _format_size(size: int) -> str:
+    for unit in ('bytes', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            return f'{size} {unit}' if unit == 'bytes' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size} bytes'
+
+
+# Formats a timestamp as a local date, for dates that logins from older versions don't have
+def _format_date(timestamp: int | None) -> str:
+    return time.strftime('%Y-%m-%d', time.localtime(timestamp)) if timestamp is not None else 'unknown'
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from db.database import DatabaseManager
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Pages copied per step of the online backup. The source is only locked while a step runs,
+# so the app can keep writing between steps
+PAGES_PER_STEP: int = 1024
+
+# Seconds the backup yields to other connections between steps
+STEP_SLEEP: float = 0.005
+
+# Database pages per chunk file. SQLite rewrites pages in place, so chunks aligned to page
+# boundaries stay byte-identical between snapshots unless a page inside them changed
+CHUNK_PAGES: int = 16
+
+MANIFEST_VERSION: int = 1
+
+
+@dataclass
+class SnapshotResult:
+    name: str
+    size: int
+    chunk_count: int
+    new_chunks: int
+    new_bytes: int
+    seconds: float
+
+
+@dataclass
+class DedupReport:
+    snapshots: int
+    logical_bytes: int
+    stored_bytes: int
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.logical_bytes - self.stored_bytes
+
+
+# Returns the path of a chunk file, fanned out by the first byte of its hash
+def _chunk_path(backup_dir: str, digest: str) -> str:
+    return os.path.join(backup_dir, 'chunks', digest[:2], digest)
+
+
+# Returns the path of a snapshot manifest
+def _manifest_path(backup_dir: str, name: str) -> str:
+    return os.path.join(backup_dir, 'snapshots', f'{name}.json')
+
+
+# Writes data to path atomically so an interrupted backup never leaves a truncated file
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            _ = f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+# Returns the names of every snapshot, oldest first
+def list_snapshots(backup_dir: str) -> list[str]:
+    snapshot_dir = os.path.join(backup_dir, 'snapshots')
+    if not os.path.isdir(snapshot_dir):
+        return []
+    return sorted(name.removesuffix('.json') for name in os.listdir(snapshot_dir) if name.endswith('.json'))
+
+
+# Reads a snapshot manifest
+def load_manifest(backup_dir: str, name: str) -> dict:
+    with open(_manifest_path(backup_dir, name), 'r') as f:
+        return json.load(f)
+
+
+# Takes a consistent snapshot of the open database with the online backup API, then splits
+# it into content-addressed chunks so pages unchanged since earlier snapshots aren't stored again
+def create_snapshot(db: DatabaseManager, backup_dir: str, pages_per_step: int = PAGES_PER_STEP) -> SnapshotResult:
+    start = time.perf_counter()
+    os.makedirs(backup_dir, exist_ok=True)
+    name = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+
+    fd, copy_path = tempfile.mkstemp(dir=backup_dir, suffix='.db.tmp')
+    os.close(fd)
+    try:
+        target = sqlite3.connect(copy_path)
+        try:
+            db.conn.backup(target, pages=pages_per_step, sleep=STEP_SLEEP)
+            page_size: int = target.execute('PRAGMA page_size').fetchone()[0]
+        finally:
+            target.close()
+
+        chunk_size = page_size * CHUNK_PAGES
+        whole = hashlib.sha256()
+        chunks: list[str] = []
+        new_chunks = new_bytes = size = 0
+        with open(copy_path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                whole.update(chunk)
+                size += len(chunk)
+                digest = hashlib.sha256(chunk).hexdigest()
+                chunks.append(digest)
+                path = _chunk_path(backup_dir, digest)
+                if not os.path.exists(path):
+                    _write_atomic(path, chunk)
+                    new_chunks += 1
+                    new_bytes += len(chunk)
+    finally:
+        os.remove(copy_path)
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'source': db.db_path,
+        'created_at': int(time.time()),
+        'page_size': page_size,
+        'chunk_size': chunk_size,
+        'size': size,
+        'sha256': whole.hexdigest(),
+        'chunks': chunks,
+    }
+    # The manifest goes last, so a snapshot only exists once all of its chunks do
+    _write_atomic(_manifest_path(backup_dir, name), json.dumps(manifest).encode())
+
+    result = SnapshotResult(name, size, len(chunks), new_chunks, new_bytes, time.perf_counter() - start)
+    logger.info(f'Created snapshot {name} of {db.db_path}: {size} bytes, {new_bytes} new')
+    return result
+
+
+# Checks that every chunk of a snapshot is present and intact and that together they
+# reproduce the original database. Returns a description of each problem found
+def verify_snapshot(backup_dir: str, name: str) -> list[str]:
+    manifest = load_manifest(backup_dir, name)
+    problems: list[str] = []
+    whole = hashlib.sha256()
+    size = 0
+
+    for index, digest in enumerate(manifest['chunks']):
+        try:
+            with open(_chunk_path(backup_dir, digest), 'rb') as f:
+                chunk = f.read()
+        except FileNotFoundError:
+            problems.append(f'chunk {index} ({digest}) is missing')
+            continue
+        if hashlib.sha256(chunk).hexdigest() != digest:
+            problems.append(f'chunk {index} ({digest}) is corrupt')
+        whole.update(chunk)
+        size += len(chunk)
+
+    if not problems and (size != manifest['size'] or whole.hexdigest() != manifest['sha256']):
+        problems.append('reassembled database does not match the snapshot checksum')
+    return problems
+
+
+# Reassembles a snapshot into destination, replacing it only once the whole file has been
+# written and its checksum matches. The database must not be open while it is restored
+def restore_snapshot(backup_dir: str, name: str, destination: str) -> None:
+    manifest = load_manifest(backup_dir, name)
+    directory = os.path.dirname(os.path.abspath(destination))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.restore')
+    try:
+        whole = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as out:
+            for digest in manifest['chunks']:
+                with open(_chunk_path(backup_dir, digest), 'rb') as f:
+                    chunk = f.read()
+                whole.update(chunk)
+                _ = out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        if whole.hexdigest() != manifest['sha256']:
+            raise ValueError(f'Snapshot {name} failed its checksum; run verify for details')
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(f'Restored snapshot {name} to {destination}')
+
+
+# Compares the total size of every snapshot against the chunk store actually on disk
+def dedup_report(backup_dir: str) -> DedupReport:
+    names = list_snapshots(backup_dir)
+    logical = sum(load_manifest(backup_dir, name)['size'] for name in names)
+
+    stored = 0
+    chunk_dir = os.path.join(backup_dir, 'chunks')
+    for root, _, files in os.walk(chunk_dir):
+        stored += sum(os.path.getsize(os.path.join(root, file)) for file in files)
+    return DedupReport(len(names), logical, stored)
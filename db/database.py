@@ -1,49 +1,153 @@
+import itertools
 import logging
 import os
 import sqlite3
+import time
+from collections.abc import Iterable, Iterator
+from typing import Any
 
-from core.data_models import User, VaultEntry
-from util.enums import InsertStatus, RemoveStatus
+from core.data_models import (Attachment, Collection, CustomField, DueLogin, HistoryEntry, LoginDates, SyncRow, TotpEntry, TrashEntry, User, VaultEntry,
+                               VisibleEntry)
+from db.migrations import MIGRATIONS, SCHEMA_VERSION
+from db.statements import CACHED_STATEMENTS, STATEMENTS, StatementStats, filter_statement_name
+from db.user_cache import user_cache
+from util.enums import AttachmentKind, FieldKind, HistoryField, InsertStatus, RemoveStatus
+from util.metrics import metrics
+from util.paths import data_dir
 
 logger: logging.Logger = logging.getLogger(__name__)
 
+# Where the vault lives unless another path is given
+DB_PATH: str = os.path.join(data_dir(), 'vault.db')
+
+# Distinguishes in-memory databases in the process-wide user cache
+_memory_ids: Iterator[int] = itertools.count()
+
+# Returns entry ids as the JSON array json_each reads, written by hand as the json module isn't
+# otherwise loaded at startup
+def _json_ids(entry_ids: list[int]) -> str:
+    return '[' + ','.join(map(str, entry_ids)) + ']'
+
 class DatabaseManager:
-    def __init__(self, db_path: str = 'data/vault.db') -> None:
+    def __init__(self, db_path: str = DB_PATH, timeout: float = 5.0) -> None:
         exists = os.path.exists(db_path) if db_path != ':memory:' else False
+        if db_path != ':memory:' and not exists:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
 
-        self.conn: sqlite3.Connection = sqlite3.connect(db_path)
+        self.db_path: str = db_path
+        # timeout is how long a write waits on another connection's lock before 'database is locked'
+        self.conn: sqlite3.Connection = sqlite3.connect(db_path, timeout=timeout, cached_statements=CACHED_STATEMENTS)
         _ = self.conn.execute('PRAGMA foreign_keys = ON')
         self.cur: sqlite3.Cursor = self.conn.cursor()
+        self.stats: StatementStats = StatementStats()
+        # Key for this database in the user cache; each in-memory database is its own namespace
+        self.cache_key: str = f':memory:{next(_memory_ids)}' if db_path == ':memory:' else os.path.abspath(db_path)
+        # Row id of the last login inserted through this manager
+        self.last_insert_id: int | None = None
 
         if not exists:
             self.create_database()
+        else:
+            self.migrate()
 
     # Closes the database connection
     def close(self) -> None:
         self.conn.close()
 
+    # Feeds a statement timing to the connection stats and the process metrics
+    def _record(self, name: str, elapsed_ns: int) -> None:
+        self.stats.record(name, elapsed_ns)
+        metrics.observe_ns('db_query', elapsed_ns, (('statement', name),))
+
+    # Runs a registered statement on its own cursor and records its timing
+    def _execute(self, name: str, params: tuple[Any, ...] = ()) -> sqlite3.Cursor:
+        start = time.perf_counter_ns()
+        try:
+            return self.conn.execute(STATEMENTS[name], params)
+        finally:
+            self._record(name, time.perf_counter_ns() - start)
+
+    # Runs a registered query and returns the first row
+    def _fetchone(self, name: str, params: tuple[Any, ...] = ()) -> Any:
+        start = time.perf_counter_ns()
+        try:
+            return self.conn.execute(STATEMENTS[name], params).fetchone()
+        finally:
+            self._record(name, time.perf_counter_ns() - start)
+
+    # Runs a registered query and returns every row
+    def _fetchall(self, name: str, params: tuple[Any, ...] = ()) -> list[Any]:
+        start = time.perf_counter_ns()
+        try:
+            return self.conn.execute(STATEMENTS[name], params).fetchall()
+        finally:
+            self._record(name, time.perf_counter_ns() - start)
+
+    # Runs a registered statement once per parameter row
+    def _executemany(self, name: str, rows: Iterable[tuple[Any, ...]]) -> sqlite3.Cursor:
+        start = time.perf_counter_ns()
+        try:
+            return self.conn.executemany(STATEMENTS[name], rows)
+        finally:
+            self._record(name, time.perf_counter_ns() - start)
+
     # Creates the database
     def create_database(self):
-        with open('db/schema.sql', 'r') as f:
-            schema = f.read()
-        _ = self.cur.executescript(schema)
+        # Read from the package rather than the working directory, so an installed copy finds it too.
+        # importlib.resources is imported here as only new databases need it
+        from importlib import resources
+
+        schema = resources.files('db').joinpath('schema.sql').read_text()
+        _ = self.conn.executescript(schema)
+        _ = self.conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         self.conn.commit()
 
+    # Upgrades a database created by an older version to the current schema
+    def migrate(self) -> None:
+        version: int = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        for target, script in MIGRATIONS:
+            if target <= version:
+                continue
+            # Each step commits together with its version bump so a failure can be retried
+            _ = self.conn.executescript(f'BEGIN; {script} PRAGMA user_version = {target}; COMMIT;')
+            logger.info(f'Migrated database {self.db_path} to schema version {target}')
+
     # Clears database for test files
     def clear_database(self):
-        _ = self.cur.execute('DELETE FROM vault_entries;')
-        _ = self.cur.execute('DELETE FROM users;')
+        _ = self._execute('clear_collections')
+        _ = self._execute('clear_history')
+        _ = self._execute('clear_vault_entries')
+        _ = self._execute('clear_users')
         self.conn.commit()
+        user_cache.clear()
 
         # Reset autoincrement counters
-        _ = self.cur.execute('DELETE FROM sqlite_sequence;')
+        _ = self._execute('clear_sequence')
         self.conn.commit()
 
+    # Permanently removes users along with their logins and history, without committing
+    def _purge_users(self, user_ids: list[int]) -> None:
+        rows = [(user_id,) for user_id in user_ids]
+        _ = self._executemany('purge_user_history', rows)
+        _ = self._executemany('purge_user_logins', rows)
+        _ = self._executemany('purge_user_memberships', rows)
+        _ = self._executemany('purge_user_tags', rows)
+        _ = self._executemany('purge_user_folders', rows)
+        _ = self._executemany('purge_user', rows)
+        # Collections whose last member is gone can never be decrypted again
+        _ = self._execute('purge_orphan_collections')
+
+    # Frees a username held by a deleted account so it can be taken again, without committing
+    def _release_username(self, username: str) -> None:
+        rows: list[tuple[int]] = self._fetchall('select_deleted_user_by_username', (username,))
+        if rows:
+            self._purge_users([row[0] for row in rows])
+
     # Adds user
-    def insert_user(self, username: str, master_hash: bytes, salt: bytes) -> InsertStatus:
+    def insert_user(self, username: str, master_hash: bytes, salt: bytes, kdf: str | None = None) -> InsertStatus:
         try:
-            _ = self.cur.execute('INSERT INTO users (username, master_hash, salt) \
-                                VALUES (?, ?, ?)', (username, master_hash, salt))
+            self._release_username(username)
+            _ = self._execute('insert_user', (username, master_hash, salt, kdf))
             self.conn.commit()
             logger.info(f'Inserted user \'{username}\' successfully')
 
@@ -55,11 +159,12 @@ class DatabaseManager:
             return InsertStatus.ERROR
 
     # Adds login
-    def insert_login(self, user_id: int, service_name: str, username: str | None, password: bytes) -> InsertStatus:
+    def insert_login(self, user_id: int, service_name: str, username: str | None, password: bytes, fingerprint: bytes | None = None,
+                     totp_secret: bytes | None = None) -> InsertStatus:
         try:
-            _ = self.cur.execute('INSERT INTO vault_entries (user_id, service_name, username, password_encrypted) \
-                                VALUES (?, ?, ?, ?)', (user_id, service_name, username, password))
+            cursor = self._execute('insert_login', (user_id, service_name, username, password, fingerprint, totp_secret, int(time.time())))
             self.conn.commit()
+            self.last_insert_id = cursor.lastrowid
             logger.info(f'Inserted login \'{service_name}\' successfully')
 
             return InsertStatus.SUCCESS
@@ -69,26 +174,35 @@ class DatabaseManager:
 
             return InsertStatus.ERROR
 
-    # Returns user given username
+    # Returns user given username, served from the process-wide cache when possible
     def get_user_from_username(self, username: str):
+        cached = user_cache.get(self.cache_key, username)
+        if cached is not None:
+            metrics.inc('user_cache_hits')
+            return cached
+
         try:
-            _ = self.cur.execute('SELECT * FROM users WHERE username = (?)', (username,))
+            row: tuple[int, str, bytes, bytes, str | None] | None = self._fetchone('select_user_by_username', (username,))
             logger.info(f'Retrieved the user \'{username}\' successfully')
-            row: tuple[int, str, bytes, bytes] | None = self.cur.fetchone()
             if row:
-                return User(*row)
+                user = User(*row)
+                user_cache.put(self.cache_key, user)
+                return user
             return None
 
         except sqlite3.InterfaceError as e:
             logger.error(f'Error retrieving the user \'{username}\': {e}')
             return None
 
+    # Drops the user's record from the process-wide cache, so the next lookup reads it again
+    def forget_cached_user(self, user_id: int) -> None:
+        user_cache.invalidate(self.cache_key, user_id)
+
     # Returns user given user id
     def get_user_from_user_id(self, user_id: int):
         try:
-            _ = self.cur.execute('SELECT * FROM users WHERE user_id = (?)', (user_id,))
+            row: tuple[int, str, bytes, bytes, str | None] | None = self._fetchone('select_user_by_id', (user_id,))
             logger.info(f'Retrieved the user \'{user_id}\' successfully')
-            row: tuple[int, str, bytes, bytes] | None = self.cur.fetchone()
             if row:
                 return User(*row)
             return None
@@ -101,9 +215,8 @@ class DatabaseManager:
     # Returns a list of all entries from a given name and with the given user
     def get_logins_from_name(self, user_id: int, service_name: str) -> list[VaultEntry]:
         try:
-            _ = self.cur.execute('SELECT * FROM vault_entries WHERE user_id = ? AND service_name = ?', (user_id, service_name))
+            rows: list[tuple[int, int, str, str, bytes]] = self._fetchall('select_logins_by_name', (user_id, service_name))
             logger.info(f'Retrieved all entries where name is \'{service_name}\'')
-            rows: list[tuple[int, int, str, str, bytes]] = self.cur.fetchall()
             return [VaultEntry(*row) for row in rows]
 
         except sqlite3.Error as e:
@@ -113,9 +226,8 @@ class DatabaseManager:
     # Returns a list of all entries assigned to the user
     def get_user_logins(self, user_id: int) -> list[VaultEntry]:
         try:
-            _ = self.cur.execute('SELECT * FROM vault_entries WHERE user_id = ?', (user_id,))
+            rows: list[tuple[int, int, str, str, bytes]] = self._fetchall('select_logins_by_user', (user_id,))
             logger.info(f'Retrieved all entries from user is \'{user_id}\'')
-            rows: list[tuple[int, int, str, str, bytes]] = self.cur.fetchall()
             return [VaultEntry(*row) for row in rows]
         except sqlite3.Error as e:
             logger.error(f'Error retrieving entries from user \'{user_id}\': {e}')
@@ -124,9 +236,10 @@ class DatabaseManager:
     # Updates username for a user
     def update_username(self, user_id: int, new_username: str) -> InsertStatus:
         try:
-            _ = self.cur.execute('UPDATE users SET username = ? \
-                                WHERE id = ?', (new_username, user_id))
+            self._release_username(new_username)
+            _ = self._execute('update_username', (new_username, user_id))
             self.conn.commit()
+            user_cache.invalidate(self.cache_key, user_id)
             logger.info(f'Updated username to \'{new_username}\' for user_id {user_id}')
             return InsertStatus.SUCCESS
         except sqlite3.IntegrityError as e:
@@ -134,22 +247,47 @@ class DatabaseManager:
             self.conn.rollback()
             return InsertStatus.ERROR
 
-    # Deletes user by user id
+    # Moves user to the trash; the account and its vault entries are purged once the trash expires
     def delete_user(self, user_id: int) -> RemoveStatus:
-       try:
-           _ = self.cur.execute('DELETE FROM users WHERE id = ?', (user_id,))
-           self.conn.commit()
-           logger.info(f'Deleted user with id {user_id} and all associated vault entries')
-           return RemoveStatus.SUCCESS
-       except sqlite3.Error as e:
-           logger.error(f'Error deleting user {user_id}: {e}')
-           self.conn.rollback()
-           return RemoveStatus.ERROR
-
-    # Deletes a vault entry by id
+        try:
+            now = int(time.time())
+            _ = self._execute('delete_user', (now, user_id))
+            _ = self._execute('delete_user_logins', (now, user_id))
+            self.conn.commit()
+            user_cache.invalidate(self.cache_key, user_id)
+            logger.info(f'Deleted user with id {user_id} and all associated vault entries')
+            return RemoveStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error deleting user {user_id}: {e}')
+            self.conn.rollback()
+            return RemoveStatus.ERROR
+
+    # Returns a deleted account still in the trash by username, and when it was deleted, or None
+    def get_deleted_user(self, username: str) -> tuple[User, int] | None:
+        row: tuple[int, str, bytes, bytes, str | None, int] | None = self._fetchone('select_deleted_user', (username,))
+        return (User(*row[:5]), row[5]) if row else None
+
+    # Takes an account out of the trash along with the logins that were deleted with it
+    def restore_user(self, user_id: int, deleted_at: int) -> InsertStatus:
+        try:
+            cursor = self._execute('restore_user', (user_id,))
+            if cursor.rowcount == 0:
+                self.conn.rollback()
+                logger.error(f'No deleted user {user_id}')
+                return InsertStatus.ERROR
+            _ = self._execute('restore_user_logins', (user_id, deleted_at))
+            self.conn.commit()
+            logger.info(f'Restored user {user_id}')
+            return InsertStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error restoring user {user_id}: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Moves a vault entry to the trash by id
     def delete_login(self, entry_id: int) -> RemoveStatus:
         try:
-            _ = self.cur.execute('DELETE FROM vault_entries WHERE id = ?', (entry_id,))
+            _ = self._execute('delete_login', (int(time.time()), entry_id))
             self.conn.commit()
             logger.info(f'Deleted vault entry with id {entry_id}')
             return RemoveStatus.SUCCESS
@@ -157,3 +295,646 @@ class DatabaseManager:
             logger.error(f'Error deleting vault entry {entry_id}: {e}')
             self.conn.rollback()
             return RemoveStatus.ERROR
+
+    # Returns how many of the user's logins share the password fingerprint
+    def count_password_fingerprint(self, user_id: int, fingerprint: bytes) -> int:
+        try:
+            row: tuple[int] = self._fetchone('count_fingerprint', (user_id, fingerprint))
+            return row[0]
+        except sqlite3.Error as e:
+            logger.error(f'Error counting password fingerprint for user {user_id}: {e}')
+            return 0
+
+    # Returns the service names of each group of logins sharing a password, largest group first
+    def get_password_reuse_groups(self, user_id: int) -> list[list[str]]:
+        try:
+            rows: list[tuple[int, str]] = self._fetchall('select_reuse_groups', (user_id,))
+            logger.info(f'Retrieved password reuse groups for user {user_id}')
+            return [services.split('\x1f') for _, services in rows]
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving password reuse groups for user {user_id}: {e}')
+            return []
+
+    # Returns the user's logins stored before fingerprints existed
+    def get_logins_without_fingerprint(self, user_id: int) -> list[VaultEntry]:
+        try:
+            rows: list[tuple[int, int, str, str, bytes]] = self._fetchall('select_logins_without_fingerprint', (user_id,))
+            return [VaultEntry(*row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving logins without fingerprint for user {user_id}: {e}')
+            return []
+
+    # Stores fingerprints for existing logins given (entry_id, fingerprint) pairs
+    def set_password_fingerprints(self, fingerprints: list[tuple[int, bytes]]) -> InsertStatus:
+        try:
+            _ = self._executemany('update_fingerprint', [(fingerprint, entry_id) for entry_id, fingerprint in fingerprints])
+            self.conn.commit()
+            logger.info(f'Stored {len(fingerprints)} password fingerprints')
+            return InsertStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error storing password fingerprints: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Stores (or with None, removes) the encrypted TOTP secret of one of the user's logins
+    def set_totp_secret(self, user_id: int, entry_id: int, secret_encrypted: bytes | None) -> InsertStatus:
+        try:
+            cursor = self._execute('update_totp_secret', (secret_encrypted, entry_id, user_id))
+            self.conn.commit()
+            if cursor.rowcount == 0:
+                logger.error(f'No vault entry {entry_id} for user {user_id} to store a TOTP secret on')
+                return InsertStatus.ERROR
+            logger.info(f'Updated TOTP secret for vault entry {entry_id}')
+            return InsertStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error updating TOTP secret for vault entry {entry_id}: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Returns every login of the user that has a TOTP secret
+    def get_totp_entries(self, user_id: int) -> list[TotpEntry]:
+        try:
+            rows: list[tuple[int, str, str | None, bytes]] = self._fetchall('select_totp_entries', (user_id,))
+            logger.info(f'Retrieved TOTP entries for user {user_id}')
+            return [TotpEntry(*row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving TOTP entries for user {user_id}: {e}')
+            return []
+
+    # Replaces a login's fields, appending the fields that changed to its history in the same transaction
+    # A password of None keeps the current password and fingerprint
+    def update_login(self, user_id: int, entry_id: int, service_name: str, username: str | None,
+                     password: bytes | None = None, fingerprint: bytes | None = None) -> InsertStatus:
+        try:
+            row: tuple[int, int, str, str | None, bytes] | None = self._fetchone('select_login_by_id', (entry_id, user_id))
+            if row is None:
+                logger.error(f'No vault entry {entry_id} for user {user_id} to update')
+                return InsertStatus.ERROR
+            current = VaultEntry(*row)
+
+            changed = HistoryField(0)
+            if current.service_name != service_name:
+                changed |= HistoryField.SERVICE_NAME
+            if current.username != username:
+                changed |= HistoryField.USERNAME
+            # Fernet output is randomised, so any new ciphertext counts as a change
+            if password is not None:
+                changed |= HistoryField.PASSWORD
+            if not changed:
+                return InsertStatus.SUCCESS
+
+            _ = self._execute('insert_history', (
+                entry_id,
+                user_id,
+                changed,
+                current.service_name if HistoryField.SERVICE_NAME in changed else None,
+                current.username if HistoryField.USERNAME in changed else None,
+                current.password_encrypted if HistoryField.PASSWORD in changed else None,
+                int(time.time()),
+            ))
+            if password is None:
+                _ = self._execute('update_login_details', (service_name, username, entry_id, user_id))
+            else:
+                _ = self._execute('update_login', (service_name, username, password, fingerprint, int(time.time()), entry_id, user_id))
+            self.conn.commit()
+            logger.info(f'Updated vault entry {entry_id}')
+            return InsertStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error updating vault entry {entry_id}: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Sets how many days a login's password may be kept before it is due for rotation, or removes
+    # the policy (and the due date) when days is None
+    def set_rotation_policy(self, user_id: int, entry_id: int, days: int | None) -> InsertStatus:
+        try:
+            cursor = self._execute('update_rotation_policy', (days, int(time.time()), entry_id, user_id))
+            self.conn.commit()
+            if cursor.rowcount == 0:
+                logger.error(f'No vault entry {entry_id} for user {user_id} to set a rotation policy on')
+                return InsertStatus.ERROR
+            logger.info(f'Set the rotation policy of vault entry {entry_id} to {days} days')
+            return InsertStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error setting the rotation policy of vault entry {entry_id}: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Returns when a login was created and last changed, and its rotation policy and due date
+    def get_login_dates(self, user_id: int, entry_id: int) -> LoginDates | None:
+        try:
+            row: tuple[int | None, int | None, int | None, int | None] | None = self._fetchone('select_login_dates', (entry_id, user_id))
+            return LoginDates(*row) if row is not None else None
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving the dates of vault entry {entry_id}: {e}')
+            return None
+
+    # Counts the user's logins due for rotation by the cutoff, and how many of those are already due
+    # at now, in one pass over the due-date index. Returns (due by cutoff, overdue)
+    def count_due_logins(self, user_id: int, cutoff: int, now: int) -> tuple[int, int]:
+        try:
+            row: tuple[int, int] = self._fetchone('count_due_logins', (now, user_id, cutoff))
+            return row[0], row[1]
+        except sqlite3.Error as e:
+            logger.error(f'Error counting logins due for rotation for user {user_id}: {e}')
+            return 0, 0
+
+    # Returns the user's logins due for rotation by the cutoff, soonest (or most overdue) first
+    def get_due_logins(self, user_id: int, cutoff: int) -> list[DueLogin]:
+        try:
+            rows: list[tuple[int, str, str | None, int | None, int, int]] = self._fetchall('select_due_logins', (user_id, cutoff))
+            return [DueLogin(*row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving logins due for rotation for user {user_id}: {e}')
+            return []
+
+    # Returns (id, service name, username) of each of the user's logins, without the encrypted columns
+    def get_login_metadata(self, user_id: int) -> list[tuple[int, str, str | None]]:
+        try:
+            return self._fetchall('select_login_metadata', (user_id,))
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving login metadata for user {user_id}: {e}')
+            return []
+
+    # Returns one of the user's logins by id
+    def get_login(self, user_id: int, entry_id: int) -> VaultEntry | None:
+        try:
+            row = self._fetchone('select_login_by_id', (entry_id, user_id))
+            return VaultEntry(*row) if row is not None else None
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving vault entry {entry_id}: {e}')
+            return None
+
+    # Tags one of the user's logins, creating any of the tags the user doesn't have yet
+    def add_login_tags(self, user_id: int, entry_id: int, tags: list[str]) -> InsertStatus:
+        try:
+            if self._fetchone('select_login_by_id', (entry_id, user_id)) is None:
+                logger.error(f'Vault entry {entry_id} of user {user_id} not found')
+                return InsertStatus.ERROR
+            _ = self._executemany('insert_tag', [(user_id, tag) for tag in tags])
+            _ = self._executemany('insert_entry_tag', [(entry_id, user_id, tag) for tag in tags])
+            self.conn.commit()
+            logger.info(f'Tagged vault entry {entry_id} with {len(tags)} tags')
+            return InsertStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error tagging vault entry {entry_id}: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Removes a tag from one of the user's logins, dropping the tag once no login carries it
+    def remove_login_tag(self, user_id: int, entry_id: int, tag: str) -> RemoveStatus:
+        try:
+            cursor = self._execute('delete_entry_tag', (entry_id, user_id, tag))
+            _ = self._execute('delete_unused_tags', (user_id,))
+            self.conn.commit()
+            if cursor.rowcount == 0:
+                logger.error(f'Vault entry {entry_id} is not tagged \'{tag}\'')
+                return RemoveStatus.ERROR
+            logger.info(f'Removed tag from vault entry {entry_id}')
+            return RemoveStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error removing tag from vault entry {entry_id}: {e}')
+            self.conn.rollback()
+            return RemoveStatus.ERROR
+
+    # Returns the tags of one of the user's logins, alphabetically
+    def get_login_tags(self, user_id: int, entry_id: int) -> list[str]:
+        try:
+            return [row[0] for row in self._fetchall('select_login_tags', (entry_id, user_id))]
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving tags of vault entry {entry_id}: {e}')
+            return []
+
+    # Returns the tags of the given logins by entry id, each sorted by name. Logins without tags are
+    # left out. One query however many logins are given
+    def get_tags_by_login(self, user_id: int, entry_ids: list[int]) -> dict[int, list[str]]:
+        tags: dict[int, list[str]] = {}
+        if not entry_ids:
+            return tags
+        try:
+            rows: list[tuple[int, str]] = self._fetchall('select_tags_by_login', (_json_ids(entry_ids), user_id))
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving tags of {len(entry_ids)} logins: {e}')
+            return tags
+        for entry_id, name in rows:
+            tags.setdefault(entry_id, []).append(name)
+        return tags
+
+    # Returns (tag, login count) for each of the user's tags
+    def get_user_tags(self, user_id: int) -> list[tuple[str, int]]:
+        try:
+            return self._fetchall('select_user_tags', (user_id,))
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving tags for user {user_id}: {e}')
+            return []
+
+    # Moves one of the user's logins into a folder, creating it if needed. A folder of None takes
+    # the login out of its folder. Folders left empty are removed
+    def set_login_folder(self, user_id: int, entry_id: int, folder: str | None) -> InsertStatus:
+        try:
+            if folder is None:
+                cursor = self._execute('clear_login_folder', (entry_id, user_id))
+            else:
+                _ = self._execute('insert_folder', (user_id, folder))
+                cursor = self._execute('update_login_folder', (user_id, folder, entry_id, user_id))
+            _ = self._execute('delete_unused_folders', (user_id,))
+            self.conn.commit()
+            if cursor.rowcount == 0:
+                logger.error(f'Vault entry {entry_id} of user {user_id} not found')
+                return InsertStatus.ERROR
+            logger.info(f'Moved vault entry {entry_id} to a folder')
+            return InsertStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error moving vault entry {entry_id} to a folder: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Returns (folder, login count) for each of the user's folders
+    def get_user_folders(self, user_id: int) -> list[tuple[str, int]]:
+        try:
+            return self._fetchall('select_user_folders', (user_id,))
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving folders for user {user_id}: {e}')
+            return []
+
+    # Returns the user's logins matching every filter given: carrying the tag, in the folder, and
+    # with a service name starting with the prefix (ignoring case). With no filters, returns every
+    # login. Each combination runs as a single indexed query, ordered by service name
+    def filter_logins(self, user_id: int, tag: str | None = None, folder: str | None = None,
+                      prefix: str | None = None) -> list[VaultEntry]:
+        params: list[Any] = [user_id]
+        if tag is not None:
+            params.append(tag)
+        if folder is not None:
+            params += [user_id, folder]
+        if prefix:
+            # Every name starting with the prefix sorts below the prefix followed by the highest code point
+            params += [prefix, prefix + '\U0010ffff']
+        try:
+            rows = self._fetchall(filter_statement_name(tag is not None, folder is not None, bool(prefix)), tuple(params))
+            return [VaultEntry(*row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f'Error filtering logins for user {user_id}: {e}')
+            return []
+
+    # Returns the login's prior versions, newest first
+    def get_login_history(self, user_id: int, entry_id: int) -> list[HistoryEntry]:
+        try:
+            rows: list[tuple[int, int, int, str | None, str | None, bytes | None, int]] = self._fetchall('select_history', (entry_id, user_id))
+            logger.info(f'Retrieved history for vault entry {entry_id}')
+            return [HistoryEntry(*row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving history for vault entry {entry_id}: {e}')
+            return []
+
+    # Deletes history beyond the retention policy in batches, each in its own short transaction
+    # so the pruning job never holds the write lock for long. Returns the number of rows removed
+    def prune_history(self, keep_last: int | None = None, max_age_days: int | None = None, batch_size: int = 500) -> int:
+        jobs: list[tuple[str, int]] = []
+        if max_age_days is not None:
+            jobs.append(('prune_history_age', int(time.time()) - max_age_days * 86400))
+        if keep_last is not None:
+            jobs.append(('prune_history_count', keep_last))
+
+        removed = 0
+        try:
+            for name, bound in jobs:
+                while True:
+                    cursor = self._execute(name, (bound, batch_size))
+                    self.conn.commit()
+                    removed += cursor.rowcount
+                    if cursor.rowcount < batch_size:
+                        break
+            if removed:
+                logger.info(f'Pruned {removed} history rows')
+        except sqlite3.Error as e:
+            logger.error(f'Error pruning history: {e}')
+            self.conn.rollback()
+        return removed
+
+    # Returns the user's deleted logins, most recently deleted first
+    def get_trash(self, user_id: int) -> list[TrashEntry]:
+        try:
+            rows: list[tuple[int, str, str | None, int]] = self._fetchall('select_trash', (user_id,))
+            return [TrashEntry(*row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving trash for user {user_id}: {e}')
+            return []
+
+    # Moves a login out of the trash
+    def restore_login(self, user_id: int, entry_id: int) -> InsertStatus:
+        try:
+            cursor = self._execute('restore_login', (entry_id, user_id))
+            self.conn.commit()
+            if cursor.rowcount == 0:
+                logger.error(f'No deleted vault entry {entry_id} for user {user_id}')
+                return InsertStatus.ERROR
+            logger.info(f'Restored vault entry {entry_id}')
+            return InsertStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error restoring vault entry {entry_id}: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Permanently removes logins and accounts that have been in the trash longer than the retention
+    # period, with their history. Works in batches like prune_history. Returns (logins, users) purged
+    def purge_trash(self, retention_days: int, batch_size: int = 500) -> tuple[int, int]:
+        cutoff = int(time.time()) - retention_days * 86400
+        logins = users = 0
+        try:
+            while True:
+                rows: list[tuple[int]] = self._fetchall('select_expired_logins', (cutoff, batch_size))
+                _ = self._executemany('purge_login_history', rows)
+                _ = self._executemany('purge_login', rows)
+                self.conn.commit()
+                logins += len(rows)
+                if len(rows) < batch_size:
+                    break
+
+            while True:
+                rows = self._fetchall('select_expired_users', (cutoff, batch_size))
+                self._purge_users([row[0] for row in rows])
+                self.conn.commit()
+                users += len(rows)
+                if len(rows) < batch_size:
+                    break
+            if logins or users:
+                logger.info(f'Purged {logins} logins and {users} users from the trash')
+        except sqlite3.Error as e:
+            logger.error(f'Error purging trash: {e}')
+            self.conn.rollback()
+        return logins, users
+
+    # Returns (entry id, password, TOTP secret) ciphertexts for all the user's logins and
+    # (history id, password) ciphertexts for their history
+    def get_user_secrets(self, user_id: int) -> tuple[list[tuple[int, bytes, bytes | None]], list[tuple[int, bytes]]]:
+        entries: list[tuple[int, bytes, bytes | None]] = self._fetchall('select_user_secrets', (user_id,))
+        history: list[tuple[int, bytes]] = self._fetchall('select_history_secrets', (user_id,))
+        return entries, history
+
+    # Returns (attachment id, wrapped key) of every attachment of the user
+    def get_attachment_keys(self, user_id: int) -> list[tuple[int, bytes]]:
+        return self._fetchall('select_attachment_keys', (user_id,))
+
+    # Returns (field id, value) ciphertexts of every custom field of the user
+    def get_field_secrets(self, user_id: int) -> list[tuple[int, bytes]]:
+        return self._fetchall('select_field_secrets', (user_id,))
+
+    # Swaps the user's key, salt and KDF spec and every ciphertext re-encrypted under the new key in one
+    # transaction, so the vault is never left half on the old key.
+    # entries are (entry id, password, fingerprint, TOTP secret); history is (history id, password);
+    # collection_keys are (collection id, collection key wrapped with the new key), attachment_keys
+    # (attachment id, attachment key wrapped with the new key) and fields (field id, value)
+    def rekey_user(self, user_id: int, master_hash: bytes, salt: bytes,
+                   entries: list[tuple[int, bytes, bytes, bytes | None]], history: list[tuple[int, bytes]],
+                   collection_keys: list[tuple[int, bytes]] | None = None, kdf: str | None = None,
+                   attachment_keys: list[tuple[int, bytes]] | None = None, fields: list[tuple[int, bytes]] | None = None) -> InsertStatus:
+        try:
+            _ = self._executemany('rekey_field', [(value, field_id) for field_id, value in fields or []])
+            _ = self._executemany('update_wrapped_key', [(wrapped, collection_id, user_id) for collection_id, wrapped in collection_keys or []])
+            _ = self._executemany('rekey_attachment', [(wrapped, attachment_id) for attachment_id, wrapped in attachment_keys or []])
+            _ = self._executemany('rekey_login', [(password, fingerprint, totp, entry_id) for entry_id, password, fingerprint, totp in entries])
+            _ = self._executemany('rekey_history', [(password, history_id) for history_id, password in history])
+            _ = self._execute('update_user_key', (master_hash, salt, kdf, user_id))
+            self.conn.commit()
+            user_cache.invalidate(self.cache_key, user_id)
+            logger.info(f'Re-encrypted {len(entries)} logins and {len(history)} history rows for user {user_id}')
+            return InsertStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error re-encrypting vault for user {user_id}: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Returns a value from the sync bookkeeping table, or default if it was never set
+    def get_sync_value(self, key: str, default: Any = None) -> Any:
+        row = self._fetchone('select_sync_value', (key,))
+        return default if row is None else row[0]
+
+    # Returns whether the user's logins have been synced with any remote
+    def has_synced(self, user_id: int) -> bool:
+        return bool(self._fetchone('select_user_synced', (user_id,))[0])
+
+    # Sets a value in the sync bookkeeping table
+    def set_sync_value(self, key: str, value: Any) -> None:
+        _ = self._execute('upsert_sync_value', (key, value))
+        self.conn.commit()
+
+    # Returns the rows of the user last changed on the given device after the clock value, oldest first
+    def get_changes(self, user_id: int, origin: str, since: int) -> list[SyncRow]:
+        rows: list[tuple[Any, ...]] = self._fetchall('select_changes', (user_id, origin, since))
+        return [SyncRow(*row) for row in rows]
+
+    # Merges rows pulled from another device in one transaction. Remote writes keep their own clock
+    # and device, so the local change triggers are paused while they're applied. Afterwards the local
+    # clock is moved past every clock seen, so later local edits order after them. Returns the
+    # number of rows inserted or overwritten; the rest lost to newer local changes
+    def apply_changes(self, user_id: int, rows: list[SyncRow], state: dict[str, Any] | None = None) -> int:
+        if not rows:
+            return 0
+        try:
+            before = self.conn.total_changes
+            _ = self._execute('upsert_sync_value', ('applying', 1))
+            _ = self._executemany('apply_change', [(
+                user_id, row.uid, row.service_name, row.username, row.password_encrypted, row.password_fingerprint,
+                row.totp_secret_encrypted, row.deleted_at, row.clock, row.origin,
+                row.created_at, row.updated_at, row.rotation_days, row.expires_at,
+            ) for row in rows])
+            applied = self.conn.total_changes - before - 1
+            _ = self._execute('upsert_sync_value', ('applying', 0))
+            _ = self._execute('advance_clock', (max(row.clock for row in rows),))
+            for key, value in (state or {}).items():
+                _ = self._execute('upsert_sync_value', (key, value))
+            self.conn.commit()
+            logger.info(f'Applied {applied} of {len(rows)} synced changes for user {user_id}')
+            return applied
+        except sqlite3.Error as e:
+            logger.error(f'Error applying synced changes for user {user_id}: {e}')
+            self.conn.rollback()
+            raise
+
+    # Stores an attachment and its encrypted chunks in one transaction. The chunks are taken from the
+    # iterable one at a time, so a large file is never held in memory; as they usually come straight
+    # from a file being read and encrypted, an OSError or ValueError raised while producing them
+    # rolls back like a database error. Returns the attachment's id, or None on failure
+    def insert_attachment(self, user_id: int, entry_id: int, kind: AttachmentKind, name: str, size: int, chunk_size: int,
+                          wrapped_key: bytes, nonce_prefix: bytes, chunks: Iterable[bytes]) -> int | None:
+        try:
+            cursor = self._execute('insert_attachment', (user_id, entry_id, kind.value, name, size, chunk_size, wrapped_key, nonce_prefix,
+                                                         int(time.time())))
+            attachment_id = cursor.lastrowid
+            _ = self._executemany('insert_attachment_chunk', ((attachment_id, seq, chunk) for seq, chunk in enumerate(chunks)))
+            self.conn.commit()
+            logger.info(f'Stored attachment {attachment_id} ({size} bytes) for login {entry_id}')
+            return attachment_id
+        except (sqlite3.Error, OSError, ValueError) as e:
+            logger.error(f'Error storing an attachment for login {entry_id}: {e}')
+            self.conn.rollback()
+            return None
+
+    # Returns the attachments of one of the user's logins, oldest first, without their chunks
+    def get_attachments(self, user_id: int, entry_id: int) -> list[Attachment]:
+        rows: list[tuple[Any, ...]] = self._fetchall('select_attachments', (entry_id, user_id))
+        return [Attachment(row[0], row[1], AttachmentKind(row[2]), *row[3:]) for row in rows]
+
+    # Returns one of the user's attachments without its chunks, or None if it doesn't exist
+    def get_attachment(self, user_id: int, attachment_id: int) -> Attachment | None:
+        row: tuple[Any, ...] | None = self._fetchone('select_attachment', (attachment_id, user_id))
+        return Attachment(row[0], row[1], AttachmentKind(row[2]), *row[3:]) if row else None
+
+    # Yields an attachment's encrypted chunks in order, fetching one row at a time
+    def iter_attachment_chunks(self, attachment_id: int) -> Iterator[bytes]:
+        for (data,) in self._execute('select_attachment_chunks', (attachment_id,)):
+            yield data
+
+    # Deletes one of the user's attachments along with its chunks
+    def delete_attachment(self, user_id: int, attachment_id: int) -> RemoveStatus:
+        try:
+            cursor = self._execute('delete_attachment', (attachment_id, user_id))
+            self.conn.commit()
+            if cursor.rowcount == 0:
+                logger.error(f'Attachment {attachment_id} of user {user_id} not found')
+                return RemoveStatus.ERROR
+            logger.info(f'Deleted attachment {attachment_id}')
+            return RemoveStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error deleting attachment {attachment_id}: {e}')
+            self.conn.rollback()
+            return RemoveStatus.ERROR
+
+    # Adds a custom field to one of the user's logins, or replaces the field of that name
+    def set_login_field(self, user_id: int, entry_id: int, name: str, kind: FieldKind, value_encrypted: bytes) -> InsertStatus:
+        try:
+            _ = self._execute('upsert_field', (entry_id, user_id, name, kind.value, value_encrypted))
+            self.conn.commit()
+            logger.info(f'Set field \'{name}\' on login {entry_id}')
+            return InsertStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error setting field \'{name}\' on login {entry_id}: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Returns one custom field of one of the user's logins by name (ignoring case), or None
+    def get_login_field(self, user_id: int, entry_id: int, name: str) -> CustomField | None:
+        row: tuple[int, int, str, int, bytes] | None = self._fetchone('select_field', (entry_id, user_id, name))
+        return CustomField(row[0], row[1], row[2], FieldKind(row[3]), row[4]) if row else None
+
+    # Returns the custom fields of the given logins by entry id, each login's in the order they were
+    # added. Logins without fields are left out. One query however many logins are given
+    def get_login_fields(self, user_id: int, entry_ids: list[int]) -> dict[int, list[CustomField]]:
+        fields: dict[int, list[CustomField]] = {}
+        if not entry_ids:
+            return fields
+        try:
+            rows: list[tuple[int, int, str, int, bytes]] = self._fetchall('select_login_fields', (_json_ids(entry_ids), user_id))
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving fields of {len(entry_ids)} logins: {e}')
+            return fields
+        for field_id, entry_id, name, kind, value_encrypted in rows:
+            fields.setdefault(entry_id, []).append(CustomField(field_id, entry_id, name, FieldKind(kind), value_encrypted))
+        return fields
+
+    # Removes a custom field from one of the user's logins
+    def remove_login_field(self, user_id: int, entry_id: int, name: str) -> RemoveStatus:
+        try:
+            cursor = self._execute('delete_field', (entry_id, user_id, name))
+            self.conn.commit()
+            if cursor.rowcount == 0:
+                logger.error(f'Field \'{name}\' not found on login {entry_id}')
+                return RemoveStatus.ERROR
+            logger.info(f'Removed field \'{name}\' from login {entry_id}')
+            return RemoveStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error removing field \'{name}\' from login {entry_id}: {e}')
+            self.conn.rollback()
+            return RemoveStatus.ERROR
+
+    # Creates a collection with the creator as its first member. Returns its id, or None on failure
+    def create_collection(self, name: str, user_id: int, wrapped_key: bytes) -> int | None:
+        try:
+            cursor = self._execute('insert_collection', (name,))
+            collection_id = cursor.lastrowid
+            _ = self._execute('insert_collection_member', (collection_id, user_id, wrapped_key))
+            self.conn.commit()
+            logger.info(f'Created collection \'{name}\' ({collection_id})')
+            return collection_id
+        except sqlite3.Error as e:
+            logger.error(f'Error creating collection \'{name}\': {e}')
+            self.conn.rollback()
+            return None
+
+    # Gives a user access to a collection through their wrapped copy of its key
+    def add_collection_member(self, collection_id: int, user_id: int, wrapped_key: bytes) -> InsertStatus:
+        try:
+            _ = self._execute('insert_collection_member', (collection_id, user_id, wrapped_key))
+            self.conn.commit()
+            logger.info(f'Added user {user_id} to collection {collection_id}')
+            return InsertStatus.SUCCESS
+        except sqlite3.IntegrityError as e:
+            logger.error(f'Error adding user {user_id} to collection {collection_id}: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Revokes a user's access to a collection; a collection left without members is deleted
+    def remove_collection_member(self, collection_id: int, user_id: int) -> RemoveStatus:
+        try:
+            cursor = self._execute('delete_collection_member', (collection_id, user_id))
+            _ = self._execute('purge_orphan_collections')
+            self.conn.commit()
+            if cursor.rowcount == 0:
+                logger.error(f'User {user_id} is not a member of collection {collection_id}')
+                return RemoveStatus.ERROR
+            logger.info(f'Removed user {user_id} from collection {collection_id}')
+            return RemoveStatus.SUCCESS
+        except sqlite3.Error as e:
+            logger.error(f'Error removing user {user_id} from collection {collection_id}: {e}')
+            self.conn.rollback()
+            return RemoveStatus.ERROR
+
+    # Returns the collections the user belongs to, with their wrapped keys
+    def get_user_collections(self, user_id: int) -> list[Collection]:
+        try:
+            rows: list[tuple[int, str, bytes]] = self._fetchall('select_user_collections', (user_id,))
+            return [Collection(*row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving collections for user {user_id}: {e}')
+            return []
+
+    # Returns (user id, username) of every member of a collection
+    def get_collection_members(self, collection_id: int) -> list[tuple[int, str]]:
+        try:
+            return self._fetchall('select_collection_members', (collection_id,))
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving members of collection {collection_id}: {e}')
+            return []
+
+    # Adds a login, encrypted with the collection key, to a collection
+    def insert_collection_login(self, collection_id: int, service_name: str, username: str | None, password: bytes) -> InsertStatus:
+        try:
+            cursor = self._execute('insert_collection_login', (collection_id, service_name, username, password))
+            self.conn.commit()
+            self.last_insert_id = cursor.lastrowid
+            logger.info(f'Inserted login \'{service_name}\' into collection {collection_id}')
+            return InsertStatus.SUCCESS
+        except sqlite3.IntegrityError as e:
+            logger.error(f'Error inserting login \'{service_name}\' into collection {collection_id}: {e}')
+            self.conn.rollback()
+            return InsertStatus.ERROR
+
+    # Returns the user's own logins followed by those of every collection they belong to
+    def get_visible_logins(self, user_id: int) -> list[VisibleEntry]:
+        try:
+            rows: list[tuple[int, int | None, str, str | None, bytes]] = self._fetchall('select_visible_logins', (user_id, user_id))
+            return [VisibleEntry(*row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving visible logins for user {user_id}: {e}')
+            return []
+
+    # Returns the user's own and shared logins for one service
+    def get_visible_logins_from_name(self, user_id: int, service_name: str) -> list[VisibleEntry]:
+        try:
+            rows: list[tuple[int, int | None, str, str | None, bytes]] = self._fetchall(
+                'select_visible_logins_by_name', (user_id, service_name, service_name, user_id))
+            return [VisibleEntry(*row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f'Error retrieving visible logins for \'{service_name}\': {e}')
+            return []
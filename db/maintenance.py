@@ -0,0 +1,92 @@
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+from db.database import DatabaseManager
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Pages freed per incremental_vacuum step. Each step is its own short write transaction,
+# so other connections can get the lock between steps
+VACUUM_STEP_PAGES: int = 256
+
+
+@dataclass
+class MaintenanceReport:
+    size_before: int
+    size_after: int = 0
+    timings: list[tuple[str, float]] = field(default_factory=list)
+    purged_logins: int = 0
+    purged_users: int = 0
+    vacuum_into_size: int | None = None
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return self.size_before - self.size_after
+
+
+# Returns the size of the database in bytes, from its page count so in-memory databases work too
+def database_size(db: DatabaseManager) -> int:
+    page_count: int = db.conn.execute('PRAGMA page_count').fetchone()[0]
+    page_size: int = db.conn.execute('PRAGMA page_size').fetchone()[0]
+    return page_count * page_size
+
+
+# Returns free pages to the filesystem. Databases created with auto_vacuum=INCREMENTAL are
+# shrunk a few pages at a time; older ones are converted with a single full VACUUM
+def vacuum(db: DatabaseManager, step_pages: int = VACUUM_STEP_PAGES) -> None:
+    mode: int = db.conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    if mode != 2:
+        logger.info(f'Converting {db.db_path} to incremental auto_vacuum with a full VACUUM')
+        _ = db.conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        _ = db.conn.execute('VACUUM')
+        return
+
+    while db.conn.execute('PRAGMA freelist_count').fetchone()[0] > 0:
+        _ = db.conn.execute(f'PRAGMA incremental_vacuum({step_pages})').fetchall()
+        db.conn.commit()
+
+
+# Purges the expired trash, compacts the database and refreshes the query planner statistics,
+# timing each step. With vacuum_into, a compacted copy is also written to that path
+def run_maintenance(db: DatabaseManager, trash_days: int, vacuum_into: str | None = None) -> MaintenanceReport:
+    report = MaintenanceReport(database_size(db))
+
+    steps = [
+        ('purge trash', lambda: _purge(db, trash_days, report)),
+        ('vacuum', lambda: vacuum(db)),
+        ('analyze', lambda: db.conn.execute('ANALYZE')),
+        ('optimize', lambda: db.conn.execute('PRAGMA optimize')),
+    ]
+    if vacuum_into is not None:
+        steps.append(('vacuum into', lambda: db.conn.execute('VACUUM INTO ?', (vacuum_into,))))
+
+    for name, step in steps:
+        start = time.perf_counter()
+        _ = step()
+        db.conn.commit()
+        report.timings.append((name, time.perf_counter() - start))
+        # ANALYZE adds a few pages of statistics; they aren't part of what the vacuum reclaimed
+        if name == 'vacuum':
+            report.size_after = database_size(db)
+
+    if vacuum_into is not None:
+        report.vacuum_into_size = os.path.getsize(vacuum_into)
+    logger.info(f'Maintenance reclaimed {report.reclaimed_bytes} bytes from {db.db_path}')
+    return report
+
+
+# Runs the trash purge and records what it removed
+def _purge(db: DatabaseManager, trash_days: int, report: MaintenanceReport) -> None:
+    report.purged_logins, report.purged_users = db.purge_trash(trash_days)
+
+
+# Prints a maintenance report
+def print_report(report: MaintenanceReport) -> None:
+    print(f'Purged {report.purged_logins} logins and {report.purged_users} accounts from the trash')
+    print(f'Database size: {report.size_before} -> {report.size_after} bytes ({report.reclaimed_bytes} reclaimed)')
+    if report.vacuum_into_size is not None:
+        print(f'Compacted copy: {report.vacuum_into_size} bytes')
+    for name, seconds in report.timings:
+        print(f'  {name:<12} {seconds * 1000:8.1f} ms')
@@ -0,0 +1,195 @@
+# Schema changes applied in order to databases created before they existed.
+# schema.sql always describes the latest schema, so new databases skip straight
+# to SCHEMA_VERSION; each entry here upgrades an existing one a single step.
+MIGRATIONS: list[tuple[int, str]] = [
+    (1, '''
+        ALTER TABLE vault_entries ADD COLUMN password_fingerprint BLOB;
+        CREATE INDEX IF NOT EXISTS idx_vault_entries_fingerprint ON vault_entries (user_id, password_fingerprint);
+    '''),
+    (2, '''
+        ALTER TABLE vault_entries ADD COLUMN totp_secret_encrypted BLOB;
+        CREATE INDEX IF NOT EXISTS idx_vault_entries_totp ON vault_entries (user_id) WHERE totp_secret_encrypted IS NOT NULL;
+    '''),
+    (3, '''
+        CREATE TABLE IF NOT EXISTS vault_entry_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entry_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            changed_fields INTEGER NOT NULL,
+            service_name TEXT,
+            username TEXT,
+            password_encrypted BLOB,
+            changed_at INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS idx_history_entry ON vault_entry_history (entry_id, changed_at);
+        CREATE INDEX IF NOT EXISTS idx_history_changed_at ON vault_entry_history (changed_at);
+    '''),
+    (4, '''
+        ALTER TABLE users ADD COLUMN deleted_at INTEGER;
+        ALTER TABLE vault_entries ADD COLUMN deleted_at INTEGER;
+        CREATE INDEX IF NOT EXISTS idx_users_deleted ON users (deleted_at) WHERE deleted_at IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_vault_entries_deleted ON vault_entries (deleted_at) WHERE deleted_at IS NOT NULL;
+    '''),
+    (5, '''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            key TEXT PRIMARY KEY,
+            value
+        );
+
+        INSERT OR IGNORE INTO sync_state (key, value) VALUES ('device_id', lower(hex(randomblob(8)))), ('clock', 0), ('applying', 0);
+        ALTER TABLE vault_entries ADD COLUMN uid TEXT;
+        ALTER TABLE vault_entries ADD COLUMN clock INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE vault_entries ADD COLUMN origin TEXT;
+        UPDATE vault_entries SET uid = lower(hex(randomblob(16))), clock = id, origin = (SELECT value FROM sync_state WHERE key = 'device_id');
+        UPDATE sync_state SET value = (SELECT COALESCE(MAX(id), 0) FROM vault_entries) WHERE key = 'clock';
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_vault_entries_uid ON vault_entries (uid);
+        CREATE INDEX IF NOT EXISTS idx_vault_entries_clock ON vault_entries (user_id, origin, clock);
+        CREATE TRIGGER IF NOT EXISTS vault_entries_sync_insert AFTER INSERT ON vault_entries
+        WHEN (SELECT value FROM sync_state WHERE key = 'applying') = 0
+        BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE key = 'clock';
+            UPDATE vault_entries SET
+                uid = COALESCE(NEW.uid, lower(hex(randomblob(16)))),
+                clock = (SELECT value FROM sync_state WHERE key = 'clock'),
+                origin = (SELECT value FROM sync_state WHERE key = 'device_id')
+            WHERE id = NEW.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS vault_entries_sync_update
+        AFTER UPDATE OF service_name, username, password_encrypted, totp_secret_encrypted, deleted_at ON vault_entries
+        WHEN (SELECT value FROM sync_state WHERE key = 'applying') = 0
+        BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE key = 'clock';
+            UPDATE vault_entries SET
+                clock = (SELECT value FROM sync_state WHERE key = 'clock'),
+                origin = (SELECT value FROM sync_state WHERE key = 'device_id')
+            WHERE id = NEW.id;
+        END;
+    '''),
+    (6, '''
+        CREATE TABLE IF NOT EXISTS collections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS collection_members (
+            collection_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            wrapped_key BLOB NOT NULL,
+            PRIMARY KEY (collection_id, user_id),
+            FOREIGN KEY (collection_id) REFERENCES collections (id) ON DELETE CASCADE,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_collection_members_user ON collection_members (user_id, collection_id);
+
+        CREATE TABLE IF NOT EXISTS collection_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            collection_id INTEGER NOT NULL,
+            service_name TEXT NOT NULL,
+            username TEXT,
+            password_encrypted BLOB NOT NULL,
+            FOREIGN KEY (collection_id) REFERENCES collections (id) ON DELETE CASCADE
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_collection_entries_name ON collection_entries (collection_id, service_name);
+    '''),
+    (7, '''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL COLLATE NOCASE,
+            UNIQUE (user_id, name),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        );
+
+        CREATE TABLE IF NOT EXISTS entry_tags (
+            tag_id INTEGER NOT NULL,
+            entry_id INTEGER NOT NULL,
+            PRIMARY KEY (tag_id, entry_id),
+            FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE,
+            FOREIGN KEY (entry_id) REFERENCES vault_entries (id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_entry_tags_entry ON entry_tags (entry_id, tag_id);
+
+        CREATE TABLE IF NOT EXISTS folders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL COLLATE NOCASE,
+            UNIQUE (user_id, name),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        );
+        ALTER TABLE vault_entries ADD COLUMN folder_id INTEGER REFERENCES folders (id) ON DELETE SET NULL;
+
+        CREATE INDEX IF NOT EXISTS idx_vault_entries_name ON vault_entries (user_id, service_name COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS idx_vault_entries_folder ON vault_entries (folder_id, service_name COLLATE NOCASE) WHERE folder_id IS NOT NULL;
+    '''),
+    # Existing logins have no record of when they were created or last changed, so those stay NULL
+    (8, '''
+        ALTER TABLE vault_entries ADD COLUMN created_at INTEGER;
+        ALTER TABLE vault_entries ADD COLUMN updated_at INTEGER;
+        ALTER TABLE vault_entries ADD COLUMN rotation_days INTEGER;
+        ALTER TABLE vault_entries ADD COLUMN expires_at INTEGER;
+        CREATE INDEX IF NOT EXISTS idx_vault_entries_expires ON vault_entries (user_id, expires_at, deleted_at) WHERE expires_at IS NOT NULL AND deleted_at IS NULL;
+
+        DROP TRIGGER IF EXISTS vault_entries_sync_update;
+        CREATE TRIGGER IF NOT EXISTS vault_entries_sync_update
+        AFTER UPDATE OF service_name, username, password_encrypted, totp_secret_encrypted, deleted_at, rotation_days ON vault_entries
+        WHEN (SELECT value FROM sync_state WHERE key = 'applying') = 0
+        BEGIN
+            UPDATE sync_state SET value = value + 1 WHERE key = 'clock';
+            UPDATE vault_entries SET
+                clock = (SELECT value FROM sync_state WHERE key = 'clock'),
+                origin = (SELECT value FROM sync_state WHERE key = 'device_id')
+            WHERE id = NEW.id;
+        END;
+    '''),
+    # Accounts keep a NULL spec, meaning the original scrypt parameters, until their next sign-in
+    (9, '''
+        ALTER TABLE users ADD COLUMN kdf TEXT;
+    '''),
+    (10, '''
+        CREATE TABLE IF NOT EXISTS attachments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            entry_id INTEGER NOT NULL,
+            kind INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            chunk_size INTEGER NOT NULL,
+            wrapped_key BLOB NOT NULL,
+            nonce_prefix BLOB NOT NULL,
+            created_at INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            FOREIGN KEY (entry_id) REFERENCES vault_entries (id) ON DELETE CASCADE
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_attachments_entry ON attachments (entry_id);
+        CREATE INDEX IF NOT EXISTS idx_attachments_user ON attachments (user_id);
+
+        CREATE TABLE IF NOT EXISTS attachment_chunks (
+            attachment_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (attachment_id, seq),
+            FOREIGN KEY (attachment_id) REFERENCES attachments (id) ON DELETE CASCADE
+        );
+    '''),
+    (11, '''
+        CREATE TABLE IF NOT EXISTS entry_fields (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entry_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL COLLATE NOCASE,
+            kind INTEGER NOT NULL,
+            value_encrypted BLOB NOT NULL,
+            UNIQUE (entry_id, name),
+            FOREIGN KEY (entry_id) REFERENCES vault_entries (id) ON DELETE CASCADE,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        );
+    '''),
+]
+
+SCHEMA_VERSION: int = MIGRATIONS[-1][0]
@@ -1,8 +1,14 @@
+-- Lets the maintenance command return free pages to the filesystem without a full VACUUM.
+-- Only takes effect on a new, empty database
+PRAGMA auto_vacuum = INCREMENTAL;
+
 CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     username TEXT UNIQUE NOT NULL,
     master_hash BLOB NOT NULL,
-    salt BLOB NOT NULL
+    salt BLOB NOT NULL,
+    deleted_at INTEGER,
+    kdf TEXT
 );
 
 CREATE TABLE IF NOT EXISTS vault_entries (
@@ -11,5 +17,191 @@ CREATE TABLE IF NOT EXISTS vault_entries (
     service_name TEXT NOT NULL,
     username TEXT,
     password_encrypted BLOB NOT NULL,
+    password_fingerprint BLOB,
+    totp_secret_encrypted BLOB,
+    deleted_at INTEGER,
+    uid TEXT,
+    clock INTEGER NOT NULL DEFAULT 0,
+    origin TEXT,
+    folder_id INTEGER REFERENCES folders (id) ON DELETE SET NULL,
+    created_at INTEGER,
+    updated_at INTEGER,
+    rotation_days INTEGER,
+    expires_at INTEGER,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_vault_entries_fingerprint ON vault_entries (user_id, password_fingerprint);
+CREATE INDEX IF NOT EXISTS idx_vault_entries_totp ON vault_entries (user_id) WHERE totp_secret_encrypted IS NOT NULL;
+
+-- Soft-deleted rows wait in the trash until purged; only they are indexed
+CREATE INDEX IF NOT EXISTS idx_users_deleted ON users (deleted_at) WHERE deleted_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_vault_entries_deleted ON vault_entries (deleted_at) WHERE deleted_at IS NOT NULL;
+
+-- Prior versions of vault entries. Each row holds only the fields that changed
+-- (flagged in changed_fields); unchanged fields are NULL
+CREATE TABLE IF NOT EXISTS vault_entry_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entry_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    changed_fields INTEGER NOT NULL,
+    service_name TEXT,
+    username TEXT,
+    password_encrypted BLOB,
+    changed_at INTEGER NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_history_entry ON vault_entry_history (entry_id, changed_at);
+CREATE INDEX IF NOT EXISTS idx_history_changed_at ON vault_entry_history (changed_at);
+
+-- Sync bookkeeping: this device's id, its Lamport clock, whether remote changes are being
+-- applied, and how far each remote has been pushed and pulled
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value
+);
+
+INSERT OR IGNORE INTO sync_state (key, value) VALUES ('device_id', lower(hex(randomblob(8)))), ('clock', 0), ('applying', 0);
+
+-- Every row carries a device-independent uid and the Lamport clock and device of its last
+-- change, so the rows changed since a sync are found through idx_vault_entries_clock.
+-- Local writes stamp them here; changes pulled from a remote carry their own
+CREATE UNIQUE INDEX IF NOT EXISTS idx_vault_entries_uid ON vault_entries (uid);
+CREATE INDEX IF NOT EXISTS idx_vault_entries_clock ON vault_entries (user_id, origin, clock);
+
+CREATE TRIGGER IF NOT EXISTS vault_entries_sync_insert AFTER INSERT ON vault_entries
+WHEN (SELECT value FROM sync_state WHERE key = 'applying') = 0
+BEGIN
+    UPDATE sync_state SET value = value + 1 WHERE key = 'clock';
+    UPDATE vault_entries SET
+        uid = COALESCE(NEW.uid, lower(hex(randomblob(16)))),
+        clock = (SELECT value FROM sync_state WHERE key = 'clock'),
+        origin = (SELECT value FROM sync_state WHERE key = 'device_id')
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS vault_entries_sync_update
+AFTER UPDATE OF service_name, username, password_encrypted, totp_secret_encrypted, deleted_at, rotation_days ON vault_entries
+WHEN (SELECT value FROM sync_state WHERE key = 'applying') = 0
+BEGIN
+    UPDATE sync_state SET value = value + 1 WHERE key = 'clock';
+    UPDATE vault_entries SET
+        clock = (SELECT value FROM sync_state WHERE key = 'clock'),
+        origin = (SELECT value FROM sync_state WHERE key = 'device_id')
+    WHERE id = NEW.id;
+END;
+
+-- Shared collections. Their entries are encrypted once with the collection's own key, and each
+-- member holds that key wrapped (encrypted) with their vault key, so changing the members never
+-- touches the entries
+CREATE TABLE IF NOT EXISTS collections (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS collection_members (
+    collection_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    wrapped_key BLOB NOT NULL,
+    PRIMARY KEY (collection_id, user_id),
+    FOREIGN KEY (collection_id) REFERENCES collections (id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_collection_members_user ON collection_members (user_id, collection_id);
+
+CREATE TABLE IF NOT EXISTS collection_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection_id INTEGER NOT NULL,
+    service_name TEXT NOT NULL,
+    username TEXT,
+    password_encrypted BLOB NOT NULL,
+    FOREIGN KEY (collection_id) REFERENCES collections (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_collection_entries_name ON collection_entries (collection_id, service_name);
+
+-- Tags and folders for organising a user's logins. A login can carry any number of tags and sit
+-- in at most one folder. Names are per user and compared case-insensitively
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL COLLATE NOCASE,
+    UNIQUE (user_id, name),
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS entry_tags (
+    tag_id INTEGER NOT NULL,
+    entry_id INTEGER NOT NULL,
+    PRIMARY KEY (tag_id, entry_id),
+    FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE,
+    FOREIGN KEY (entry_id) REFERENCES vault_entries (id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_entry_tags_entry ON entry_tags (entry_id, tag_id);
+
+CREATE TABLE IF NOT EXISTS folders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL COLLATE NOCASE,
+    UNIQUE (user_id, name),
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+);
+
+-- Name prefix filters are case-insensitive range scans over these, already in listing order
+CREATE INDEX IF NOT EXISTS idx_vault_entries_name ON vault_entries (user_id, service_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_vault_entries_folder ON vault_entries (folder_id, service_name COLLATE NOCASE) WHERE folder_id IS NOT NULL;
+
+-- Password age and rotation. updated_at is when the password last changed, rotation_days the
+-- login's policy, and expires_at when the password is due for rotation. Only logins with a due
+-- date are indexed, in due order, so the rotation report and sign-in count never scan the vault.
+-- deleted_at is carried in the index so the count is answered from the index alone
+CREATE INDEX IF NOT EXISTS idx_vault_entries_expires ON vault_entries (user_id, expires_at, deleted_at) WHERE expires_at IS NOT NULL AND deleted_at IS NULL;
+
+-- Files and secure notes attached to logins. Each attachment has its own random key, wrapped with
+-- the vault key, so re-keying a vault only re-wraps these keys. The content is encrypted in chunks
+-- (see core/attachments.py), one row each in a table of its own, so scans of the logins never
+-- touch it and reading or writing an attachment holds one chunk in memory at a time
+CREATE TABLE IF NOT EXISTS attachments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    entry_id INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    wrapped_key BLOB NOT NULL,
+    nonce_prefix BLOB NOT NULL,
+    created_at INTEGER NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+    FOREIGN KEY (entry_id) REFERENCES vault_entries (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_attachments_entry ON attachments (entry_id);
+CREATE INDEX IF NOT EXISTS idx_attachments_user ON attachments (user_id);
+
+CREATE TABLE IF NOT EXISTS attachment_chunks (
+    attachment_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (attachment_id, seq),
+    FOREIGN KEY (attachment_id) REFERENCES attachments (id) ON DELETE CASCADE
+);
+
+-- Custom fields of logins, such as URLs, PINs, security questions or API keys. Each value is
+-- encrypted on its own, so a view decrypts only the fields it shows, and hidden fields only when
+-- asked for by name. Names are per login and compared case-insensitively. The fields of any set
+-- of logins are read in one query through the (entry_id, name) index
+CREATE TABLE IF NOT EXISTS entry_fields (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entry_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL COLLATE NOCASE,
+    kind INTEGER NOT NULL,
+    value_encrypted BLOB NOT NULL,
+    UNIQUE (entry_id, name),
+    FOREIGN KEY (entry_id) REFERENCES vault_entries (id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
 );
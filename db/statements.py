@@ -0,0 +1,296 @@
+import itertools
+import threading
+
+
+# Every SQL statement DatabaseManager runs, keyed by name so the text stays
+# byte-identical between calls and always hits the connection's statement cache
+STATEMENTS: dict[str, str] = {
+    'clear_collections': 'DELETE FROM collections',
+    'clear_history': 'DELETE FROM vault_entry_history',
+    'clear_vault_entries': 'DELETE FROM vault_entries',
+    'clear_users': 'DELETE FROM users',
+    'clear_sequence': 'DELETE FROM sqlite_sequence',
+
+    'insert_user': 'INSERT INTO users (username, master_hash, salt, kdf) VALUES (?, ?, ?, ?)',
+    'select_user_by_username': 'SELECT id, username, master_hash, salt, kdf FROM users WHERE username = ? AND deleted_at IS NULL',
+    'select_user_by_id': 'SELECT id, username, master_hash, salt, kdf FROM users WHERE id = ? AND deleted_at IS NULL',
+    'update_username': 'UPDATE users SET username = ? WHERE id = ?',
+    'delete_user': 'UPDATE users SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL',
+    'delete_user_logins': 'UPDATE vault_entries SET deleted_at = ? WHERE user_id = ? AND deleted_at IS NULL',
+    'select_deleted_user_by_username': 'SELECT id FROM users WHERE username = ? AND deleted_at IS NOT NULL',
+    'select_deleted_user': (
+        'SELECT id, username, master_hash, salt, kdf, deleted_at FROM users WHERE username = ? AND deleted_at IS NOT NULL '
+        'ORDER BY deleted_at DESC LIMIT 1'
+    ),
+    'restore_user': 'UPDATE users SET deleted_at = NULL WHERE id = ? AND deleted_at IS NOT NULL',
+    # Only the logins that went to the trash with the account; ones deleted before it stay there
+    'restore_user_logins': 'UPDATE vault_entries SET deleted_at = NULL WHERE user_id = ? AND deleted_at = ?',
+
+    'insert_login': (
+        'INSERT INTO vault_entries (user_id, service_name, username, password_encrypted, password_fingerprint, totp_secret_encrypted, '
+        'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?7, ?7)'
+    ),
+    'select_logins_by_name': 'SELECT id, user_id, service_name, username, password_encrypted FROM vault_entries WHERE user_id = ? AND service_name = ? AND deleted_at IS NULL',
+    'select_logins_by_user': 'SELECT id, user_id, service_name, username, password_encrypted FROM vault_entries WHERE user_id = ? AND deleted_at IS NULL',
+    'select_login_metadata': 'SELECT id, service_name, username FROM vault_entries WHERE user_id = ? AND deleted_at IS NULL',
+    'delete_login': 'UPDATE vault_entries SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL',
+    'select_login_by_id': 'SELECT id, user_id, service_name, username, password_encrypted FROM vault_entries WHERE id = ? AND user_id = ? AND deleted_at IS NULL',
+    # A new password restarts the login's rotation period, if it has one
+    'update_login': (
+        'UPDATE vault_entries SET service_name = ?, username = ?, password_encrypted = ?, password_fingerprint = ?, '
+        'updated_at = ?5, expires_at = ?5 + rotation_days * 86400 WHERE id = ? AND user_id = ?'
+    ),
+    'update_login_details': 'UPDATE vault_entries SET service_name = ?, username = ? WHERE id = ? AND user_id = ?',
+
+    'count_fingerprint': 'SELECT COUNT(*) FROM vault_entries WHERE user_id = ? AND password_fingerprint = ? AND deleted_at IS NULL',
+    'select_reuse_groups': (
+        'SELECT COUNT(*), GROUP_CONCAT(service_name, char(31)) FROM vault_entries '
+        'WHERE user_id = ? AND password_fingerprint IS NOT NULL AND deleted_at IS NULL '
+        'GROUP BY password_fingerprint HAVING COUNT(*) > 1 ORDER BY COUNT(*) DESC'
+    ),
+    'select_logins_without_fingerprint': 'SELECT id, user_id, service_name, username, password_encrypted FROM vault_entries WHERE user_id = ? AND password_fingerprint IS NULL',
+    'update_fingerprint': 'UPDATE vault_entries SET password_fingerprint = ? WHERE id = ?',
+
+    'update_totp_secret': 'UPDATE vault_entries SET totp_secret_encrypted = ? WHERE id = ? AND user_id = ?',
+    'select_totp_entries': 'SELECT id, service_name, username, totp_secret_encrypted FROM vault_entries WHERE user_id = ? AND totp_secret_encrypted IS NOT NULL AND deleted_at IS NULL',
+
+    'select_trash': 'SELECT id, service_name, username, deleted_at FROM vault_entries WHERE user_id = ? AND deleted_at IS NOT NULL ORDER BY deleted_at DESC',
+    'restore_login': 'UPDATE vault_entries SET deleted_at = NULL WHERE id = ? AND user_id = ? AND deleted_at IS NOT NULL',
+    'select_expired_logins': 'SELECT id FROM vault_entries WHERE deleted_at < ? LIMIT ?',
+    'select_expired_users': 'SELECT id FROM users WHERE deleted_at < ? LIMIT ?',
+    'purge_login_history': 'DELETE FROM vault_entry_history WHERE entry_id = ?',
+    'purge_login': 'DELETE FROM vault_entries WHERE id = ?',
+    'purge_user_history': 'DELETE FROM vault_entry_history WHERE user_id = ?',
+    'purge_user_logins': 'DELETE FROM vault_entries WHERE user_id = ?',
+    'purge_user': 'DELETE FROM users WHERE id = ?',
+    'purge_user_memberships': 'DELETE FROM collection_members WHERE user_id = ?',
+    'purge_orphan_collections': 'DELETE FROM collections WHERE id NOT IN (SELECT collection_id FROM collection_members)',
+
+    # Every ciphertext of a user, including trashed logins and history, for re-encrypting under a new key
+    'select_user_secrets': 'SELECT id, password_encrypted, totp_secret_encrypted FROM vault_entries WHERE user_id = ?',
+    'select_history_secrets': 'SELECT id, password_encrypted FROM vault_entry_history WHERE user_id = ? AND password_encrypted IS NOT NULL',
+    'rekey_login': 'UPDATE vault_entries SET password_encrypted = ?, password_fingerprint = ?, totp_secret_encrypted = ? WHERE id = ?',
+    'rekey_history': 'UPDATE vault_entry_history SET password_encrypted = ? WHERE id = ?',
+    'update_user_key': 'UPDATE users SET master_hash = ?, salt = ?, kdf = ? WHERE id = ?',
+
+    # Due dates count from the last password change, or from when the policy is set if that isn't known
+    'update_rotation_policy': (
+        'UPDATE vault_entries SET rotation_days = ?1, expires_at = COALESCE(updated_at, ?2) + ?1 * 86400 '
+        'WHERE id = ?3 AND user_id = ?4 AND deleted_at IS NULL'
+    ),
+    'select_login_dates': 'SELECT created_at, updated_at, rotation_days, expires_at FROM vault_entries WHERE id = ? AND user_id = ?',
+    # Both walk idx_vault_entries_expires up to the cutoff, in due order
+    'count_due_logins': (
+        'SELECT COUNT(*), COALESCE(SUM(expires_at <= ?1), 0) FROM vault_entries '
+        'WHERE user_id = ?2 AND expires_at <= ?3 AND expires_at IS NOT NULL AND deleted_at IS NULL'
+    ),
+    'select_due_logins': (
+        'SELECT id, service_name, username, updated_at, rotation_days, expires_at FROM vault_entries '
+        'WHERE user_id = ? AND expires_at <= ? AND expires_at IS NOT NULL AND deleted_at IS NULL ORDER BY expires_at'
+    ),
+
+    'select_sync_value': 'SELECT value FROM sync_state WHERE key = ?',
+    # Whether the user has pushed to or pulled from any remote; the keys are '<remote>:<user id>:pushed_...' and ':pulled:...'
+    'select_user_synced': 'SELECT EXISTS (SELECT 1 FROM sync_state WHERE key LIKE \'%:\' || ? || \':pu%\')',
+    'upsert_sync_value': 'INSERT INTO sync_state (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value',
+    'advance_clock': 'UPDATE sync_state SET value = MAX(value, ?) WHERE key = \'clock\'',
+    'select_changes': (
+        'SELECT uid, service_name, username, password_encrypted, password_fingerprint, totp_secret_encrypted, deleted_at, clock, origin, '
+        'created_at, updated_at, rotation_days, expires_at FROM vault_entries WHERE user_id = ? AND origin = ? AND clock > ? ORDER BY clock'
+    ),
+    # Inserts a remote row, or overwrites the local copy only if the remote change is newer.
+    # Ties on the clock are broken by device id so every device picks the same winner
+    'apply_change': (
+        'INSERT INTO vault_entries (user_id, uid, service_name, username, password_encrypted, password_fingerprint, '
+        'totp_secret_encrypted, deleted_at, clock, origin, created_at, updated_at, rotation_days, expires_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+        'ON CONFLICT (uid) DO UPDATE SET service_name = excluded.service_name, username = excluded.username, '
+        'password_encrypted = excluded.password_encrypted, password_fingerprint = excluded.password_fingerprint, '
+        'totp_secret_encrypted = excluded.totp_secret_encrypted, deleted_at = excluded.deleted_at, '
+        'clock = excluded.clock, origin = excluded.origin, created_at = excluded.created_at, updated_at = excluded.updated_at, '
+        'rotation_days = excluded.rotation_days, expires_at = excluded.expires_at '
+        'WHERE (excluded.clock, excluded.origin) > (vault_entries.clock, vault_entries.origin) '
+        'AND vault_entries.user_id = excluded.user_id'
+    ),
+
+    'insert_attachment': (
+        'INSERT INTO attachments (user_id, entry_id, kind, name, size, chunk_size, wrapped_key, nonce_prefix, created_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+    ),
+    'insert_attachment_chunk': 'INSERT INTO attachment_chunks (attachment_id, seq, data) VALUES (?, ?, ?)',
+    'select_attachments': (
+        'SELECT id, entry_id, kind, name, size, chunk_size, wrapped_key, nonce_prefix, created_at FROM attachments '
+        'WHERE entry_id = ? AND user_id = ? ORDER BY id'
+    ),
+    'select_attachment': (
+        'SELECT id, entry_id, kind, name, size, chunk_size, wrapped_key, nonce_prefix, created_at FROM attachments '
+        'WHERE id = ? AND user_id = ?'
+    ),
+    'select_attachment_chunks': 'SELECT data FROM attachment_chunks WHERE attachment_id = ? ORDER BY seq',
+    'delete_attachment': 'DELETE FROM attachments WHERE id = ? AND user_id = ?',
+    'select_attachment_keys': 'SELECT id, wrapped_key FROM attachments WHERE user_id = ?',
+    'rekey_attachment': 'UPDATE attachments SET wrapped_key = ? WHERE id = ?',
+
+    'upsert_field': (
+        'INSERT INTO entry_fields (entry_id, user_id, name, kind, value_encrypted) VALUES (?, ?, ?, ?, ?) '
+        'ON CONFLICT (entry_id, name) DO UPDATE SET kind = excluded.kind, value_encrypted = excluded.value_encrypted'
+    ),
+    'select_field': 'SELECT id, entry_id, name, kind, value_encrypted FROM entry_fields WHERE entry_id = ? AND user_id = ? AND name = ?',
+    # The fields of a list of logins, given as a JSON array of entry ids, so listing any number of
+    # logins with their fields takes one query rather than one per login. CROSS JOIN pins the walk
+    # from each id into the (entry_id, name) index
+    'select_login_fields': (
+        'SELECT f.id, f.entry_id, f.name, f.kind, f.value_encrypted FROM json_each(?) j '
+        'CROSS JOIN entry_fields f ON f.entry_id = j.value WHERE f.user_id = ? ORDER BY f.entry_id, f.id'
+    ),
+    'delete_field': 'DELETE FROM entry_fields WHERE entry_id = ? AND user_id = ? AND name = ?',
+    # Reached through the user's logins, as fields are only indexed by login
+    'select_field_secrets': (
+        'SELECT f.id, f.value_encrypted FROM vault_entries e CROSS JOIN entry_fields f ON f.entry_id = e.id WHERE e.user_id = ?'
+    ),
+    'rekey_field': 'UPDATE entry_fields SET value_encrypted = ? WHERE id = ?',
+
+    'insert_collection': 'INSERT INTO collections (name) VALUES (?)',
+    'insert_collection_member': 'INSERT INTO collection_members (collection_id, user_id, wrapped_key) VALUES (?, ?, ?)',
+    'delete_collection_member': 'DELETE FROM collection_members WHERE collection_id = ? AND user_id = ?',
+    'update_wrapped_key': 'UPDATE collection_members SET wrapped_key = ? WHERE collection_id = ? AND user_id = ?',
+    'select_user_collections': (
+        'SELECT m.collection_id, c.name, m.wrapped_key FROM collection_members m '
+        'JOIN collections c ON c.id = m.collection_id WHERE m.user_id = ? ORDER BY c.name'
+    ),
+    'select_collection_members': (
+        'SELECT u.id, u.username FROM collection_members m JOIN users u ON u.id = m.user_id '
+        'WHERE m.collection_id = ? AND u.deleted_at IS NULL ORDER BY u.username'
+    ),
+    'insert_collection_login': 'INSERT INTO collection_entries (collection_id, service_name, username, password_encrypted) VALUES (?, ?, ?, ?)',
+    # Personal logins and the logins of every collection the user belongs to, in one pass: the first
+    # half walks the user's entries, the second the member index into each collection's entries
+    'select_visible_logins': (
+        'SELECT id, NULL, service_name, username, password_encrypted FROM vault_entries WHERE user_id = ? AND deleted_at IS NULL '
+        'UNION ALL '
+        'SELECT e.id, e.collection_id, e.service_name, e.username, e.password_encrypted FROM collection_members m '
+        'JOIN collection_entries e ON e.collection_id = m.collection_id WHERE m.user_id = ?'
+    ),
+    'select_visible_logins_by_name': (
+        'SELECT id, NULL, service_name, username, password_encrypted FROM vault_entries '
+        'WHERE user_id = ? AND service_name = ? AND deleted_at IS NULL '
+        'UNION ALL '
+        'SELECT e.id, e.collection_id, e.service_name, e.username, e.password_encrypted FROM collection_members m '
+        'JOIN collection_entries e ON e.collection_id = m.collection_id AND e.service_name = ? WHERE m.user_id = ?'
+    ),
+
+    'insert_tag': 'INSERT OR IGNORE INTO tags (user_id, name) VALUES (?, ?)',
+    # Only tags a login with one of its owner's tags, and only if the login is the owner's
+    'insert_entry_tag': (
+        'INSERT OR IGNORE INTO entry_tags (tag_id, entry_id) SELECT t.id, e.id FROM tags t '
+        'JOIN vault_entries e ON e.id = ? AND e.user_id = t.user_id AND e.deleted_at IS NULL WHERE t.user_id = ? AND t.name = ?'
+    ),
+    'delete_entry_tag': (
+        'DELETE FROM entry_tags WHERE entry_id = ? AND tag_id = (SELECT id FROM tags WHERE user_id = ? AND name = ?)'
+    ),
+    'delete_unused_tags': 'DELETE FROM tags WHERE user_id = ? AND id NOT IN (SELECT tag_id FROM entry_tags)',
+    'select_login_tags': (
+        'SELECT t.name FROM entry_tags et JOIN tags t ON t.id = et.tag_id '
+        'WHERE et.entry_id = ? AND t.user_id = ? ORDER BY t.name'
+    ),
+    # The tags of many logins at once, given their ids as a JSON array, like select_login_fields.
+    # CROSS JOIN pins the walk from each id into idx_entry_tags_entry
+    'select_tags_by_login': (
+        'SELECT et.entry_id, t.name FROM json_each(?) j CROSS JOIN entry_tags et ON et.entry_id = j.value '
+        'CROSS JOIN tags t ON t.id = et.tag_id WHERE t.user_id = ? ORDER BY et.entry_id, t.name'
+    ),
+    'select_user_tags': (
+        'SELECT t.name, COUNT(e.id) FROM tags t JOIN entry_tags et ON et.tag_id = t.id '
+        'JOIN vault_entries e ON e.id = et.entry_id AND e.deleted_at IS NULL WHERE t.user_id = ? GROUP BY t.id ORDER BY t.name'
+    ),
+    'insert_folder': 'INSERT OR IGNORE INTO folders (user_id, name) VALUES (?, ?)',
+    'update_login_folder': (
+        'UPDATE vault_entries SET folder_id = (SELECT id FROM folders WHERE user_id = ? AND name = ?) '
+        'WHERE id = ? AND user_id = ? AND deleted_at IS NULL'
+    ),
+    'clear_login_folder': 'UPDATE vault_entries SET folder_id = NULL WHERE id = ? AND user_id = ? AND deleted_at IS NULL',
+    'delete_unused_folders': (
+        'DELETE FROM folders WHERE user_id = ? AND NOT EXISTS (SELECT 1 FROM vault_entries WHERE folder_id = folders.id)'
+    ),
+    'select_user_folders': (
+        'SELECT f.name, COUNT(e.id) FROM folders f JOIN vault_entries e ON e.folder_id = f.id AND e.deleted_at IS NULL '
+        'WHERE f.user_id = ? GROUP BY f.id ORDER BY f.name'
+    ),
+    'purge_user_tags': 'DELETE FROM tags WHERE user_id = ?',
+    'purge_user_folders': 'DELETE FROM folders WHERE user_id = ?',
+
+    'insert_history': (
+        'INSERT INTO vault_entry_history (entry_id, user_id, changed_fields, service_name, username, password_encrypted, changed_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)'
+    ),
+    'select_history': (
+        'SELECT id, entry_id, changed_fields, service_name, username, password_encrypted, changed_at FROM vault_entry_history '
+        'WHERE entry_id = ? AND user_id = ? ORDER BY changed_at DESC, id DESC'
+    ),
+    'prune_history_age': (
+        'DELETE FROM vault_entry_history WHERE id IN '
+        '(SELECT id FROM vault_entry_history WHERE changed_at < ? LIMIT ?)'
+    ),
+    'prune_history_count': (
+        'DELETE FROM vault_entry_history WHERE id IN '
+        '(SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY entry_id ORDER BY changed_at DESC, id DESC) AS version '
+        'FROM vault_entry_history) WHERE version > ? LIMIT ?)'
+    ),
+}
+
+
+# Returns the name of the filter_logins statement for a combination of filters
+def filter_statement_name(tag: bool, folder: bool, prefix: bool) -> str:
+    return 'filter_logins' + '_tag' * tag + '_folder' * folder + '_prefix' * prefix
+
+
+# Builds the filter_logins statement for a combination of filters. Each combination is its own
+# statement rather than one with optional terms, so SQLite picks the right index for each:
+# a tag filter walks entry_tags from the tag, a folder filter idx_vault_entries_folder and a
+# name prefix alone idx_vault_entries_name. CROSS JOIN pins the tag-first order; otherwise the
+# planner may prefer walking all of the user's logins in name order to skip sorting the matches.
+# Parameters go user id, tag, user id and folder, prefix range
+def _filter_statement(tag: bool, folder: bool, prefix: bool) -> str:
+    columns = 'e.id, e.user_id, e.service_name, e.username, e.password_encrypted'
+    if tag:
+        sql = (f'SELECT {columns} FROM tags t CROSS JOIN entry_tags et ON et.tag_id = t.id CROSS JOIN vault_entries e ON e.id = et.entry_id '
+               'WHERE t.user_id = ? AND t.name = ? AND e.user_id = t.user_id AND e.deleted_at IS NULL')
+    else:
+        sql = f'SELECT {columns} FROM vault_entries e WHERE e.user_id = ? AND e.deleted_at IS NULL'
+    if folder:
+        sql += ' AND e.folder_id = (SELECT id FROM folders WHERE user_id = ? AND name = ?)'
+    if prefix:
+        sql += ' AND e.service_name COLLATE NOCASE >= ? AND e.service_name COLLATE NOCASE < ?'
+    return sql + ' ORDER BY e.service_name COLLATE NOCASE, e.id'
+
+
+STATEMENTS.update(
+    (filter_statement_name(*filters), _filter_statement(*filters)) for filters in itertools.product((False, True), repeat=3)
+)
+
+# Size of the per-connection prepared statement cache (sqlite3 defaults to 128)
+CACHED_STATEMENTS: int = 256
+
+
+class StatementStats:
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock()
+        self._counts: dict[str, int] = {}
+        self._total_ns: dict[str, int] = {}
+
+    # Records one execution of the named statement
+    def record(self, name: str, elapsed_ns: int) -> None:
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + 1
+            self._total_ns[name] = self._total_ns.get(name, 0) + elapsed_ns
+
+    # Returns the execution count and total time in nanoseconds per statement
+    def snapshot(self) -> dict[str, tuple[int, int]]:
+        with self._lock:
+            return {name: (count, self._total_ns[name]) for name, count in self._counts.items()}
+
+    # Clears all recorded timings
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._total_ns.clear()
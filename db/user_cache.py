@@ -0,0 +1,61 @@
+import dataclasses
+import threading
+import time
+from collections import OrderedDict
+
+from core.data_models import User
+
+# Most user records kept per process
+MAX_CACHED_USERS: int = 1024
+
+# Seconds a cached record is trusted before it is re-read, which bounds how long
+# changes made by other processes sharing the database can go unnoticed
+USER_CACHE_TTL: float = 60.0
+
+
+class UserCache:
+    def __init__(self, max_size: int = MAX_CACHED_USERS, ttl: float = USER_CACHE_TTL) -> None:
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self._lock: threading.Lock = threading.Lock()
+        self._users: OrderedDict[tuple[str, str], tuple[User, float]] = OrderedDict()
+
+    # Returns a copy of the cached user, or None when missing or expired
+    def get(self, db_key: str, username: str) -> User | None:
+        key = (db_key, username)
+        with self._lock:
+            cached = self._users.get(key)
+            if cached is None:
+                return None
+            user, stored_at = cached
+            if time.monotonic() - stored_at > self.ttl:
+                del self._users[key]
+                return None
+            self._users.move_to_end(key)
+            # Callers mutate the returned user (e.g. on rename), so never hand out the cached object
+            return dataclasses.replace(user)
+
+    # Stores a copy of the user, evicting the least recently used record when full
+    def put(self, db_key: str, user: User) -> None:
+        key = (db_key, user.username)
+        with self._lock:
+            self._users[key] = (dataclasses.replace(user), time.monotonic())
+            self._users.move_to_end(key)
+            while len(self._users) > self.max_size:
+                _ = self._users.popitem(last=False)
+
+    # Drops every cached record for the user id
+    def invalidate(self, db_key: str, user_id: int) -> None:
+        with self._lock:
+            stale = [key for key, (user, _) in self._users.items() if key[0] == db_key and user.id == user_id]
+            for key in stale:
+                del self._users[key]
+
+    # Drops every cached record
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+
+# Process-wide cache shared by every DatabaseManager
+user_cache: UserCache = UserCache()
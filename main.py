@@ -1,5 +1,21 @@
-from core.cli import CLIHandler
-from db.database import DatabaseManager
+import argparse
+import getpass
+import os
+import sys
+import time
+
+from core.audit_log import AUDIT_DIR, SHARED_EVENTS, AuditLog
+from core.cli import ROTATION_NOTICE_DAYS, CLIHandler
+from core.clipboard import BACKENDS, CLEAR_AFTER, Clipboard, get_backend
+from core.encryption import EncryptionManager
+from core.kdf import DEFAULT_KDF, KDFS, Argon2idKdf, Kdf, ScryptKdf
+from core.kdf_pool import KdfPool
+from core.lookup_snapshot import LOOKUP_DIR, LookupSnapshot, snapshot_path
+from core.password_audit import BreachedPasswordIndex
+from db.database import DB_PATH, DatabaseManager
+from util.metrics import metrics
+from util.paths import data_dir, state_dir
+from util.profiling import PROFILERS, ActionProfiler
 from util.setup_logger import setup_logger
 
 
@@ -9,21 +25,234 @@ def display_welcome_menu() -> str:
     print()
     print('1. Create an account')
     print('2. Sign into an account')
-    print('3. Exit the program')
+    print('3. Restore a deleted account')
+    print('4. Exit the program')
     print()
 
     while True:
-        choice = input('\nPlease select a choice (1-3): ').strip()
-        if choice in ['1', '2', '3']:
+        choice = input('\nPlease select a choice (1-4): ').strip()
+        if choice in ['1', '2', '3', '4']:
             return choice
         else:
-            print('Invalid choice. Please enter a number between 1 and 3.')
+            print('Invalid choice. Please enter a number between 1 and 4.')
+
+
+# Converts a local ISO date or time to epoch seconds
+def parse_local_time(value: str) -> int:
+    # Only the audit command needs this, so the interactive program doesn't load it
+    from datetime import datetime
+
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+COMMANDS: tuple[str, ...] = ('run', 'maintenance', 'backup', 'restore', 'verify', 'snapshots', 'lookup', 'audit')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Cosmicc password manager')
+    _ = parser.add_argument('command', nargs='?', choices=COMMANDS, default='run',
+                            help='run the password manager (default), or run one of the maintenance or backup commands and exit')
+    _ = parser.add_argument('--metrics-file', help='write metrics in Prometheus text format to this file on exit')
+    _ = parser.add_argument('--no-metrics', action='store_true', help='disable latency and counter metrics')
+    _ = parser.add_argument('--profile', choices=PROFILERS, help='profile each menu action with the given profiler')
+    _ = parser.add_argument('--profile-dir', default=os.path.join(state_dir(), 'profiles'),
+                            help='directory for profiler reports')
+    _ = parser.add_argument('--kdf', choices=KDFS, default=DEFAULT_KDF.name,
+                            help='key derivation for new accounts; existing accounts move to it on their next sign-in')
+    _ = parser.add_argument('--argon2-memory', type=int, default=65536, help='Argon2id memory in KiB')
+    _ = parser.add_argument('--argon2-iterations', type=int, default=3, help='Argon2id passes over its memory')
+    _ = parser.add_argument('--argon2-lanes', type=int, default=4,
+                            help='Argon2id lanes, which can be filled on separate cores')
+    _ = parser.add_argument('--kdf-workers', type=int, default=0,
+                            help='verify master passwords on this many worker processes (0 verifies inline)')
+    _ = parser.add_argument('--breach-index', default=os.path.join(data_dir(), 'breached.bin'),
+                            help='breached-password index used by the security report (see core/password_audit.py)')
+    _ = parser.add_argument('--history-keep', type=int, default=20,
+                            help='versions of each login kept in its history (pruned at startup)')
+    _ = parser.add_argument('--history-days', type=int, default=365,
+                            help='days a login\'s previous versions are kept (pruned at startup)')
+    _ = parser.add_argument('--trash-days', type=int, default=30,
+                            help='days deleted logins and accounts stay restorable before they are purged')
+    _ = parser.add_argument('--rotation-notice-days', type=int, default=ROTATION_NOTICE_DAYS,
+                            help='days ahead that passwords due for rotation are counted at sign-in')
+    _ = parser.add_argument('--vacuum-into', help='with maintenance, also write a compacted copy of the database here')
+    _ = parser.add_argument('--clipboard', choices=BACKENDS, default='auto',
+                            help='how looked-up passwords are copied (\'none\' prints them instead)')
+    _ = parser.add_argument('--clipboard-file', help='file used by the \'file\' clipboard backend')
+    _ = parser.add_argument('--clipboard-clear', type=float, default=CLEAR_AFTER,
+                            help='seconds before a copied password is cleared from the clipboard')
+    _ = parser.add_argument('--sync-remote', help='directory shared with other devices to sync logins through')
+    _ = parser.add_argument('--backup-dir', default=os.path.join(data_dir(), 'backups'),
+                            help='where backup snapshots and their chunks are stored')
+    _ = parser.add_argument('--snapshot', help='snapshot to restore or verify (defaults to the latest)')
+    _ = parser.add_argument('--lookup-snapshots', action='store_true',
+                            help='keep a read-only lookup snapshot of the signed-in user\'s logins for the lookup command')
+    _ = parser.add_argument('--lookup-dir', default=LOOKUP_DIR, help='where lookup snapshots are kept')
+    _ = parser.add_argument('--audit-dir', default=AUDIT_DIR, help='where the audit log is kept')
+    _ = parser.add_argument('--no-audit', action='store_true', help='don\'t record sign-ins and login access in the audit log')
+    _ = parser.add_argument('--user', help='with lookup, the account to read from; with audit, only show this account\'s events')
+    _ = parser.add_argument('--service', help='with lookup, the service name of the login')
+    _ = parser.add_argument('--account', help='with lookup, the username of the login when a service has several')
+    entries = parser.add_mutually_exclusive_group()
+    _ = entries.add_argument('--entry', type=int, help='with audit, only show events about the login with this id')
+    _ = entries.add_argument('--shared-entry', type=int, help='with audit, only show events about the shared collection entry with this id')
+    _ = parser.add_argument('--since', type=parse_local_time,
+                            help='with audit, only show events from this local date or time on (e.g. 2026-01-31 or 2026-01-31T09:00)')
+    _ = parser.add_argument('--until', type=parse_local_time, help='with audit, only show events before this local date or time')
+    _ = parser.add_argument('--limit', type=int, default=50, help='with audit, how many of the newest matching events to show')
+    return parser.parse_args()
+
+
+# Returns the KDF chosen on the command line
+def selected_kdf(args: argparse.Namespace) -> Kdf:
+    if args.kdf == 'argon2id':
+        return Argon2idKdf(args.argon2_memory, args.argon2_iterations, args.argon2_lanes)
+    return ScryptKdf()
+
+
+# Prints the password of one login from the user's lookup snapshot, without opening the database.
+# The master password is read from the terminal, or from the first line of stdin when piped
+def lookup_password(args: argparse.Namespace) -> int:
+    if args.user is None or args.service is None:
+        print('lookup needs --user and --service', file=sys.stderr)
+        return 2
+    path = snapshot_path(args.lookup_dir, args.user)
+    if not os.path.exists(path):
+        print(f'No lookup snapshot for {args.user} in {args.lookup_dir}; sign in once with --lookup-snapshots', file=sys.stderr)
+        return 1
+
+    password = getpass.getpass('Master password: ') if sys.stdin.isatty() else sys.stdin.readline().rstrip('\n')
+    encryption = EncryptionManager()
+    with LookupSnapshot(path) as snapshot:
+        key = snapshot.unlock(password, encryption)
+        if key is None:
+            print('Incorrect master password.', file=sys.stderr)
+            return 1
+        matches = snapshot.lookup(key, args.service)
+
+    if args.account is not None:
+        matches = [match for match in matches if match[0] == args.account]
+    if not matches:
+        print(f'No login for {args.service}', file=sys.stderr)
+        return 1
+    if len(matches) > 1:
+        usernames = ', '.join(username or 'N/A' for username, _ in matches)
+        print(f'{args.service} has several logins ({usernames}); pick one with --account', file=sys.stderr)
+        return 1
+
+    with encryption.decrypt_password(key, matches[0][1]) as decrypted:
+        _ = sys.stdout.write(decrypted.decode() + '\n')
+    return 0
+
+
+# Prints the newest audit events matching the filters, and how many matched in total
+def audit_report(args: argparse.Namespace) -> int:
+    db = DatabaseManager()
+    try:
+        user_id = None
+        if args.user is not None:
+            user = db.get_user_from_username(args.user)
+            if user is None:
+                print(f'No account named {args.user}', file=sys.stderr)
+                return 1
+            user_id = user.id
+
+        shared = args.shared_entry is not None
+        result = AuditLog(args.audit_dir).query(user_id, args.shared_entry if shared else args.entry, args.since, args.until, args.limit, shared)
+
+        usernames: dict[int, str] = {}
+        for record in result.records:
+            if record.user_id not in usernames:
+                user = db.get_user_from_user_id(record.user_id)
+                usernames[record.user_id] = user.username if user is not None else f'#{record.user_id}'
+            entry = ((' shared entry ' if record.event.value in SHARED_EVENTS else ' login ') + str(record.entry_id)) if record.entry_id else ''
+            print(f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.timestamp))}  '
+                  f'{usernames[record.user_id]}  {record.event.name.lower()}{entry}')
+        print(f'{result.total} matching events' + (f', newest {len(result.records)} shown' if len(result.records) < result.total else ''))
+        return 0
+    finally:
+        db.close()
+
+
+# Runs one of the non-interactive commands
+def run_command(args: argparse.Namespace) -> None:
+    if args.command == 'lookup':
+        sys.exit(lookup_password(args))
+    if args.command == 'audit':
+        sys.exit(audit_report(args))
+
+    # Only the commands need these, so the interactive program doesn't load them
+    from db.backup import create_snapshot, dedup_report, list_snapshots, restore_snapshot, verify_snapshot
+    from db.maintenance import print_report, run_maintenance
+
+    if args.command in ('restore', 'verify'):
+        snapshots = list_snapshots(args.backup_dir)
+        if not snapshots:
+            print(f'No snapshots in {args.backup_dir}')
+            return
+        name = args.snapshot or snapshots[-1]
+
+        if args.command == 'verify':
+            problems = verify_snapshot(args.backup_dir, name)
+            for problem in problems:
+                print(f'  {problem}')
+            print(f'Snapshot {name} is {"damaged" if problems else "intact"}')
+        else:
+            restore_snapshot(args.backup_dir, name, DB_PATH)
+            print(f'Restored snapshot {name} to {DB_PATH}')
+        return
+
+    if args.command == 'snapshots':
+        for name in list_snapshots(args.backup_dir):
+            print(name)
+        report = dedup_report(args.backup_dir)
+        print(f'{report.snapshots} snapshots totalling {report.logical_bytes} bytes stored in {report.stored_bytes} bytes '
+              f'({report.saved_bytes} saved by deduplication)')
+        return
+
+    db = DatabaseManager()
+    try:
+        match args.command:
+            case 'maintenance':
+                print_report(run_maintenance(db, args.trash_days, args.vacuum_into))
+            case 'backup':
+                result = create_snapshot(db, args.backup_dir)
+                print(f'Created snapshot {result.name} in {result.seconds:.2f}s: {result.size} bytes in {result.chunk_count} chunks, '
+                      f'{result.new_chunks} new ({result.new_bytes} bytes written)')
+    finally:
+        db.close()
 
 
 def main():
+    args = parse_args()
     setup_logger()
+    metrics.enabled = not args.no_metrics
+    profiler = ActionProfiler(args.profile, args.profile_dir) if args.profile else None
+
+    if args.command != 'run':
+        run_command(args)
+        return
+
+    try:
+        kdf = selected_kdf(args)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    kdf_pool = KdfPool(args.kdf_workers) if args.kdf_workers > 0 else None
+    breach_index = BreachedPasswordIndex(args.breach_index) if os.path.exists(args.breach_index) else None
+
+    backend = get_backend(args.clipboard, args.clipboard_file)
+    clipboard = Clipboard(backend, args.clipboard_clear) if backend is not None else None
+
     db = DatabaseManager()
-    user_handler = CLIHandler(db)
+    _ = db.prune_history(keep_last=args.history_keep, max_age_days=args.history_days)
+    _ = db.purge_trash(args.trash_days)
+    user_handler = CLIHandler(db, profiler=profiler, metrics_file=args.metrics_file, kdf_pool=kdf_pool,
+                              breach_index=breach_index, sync_remote=args.sync_remote, clipboard=clipboard,
+                              lookup_dir=args.lookup_dir if args.lookup_snapshots else None,
+                              audit_log=AuditLog(args.audit_dir) if not args.no_audit else None,
+                              rotation_notice_days=args.rotation_notice_days, kdf=kdf,
+                              trash_days=args.trash_days)
 
     try:
         while True:
@@ -43,13 +272,22 @@ def main():
                     if user_handler.signin():
                         user_handler.run()
                 case '3':
+                    _ = user_handler.restore_account()
+                case '4':
                     print('Have a nice day!')
                     break
                 case _:
                     pass
 
     finally:
+        user_handler.sign_out()
         db.close()
+        if kdf_pool is not None:
+            kdf_pool.shutdown()
+        if breach_index is not None:
+            breach_index.close()
+        if args.metrics_file is not None:
+            metrics.write_prometheus(args.metrics_file)
 
 
 if __name__ == '__main__':
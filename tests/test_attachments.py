@@ -0,0 +1,184 @@
+import io
+import os
+import tracemalloc
+
+import pytest
+
+from core.attachments import CHUNK_SIZE, CorruptAttachment, decrypt_chunks, encrypt_buffer, encrypt_chunks, new_nonce_prefix
+from core.data_models import User
+from core.secret_buffer import SecretBuffer
+from core.vault import Vault
+from db.database import DatabaseManager
+from util.enums import AttachmentKind, InsertStatus, RemoveStatus
+
+PASSWORD: str = 'TestPassword123!@#'
+
+KEY: bytes = bytes(range(32))
+
+
+# Decrypts every chunk and joins the plaintext
+def decrypt_all(nonce_prefix: bytes, chunks: list[bytes], chunk_size: int) -> bytes:
+    return b''.join(bytes(chunk) for chunk in decrypt_chunks(KEY, nonce_prefix, chunks, chunk_size))
+
+
+class TestChunkedEncryption:
+    # Test that files of every size relative to the chunk size round trip
+    @pytest.mark.parametrize('size', [0, 1, 1023, 1024, 1025, 4096, 5000])
+    def test_round_trip(self, size: int) -> None:
+        data = os.urandom(size)
+        nonce_prefix = new_nonce_prefix()
+
+        chunks = list(encrypt_chunks(KEY, nonce_prefix, io.BytesIO(data), size, chunk_size=1024))
+
+        assert len(chunks) == max(1, -(-size // 1024))
+        assert decrypt_all(nonce_prefix, chunks, 1024) == data
+        assert list(encrypt_buffer(KEY, nonce_prefix, data, chunk_size=1024)) == chunks
+
+    # Test that changed, reordered, dropped, truncated or extended chunks fail to authenticate
+    def test_tampering(self) -> None:
+        nonce_prefix = new_nonce_prefix()
+        chunks = list(encrypt_buffer(KEY, nonce_prefix, os.urandom(3000), chunk_size=1024))
+        flipped = bytearray(chunks[1])
+        flipped[0] ^= 1
+
+        for tampered in ([chunks[0], bytes(flipped), chunks[2]], [chunks[1], chunks[0], chunks[2]], [chunks[0], chunks[2]],
+                         chunks[:2], chunks + chunks[-1:], []):
+            with pytest.raises(CorruptAttachment):
+                _ = decrypt_all(nonce_prefix, tampered, 1024)
+        with pytest.raises(CorruptAttachment):
+            _ = decrypt_all(new_nonce_prefix(), chunks, 1024)
+
+    # Test that a file shorter than its recorded size is an error rather than a short attachment
+    def test_source_ends_early(self) -> None:
+        with pytest.raises(ValueError):
+            _ = list(encrypt_chunks(KEY, new_nonce_prefix(), io.BytesIO(b'short'), 100, chunk_size=16))
+
+
+# Create a vault with a user holding one login
+@pytest.fixture
+def vault_user():
+    db = DatabaseManager(':memory:')
+    vault = Vault(db)
+    _ = vault.create_user('testuser', PASSWORD)
+    user = db.get_user_from_username('testuser')
+    assert user is not None
+    _ = vault.add_login(user, 'Server', 'root', 'secret')
+    yield vault, user
+    db.close()
+
+
+class TestVaultAttachments:
+    # Test attaching a file and saving it back, with the file readable only by its owner
+    def test_file_round_trip(self, vault_user: tuple[Vault, User], tmp_path) -> None:
+        vault, user = vault_user
+        data = os.urandom(600_000)
+        (tmp_path / 'id_ed25519').write_bytes(data)
+
+        assert vault.add_attachment(user, 'Server', str(tmp_path / 'id_ed25519')) == InsertStatus.SUCCESS
+        entry_id = vault.database.get_logins_from_name(user.id, 'Server')[0].id
+        attachment = vault.database.get_attachments(user.id, entry_id)[0]
+        assert (attachment.kind, attachment.name, attachment.size) == (AttachmentKind.FILE, 'id_ed25519', len(data))
+        assert vault.database.conn.execute('SELECT COUNT(*) FROM attachment_chunks').fetchone()[0] == 3
+
+        assert vault.export_attachment(user, attachment, str(tmp_path / 'saved')) == InsertStatus.SUCCESS
+        assert (tmp_path / 'saved').read_bytes() == data
+        assert os.stat(tmp_path / 'saved').st_mode & 0o777 == 0o600
+
+    # Test that an attachment that fails to authenticate leaves neither the file nor a temporary file behind
+    def test_corrupt_export(self, vault_user: tuple[Vault, User], tmp_path) -> None:
+        vault, user = vault_user
+        (tmp_path / 'in').write_bytes(os.urandom(1000))
+        _ = vault.add_attachment(user, 'Server', str(tmp_path / 'in'))
+        attachment = vault.database.get_attachments(user.id, vault.database.get_logins_from_name(user.id, 'Server')[0].id)[0]
+        _ = vault.database.conn.execute('UPDATE attachment_chunks SET data = zeroblob(length(data))')
+
+        assert vault.export_attachment(user, attachment, str(tmp_path / 'out')) == InsertStatus.ERROR
+        assert sorted(os.listdir(tmp_path)) == ['in']
+
+    # Test that an attachment whose key doesn't unwrap fails cleanly, leaving no temporary file behind
+    def test_export_wrong_key(self, vault_user: tuple[Vault, User], tmp_path) -> None:
+        vault, user = vault_user
+        (tmp_path / 'in').write_bytes(os.urandom(1000))
+        _ = vault.add_attachment(user, 'Server', str(tmp_path / 'in'))
+        attachment = vault.database.get_attachments(user.id, vault.database.get_logins_from_name(user.id, 'Server')[0].id)[0]
+        attachment.wrapped_key = vault.encryption.wrap_key(vault.encryption.generate_key(), KEY)
+
+        assert vault.export_attachment(user, attachment, str(tmp_path / 'out')) == InsertStatus.ERROR
+        assert sorted(os.listdir(tmp_path)) == ['in']
+        with pytest.raises(CorruptAttachment):
+            _ = vault.read_note(user, attachment)
+
+    # Test that saving an attachment holds a few chunks in memory, however large the attachment
+    def test_export_memory(self, vault_user: tuple[Vault, User], tmp_path) -> None:
+        vault, user = vault_user
+        (tmp_path / 'large').write_bytes(os.urandom(8 * 1024 * 1024))
+        _ = vault.add_attachment(user, 'Server', str(tmp_path / 'large'))
+        attachment = vault.database.get_attachments(user.id, vault.database.get_logins_from_name(user.id, 'Server')[0].id)[0]
+
+        tracemalloc.start()
+        try:
+            assert vault.export_attachment(user, attachment, str(tmp_path / 'out')) == InsertStatus.SUCCESS
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert peak < 6 * attachment.chunk_size < attachment.size
+
+    # Test adding, reading and deleting a secure note
+    def test_note(self, vault_user: tuple[Vault, User]) -> None:
+        vault, user = vault_user
+        assert vault.add_note(user, 'Server', 'Recovery codes', 'abcd-efgh\nijkl-mnop') == InsertStatus.SUCCESS
+        note = vault.database.get_attachments(user.id, vault.database.get_logins_from_name(user.id, 'Server')[0].id)[0]
+        assert note.kind == AttachmentKind.NOTE
+
+        with vault.read_note(user, note) as text:
+            assert text.decode() == 'abcd-efgh\nijkl-mnop'
+
+        assert vault.remove_attachment(user, note) == RemoveStatus.SUCCESS
+        assert vault.database.conn.execute('SELECT COUNT(*) FROM attachment_chunks').fetchone()[0] == 0
+        assert vault.remove_attachment(user, note) == RemoveStatus.ERROR
+
+    # Test that a note that fails partway through is wiped rather than left half decrypted
+    def test_corrupt_note_wiped(self, vault_user: tuple[Vault, User], monkeypatch: pytest.MonkeyPatch) -> None:
+        vault, user = vault_user
+        _ = vault.add_note(user, 'Server', 'Long', 'a' * (CHUNK_SIZE + 100))
+        note = vault.database.get_attachments(user.id, vault.database.get_logins_from_name(user.id, 'Server')[0].id)[0]
+        _ = vault.database.conn.execute('UPDATE attachment_chunks SET data = zeroblob(length(data)) WHERE seq = 1')
+        buffers: list[SecretBuffer] = []
+
+        class RecordingBuffer(SecretBuffer):
+            def __init__(self, *args) -> None:
+                super().__init__(*args)
+                buffers.append(self)
+
+        monkeypatch.setattr('core.vault.SecretBuffer', RecordingBuffer)
+        with pytest.raises(CorruptAttachment):
+            _ = vault.read_note(user, note)
+
+        assert buffers and buffers[0] == bytes(note.size)
+
+    # Test that re-keying the vault re-wraps the attachment keys without rewriting the chunks
+    def test_rekey(self, vault_user: tuple[Vault, User]) -> None:
+        vault, user = vault_user
+        _ = vault.add_note(user, 'Server', 'PIN', '1234')
+        chunks_before = vault.database.conn.execute('SELECT data FROM attachment_chunks').fetchall()
+
+        new_salt, new_key = vault.encryption.hash_master_password('AnotherPassword456!@#', vault.kdf.spec)
+        rekeyed = vault.rekey(user, new_key, new_salt, vault.kdf.spec)
+        assert rekeyed is not None
+        note = vault.database.get_attachments(user.id, vault.database.get_logins_from_name(user.id, 'Server')[0].id)[0]
+
+        with vault.read_note(rekeyed, note) as text:
+            assert text.decode() == '1234'
+        assert vault.database.conn.execute('SELECT data FROM attachment_chunks').fetchall() == chunks_before
+
+    # Test that purging a login from the trash deletes its attachments and their chunks
+    def test_purged_with_login(self, vault_user: tuple[Vault, User], monkeypatch: pytest.MonkeyPatch) -> None:
+        vault, user = vault_user
+        _ = vault.add_note(user, 'Server', 'PIN', '1234')
+        monkeypatch.setattr('builtins.input', lambda _: 'yes')
+        assert vault.remove_login(user, 'Server') == RemoveStatus.SUCCESS
+
+        assert vault.database.purge_trash(-1) == (1, 0)
+        assert vault.database.conn.execute('SELECT COUNT(*) FROM attachments').fetchone()[0] == 0
+        assert vault.database.conn.execute('SELECT COUNT(*) FROM attachment_chunks').fetchone()[0] == 0
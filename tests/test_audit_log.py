@@ -0,0 +1,156 @@
+import os
+
+import pytest
+
+from core.audit_log import FLUSH_RECORDS, PARTITION_SECONDS, RECORD_SIZE, AuditLog
+from core.vault import Vault
+from db.database import DatabaseManager
+from util.enums import AuditEvent, InsertStatus, RemoveStatus
+
+PASSWORD: str = 'TestPassword123!@#'
+
+# Midnight UTC on 1 March 2026
+DAY: int = 1772323200
+
+
+class TestAuditLog:
+    # Test that events are buffered until flushed, then written as fixed-width records to one file per day
+    def test_partitions(self, tmp_path) -> None:
+        log = AuditLog(str(tmp_path))
+        log.record(AuditEvent.SIGN_IN, 1, timestamp=DAY + 10)
+        log.record(AuditEvent.REVEAL, 1, 7, timestamp=DAY + 20)
+        log.record(AuditEvent.DELETE, 2, 8, timestamp=DAY + PARTITION_SECONDS + 5)
+        assert os.listdir(tmp_path) == []
+
+        log.flush()
+
+        assert sorted(os.listdir(tmp_path)) == ['20260301.audit', '20260302.audit']
+        assert os.path.getsize(tmp_path / '20260301.audit') == 2 * RECORD_SIZE
+        assert os.stat(tmp_path / '20260301.audit').st_mode & 0o777 == 0o600
+        assert [day for day, _ in log.partitions()] == [DAY // PARTITION_SECONDS, DAY // PARTITION_SECONDS + 1]
+
+    # Test that a full buffer is written without waiting for a flush
+    def test_flushes_when_full(self, tmp_path) -> None:
+        log = AuditLog(str(tmp_path))
+        for i in range(FLUSH_RECORDS):
+            log.record(AuditEvent.REVEAL, 1, i, timestamp=DAY)
+
+        assert os.path.getsize(tmp_path / '20260301.audit') == FLUSH_RECORDS * RECORD_SIZE
+
+    # Test filtering by user, entry and time range, across partitions
+    def test_query_filters(self, tmp_path) -> None:
+        log = AuditLog(str(tmp_path))
+        for hour in range(72):
+            log.record(AuditEvent.REVEAL, hour % 3 + 1, hour % 5 + 1, timestamp=DAY + hour * 3600)
+
+        assert log.query().total == 72
+        assert log.query(user_id=1).total == 24
+        assert log.query(entry_id=2).total == 15
+        assert log.query(user_id=1, entry_id=1).total == 5
+        assert log.query(since=DAY + 12 * 3600, until=DAY + 36 * 3600).total == 24
+        assert log.query(since=DAY + PARTITION_SECONDS).total == 48
+        assert log.query(until=DAY + 1).total == 1
+        assert log.query(user_id=9).total == 0
+
+        result = log.query(user_id=2, since=DAY + 30 * 3600, until=DAY + 60 * 3600)
+        assert all(record.user_id == 2 and DAY + 30 * 3600 <= record.timestamp < DAY + 60 * 3600 for record in result.records)
+        assert result.total == len(result.records) == 10
+
+    # Test that a limited query counts every match but returns only the newest, oldest first
+    def test_query_limit(self, tmp_path) -> None:
+        log = AuditLog(str(tmp_path))
+        for hour in range(72):
+            log.record(AuditEvent.ADD, 1, hour + 1, timestamp=DAY + hour * 3600)
+
+        result = log.query(limit=30)
+
+        assert result.total == 72
+        assert [record.entry_id for record in result.records] == list(range(43, 73))
+        assert log.query(limit=0).records == []
+
+    # Test that a record cut short by an interrupted write is ignored
+    def test_partial_record(self, tmp_path) -> None:
+        log = AuditLog(str(tmp_path))
+        log.record(AuditEvent.SIGN_IN, 1, timestamp=DAY)
+        log.flush()
+        with open(tmp_path / '20260301.audit', 'ab') as f:
+            _ = f.write(b'\x01\x02\x03')
+
+        records = log.query().records
+
+        assert len(records) == 1
+        assert records[0].event == AuditEvent.SIGN_IN and records[0].entry_id == 0
+
+    # Test that a login and a shared collection entry with the same id are told apart
+    def test_shared_entries(self, tmp_path) -> None:
+        log = AuditLog(str(tmp_path))
+        log.record(AuditEvent.ADD, 1, 5, timestamp=DAY)
+        log.record(AuditEvent.SHARED_ADD, 1, 5, timestamp=DAY + 1)
+        log.record(AuditEvent.SHARED_REVEAL, 2, 5, timestamp=DAY + 2)
+
+        assert [record.event for record in log.query(entry_id=5).records] == [AuditEvent.ADD]
+        assert [record.event for record in log.query(entry_id=5, shared=True).records] == [AuditEvent.SHARED_ADD, AuditEvent.SHARED_REVEAL]
+        assert log.query(user_id=1).total == 2
+
+    # Test that a file in the directory that isn't a day's partition is skipped rather than breaking queries
+    def test_stray_file(self, tmp_path) -> None:
+        log = AuditLog(str(tmp_path))
+        log.record(AuditEvent.SIGN_IN, 1, timestamp=DAY)
+        log.flush()
+        (tmp_path / 'backup.audit').write_bytes(b'')
+
+        assert [day for day, _ in log.partitions()] == [DAY // PARTITION_SECONDS]
+        assert log.query().total == 1
+
+    # Test that a missing directory means an empty log
+    def test_empty(self, tmp_path) -> None:
+        log = AuditLog(str(tmp_path / 'missing'))
+
+        assert log.partitions() == []
+        assert log.query().total == 0
+
+
+class TestVaultAuditing:
+    # Test that adding, revealing, updating and deleting logins are recorded against the login
+    def test_vault_events(self, tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+        db = DatabaseManager(':memory:')
+        log = AuditLog(str(tmp_path))
+        vault = Vault(db, audit_log=log)
+        _ = vault.create_user('testuser', PASSWORD)
+        user = db.get_user_from_username('testuser')
+        assert user is not None
+
+        assert vault.add_login(user, 'GitHub', 'octocat', 'secret') == InsertStatus.SUCCESS
+        login = db.get_logins_from_name(user.id, 'GitHub')[0]
+        vault.get_login_information(user, 'GitHub')
+        assert vault.update_login(user, login, 'GitHub', 'octocat', 'new-secret') == InsertStatus.SUCCESS
+        monkeypatch.setattr('builtins.input', lambda _: 'yes')
+        assert vault.remove_login(user, 'GitHub') == RemoveStatus.SUCCESS
+        db.close()
+
+        records = log.query(user_id=user.id).records
+
+        assert [record.event for record in records] == [AuditEvent.ADD, AuditEvent.REVEAL, AuditEvent.UPDATE, AuditEvent.DELETE]
+        assert all(record.entry_id == login.id for record in records)
+
+    # Test that adding and revealing shared collection entries are recorded as shared events
+    def test_shared_events(self, tmp_path) -> None:
+        db = DatabaseManager(':memory:')
+        log = AuditLog(str(tmp_path))
+        vault = Vault(db, audit_log=log)
+        _ = vault.create_user('testuser', PASSWORD)
+        user = db.get_user_from_username('testuser')
+        assert user is not None
+        collection_id = vault.create_collection(user, 'Team')
+        assert collection_id is not None
+
+        assert vault.add_login(user, 'GitHub', 'octocat', 'secret') == InsertStatus.SUCCESS
+        assert vault.add_collection_login(user, collection_id, 'AWS', 'root', 'shared') == InsertStatus.SUCCESS
+        vault.list_visible_logins(user)
+        db.close()
+
+        login = log.query(entry_id=1).records
+        shared = log.query(entry_id=1, shared=True).records
+
+        assert [record.event for record in login] == [AuditEvent.ADD, AuditEvent.REVEAL]
+        assert [record.event for record in shared] == [AuditEvent.SHARED_ADD, AuditEvent.SHARED_REVEAL]
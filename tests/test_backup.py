@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from core.data_models import User
+from db.backup import create_snapshot, dedup_report, list_snapshots, restore_snapshot, verify_snapshot
+from db.database import DatabaseManager
+
+
+# File-backed database with a user and enough logins to span several chunks
+@pytest.fixture
+def db_with_logins(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'vault.db'))
+    _ = db.insert_user('testuser', b'test_hash', b'test_salt')
+    user = db.get_user_from_username('testuser')
+    _ = db.conn.executemany('INSERT INTO vault_entries (user_id, service_name, username, password_encrypted) VALUES (?, ?, ?, ?)',
+                            [(user.id, f'Service{i}', 'user', os.urandom(500)) for i in range(2000)])
+    db.conn.commit()
+    yield db, user
+    db.close()
+
+
+class TestSnapshots:
+    # Test that a snapshot restores to an identical, usable database
+    def test_snapshot_and_restore(self, db_with_logins: tuple[DatabaseManager, User], tmp_path) -> None:
+        db, user = db_with_logins
+        backup_dir = str(tmp_path / 'backups')
+
+        result = create_snapshot(db, backup_dir, pages_per_step=8)
+        restored_path = str(tmp_path / 'restored.db')
+        restore_snapshot(backup_dir, result.name, restored_path)
+        restored = DatabaseManager(restored_path)
+
+        assert list_snapshots(backup_dir) == [result.name]
+        assert result.new_chunks == result.chunk_count
+        assert len(restored.get_user_logins(user.id)) == 2000
+        restored.close()
+
+    # Test that unchanged chunks are stored once across snapshots
+    def test_deduplication(self, db_with_logins: tuple[DatabaseManager, User], tmp_path) -> None:
+        db, user = db_with_logins
+        backup_dir = str(tmp_path / 'backups')
+
+        first = create_snapshot(db, backup_dir)
+        _ = db.insert_login(user.id, 'NewService', 'user', b'pass')
+        second = create_snapshot(db, backup_dir)
+        report = dedup_report(backup_dir)
+
+        assert second.new_chunks < second.chunk_count
+        assert report.snapshots == 2
+        assert report.logical_bytes == first.size + second.size
+        assert report.stored_bytes == first.new_bytes + second.new_bytes
+        assert report.saved_bytes > 0
+
+    # Test that verification reports missing and corrupt chunks
+    def test_verify(self, db_with_logins: tuple[DatabaseManager, User], tmp_path) -> None:
+        db, user = db_with_logins
+        backup_dir = str(tmp_path / 'backups')
+        result = create_snapshot(db, backup_dir)
+
+        assert verify_snapshot(backup_dir, result.name) == []
+
+        chunk_files = sorted(os.path.join(root, f) for root, _, files in os.walk(os.path.join(backup_dir, 'chunks')) for f in files)
+        with open(chunk_files[0], 'r+b') as f:
+            _ = f.write(b'corrupt')
+        os.remove(chunk_files[1])
+
+        problems = verify_snapshot(backup_dir, result.name)
+        assert len(problems) == 2
+        with pytest.raises((ValueError, FileNotFoundError)):
+            restore_snapshot(backup_dir, result.name, str(tmp_path / 'restored.db'))
+        assert not os.path.exists(tmp_path / 'restored.db')
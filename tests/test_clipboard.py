@@ -0,0 +1,47 @@
+import io
+import time
+
+from core.clipboard import Clipboard, FileBackend, Osc52Backend
+
+
+class TestClipboard:
+    # Test that a copied secret is cleared after the delay
+    def test_auto_clear(self, tmp_path) -> None:
+        backend = FileBackend(str(tmp_path / 'clipboard.txt'))
+        clipboard = Clipboard(backend, clear_after=0.05)
+
+        assert clipboard.copy('hunter2')
+        assert backend.read() == 'hunter2'
+
+        time.sleep(0.3)
+        assert backend.read() == ''
+
+    # Test that copying again restarts the countdown
+    def test_copy_restarts_timer(self, tmp_path) -> None:
+        backend = FileBackend(str(tmp_path / 'clipboard.txt'))
+        clipboard = Clipboard(backend, clear_after=0.2)
+
+        _ = clipboard.copy('first')
+        time.sleep(0.1)
+        _ = clipboard.copy('second')
+        time.sleep(0.15)
+
+        assert backend.read() == 'second'
+        clipboard.clear()
+        assert backend.read() == ''
+
+    # Test that clearing without a copy leaves the clipboard alone
+    def test_clear_without_copy(self, tmp_path) -> None:
+        backend = FileBackend(str(tmp_path / 'clipboard.txt'))
+        backend.copy('user data')
+
+        Clipboard(backend).clear()
+
+        assert backend.read() == 'user data'
+
+    # Test the OSC 52 escape sequence
+    def test_osc52(self) -> None:
+        stream = io.StringIO()
+        Osc52Backend(stream).copy('hunter2')
+
+        assert stream.getvalue() == '\x1b]52;c;aHVudGVyMg==\x07'
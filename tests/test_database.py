@@ -1,8 +1,15 @@
+import shutil
+import sqlite3
+import time
+
 import pytest
 
 from core.data_models import User
 from db.database import DatabaseManager
-from util.enums import InsertStatus
+from db.maintenance import run_maintenance
+from db.migrations import SCHEMA_VERSION
+from db.statements import STATEMENTS
+from util.enums import HistoryField, InsertStatus, RemoveStatus
 
 
 # Create a temporary in-memory database for testing
@@ -234,3 +241,418 @@ class TestDatabaseUtilities:
         _ = db.insert_login(user.id, 'Service2', 'user2', b'pass2')
         logins = db.get_user_logins(user.id)
         assert len(logins) == 2
+
+    # Test retrieving a user by id
+    def test_get_user_from_user_id(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        found = db.get_user_from_user_id(user.id)
+
+        assert found is not None
+        assert found.username == 'testuser'
+
+
+class TestStatementStats:
+    # Test that each registered statement is counted when it runs
+    def test_stats_count_statements(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        db.stats.reset()
+
+        _ = db.get_logins_from_name(user.id, 'GitHub')
+        _ = db.get_logins_from_name(user.id, 'Gmail')
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass')
+
+        snapshot = db.stats.snapshot()
+        assert snapshot['select_logins_by_name'][0] == 2
+        assert snapshot['insert_login'][0] == 1
+        assert snapshot['select_logins_by_name'][1] >= 0
+
+    # Test that results from one query survive another query running in between
+    def test_interleaved_queries(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'user1', b'pass1')
+        _ = db.insert_login(user.id, 'Gmail', 'user2', b'pass2')
+
+        for login in db.get_user_logins(user.id):
+            matches = db.get_logins_from_name(user.id, login.service_name)
+            assert len(matches) == 1
+
+
+class TestUserCache:
+    # Test that repeated lookups are served from the cache
+    def test_cached_lookup(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        db.stats.reset()
+
+        first = db.get_user_from_username('testuser')
+        second = db.get_user_from_username('testuser')
+
+        assert first == second
+        assert 'select_user_by_username' not in db.stats.snapshot()
+
+    # Test that callers cannot mutate the cached record
+    def test_cached_user_is_copy(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        cached = db.get_user_from_username('testuser')
+        assert cached is not None
+        cached.username = 'changed'
+
+        again = db.get_user_from_username('testuser')
+        assert again is not None
+        assert again.username == 'testuser'
+
+    # Test that renaming a user invalidates the old username
+    def test_update_username_invalidates(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.update_username(user.id, 'renamed')
+
+        assert db.get_user_from_username('testuser') is None
+        assert db.get_user_from_username('renamed') is not None
+
+    # Test that deleting a user invalidates the cache
+    def test_delete_user_invalidates(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.delete_user(user.id)
+
+        assert db.get_user_from_username('testuser') is None
+
+    # Test that separate in-memory databases don't share cached users
+    def test_in_memory_databases_isolated(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        other = DatabaseManager(':memory:')
+
+        assert other.get_user_from_username('testuser') is None
+        other.close()
+
+
+class TestMigrations:
+    # Test that new databases start at the latest schema version
+    def test_new_database_version(self, db: DatabaseManager) -> None:
+        assert db.conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+
+    # Test that a database created with the original schema is upgraded on open
+    def test_migrate_original_schema(self, tmp_path) -> None:
+        path = tmp_path / 'vault.db'
+        shutil.copy('data/vault.db', path)
+        assert sqlite3.connect(path).execute('PRAGMA user_version').fetchone()[0] == 0
+
+        db = DatabaseManager(str(path))
+        columns = [row[1] for row in db.conn.execute('PRAGMA table_info(vault_entries)')]
+
+        assert db.conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        assert 'password_fingerprint' in columns
+        assert 'folder_id' in columns
+        assert 'expires_at' in columns
+        assert 'kdf' in [row[1] for row in db.conn.execute('PRAGMA table_info(users)')]
+        assert db.conn.execute('SELECT COUNT(*) FROM attachment_chunks').fetchone()[0] == 0
+        assert db.conn.execute('SELECT COUNT(*) FROM entry_fields').fetchone()[0] == 0
+        assert db.conn.execute('SELECT COUNT(*) FROM vault_entries WHERE uid IS NULL').fetchone()[0] == 0
+        db.close()
+
+
+class TestPasswordFingerprints:
+    # Test counting logins that share a fingerprint
+    def test_count_password_fingerprint(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'a', b'pass1', b'fp1')
+        _ = db.insert_login(user.id, 'Gmail', 'b', b'pass2', b'fp1')
+        _ = db.insert_login(user.id, 'Bank', 'c', b'pass3', b'fp2')
+
+        assert db.count_password_fingerprint(user.id, b'fp1') == 2
+        assert db.count_password_fingerprint(user.id, b'fp3') == 0
+
+    # Test grouping logins that share a password
+    def test_get_password_reuse_groups(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'a', b'pass1', b'fp1')
+        _ = db.insert_login(user.id, 'Gmail', 'b', b'pass2', b'fp1')
+        _ = db.insert_login(user.id, 'Bank', 'c', b'pass3', b'fp2')
+        _ = db.insert_login(user.id, 'Old', 'd', b'pass4')
+
+        groups = db.get_password_reuse_groups(user.id)
+
+        assert len(groups) == 1
+        assert sorted(groups[0]) == ['GitHub', 'Gmail']
+
+
+class TestLoginHistory:
+    # Test that an update stores only the previous values of changed fields
+    def test_update_login_stores_delta(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'old_user', b'pass1', b'fp1')
+        entry_id = db.get_user_logins(user.id)[0].id
+
+        status = db.update_login(user.id, entry_id, 'GitHub', 'new_user')
+        history = db.get_login_history(user.id, entry_id)
+
+        assert status == InsertStatus.SUCCESS
+        assert db.get_user_logins(user.id)[0].username == 'new_user'
+        assert len(history) == 1
+        assert history[0].changed_fields == HistoryField.USERNAME
+        assert history[0].username == 'old_user'
+        assert history[0].service_name is None
+        assert history[0].password_encrypted is None
+
+    # Test that an update with no changes writes no history
+    def test_update_login_unchanged(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass1')
+        entry_id = db.get_user_logins(user.id)[0].id
+
+        assert db.update_login(user.id, entry_id, 'GitHub', 'user') == InsertStatus.SUCCESS
+        assert db.get_login_history(user.id, entry_id) == []
+
+    # Test that another user's login can't be updated
+    def test_update_login_wrong_user(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass1')
+        entry_id = db.get_user_logins(user.id)[0].id
+
+        assert db.update_login(user.id + 1, entry_id, 'Stolen', 'user') == InsertStatus.ERROR
+        assert db.get_user_logins(user.id)[0].service_name == 'GitHub'
+
+    # Test pruning down to the newest versions of each login in small batches
+    def test_prune_history_keep_last(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass1')
+        entry_id = db.get_user_logins(user.id)[0].id
+        for i in range(10):
+            _ = db.update_login(user.id, entry_id, 'GitHub', f'user{i}')
+
+        removed = db.prune_history(keep_last=3, batch_size=2)
+        history = db.get_login_history(user.id, entry_id)
+
+        assert removed == 7
+        assert [change.username for change in history] == ['user8', 'user7', 'user6']
+
+    # Test pruning versions older than the retention window
+    def test_prune_history_max_age(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass1')
+        entry_id = db.get_user_logins(user.id)[0].id
+        _ = db.update_login(user.id, entry_id, 'GitHub', 'user1')
+        _ = db.update_login(user.id, entry_id, 'GitHub', 'user2')
+        _ = db.conn.execute('UPDATE vault_entry_history SET changed_at = 0 WHERE username = ?', ('user',))
+
+        assert db.prune_history(max_age_days=30) == 1
+        assert [change.username for change in db.get_login_history(user.id, entry_id)] == ['user1']
+
+
+class TestTrash:
+    # Test that a deleted login is hidden and can be restored
+    def test_delete_and_restore_login(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass1')
+        entry_id = db.get_user_logins(user.id)[0].id
+
+        _ = db.delete_login(entry_id)
+        assert db.get_user_logins(user.id) == []
+        assert [entry.id for entry in db.get_trash(user.id)] == [entry_id]
+
+        assert db.restore_login(user.id, entry_id) == InsertStatus.SUCCESS
+        assert len(db.get_user_logins(user.id)) == 1
+        assert db.get_trash(user.id) == []
+        assert db.restore_login(user.id, entry_id) == InsertStatus.ERROR
+
+    # Test that only logins past the retention period are purged, with their history
+    def test_purge_trash(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass1')
+        _ = db.insert_login(user.id, 'Gmail', 'user', b'pass2')
+        old, recent = [login.id for login in db.get_user_logins(user.id)]
+        _ = db.update_login(user.id, old, 'GitHub', 'user2')
+        _ = db.delete_login(old)
+        _ = db.delete_login(recent)
+        _ = db.conn.execute('UPDATE vault_entries SET deleted_at = 0 WHERE id = ?', (old,))
+
+        assert db.purge_trash(30, batch_size=1) == (1, 0)
+        assert [entry.id for entry in db.get_trash(user.id)] == [recent]
+        assert db.conn.execute('SELECT COUNT(*) FROM vault_entry_history').fetchone()[0] == 0
+
+    # Test that a deleted account's username can be registered again
+    def test_reuse_deleted_username(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass1')
+        _ = db.delete_user(user.id)
+
+        assert db.get_user_from_username('testuser') is None
+        assert db.insert_user('testuser', b'new_hash', b'new_salt') == InsertStatus.SUCCESS
+        assert db.conn.execute('SELECT COUNT(*) FROM vault_entries').fetchone()[0] == 0
+
+    # Test that maintenance purges expired accounts and gives their pages back
+    def test_run_maintenance(self, tmp_path) -> None:
+        db = DatabaseManager(str(tmp_path / 'vault.db'))
+        _ = db.insert_user('churned', b'hash', b'salt')
+        user = db.get_user_from_username('churned')
+        assert user is not None
+        for i in range(500):
+            _ = db.insert_login(user.id, f'Service{i}', 'user', b'x' * 1000)
+        _ = db.delete_user(user.id)
+        _ = db.conn.execute('UPDATE users SET deleted_at = 0')
+        _ = db.conn.execute('UPDATE vault_entries SET deleted_at = 0')
+        db.conn.commit()
+
+        report = run_maintenance(db, 30, vacuum_into=str(tmp_path / 'compact.db'))
+
+        assert (report.purged_logins, report.purged_users) == (500, 1)
+        assert report.reclaimed_bytes > 400_000
+        assert report.vacuum_into_size is not None and report.vacuum_into_size < report.size_before
+        assert [name for name, _ in report.timings] == ['purge trash', 'vacuum', 'analyze', 'optimize', 'vacuum into']
+        db.close()
+
+
+class TestTagsAndFolders:
+    # Test filtering by tag, folder and name prefix, alone and combined
+    def test_filter_logins(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        for name in ('GitHub', 'gitlab', 'Gmail', 'Bank'):
+            _ = db.insert_login(user.id, name, 'user', b'pass')
+        ids = {login.service_name: login.id for login in db.get_user_logins(user.id)}
+        _ = db.add_login_tags(user.id, ids['GitHub'], ['work', 'dev'])
+        _ = db.add_login_tags(user.id, ids['gitlab'], ['dev'])
+        _ = db.add_login_tags(user.id, ids['Bank'], ['Work'])
+        _ = db.set_login_folder(user.id, ids['GitHub'], 'Code')
+        _ = db.set_login_folder(user.id, ids['Gmail'], 'code')
+
+        def names(**filters) -> list[str]:
+            return [login.service_name for login in db.filter_logins(user.id, **filters)]
+
+        assert names() == ['Bank', 'GitHub', 'gitlab', 'Gmail']
+        assert names(tag='WORK') == ['Bank', 'GitHub']
+        assert names(folder='code') == ['GitHub', 'Gmail']
+        assert names(prefix='Git') == ['GitHub', 'gitlab']
+        assert names(tag='dev', prefix='gitl') == ['gitlab']
+        assert names(tag='dev', folder='Code') == ['GitHub']
+        assert names(tag='work', folder='code', prefix='g') == ['GitHub']
+        assert names(tag='missing') == []
+
+    # Test that one user can't tag or file another user's logins, or see their tags
+    def test_tags_are_per_user(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_user('other', b'hash', b'salt')
+        other = db.get_user_from_username('other')
+        assert other is not None
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass')
+        entry_id = db.get_user_logins(user.id)[0].id
+
+        assert db.add_login_tags(other.id, entry_id, ['mine']) == InsertStatus.ERROR
+        assert db.set_login_folder(other.id, entry_id, 'Stolen') == InsertStatus.ERROR
+        _ = db.add_login_tags(user.id, entry_id, ['work'])
+        assert db.filter_logins(other.id, tag='work') == []
+        assert db.get_user_tags(other.id) == []
+        assert db.get_user_folders(other.id) == []
+
+    # Test that removing the last use of a tag or folder removes it, and deleted logins drop out of filters
+    def test_remove_and_delete(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass')
+        _ = db.insert_login(user.id, 'Gmail', 'user', b'pass')
+        github, gmail = (login.id for login in db.get_user_logins(user.id))
+        _ = db.add_login_tags(user.id, github, ['work'])
+        _ = db.add_login_tags(user.id, gmail, ['work', 'mail'])
+        _ = db.set_login_folder(user.id, gmail, 'Personal')
+
+        assert db.remove_login_tag(user.id, gmail, 'mail') == RemoveStatus.SUCCESS
+        assert db.remove_login_tag(user.id, gmail, 'mail') == RemoveStatus.ERROR
+        assert db.get_user_tags(user.id) == [('work', 2)]
+        assert db.get_login_tags(user.id, gmail) == ['work']
+
+        _ = db.delete_login(gmail)
+        assert [login.id for login in db.filter_logins(user.id, tag='work')] == [github]
+        assert db.get_user_folders(user.id) == []
+
+        _ = db.restore_login(user.id, gmail)
+        assert db.get_user_folders(user.id) == [('Personal', 1)]
+        assert db.set_login_folder(user.id, gmail, None) == InsertStatus.SUCCESS
+        assert db.get_user_folders(user.id) == []
+        assert db.conn.execute('SELECT COUNT(*) FROM folders').fetchone()[0] == 0
+
+    # Test that the tags of many logins come back grouped by login in one query
+    def test_tags_by_login(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, user = db_with_user
+        for name in ('GitHub', 'Gmail', 'Slack'):
+            _ = db.insert_login(user.id, name, 'user', b'pass')
+        github, gmail, slack = (login.id for login in db.get_user_logins(user.id))
+        _ = db.add_login_tags(user.id, github, ['work', 'dev'])
+        _ = db.add_login_tags(user.id, slack, ['work'])
+        db.stats.reset()
+
+        assert db.get_tags_by_login(user.id, [github, gmail, slack]) == {github: ['dev', 'work'], slack: ['work']}
+        assert db.stats.snapshot()['select_tags_by_login'][0] == 1
+        assert db.get_tags_by_login(user.id + 1, [github]) == {}
+        assert db.get_tags_by_login(user.id, []) == {}
+
+    # Test that tag and folder filters use indexes rather than scanning the vault
+    def test_filter_query_plans(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, _ = db_with_user
+        for name, sql in STATEMENTS.items():
+            if name.startswith('filter_logins'):
+                plan = ' '.join(row[3] for row in db.conn.execute(f'EXPLAIN QUERY PLAN {sql}', (1,) * sql.count('?')))
+                assert 'SCAN' not in plan, name
+        sql = STATEMENTS['select_tags_by_login']
+        plan = ' '.join(row[3] for row in db.conn.execute(f'EXPLAIN QUERY PLAN {sql}', ('[1]', 1)))
+        assert 'SCAN et' not in plan and 'SCAN t ' not in plan
+
+
+class TestRotation:
+    # Test that logins record when they were created and when their password last changed
+    def test_login_dates(self, db_with_user: tuple[DatabaseManager, User], monkeypatch: pytest.MonkeyPatch) -> None:
+        db, user = db_with_user
+        monkeypatch.setattr(time, 'time', lambda: 1_000_000)
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass1')
+        entry_id = db.get_user_logins(user.id)[0].id
+
+        monkeypatch.setattr(time, 'time', lambda: 2_000_000)
+        _ = db.update_login(user.id, entry_id, 'GitHub', 'renamed')
+        dates = db.get_login_dates(user.id, entry_id)
+        assert dates is not None and (dates.created_at, dates.updated_at) == (1_000_000, 1_000_000)
+
+        _ = db.update_login(user.id, entry_id, 'GitHub', 'renamed', b'pass2')
+        dates = db.get_login_dates(user.id, entry_id)
+        assert dates is not None and (dates.created_at, dates.updated_at, dates.expires_at) == (1_000_000, 2_000_000, None)
+
+    # Test that a policy sets the due date from the last change, and a new password restarts it
+    def test_rotation_policy(self, db_with_user: tuple[DatabaseManager, User], monkeypatch: pytest.MonkeyPatch) -> None:
+        db, user = db_with_user
+        monkeypatch.setattr(time, 'time', lambda: 1_000_000)
+        _ = db.insert_login(user.id, 'GitHub', 'user', b'pass1')
+        entry_id = db.get_user_logins(user.id)[0].id
+
+        assert db.set_rotation_policy(user.id, entry_id, 30) == InsertStatus.SUCCESS
+        dates = db.get_login_dates(user.id, entry_id)
+        assert dates is not None and (dates.rotation_days, dates.expires_at) == (30, 1_000_000 + 30 * 86400)
+
+        monkeypatch.setattr(time, 'time', lambda: 5_000_000)
+        _ = db.update_login(user.id, entry_id, 'GitHub', 'user', b'pass2')
+        dates = db.get_login_dates(user.id, entry_id)
+        assert dates is not None and dates.expires_at == 5_000_000 + 30 * 86400
+
+        assert db.set_rotation_policy(user.id, entry_id, None) == InsertStatus.SUCCESS
+        dates = db.get_login_dates(user.id, entry_id)
+        assert dates is not None and (dates.rotation_days, dates.expires_at) == (None, None)
+        assert db.set_rotation_policy(user.id, entry_id + 1, 30) == InsertStatus.ERROR
+
+    # Test listing and counting due logins, which leave out trashed ones
+    def test_due_logins(self, db_with_user: tuple[DatabaseManager, User], monkeypatch: pytest.MonkeyPatch) -> None:
+        db, user = db_with_user
+        monkeypatch.setattr(time, 'time', lambda: 0)
+        for name in ('A', 'B', 'C', 'D', 'E'):
+            _ = db.insert_login(user.id, name, 'user', b'pass')
+        ids = {login.service_name: login.id for login in db.get_user_logins(user.id)}
+        for name, days in (('A', 30), ('B', 10), ('C', 60), ('D', 5)):
+            _ = db.set_rotation_policy(user.id, ids[name], days)
+        _ = db.delete_login(ids['D'])
+
+        now = 20 * 86400
+        assert [login.service_name for login in db.get_due_logins(user.id, now + 14 * 86400)] == ['B', 'A']
+        assert db.count_due_logins(user.id, now + 14 * 86400, now) == (2, 1)
+        assert db.count_due_logins(user.id, now + 100 * 86400, now) == (3, 1)
+        assert db.count_due_logins(user.id, 0, now) == (0, 0)
+
+    # Test that the due-date queries are answered from the index, the count without reading the table
+    def test_due_queries_use_index(self, db_with_user: tuple[DatabaseManager, User]) -> None:
+        db, _ = db_with_user
+        count_plan = ' '.join(row[3] for row in db.conn.execute(f'EXPLAIN QUERY PLAN {STATEMENTS["count_due_logins"]}', (1, 1, 1)))
+        list_plan = ' '.join(row[3] for row in db.conn.execute(f'EXPLAIN QUERY PLAN {STATEMENTS["select_due_logins"]}', (1, 1)))
+
+        assert 'COVERING INDEX idx_vault_entries_expires' in count_plan
+        assert 'idx_vault_entries_expires' in list_plan and 'TEMP B-TREE' not in list_plan
+
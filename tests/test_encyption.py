@@ -1,6 +1,11 @@
+import base64
+
 import pytest
+from cryptography.fernet import Fernet, InvalidToken
 
 from core.encryption import EncryptionManager
+from core.kdf_pool import KdfPool
+from core.secret_buffer import SecretBuffer
 
 
 # Create an EncryptionManager instance for testing
@@ -128,3 +133,46 @@ def test_verify_with_empty_password(encryption: EncryptionManager) -> None:
     result = encryption.vertify_master_password(password, salt, stored_hash)
 
     assert result is True
+
+# Test verifying master passwords on a worker process pool
+def test_kdf_pool_verify(encryption: EncryptionManager) -> None:
+    salt, stored_hash = encryption.hash_master_password('pool_password')
+    pool = KdfPool(workers=2)
+    try:
+        assert pool.verify('pool_password', salt, stored_hash) is True
+        assert pool.verify_many([
+            ('pool_password', salt, stored_hash),
+            ('wrong_password', salt, stored_hash),
+        ]) == [True, False]
+    finally:
+        pool.shutdown()
+
+# Test that tokens stay interchangeable with cryptography's Fernet, so existing vaults still decrypt
+@pytest.mark.parametrize('password', ['', 'a', 'sixteen byte pwd', 'seventeen byte pw', 'pässwörd'])
+def test_tokens_match_fernet(encryption: EncryptionManager, password: str) -> None:
+    key = encryption.generate_key()
+    fernet = Fernet(base64.urlsafe_b64encode(key))
+
+    assert fernet.decrypt(encryption.encrypt_password(key, password)) == password.encode()
+    assert encryption.decrypt_password(key, fernet.encrypt(password.encode())).decode() == password
+
+# Test that a tampered or malformed token is rejected
+def test_decrypt_tampered_token(encryption: EncryptionManager) -> None:
+    key = encryption.generate_key()
+    data = bytearray(base64.urlsafe_b64decode(encryption.encrypt_password(key, 'secret')))
+    data[30] ^= 1
+
+    with pytest.raises(InvalidToken):
+        _ = encryption.decrypt_password(key, base64.urlsafe_b64encode(data))
+    with pytest.raises(InvalidToken):
+        _ = encryption.decrypt_password(key, b'not a token')
+
+# Test that passwords decrypt into a buffer that can be wiped, and that buffers encrypt directly
+def test_decrypt_into_secret_buffer(encryption: EncryptionManager) -> None:
+    key = SecretBuffer(encryption.generate_key())
+    token = encryption.encrypt_password(key, SecretBuffer.from_str('buffered'))
+
+    with encryption.decrypt_password(key, token) as password:
+        assert isinstance(password, SecretBuffer)
+        assert password == b'buffered'
+    assert password == bytes(len('buffered'))
@@ -0,0 +1,126 @@
+from unittest.mock import patch
+
+import pytest
+
+from core.data_models import User
+from core.vault import Vault
+from db.database import DatabaseManager
+from db.statements import STATEMENTS
+from util.enums import FieldKind, InsertStatus, RemoveStatus
+
+PASSWORD: str = 'TestPassword123!@#'
+
+
+# Create a vault with a user holding two logins
+@pytest.fixture
+def vault_user():
+    db = DatabaseManager(':memory:')
+    vault = Vault(db)
+    _ = vault.create_user('testuser', PASSWORD)
+    user = db.get_user_from_username('testuser')
+    assert user is not None
+    _ = vault.add_login(user, 'Bank', 'jane', 'secret')
+    _ = vault.add_login(user, 'GitHub', 'octocat', 'hunter2')
+    yield vault, user
+    db.close()
+
+
+class TestFieldStorage:
+    # Test adding, replacing, reading (ignoring case) and removing a field
+    def test_set_get_remove(self, vault_user: tuple[Vault, User]) -> None:
+        vault, user = vault_user
+        db = vault.database
+        entry_id = db.get_logins_from_name(user.id, 'Bank')[0].id
+
+        assert db.set_login_field(user.id, entry_id, 'PIN', FieldKind.HIDDEN, b'one') == InsertStatus.SUCCESS
+        assert db.set_login_field(user.id, entry_id, 'pin', FieldKind.HIDDEN, b'two') == InsertStatus.SUCCESS
+        field = db.get_login_field(user.id, entry_id, 'Pin')
+        assert field is not None
+        assert (field.name, field.kind, field.value_encrypted) == ('PIN', FieldKind.HIDDEN, b'two')
+        assert db.conn.execute('SELECT COUNT(*) FROM entry_fields').fetchone()[0] == 1
+
+        assert db.remove_login_field(user.id, entry_id, 'PIN') == RemoveStatus.SUCCESS
+        assert db.get_login_field(user.id, entry_id, 'PIN') is None
+        assert db.remove_login_field(user.id, entry_id, 'PIN') == RemoveStatus.ERROR
+
+    # Test that the fields of many logins come back grouped by login, in the order they were added
+    def test_get_login_fields(self, vault_user: tuple[Vault, User]) -> None:
+        vault, user = vault_user
+        db = vault.database
+        bank, github = (db.get_logins_from_name(user.id, name)[0].id for name in ('Bank', 'GitHub'))
+        _ = db.set_login_field(user.id, github, 'URL', FieldKind.TEXT, b'a')
+        _ = db.set_login_field(user.id, bank, 'URL', FieldKind.TEXT, b'b')
+        _ = db.set_login_field(user.id, bank, 'PIN', FieldKind.HIDDEN, b'c')
+
+        fields = db.get_login_fields(user.id, [bank, github, 999])
+
+        assert {entry_id: [field.name for field in entry_fields] for entry_id, entry_fields in fields.items()} == {
+            bank: ['URL', 'PIN'], github: ['URL']}
+        assert db.get_login_fields(user.id + 1, [bank, github]) == {}
+        assert db.get_login_fields(user.id, []) == {}
+
+    # Test that field lookups use indexes rather than scanning the table
+    def test_query_plans(self, vault_user: tuple[Vault, User]) -> None:
+        vault, _ = vault_user
+        for name in ('select_field', 'select_login_fields', 'delete_field', 'select_field_secrets'):
+            sql = STATEMENTS[name]
+            plan = ' '.join(row[3] for row in vault.database.conn.execute(f'EXPLAIN QUERY PLAN {sql}', (1,) * sql.count('?')))
+            assert 'SCAN f ' not in plan and 'SCAN entry_fields' not in plan, name
+
+
+class TestVaultFields:
+    # Test that listing logins fetches every login's fields in one query and decrypts only the text ones
+    def test_list_decrypts_text_fields(self, vault_user: tuple[Vault, User], capsys: pytest.CaptureFixture[str]) -> None:
+        vault, user = vault_user
+        _ = vault.set_login_field(user, 'Bank', 'URL', 'https://bank.example')
+        _ = vault.set_login_field(user, 'Bank', 'PIN', '4321', FieldKind.HIDDEN)
+        _ = vault.set_login_field(user, 'GitHub', 'Recovery', 'abcd-efgh', FieldKind.HIDDEN)
+        _ = capsys.readouterr()
+        vault.database.stats.reset()
+
+        with patch.object(vault.encryption, 'decrypt_password', wraps=vault.encryption.decrypt_password) as decrypt:
+            vault.list_logins(user)
+
+        output = capsys.readouterr().out
+        assert 'URL: https://bank.example' in output and 'PIN: (hidden)' in output
+        assert '4321' not in output and 'abcd-efgh' not in output
+        # The two passwords and the one text field
+        assert decrypt.call_count == 3
+        assert vault.database.stats.snapshot()['select_login_fields'][0] == 1
+
+    # Test that showing a field decrypts that field alone, and copies it instead when there is a clipboard
+    def test_show_field(self, vault_user: tuple[Vault, User], capsys: pytest.CaptureFixture[str]) -> None:
+        vault, user = vault_user
+        _ = vault.set_login_field(user, 'Bank', 'URL', 'https://bank.example')
+        _ = vault.set_login_field(user, 'Bank', 'PIN', '4321', FieldKind.HIDDEN)
+        _ = capsys.readouterr()
+
+        with patch.object(vault.encryption, 'decrypt_password', wraps=vault.encryption.decrypt_password) as decrypt:
+            assert vault.show_login_field(user, 'Bank', 'pin')
+
+        assert decrypt.call_count == 1
+        assert 'PIN: 4321' in capsys.readouterr().out
+        assert not vault.show_login_field(user, 'Bank', 'Security question')
+
+    # Test that re-keying the vault keeps the fields readable
+    def test_rekey(self, vault_user: tuple[Vault, User], capsys: pytest.CaptureFixture[str]) -> None:
+        vault, user = vault_user
+        _ = vault.set_login_field(user, 'GitHub', 'Recovery', 'abcd-efgh', FieldKind.HIDDEN)
+
+        new_salt, new_key = vault.encryption.hash_master_password('AnotherPassword456!@#', vault.kdf.spec)
+        rekeyed = vault.rekey(user, new_key, new_salt, vault.kdf.spec)
+        assert rekeyed is not None
+        _ = capsys.readouterr()
+
+        assert vault.show_login_field(rekeyed, 'GitHub', 'Recovery')
+        assert 'Recovery: abcd-efgh' in capsys.readouterr().out
+
+    # Test that purging a login from the trash deletes its fields
+    def test_purged_with_login(self, vault_user: tuple[Vault, User], monkeypatch: pytest.MonkeyPatch) -> None:
+        vault, user = vault_user
+        _ = vault.set_login_field(user, 'Bank', 'PIN', '4321', FieldKind.HIDDEN)
+        monkeypatch.setattr('builtins.input', lambda _: 'yes')
+        assert vault.remove_login(user, 'Bank') == RemoveStatus.SUCCESS
+
+        assert vault.database.purge_trash(-1) == (1, 0)
+        assert vault.database.conn.execute('SELECT COUNT(*) FROM entry_fields').fetchone()[0] == 0
@@ -0,0 +1,82 @@
+import pytest
+
+from core.encryption import EncryptionManager
+from core.kdf import DEFAULT_KDF, LEGACY_KDF, Argon2idKdf, ScryptKdf, parse_kdf
+from core.vault import Vault
+from db.database import DatabaseManager
+
+PASSWORD: str = 'TestPassword123!@#'
+
+# Cheap parameters so the tests don't spend their time deriving keys
+FAST_ARGON2: Argon2idKdf = Argon2idKdf(memory=1024, iterations=1, lanes=2)
+
+
+class TestKdfRegistry:
+    # Test that every KDF survives a round trip through its spec
+    @pytest.mark.parametrize('kdf', [LEGACY_KDF, DEFAULT_KDF, ScryptKdf(n=2**15), FAST_ARGON2])
+    def test_spec_round_trip(self, kdf) -> None:
+        assert parse_kdf(kdf.spec) == kdf
+
+    # Test that a record without a spec is read as the scrypt parameters used before the registry
+    def test_legacy(self) -> None:
+        assert parse_kdf(None) == ScryptKdf(n=2**14, r=8, p=1)
+        assert DEFAULT_KDF.spec == 'argon2id$m=65536,t=3,p=4'
+
+    # Test that unknown KDFs and malformed or out-of-range parameters are rejected
+    @pytest.mark.parametrize('spec', ['bcrypt$c=12', 'argon2id$m=abc', 'argon2id$x=1', 'argon2id$m=8,t=1,p=4', 'scrypt$n'])
+    def test_invalid(self, spec: str) -> None:
+        with pytest.raises(ValueError):
+            _ = parse_kdf(spec)
+
+    # Test that a password hashed with either KDF verifies only under the same KDF
+    @pytest.mark.parametrize('kdf', [LEGACY_KDF, FAST_ARGON2])
+    def test_verify(self, kdf) -> None:
+        encryption = EncryptionManager()
+        salt, stored_hash = encryption.hash_master_password(PASSWORD, kdf.spec)
+
+        assert encryption.vertify_master_password(PASSWORD, salt, stored_hash, kdf.spec)
+        assert not encryption.vertify_master_password('wrong', salt, stored_hash, kdf.spec)
+        other = ScryptKdf(n=2**15) if kdf.name == 'argon2id' else FAST_ARGON2
+        assert not encryption.vertify_master_password(PASSWORD, salt, stored_hash, other.spec)
+
+
+class TestKdfUpgrade:
+    # Create a database holding an account made before the registry, with a login and its history
+    @pytest.fixture
+    def legacy_db(self):
+        db = DatabaseManager(':memory:')
+        vault = Vault(db, kdf=LEGACY_KDF)
+        salt, stored_hash = vault.encryption.hash_master_password(PASSWORD)
+        _ = db.insert_user('testuser', stored_hash, salt)
+        user = db.get_user_from_username('testuser')
+        assert user is not None
+        _ = vault.add_login(user, 'GitHub', 'octocat', 'first-secret')
+        _ = vault.update_login(user, db.get_logins_from_name(user.id, 'GitHub')[0], 'GitHub', 'octocat', 'gh-secret')
+        yield db
+        db.close()
+
+    # Test that signing in moves the account to the vault's KDF, keeping every login readable
+    def test_upgrade(self, legacy_db: DatabaseManager) -> None:
+        vault = Vault(legacy_db, kdf=FAST_ARGON2)
+        user = legacy_db.get_user_from_username('testuser')
+        assert user is not None and user.kdf is None
+
+        upgraded = vault.upgrade_kdf(user, PASSWORD)
+
+        assert upgraded.kdf == FAST_ARGON2.spec
+        assert upgraded.salt != user.salt and upgraded.master_hash != user.master_hash
+        assert vault.check_master_password(upgraded, PASSWORD)
+        assert not vault.check_master_password(upgraded, 'wrong')
+        login = legacy_db.get_logins_from_name(user.id, 'GitHub')[0]
+        assert vault.encryption.decrypt_password(upgraded.master_hash, login.password_encrypted).decode() == 'gh-secret'
+        assert vault.upgrade_kdf(upgraded, PASSWORD) is upgraded
+
+    # Test that an account that syncs keeps its KDF, since every device must derive the same key
+    def test_synced_account_kept(self, legacy_db: DatabaseManager) -> None:
+        vault = Vault(legacy_db, kdf=FAST_ARGON2)
+        user = legacy_db.get_user_from_username('testuser')
+        assert user is not None
+        legacy_db.set_sync_value(f'remote:{user.id}:pushed_clock', 1)
+
+        assert vault.upgrade_kdf(user, PASSWORD) is user
+        assert legacy_db.get_user_from_user_id(user.id).kdf is None
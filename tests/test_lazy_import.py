@@ -0,0 +1,46 @@
+import sys
+import threading
+
+import pytest
+
+from util.lazy_import import lazy_import
+
+
+# A package on sys.path whose modules record when they are executed; its submodule is slow to execute
+@pytest.fixture
+def lazy_package(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    package = tmp_path / 'lazypkg'
+    package.mkdir()
+    _ = (package / '__init__.py').write_text('import builtins\nbuiltins.lazypkg_executed.append(__name__)\n')
+    _ = (package / 'slow.py').write_text('import builtins, time\nbuiltins.lazypkg_executed.append(__name__)\n'
+                                         'time.sleep(0.1)\nVALUE = 42\n')
+    executed: list[str] = []
+    monkeypatch.setattr('builtins.lazypkg_executed', executed, raising=False)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield executed
+    for name in ('lazypkg.slow', 'lazypkg'):
+        _ = sys.modules.pop(name, None)
+
+
+class TestLazyImport:
+    # Test that neither a submodule nor its package is executed until an attribute is used
+    def test_parents_stay_lazy(self, lazy_package: list[str]) -> None:
+        slow = lazy_import('lazypkg.slow')
+        assert lazy_package == []
+
+        assert slow.VALUE == 42
+        assert lazy_package == ['lazypkg', 'lazypkg.slow']
+        assert sys.modules['lazypkg'].slow is slow
+
+    # Test that threads using a module at once all wait for it to finish executing, and it runs once
+    def test_threads(self, lazy_package: list[str]) -> None:
+        slow = lazy_import('lazypkg.slow')
+        values: list[int] = []
+        threads = [threading.Thread(target=lambda: values.append(slow.VALUE)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert values == [42] * 8
+        assert lazy_package.count('lazypkg.slow') == 1
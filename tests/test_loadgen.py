@@ -0,0 +1,39 @@
+import pytest
+
+from benchmarks.loadgen import LoadConfig, format_report, parse_mix, percentiles, run_load
+
+
+# Test parsing an operation mix
+def test_parse_mix() -> None:
+    assert parse_mix('add=4, lookup=8,list') == {'add': 4, 'lookup': 8, 'list': 1}
+
+# Test that unknown operations are rejected
+def test_parse_mix_unknown_operation() -> None:
+    with pytest.raises(ValueError):
+        _ = parse_mix('add=1,explode=2')
+
+# Test percentile calculation in milliseconds
+def test_percentiles() -> None:
+    p50, p95, p99 = percentiles([i / 1000 for i in range(1, 101)])
+
+    assert p50 == pytest.approx(50.5)
+    assert p95 == pytest.approx(95.05)
+    assert p99 == pytest.approx(99.01)
+
+# Test a short threaded soak run against a file database
+def test_run_load_threads(tmp_path) -> None:
+    config = LoadConfig(
+        db_path=str(tmp_path / 'load.db'),
+        users=2,
+        mix=parse_mix('add=2,lookup=2,list=1,delete=1'),
+        workers=2,
+        mode='thread',
+        duration=0.3,
+        timeout=5.0,
+        seed=1,
+    )
+    result, elapsed = run_load(config)
+
+    assert sum(len(latencies) for latencies in result.latencies.values()) > 0
+    assert sum(result.errors.values()) == 0
+    assert 'ops/s' in format_report(result, elapsed)
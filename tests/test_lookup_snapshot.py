@@ -0,0 +1,136 @@
+import os
+
+import pytest
+
+from core.data_models import User
+from core.lookup_snapshot import LookupSnapshot, _find_perfect_hash, snapshot_path, write_lookup_snapshot
+from core.vault import Vault
+from db.database import DatabaseManager
+
+PASSWORD: str = 'TestPassword123!@#'
+
+
+# Create a vault with a signed-in user holding a few logins
+@pytest.fixture
+def vault_user():
+    db = DatabaseManager(':memory:')
+    vault = Vault(db)
+    _ = vault.create_user('testuser', PASSWORD)
+    user = db.get_user_from_username('testuser')
+    assert user is not None
+    _ = vault.add_login(user, 'GitHub', 'octocat', 'gh-secret')
+    _ = vault.add_login(user, 'GitHub', 'work', 'gh-work-secret')
+    _ = vault.add_login(user, 'Gmail', None, 'mail-secret')
+    for i in range(200):
+        _ = vault.add_login(user, f'Service{i}', f'user{i}', f'secret{i}')
+    yield vault, user
+    db.close()
+
+
+# Writes the user's snapshot and opens it
+@pytest.fixture
+def snapshot(vault_user: tuple[Vault, User], tmp_path):
+    vault, user = vault_user
+    path = write_lookup_snapshot(vault, user, str(tmp_path))
+    with LookupSnapshot(path) as snapshot:
+        yield snapshot
+
+
+class TestPerfectHash:
+    # Test that every key gets its own slot for a range of key counts
+    @pytest.mark.parametrize('count', [0, 1, 2, 3, 17, 1000])
+    def test_minimal_and_perfect(self, count: int) -> None:
+        fingerprints = [os.urandom(16) for _ in range(count)]
+        _, _, slots = _find_perfect_hash(fingerprints)
+
+        assert sorted(slots) == list(range(count))
+
+
+class TestLookupSnapshot:
+    # Test that the snapshot is named by a hash of the username and is private to the owner
+    def test_file(self, vault_user: tuple[Vault, User], tmp_path) -> None:
+        vault, user = vault_user
+        path = write_lookup_snapshot(vault, user, str(tmp_path))
+
+        assert path == snapshot_path(str(tmp_path), 'testuser')
+        assert 'testuser' not in os.path.basename(path)
+        assert os.stat(path).st_mode & 0o777 == 0o600
+        with open(path, 'rb') as f:
+            data = f.read()
+        assert b'GitHub' not in data and b'gh-secret' not in data
+
+    # Test that unlocking checks the master password
+    def test_unlock(self, snapshot: LookupSnapshot, vault_user: tuple[Vault, User]) -> None:
+        _, user = vault_user
+
+        assert snapshot.unlock(PASSWORD) == user.master_hash
+        assert snapshot.unlock('wrong password') is None
+
+    # Test that a lookup returns every login of the service and their passwords decrypt
+    def test_lookup(self, snapshot: LookupSnapshot, vault_user: tuple[Vault, User]) -> None:
+        vault, user = vault_user
+
+        matches = snapshot.lookup(user.master_hash, 'GitHub')
+        assert sorted(username for username, _ in matches) == ['octocat', 'work']
+        passwords = {username: vault.encryption.decrypt_password(user.master_hash, token).decode() for username, token in matches}
+        assert passwords == {'octocat': 'gh-secret', 'work': 'gh-work-secret'}
+
+        [(username, token)] = snapshot.lookup(user.master_hash, 'Gmail')
+        assert username is None
+        assert vault.encryption.decrypt_password(user.master_hash, token).decode() == 'mail-secret'
+
+        for i in range(200):
+            [(username, token)] = snapshot.lookup(user.master_hash, f'Service{i}')
+            assert username == f'user{i}'
+
+    # Test that names not in the vault, including other cases of stored names, find nothing
+    def test_missing(self, snapshot: LookupSnapshot, vault_user: tuple[Vault, User]) -> None:
+        _, user = vault_user
+
+        assert snapshot.lookup(user.master_hash, 'Nowhere') == []
+        assert snapshot.lookup(user.master_hash, 'github') == []
+
+    # Test that a rewritten snapshot reflects changes made since
+    def test_rewrite(self, vault_user: tuple[Vault, User], tmp_path) -> None:
+        vault, user = vault_user
+        _ = write_lookup_snapshot(vault, user, str(tmp_path))
+        _ = vault.add_login(user, 'Slack', 'me', 'slack-secret')
+        path = write_lookup_snapshot(vault, user, str(tmp_path))
+
+        with LookupSnapshot(path) as snapshot:
+            assert [username for username, _ in snapshot.lookup(user.master_hash, 'Slack')] == ['me']
+
+    # Test that a login too long for a record is left out with a warning rather than aborting the write
+    def test_oversized_login(self, vault_user: tuple[Vault, User], tmp_path, caplog: pytest.LogCaptureFixture) -> None:
+        vault, user = vault_user
+        _ = vault.add_login(user, 'Huge', 'x' * 70_000, 'huge-secret')
+        _ = vault.add_login(user, 'Essay', 'me', 'y' * 60_000)
+
+        path = write_lookup_snapshot(vault, user, str(tmp_path))
+
+        with LookupSnapshot(path) as snapshot:
+            assert snapshot.lookup(user.master_hash, 'Huge') == []
+            assert snapshot.lookup(user.master_hash, 'Essay') == []
+            assert [username for username, _ in snapshot.lookup(user.master_hash, 'GitHub')] == ['octocat', 'work']
+        assert 'Leaving login' in caplog.text
+        assert os.path.getsize(path) < 1_000_000
+
+    # Test that a vault without logins gives a snapshot that finds nothing
+    def test_empty(self, tmp_path) -> None:
+        db = DatabaseManager(':memory:')
+        vault = Vault(db)
+        _ = vault.create_user('empty', PASSWORD)
+        user = db.get_user_from_username('empty')
+        assert user is not None
+
+        with LookupSnapshot(write_lookup_snapshot(vault, user, str(tmp_path))) as snapshot:
+            assert snapshot.lookup(user.master_hash, 'GitHub') == []
+        db.close()
+
+    # Test that other files are rejected
+    def test_not_a_snapshot(self, tmp_path) -> None:
+        path = tmp_path / 'other.lookup'
+        path.write_bytes(b'\x00' * 128)
+
+        with pytest.raises(ValueError):
+            _ = LookupSnapshot(str(path))
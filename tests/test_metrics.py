@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+
+import pytest
+
+from core.encryption import EncryptionManager
+from db.database import DatabaseManager
+from util.metrics import PENDING_LIMIT, Histogram, MetricsRegistry, metrics
+from util.profiling import ActionProfiler
+
+
+# Reset the shared registry around each test
+@pytest.fixture
+def registry():
+    metrics.reset()
+    metrics.enabled = True
+    yield metrics
+    metrics.reset()
+
+
+class TestHistogram:
+    # Test that observations land in the right bucket and update totals
+    def test_observe(self) -> None:
+        histogram = Histogram((0.001, 0.01, 0.1))
+        histogram.observe(0.0005)
+        histogram.observe(0.05)
+        histogram.observe(2.0)
+
+        assert histogram.counts == [1, 0, 1, 1]
+        assert histogram.count == 3
+        assert histogram.max == 2.0
+
+    # Test quantile estimation from bucket bounds
+    def test_quantile(self) -> None:
+        histogram = Histogram((0.001, 0.01, 0.1))
+        for _ in range(9):
+            histogram.observe(0.0005)
+        histogram.observe(0.05)
+
+        assert histogram.quantile(0.5) == 0.001
+        assert histogram.quantile(0.99) == 0.1
+
+
+class TestMetricsRegistry:
+    # Test that a disabled registry records nothing
+    def test_disabled(self) -> None:
+        registry = MetricsRegistry()
+        registry.enabled = False
+        registry.observe_ns('encrypt', 1000)
+        registry.inc('failures')
+
+        assert registry.histograms() == []
+        assert registry.counters() == []
+
+    # Test the Prometheus text rendering of counters and histograms
+    def test_render_prometheus(self) -> None:
+        registry = MetricsRegistry()
+        registry.observe_ns('db_query', 2_000_000, (('statement', 'insert_login'),))
+        registry.inc('kdf_verify_failures')
+
+        text = registry.render_prometheus()
+        assert '# TYPE pm_kdf_verify_failures_total counter' in text
+        assert 'pm_kdf_verify_failures_total 1' in text
+        assert '# TYPE pm_db_query_seconds histogram' in text
+        assert 'pm_db_query_seconds_bucket{statement="insert_login",le="+Inf"} 1' in text
+        assert 'pm_db_query_seconds_count{statement="insert_login"} 1' in text
+
+    # Test that observations recorded from several threads at once, across drains, are all kept
+    def test_concurrent_observations(self) -> None:
+        registry = MetricsRegistry()
+
+        def observe() -> None:
+            for _ in range(5 * PENDING_LIMIT):
+                registry.observe_ns('encrypt', 1000)
+
+        threads = [threading.Thread(target=observe) for _ in range(4)]
+        # Switch threads as often as possible, so appends interleave with drains
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        assert registry.histograms()[0][2].count == 4 * 5 * PENDING_LIMIT
+
+    # Test writing the dump file
+    def test_write_prometheus(self, tmp_path) -> None:
+        registry = MetricsRegistry()
+        registry.inc('signins')
+        path = tmp_path / 'metrics' / 'pm.prom'
+        registry.write_prometheus(str(path))
+
+        assert 'pm_signins_total 1' in path.read_text()
+
+
+class TestInstrumentation:
+    # Test that encryption operations are recorded
+    def test_encryption_recorded(self, registry: MetricsRegistry) -> None:
+        encryption = EncryptionManager()
+        salt, key = encryption.hash_master_password('master')
+        token = encryption.encrypt_password(key, 'secret')
+        _ = encryption.decrypt_password(key, token)
+        _ = encryption.vertify_master_password('wrong', salt, key)
+
+        names = {name for name, _, _ in registry.histograms()}
+        assert {'kdf_derive', 'kdf_verify', 'encrypt', 'decrypt'} <= names
+        assert ('kdf_verify_failures', (), 1) in registry.counters()
+
+    # Test that database statements are recorded per statement
+    def test_database_recorded(self, registry: MetricsRegistry) -> None:
+        db = DatabaseManager(':memory:')
+        _ = db.get_user_from_username('nobody')
+        db.close()
+
+        labels = [labels for name, labels, _ in registry.histograms() if name == 'db_query']
+        assert (('statement', 'select_user_by_username'),) in labels
+
+
+class TestActionProfiler:
+    # Test that runs in the same second each write a report of their own
+    def test_reports_not_overwritten(self, tmp_path) -> None:
+        profiler = ActionProfiler('cprofile', str(tmp_path))
+        for _ in range(3):
+            with profiler.profile('list'):
+                pass
+
+        assert len(os.listdir(tmp_path)) == 3
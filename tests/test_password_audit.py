@@ -0,0 +1,88 @@
+import hashlib
+
+import pytest
+
+from core.data_models import VaultEntry
+from core.password_audit import BreachedPasswordIndex, analyze_password, audit_passwords, build_breach_index
+
+
+# Build a breach index from a small plaintext corpus
+@pytest.fixture
+def breach_index(tmp_path):
+    source = tmp_path / 'breached.txt'
+    corpus = ['password', '123456', 'qwerty'] + [f'leaked{i}' for i in range(2000)]
+    source.write_text('\n'.join(corpus + ['password']) + '\n')
+    destination = tmp_path / 'breached.bin'
+
+    count = build_breach_index(str(source), str(destination), plaintext=True, run_size=500)
+    assert count == len(corpus)
+
+    index = BreachedPasswordIndex(str(destination))
+    yield index
+    index.close()
+
+
+class TestAnalyzePassword:
+    # Test that every character class is detected
+    def test_character_classes(self) -> None:
+        analysis = analyze_password('Abc1!')
+
+        assert analysis.has_upper
+        assert analysis.has_lower
+        assert analysis.has_digit
+        assert analysis.has_special
+        assert not analysis.has_other
+
+    # Test that characters outside the known classes are flagged
+    def test_other_characters(self) -> None:
+        assert analyze_password('pass word').has_other
+
+    # Test that longer, more varied passwords score higher
+    def test_scores(self) -> None:
+        assert analyze_password('abc').score == 0
+        assert analyze_password('Tr0ub4dor&3xyzQ!').score >= 3
+        assert analyze_password('').entropy_bits == 0
+
+
+class TestBreachIndex:
+    # Test that corpus passwords are found and others are not
+    def test_membership(self, breach_index: BreachedPasswordIndex) -> None:
+        assert 'password' in breach_index
+        assert 'leaked1999' in breach_index
+        assert 'leaked0' in breach_index
+        assert 'not-in-the-corpus' not in breach_index
+
+    # Test that the index file is sorted and de-duplicated
+    def test_index_sorted(self, breach_index: BreachedPasswordIndex) -> None:
+        with open(breach_index.path, 'rb') as f:
+            data = f.read()
+        digests = [data[i:i + 20] for i in range(0, len(data), 20)]
+
+        assert digests == sorted(set(digests))
+
+    # Test building from hex hashes with counts
+    def test_build_from_hashes(self, tmp_path) -> None:
+        source = tmp_path / 'hashes.txt'
+        source.write_text(f'{hashlib.sha1(b"hunter2").hexdigest().upper()}:42\n')
+        destination = tmp_path / 'hashes.bin'
+        _ = build_breach_index(str(source), str(destination))
+
+        index = BreachedPasswordIndex(str(destination))
+        assert 'hunter2' in index
+        index.close()
+
+
+class TestAuditPasswords:
+    # Test reuse and breach detection across entries
+    def test_audit(self, breach_index: BreachedPasswordIndex) -> None:
+        logins = [
+            (VaultEntry(1, 1, 'GitHub', 'a', b''), 'password'),
+            (VaultEntry(2, 1, 'Gmail', 'b', b''), 'password'),
+            (VaultEntry(3, 1, 'Bank', 'c', b''), 'Unique-Passphrase-42!'),
+        ]
+        report = audit_passwords(logins, breach_index)
+
+        assert report.breach_checked
+        assert [audit.entry.id for audit in report.reused] == [1, 2]
+        assert [audit.entry.id for audit in report.breached] == [1, 2]
+        assert [audit.entry.id for audit in report.weak] == [1, 2]
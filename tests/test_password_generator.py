@@ -0,0 +1,89 @@
+import string
+from collections import Counter
+
+import pytest
+
+from core.password_generator import (AMBIGUOUS_CHARACTERS, SPECIAL_CHARACTERS, PasswordPolicy, RandomPool,
+                                     generate_batch, generate_passphrase, generate_password, load_wordlist)
+
+
+class TestRandomPool:
+    # Test that reads never return the same bytes twice
+    def test_read_advances(self) -> None:
+        pool = RandomPool(pool_size=64)
+        chunks = [pool.read(16) for _ in range(10)]
+
+        assert all(len(chunk) == 16 for chunk in chunks)
+        assert len(set(chunks)) == 10
+
+    # Test that randbelow stays in range
+    def test_randbelow_range(self) -> None:
+        pool = RandomPool()
+        values = {pool.randbelow(7776) for _ in range(2000)}
+
+        assert min(values) >= 0
+        assert max(values) < 7776
+
+    # Test that choices only uses the alphabet and is roughly uniform
+    def test_choices_uniform(self) -> None:
+        pool = RandomPool()
+        counts = Counter(pool.choices('abc', 30000))
+
+        assert set(counts) == {'a', 'b', 'c'}
+        assert all(9000 < count < 11000 for count in counts.values())
+
+
+class TestGeneratePassword:
+    # Test that the default policy includes every character class
+    def test_default_policy(self) -> None:
+        password = generate_password()
+
+        assert len(password) == 20
+        assert any(ch in string.ascii_uppercase for ch in password)
+        assert any(ch in string.ascii_lowercase for ch in password)
+        assert any(ch in string.digits for ch in password)
+        assert any(ch in SPECIAL_CHARACTERS for ch in password)
+
+    # Test that ambiguous characters can be excluded
+    def test_exclude_ambiguous(self) -> None:
+        passwords = generate_batch(PasswordPolicy(length=30, exclude_ambiguous=True), 200)
+
+        assert not AMBIGUOUS_CHARACTERS & set(''.join(passwords))
+
+    # Test that disabled classes are never used
+    def test_digits_only(self) -> None:
+        password = generate_password(PasswordPolicy(length=8, uppercase=False, lowercase=False, special=False))
+
+        assert password.isdigit()
+
+    # Test that impossible policies are rejected
+    def test_invalid_policies(self) -> None:
+        with pytest.raises(ValueError):
+            _ = generate_password(PasswordPolicy(length=3))
+        with pytest.raises(ValueError):
+            _ = generate_password(PasswordPolicy(uppercase=False, lowercase=False, digits=False, special=False))
+
+    # Test that batches have the requested size and are unique
+    def test_batch(self) -> None:
+        passwords = generate_batch(PasswordPolicy(length=16), 5000)
+
+        assert len(passwords) == 5000
+        assert len(set(passwords)) == 5000
+        assert all(len(password) == 16 for password in passwords)
+
+
+class TestGeneratePassphrase:
+    # Test that the bundled word list is the full diceware list
+    def test_wordlist(self) -> None:
+        words = load_wordlist()
+
+        assert len(words) == 7776
+        assert len(set(words)) == 7776
+
+    # Test passphrase shape
+    def test_passphrase(self) -> None:
+        passphrase = generate_passphrase(word_count=5, separator=' ')
+        words = passphrase.split(' ')
+
+        assert len(words) == 5
+        assert all(word in load_wordlist() for word in words)
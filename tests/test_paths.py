@@ -0,0 +1,69 @@
+import logging
+import os
+
+import pytest
+
+from db.database import DatabaseManager
+from util.paths import data_dir, state_dir
+from util.setup_logger import DeferredFileHandler
+
+
+class TestPaths:
+    # Test that the XDG variables choose the data and state directories
+    def test_xdg_variables(self, monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path / 'share'))
+        monkeypatch.setenv('XDG_STATE_HOME', str(tmp_path / 'state'))
+
+        assert data_dir() == str(tmp_path / 'share' / 'cosmicc')
+        assert state_dir() == str(tmp_path / 'state' / 'cosmicc')
+
+    # Test that unset or relative XDG variables fall back to the home directory
+    def test_defaults(self, monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv('HOME', str(tmp_path / 'home'))
+        monkeypatch.delenv('XDG_DATA_HOME', raising=False)
+        monkeypatch.setenv('XDG_STATE_HOME', 'relative/state')
+
+        assert data_dir() == str(tmp_path / 'home' / '.local' / 'share' / 'cosmicc')
+        assert state_dir() == str(tmp_path / 'home' / '.local' / 'state' / 'cosmicc')
+
+    # Test that a directory with an existing data/vault.db keeps using it
+    def test_legacy_vault(self, monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv('XDG_DATA_HOME', str(tmp_path / 'share'))
+        (tmp_path / 'data').mkdir()
+        (tmp_path / 'data' / 'vault.db').touch()
+
+        assert data_dir() == 'data'
+
+    # Test that a new vault gets its schema and directory from anywhere, not just the repository root
+    def test_create_database_elsewhere(self, monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+        monkeypatch.chdir(tmp_path)
+        path = tmp_path / 'nested' / 'vault.db'
+
+        db = DatabaseManager(str(path))
+        tables = {row[0] for row in db.conn.execute('SELECT name FROM sqlite_master WHERE type = \'table\'')}
+        db.close()
+
+        assert os.path.exists(path)
+        assert {'users', 'vault_entries'} <= tables
+
+
+class TestDeferredFileHandler:
+    # Test that the log file is only created once something is logged
+    def test_opens_on_first_record(self, tmp_path) -> None:
+        log_file = tmp_path / 'logs' / 'app.log'
+        handler = DeferredFileHandler(str(log_file))
+        logger = logging.getLogger('test_deferred_file_handler')
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+        try:
+            assert not log_file.exists()
+            logger.info('hello')
+            handler.flush()
+            assert '"message": "hello"' in log_file.read_text()
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
@@ -0,0 +1,39 @@
+from core.secret_buffer import SecretBuffer
+
+
+class TestSecretBuffer:
+    # Test that wiping zeroes the contents in place
+    def test_wipe(self) -> None:
+        secret = SecretBuffer.from_str('hunter2')
+        view = memoryview(secret)
+
+        secret.wipe()
+
+        assert bytes(view) == bytes(7)
+        assert len(secret) == 7
+
+    # Test that leaving a with block wipes the buffer, even on an error
+    def test_context_manager(self) -> None:
+        secret = SecretBuffer(b'key material')
+        try:
+            with secret:
+                raise ValueError
+        except ValueError:
+            pass
+
+        assert secret == bytes(12)
+
+    # Test that the contents never show up in repr or str
+    def test_repr_hides_contents(self) -> None:
+        secret = SecretBuffer.from_str('hunter2')
+
+        assert 'hunter2' not in repr(secret)
+        assert 'hunter2' not in str(secret)
+        assert 'hunter2' not in f'{secret}'
+
+    # Test that wiping an empty buffer is a no-op
+    def test_wipe_empty(self) -> None:
+        secret = SecretBuffer()
+        secret.wipe()
+
+        assert secret == b''
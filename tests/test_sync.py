@@ -0,0 +1,137 @@
+import pytest
+
+from core.data_models import User
+from core.sync import DirectoryRemote, SyncEngine
+from core.vault import Vault
+from db.database import DatabaseManager
+from util.enums import SyncStatus
+
+
+# Two devices holding the same account, each with its own in-memory database
+@pytest.fixture
+def devices():
+    first = Vault(DatabaseManager(':memory:'))
+    second = Vault(DatabaseManager(':memory:'))
+    _ = first.create_user('testuser', 'TestPassword123!@#')
+    user = first.database.get_user_from_username('testuser')
+    assert user is not None
+    _ = second.database.insert_user('testuser', user.master_hash, user.salt, user.kdf)
+    other = second.database.get_user_from_username('testuser')
+    assert other is not None
+
+    yield (first, user), (second, other)
+    first.database.close()
+    second.database.close()
+
+
+# Returns (service, username, password) for every login on a device, sorted
+def logins(vault: Vault, user: User) -> list[tuple[str, str, str]]:
+    return sorted(
+        (login.service_name, login.username, vault.encryption.decrypt_password(user.master_hash, login.password_encrypted).decode())
+        for login in vault.database.get_user_logins(user.id)
+    )
+
+
+class TestSync:
+    # Test that logins added on each device reach the other
+    def test_sync_both_ways(self, devices, tmp_path) -> None:
+        (first, user1), (second, user2) = devices
+        remote = DirectoryRemote(str(tmp_path / 'remote'))
+        _ = first.add_login(user1, 'GitHub', 'octocat', 'password1')
+        _ = second.add_login(user2, 'Gmail', 'me', 'password2')
+
+        assert SyncEngine(first).sync(user1, remote).pushed == 1
+        assert SyncEngine(second).sync(user2, remote).applied == 1
+        assert SyncEngine(first).sync(user1, remote).applied == 1
+
+        assert logins(first, user1) == logins(second, user2) == [('GitHub', 'octocat', 'password1'), ('Gmail', 'me', 'password2')]
+
+    # Test that later syncs only ship the rows that changed
+    def test_sync_sends_only_changes(self, devices, tmp_path) -> None:
+        (first, user1), (second, user2) = devices
+        remote = DirectoryRemote(str(tmp_path / 'remote'))
+        for i in range(50):
+            _ = first.add_login(user1, f'Service{i}', 'user', f'password{i}')
+        _ = SyncEngine(first).sync(user1, remote)
+        _ = SyncEngine(second).sync(user2, remote)
+
+        login = first.database.get_logins_from_name(user1.id, 'Service7')[0]
+        _ = first.update_login(user1, login, 'Service7', 'user', 'changed')
+        pushed = SyncEngine(first).sync(user1, remote)
+        pulled = SyncEngine(second).sync(user2, remote)
+
+        assert pushed.pushed == 1
+        assert (pulled.pulled, pulled.applied) == (1, 1)
+        assert ('Service7', 'user', 'changed') in logins(second, user2)
+        assert SyncEngine(second).sync(user2, remote).pushed == 0
+
+    # Test that concurrent edits converge on the same winner on both devices
+    def test_conflict_resolution(self, devices, tmp_path) -> None:
+        (first, user1), (second, user2) = devices
+        remote = DirectoryRemote(str(tmp_path / 'remote'))
+        _ = first.add_login(user1, 'GitHub', 'octocat', 'original')
+        _ = SyncEngine(first).sync(user1, remote)
+        _ = SyncEngine(second).sync(user2, remote)
+
+        _ = first.update_login(user1, first.database.get_user_logins(user1.id)[0], 'GitHub', 'octocat', 'from-first')
+        _ = second.update_login(user2, second.database.get_user_logins(user2.id)[0], 'GitHub', 'octocat', 'from-second')
+        for _ in range(2):
+            _ = SyncEngine(first).sync(user1, remote)
+            _ = SyncEngine(second).sync(user2, remote)
+
+        assert logins(first, user1) == logins(second, user2)
+        assert logins(first, user1)[0][2] in ('from-first', 'from-second')
+
+    # Test that deleting a login removes it on the other device
+    def test_sync_delete(self, devices, tmp_path) -> None:
+        (first, user1), (second, user2) = devices
+        remote = DirectoryRemote(str(tmp_path / 'remote'))
+        _ = first.add_login(user1, 'GitHub', 'octocat', 'password1')
+        _ = SyncEngine(first).sync(user1, remote)
+        _ = SyncEngine(second).sync(user2, remote)
+
+        _ = second.database.delete_login(second.database.get_user_logins(user2.id)[0].id)
+        _ = SyncEngine(second).sync(user2, remote)
+        _ = SyncEngine(first).sync(user1, remote)
+
+        assert first.database.get_user_logins(user1.id) == []
+        assert len(first.database.get_trash(user1.id)) == 1
+
+    # Test that a login's dates and rotation policy travel with it
+    def test_sync_rotation_policy(self, devices, tmp_path) -> None:
+        (first, user1), (second, user2) = devices
+        remote = DirectoryRemote(str(tmp_path / 'remote'))
+        _ = first.add_login(user1, 'GitHub', 'octocat', 'password1')
+        _ = SyncEngine(first).sync(user1, remote)
+        _ = SyncEngine(second).sync(user2, remote)
+
+        entry_id = first.database.get_user_logins(user1.id)[0].id
+        _ = first.database.set_rotation_policy(user1.id, entry_id, 30)
+        assert SyncEngine(first).sync(user1, remote).pushed == 1
+        _ = SyncEngine(second).sync(user2, remote)
+
+        assert second.database.get_login_dates(user2.id, second.database.get_user_logins(user2.id)[0].id) == \
+            first.database.get_login_dates(user1.id, entry_id)
+
+    # Test that a separately registered account is detected and can adopt the remote key
+    def test_key_mismatch(self, devices, tmp_path) -> None:
+        (first, user1), _ = devices
+        remote = DirectoryRemote(str(tmp_path / 'remote'))
+        _ = first.add_login(user1, 'GitHub', 'octocat', 'password1')
+        _ = SyncEngine(first).sync(user1, remote)
+
+        third = Vault(DatabaseManager(':memory:'))
+        _ = third.create_user('testuser', 'TestPassword123!@#')
+        user3 = third.database.get_user_from_username('testuser')
+        assert user3 is not None
+        _ = third.add_login(user3, 'Gmail', 'me', 'password2')
+        engine = SyncEngine(third)
+
+        assert engine.sync(user3, remote).status == SyncStatus.KEY_MISMATCH
+        assert engine.adopt_remote_key(user3, 'WrongPassword123!@#', remote) is None
+
+        rekeyed = engine.adopt_remote_key(user3, 'TestPassword123!@#', remote)
+        assert rekeyed is not None and rekeyed.salt == user1.salt
+        assert engine.sync(rekeyed, remote).status == SyncStatus.SUCCESS
+        assert logins(third, rekeyed) == [('GitHub', 'octocat', 'password1'), ('Gmail', 'me', 'password2')]
+        third.database.close()
@@ -0,0 +1,121 @@
+import base64
+from unittest.mock import patch
+
+import pytest
+
+from core.data_models import User
+from core.totp import TotpParams, TotpSession, decode_secret, hotp, parse_totp_secret, totp
+from core.vault import Vault
+from db.database import DatabaseManager
+from util.enums import InsertStatus
+
+RFC_KEY_SHA1 = b'12345678901234567890'
+RFC_KEY_SHA256 = b'12345678901234567890123456789012'
+
+
+@pytest.fixture
+def vault():
+    database = DatabaseManager(':memory:')
+    yield Vault(database)
+    database.close()
+
+
+@pytest.fixture
+def test_user(vault: Vault) -> User:
+    _ = vault.create_user('testuser', 'TestPassword123!@#')
+    user = vault.database.get_user_from_username('testuser')
+    assert user is not None
+    return user
+
+
+class TestCodeGeneration:
+    # Test the RFC 4226 HOTP test vectors
+    def test_hotp_rfc4226(self) -> None:
+        expected = ['755224', '287082', '359152', '969429', '338314']
+        assert [hotp(RFC_KEY_SHA1, counter) for counter in range(5)] == expected
+
+    # Test the RFC 6238 TOTP test vectors
+    def test_totp_rfc6238(self) -> None:
+        assert totp(TotpParams(RFC_KEY_SHA1, digits=8), 59) == '94287082'
+        assert totp(TotpParams(RFC_KEY_SHA1, digits=8), 1111111109) == '07081804'
+        assert totp(TotpParams(RFC_KEY_SHA256, digits=8, algorithm='sha256'), 59) == '46119246'
+
+
+class TestSecretParsing:
+    # Test decoding secrets in the forms authenticator apps show them
+    def test_decode_secret(self) -> None:
+        secret = base64.b32encode(RFC_KEY_SHA1).decode().rstrip('=')
+
+        assert decode_secret(secret.lower()) == RFC_KEY_SHA1
+        assert decode_secret(' '.join(secret[i:i + 4] for i in range(0, len(secret), 4))) == RFC_KEY_SHA1
+
+    # Test parsing an otpauth URI with parameters
+    def test_parse_otpauth_uri(self) -> None:
+        secret = base64.b32encode(RFC_KEY_SHA1).decode()
+        params = parse_totp_secret(f'otpauth://totp/GitHub:me?secret={secret}&digits=8&period=60&algorithm=SHA256')
+
+        assert params == TotpParams(RFC_KEY_SHA1, digits=8, period=60, algorithm='sha256')
+
+    # Test that invalid secrets are rejected
+    def test_invalid_secrets(self) -> None:
+        with pytest.raises(ValueError):
+            _ = parse_totp_secret('not base32!')
+        with pytest.raises(ValueError):
+            _ = parse_totp_secret('otpauth://hotp/x?secret=JBSWY3DP')
+
+
+class TestTotpStorage:
+    # Test storing a TOTP secret with a new login
+    def test_add_login_with_totp(self, vault: Vault, test_user: User) -> None:
+        status = vault.add_login(test_user, 'GitHub', 'me', 'pass', 'JBSWY3DPEHPK3PXP')
+
+        assert status == InsertStatus.SUCCESS
+        entries = vault.database.get_totp_entries(test_user.id)
+        assert len(entries) == 1
+        assert entries[0].service_name == 'GitHub'
+        assert entries[0].secret_encrypted != b'JBSWY3DPEHPK3PXP'
+
+    # Test adding a TOTP secret to an existing login
+    def test_add_totp_secret(self, vault: Vault, test_user: User) -> None:
+        _ = vault.add_login(test_user, 'GitHub', 'me', 'pass')
+        _ = vault.add_login(test_user, 'Gmail', 'me', 'pass')
+
+        assert vault.add_totp_secret(test_user, 'Gmail', 'JBSWY3DPEHPK3PXP') == InsertStatus.SUCCESS
+        assert [entry.service_name for entry in vault.database.get_totp_entries(test_user.id)] == ['Gmail']
+
+    # Test that invalid secrets never reach the database
+    def test_add_invalid_totp_secret(self, vault: Vault, test_user: User) -> None:
+        with pytest.raises(ValueError):
+            _ = vault.add_login(test_user, 'GitHub', 'me', 'pass', 'not base32!')
+
+
+class TestTotpSession:
+    # Test that codes refresh from cached keys without decrypting again
+    def test_codes_use_cached_keys(self, vault: Vault, test_user: User) -> None:
+        secret = base64.b32encode(RFC_KEY_SHA1).decode()
+        _ = vault.add_login(test_user, 'GitHub', 'me', 'pass', f'otpauth://totp/x?secret={secret}&digits=8')
+        _ = vault.add_login(test_user, 'Gmail', 'me', 'pass', 'JBSWY3DPEHPK3PXP')
+        session = TotpSession(vault.encryption)
+
+        with patch.object(vault.encryption, 'decrypt_password', wraps=vault.encryption.decrypt_password) as decrypt:
+            entries = vault.database.get_totp_entries(test_user.id)
+            session.load(test_user, entries)
+            first = session.codes(59)
+            second = session.codes(89)
+            session.load(test_user, entries)
+
+            assert decrypt.call_count == 2
+
+        assert first[0].code == '94287082'
+        assert first[0].seconds_remaining == 1
+        assert second[0].code != first[0].code
+        assert len(first) == 2
+
+    # Test that clearing the session forgets every key
+    def test_clear(self, vault: Vault, test_user: User) -> None:
+        _ = vault.add_login(test_user, 'GitHub', 'me', 'pass', 'JBSWY3DPEHPK3PXP')
+        session = TotpSession(vault.encryption)
+        session.load(test_user, vault.database.get_totp_entries(test_user.id))
+        session.clear()
+
+        assert session.codes() == []
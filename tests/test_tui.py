@@ -0,0 +1,97 @@
+from core.tui import MetadataIndex, TuiState, render
+
+
+# A stand-in for a curses window that records what was drawn
+class FakeScreen:
+    def __init__(self, height: int = 10, width: int = 40) -> None:
+        self.height: int = height
+        self.width: int = width
+        self.lines: dict[int, str] = {}
+
+    def getmaxyx(self) -> tuple[int, int]:
+        return self.height, self.width
+
+    def erase(self) -> None:
+        self.lines.clear()
+
+    def addnstr(self, y: int, x: int, text: str, n: int, attr: int = 0) -> None:
+        self.lines[y] = text[:n]
+
+    def move(self, y: int, x: int) -> None:
+        pass
+
+    def refresh(self) -> None:
+        pass
+
+
+ROWS: list[tuple[int, str, str | None]] = [
+    (1, 'GitHub', 'alice'),
+    (2, 'gitlab', None),
+    (3, 'Bank', 'alice@example.com'),
+    (4, 'Mail', 'bob'),
+]
+
+
+class TestMetadataIndex:
+    # Test that rows are sorted by service name, ignoring case
+    def test_sorted(self) -> None:
+        index = MetadataIndex(ROWS)
+
+        assert index.ids == [3, 1, 2, 4]
+        assert index.labels[2] == 'gitlab  (N/A)'
+
+    # Test that the query matches service names and usernames, ignoring case
+    def test_filter(self) -> None:
+        index = MetadataIndex(ROWS)
+
+        assert [index.ids[i] for i in index.filter('GIT')] == [1, 2]
+        assert [index.ids[i] for i in index.filter('alice')] == [3, 1]
+        assert index.filter('nothing') == []
+        assert len(index.filter('')) == len(ROWS)
+
+    # Test that typing and deleting characters give the same results as filtering from scratch
+    def test_narrow_and_backspace(self) -> None:
+        index = MetadataIndex(ROWS)
+        for query in ('g', 'gi', 'git', 'gith', 'git', 'gi', 'b', 'bo'):
+            assert index.filter(query) == MetadataIndex(ROWS).filter(query)
+
+    # Test that the query can't match across the service name and username
+    def test_no_match_across_fields(self) -> None:
+        index = MetadataIndex(ROWS)
+
+        assert index.filter('mailbob') == []
+
+
+class TestTuiState:
+    # Test that the window scrolls to keep the selection visible
+    def test_scroll(self) -> None:
+        state = TuiState(selected=12)
+        state.clamp(match_count=20, list_height=5)
+
+        assert state.top == 8
+
+        state.selected = 3
+        state.clamp(match_count=20, list_height=5)
+        assert state.top == 3
+
+    # Test that the selection stays inside the matches
+    def test_clamp_selection(self) -> None:
+        state = TuiState(selected=50, top=40)
+        state.clamp(match_count=10, list_height=5)
+
+        assert (state.selected, state.top) == (9, 5)
+
+        state.clamp(match_count=0, list_height=5)
+        assert (state.selected, state.top) == (0, 0)
+
+    # Test that only the rows that fit on screen are drawn
+    def test_render_visible_rows(self) -> None:
+        index = MetadataIndex([(i, f'service{i:03d}', None) for i in range(100)])
+        screen = FakeScreen(height=10)
+        state = TuiState(selected=50)
+
+        render(screen, state, index, index.filter(''))
+
+        list_rows = [line for y, line in screen.lines.items() if y >= 2]
+        assert len(list_rows) == 7
+        assert any(line.startswith('service050') for line in list_rows)
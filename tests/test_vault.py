@@ -1,10 +1,13 @@
+import time
 from unittest.mock import patch
 
 import pytest
 
+from core.clipboard import Clipboard, FileBackend
 from core.data_models import User
 from core.vault import Vault
 from db.database import DatabaseManager
+from db.user_cache import user_cache
 from util.enums import InsertStatus, RemoveStatus
 
 
@@ -179,6 +182,21 @@ class TestListLogins:
         captured = capsys.readouterr()
         assert 'N/A' in captured.out
 
+    # Test that a filtered listing shows each login's tags, fetched in one query for all of them
+    def test_list_filtered_logins_tags(self, vault: Vault, test_user: tuple[User, str], capsys: pytest.CaptureFixture[str]) -> None:
+        user, password = test_user
+        for name in ('GitHub', 'Gmail', 'Slack'):
+            _ = vault.add_login(user, name, 'me', 'pass')
+            _ = vault.database.add_login_tags(user.id, vault.database.get_logins_from_name(user.id, name)[0].id, ['work', name.lower()])
+        vault.database.stats.reset()
+
+        vault.list_filtered_logins(user, tag='work')
+
+        captured = capsys.readouterr()
+        assert 'Tags: github, work' in captured.out and 'Tags: slack, work' in captured.out
+        stats = vault.database.stats.snapshot()
+        assert stats['select_tags_by_login'][0] == 1 and 'select_login_tags' not in stats
+
 
 class TestRemoveLogin:
     # Test removing a single login with confirmation
@@ -319,6 +337,27 @@ class TestRemoveUser:
         logins = vault.database.get_user_logins(user.id)
         assert len(logins) == 0
 
+    # Test that a deleted account comes back with its master password, along with the logins deleted with
+    # it but not those already in the trash
+    def test_restore_user(self, vault: Vault, test_user: tuple[User, str], monkeypatch: pytest.MonkeyPatch) -> None:
+        user, password = test_user
+        _ = vault.add_login(user, 'GitHub', 'user1', 'pass1')
+        _ = vault.add_login(user, 'Gmail', 'user2', 'pass2')
+        monkeypatch.setattr(time, 'time', lambda: 1_000_000)
+        _ = vault.database.delete_login(vault.database.get_logins_from_name(user.id, 'Gmail')[0].id)
+        monkeypatch.setattr(time, 'time', lambda: 2_000_000)
+        _ = vault.remove_user(user)
+
+        assert vault.restore_user(user.username, 'WrongPassword123!@#') == InsertStatus.ERROR
+        assert vault.restore_user('nobody', password) == InsertStatus.ERROR
+        assert vault.database.get_user_from_username(user.username) is None
+
+        assert vault.restore_user(user.username, password) == InsertStatus.SUCCESS
+        assert vault.database.get_user_from_username(user.username) is not None
+        assert [login.service_name for login in vault.database.get_user_logins(user.id)] == ['GitHub']
+        assert [entry.service_name for entry in vault.database.get_trash(user.id)] == ['Gmail']
+        assert vault.restore_user(user.username, password) == InsertStatus.ERROR
+
 
 class TestEncryptionIntegrity:
     # Test that encrypted passwords decrypt correctly
@@ -364,3 +403,243 @@ class TestEncryptionIntegrity:
 
         assert decrypted1.decode() == same_password
         assert decrypted2.decode() == same_password
+
+
+class TestSecurityReport:
+    # Test that the report flags weak and reused passwords
+    def test_security_report(self, vault: Vault, test_user: tuple[User, str], capsys: pytest.CaptureFixture[str]) -> None:
+        user, password = test_user
+        _ = vault.add_login(user, 'GitHub', 'user1', 'hunter2')
+        _ = vault.add_login(user, 'Gmail', 'user2', 'hunter2')
+        _ = vault.add_login(user, 'Bank', 'user3', 'Correct-Horse-Battery-Staple-9')
+
+        vault.security_report(user)
+
+        captured = capsys.readouterr()
+        assert 'Checked 3 logins: 2 weak, 2 reused' in captured.out
+        assert 'breach check unavailable' in captured.out
+        assert 'reused in 2 logins' in captured.out
+
+
+class TestPasswordReuse:
+    # Test that reuse is counted without decrypting
+    def test_count_password_reuse(self, vault: Vault, test_user: tuple[User, str]) -> None:
+        user, password = test_user
+        _ = vault.add_login(user, 'GitHub', 'user1', 'shared-password')
+        _ = vault.add_login(user, 'Gmail', 'user2', 'shared-password')
+
+        assert vault.count_password_reuse(user, 'shared-password') == 2
+        assert vault.count_password_reuse(user, 'other-password') == 0
+
+    # Test that fingerprints differ between users with the same password
+    def test_fingerprints_are_per_user(self, vault: Vault) -> None:
+        _ = vault.create_user('user1', 'MasterPass1!@#')
+        _ = vault.create_user('user2', 'MasterPass2!@#')
+        user1 = vault.database.get_user_from_username('user1')
+        user2 = vault.database.get_user_from_username('user2')
+        assert user1 is not None and user2 is not None
+
+        assert vault.encryption.fingerprint_password(user1.master_hash, 'same') != vault.encryption.fingerprint_password(user2.master_hash, 'same')
+
+    # Test that logins stored without a fingerprint are backfilled
+    def test_backfill_fingerprints(self, vault: Vault, test_user: tuple[User, str], capsys: pytest.CaptureFixture[str]) -> None:
+        user, password = test_user
+        encrypted = vault.encryption.encrypt_password(user.master_hash, 'shared-password')
+        _ = vault.database.insert_login(user.id, 'Legacy', 'old', encrypted)
+        _ = vault.add_login(user, 'GitHub', 'user1', 'shared-password')
+
+        assert vault.backfill_fingerprints(user) == 1
+        assert vault.backfill_fingerprints(user) == 0
+
+        vault.list_password_reuse(user)
+        captured = capsys.readouterr()
+        assert 'Same password used for 2 logins' in captured.out
+
+
+class TestLoginHistory:
+    # Test that every version can be rebuilt from the stored deltas
+    def test_login_history(self, vault: Vault, test_user: tuple[User, str]) -> None:
+        user, password = test_user
+        _ = vault.add_login(user, 'GitHub', 'user1', 'first-password')
+        login = vault.database.get_user_logins(user.id)[0]
+
+        _ = vault.update_login(user, login, 'GitHub', 'user2', None)
+        login = vault.database.get_user_logins(user.id)[0]
+        _ = vault.update_login(user, login, 'GitHub Enterprise', 'user2', 'second-password')
+        login = vault.database.get_user_logins(user.id)[0]
+
+        versions = vault.login_history(user, login)
+
+        assert [(v.service_name, v.username, v.password) for v in versions] == [
+            ('GitHub Enterprise', 'user2', 'second-password'),
+            ('GitHub', 'user2', 'first-password'),
+            ('GitHub', 'user1', 'first-password'),
+        ]
+        assert versions[0].changed_at is not None
+        assert versions[-1].changed_at is None
+
+    # Test that a password change updates the reuse fingerprint
+    def test_update_login_fingerprint(self, vault: Vault, test_user: tuple[User, str]) -> None:
+        user, password = test_user
+        _ = vault.add_login(user, 'GitHub', 'user1', 'shared-password')
+        _ = vault.add_login(user, 'Gmail', 'user2', 'shared-password')
+        login = vault.database.get_logins_from_name(user.id, 'Gmail')[0]
+
+        _ = vault.update_login(user, login, 'Gmail', 'user2', 'unique-password')
+
+        assert vault.count_password_reuse(user, 'shared-password') == 1
+
+    # Test the interactive update flow keeps blank fields
+    def test_edit_login(self, vault: Vault, test_user: tuple[User, str]) -> None:
+        user, password = test_user
+        _ = vault.add_login(user, 'GitHub', 'user1', 'first-password')
+
+        with patch('builtins.input', side_effect=['', 'user2', '']):
+            status = vault.edit_login(user, 'GitHub')
+
+        login = vault.database.get_user_logins(user.id)[0]
+        assert status == InsertStatus.SUCCESS
+        assert login.service_name == 'GitHub'
+        assert login.username == 'user2'
+        assert vault.encryption.decrypt_password(user.master_hash, login.password_encrypted).decode() == 'first-password'
+
+
+class TestCollections:
+    # Test that a shared login is visible to every member, decrypted with the collection key
+    def test_shared_login_visible_to_members(self, vault: Vault, test_user: tuple[User, str]) -> None:
+        user, password = test_user
+        _ = vault.create_user('teammate', 'TeammatePass123!@#')
+        teammate = vault.database.get_user_from_username('teammate')
+        assert teammate is not None
+
+        collection_id = vault.create_collection(user, 'Team')
+        assert collection_id is not None
+        assert vault.add_collection_member(user, collection_id, 'teammate') == InsertStatus.SUCCESS
+        _ = vault.add_collection_login(user, collection_id, 'AWS', 'root', 'shared-secret')
+        _ = vault.add_login(user, 'GitHub', 'me', 'personal-secret')
+
+        mine = sorted((entry.service_name, password) for entry, password in vault.visible_logins(user))
+        theirs = [(entry.service_name, password) for entry, password in vault.visible_logins(teammate)]
+
+        assert mine == [('AWS', 'shared-secret'), ('GitHub', 'personal-secret')]
+        assert theirs == [('AWS', 'shared-secret')]
+        assert [entry.service_name for entry, _ in vault.visible_logins(teammate, 'AWS')] == ['AWS']
+
+    # Test that removing a member only touches their wrapped key
+    def test_remove_member(self, vault: Vault, test_user: tuple[User, str]) -> None:
+        user, password = test_user
+        _ = vault.create_user('teammate', 'TeammatePass123!@#')
+        teammate = vault.database.get_user_from_username('teammate')
+        assert teammate is not None
+        collection_id = vault.create_collection(user, 'Team')
+        assert collection_id is not None
+        _ = vault.add_collection_member(user, collection_id, 'teammate')
+        _ = vault.add_collection_login(user, collection_id, 'AWS', 'root', 'shared-secret')
+        before = vault.database.conn.execute('SELECT password_encrypted FROM collection_entries').fetchall()
+
+        assert vault.remove_collection_member(user, collection_id, 'teammate') == RemoveStatus.SUCCESS
+
+        assert vault.visible_logins(teammate) == []
+        assert vault.add_collection_login(teammate, collection_id, 'Evil', 'x', 'y') == InsertStatus.ERROR
+        assert vault.database.conn.execute('SELECT password_encrypted FROM collection_entries').fetchall() == before
+
+    # Test that re-keying a vault keeps access to its collections
+    def test_rekey_keeps_collections(self, vault: Vault, test_user: tuple[User, str]) -> None:
+        user, password = test_user
+        collection_id = vault.create_collection(user, 'Team')
+        assert collection_id is not None
+        _ = vault.add_collection_login(user, collection_id, 'AWS', 'root', 'shared-secret')
+        _ = vault.add_login(user, 'GitHub', 'me', 'personal-secret')
+
+        rekeyed = vault.rekey(user, vault.encryption.generate_key(), b'new_salt')
+
+        assert rekeyed is not None
+        assert sorted(password for _, password in vault.visible_logins(rekeyed)) == ['personal-secret', 'shared-secret']
+
+    # Test that unwrapped collection keys are wiped when their with block ends
+    def test_collection_keys_wiped(self, vault: Vault, test_user: tuple[User, str]) -> None:
+        user, _ = test_user
+        collection_id = vault.create_collection(user, 'Team')
+        assert collection_id is not None
+
+        with vault.collection_keys(user) as keys:
+            key = keys[collection_id]
+            assert key != bytes(len(key))
+
+        assert key == bytes(len(key))
+
+
+class TestCopyLoginPassword:
+    # Test that only the chosen login is decrypted and its password is never printed
+    def test_copy_login_password(self, vault: Vault, test_user: tuple[User, str], tmp_path, capsys: pytest.CaptureFixture[str]) -> None:
+        user, password = test_user
+        _ = vault.add_login(user, 'GitHub', 'user1', 'secret-one')
+        _ = vault.add_login(user, 'Gmail', 'user2', 'secret-two')
+        backend = FileBackend(str(tmp_path / 'clipboard.txt'))
+        clipboard = Clipboard(backend, clear_after=60)
+
+        with patch.object(vault.encryption, 'decrypt_password', wraps=vault.encryption.decrypt_password) as decrypt:
+            assert vault.copy_login_password(user, 'Gmail', clipboard)
+
+        captured = capsys.readouterr()
+        assert decrypt.call_count == 1
+        assert backend.read() == 'secret-two'
+        assert 'secret-two' not in captured.out
+        assert 'Username: user2' in captured.out
+        clipboard.clear()
+
+    # Test that listings with a clipboard decrypt and print no passwords, and record no reveals
+    def test_listings_hide_passwords(self, vault: Vault, test_user: tuple[User, str], tmp_path, capsys: pytest.CaptureFixture[str]) -> None:
+        user, password = test_user
+        _ = vault.add_login(user, 'GitHub', 'user1', 'secret-one')
+        collection_id = vault.create_collection(user, 'Team')
+        assert collection_id is not None
+        _ = vault.add_collection_login(user, collection_id, 'AWS', 'root', 'shared-secret')
+        clipboard = Clipboard(FileBackend(str(tmp_path / 'clipboard.txt')), clear_after=60)
+        _ = capsys.readouterr()
+
+        with patch.object(vault.encryption, 'decrypt_password', wraps=vault.encryption.decrypt_password) as decrypt, \
+                patch.object(vault, 'record_event') as record_event:
+            vault.list_logins(user, clipboard)
+            vault.list_visible_logins(user, clipboard)
+            vault.list_filtered_logins(user, prefix='Git', clipboard=clipboard)
+
+        output = capsys.readouterr().out
+        assert decrypt.call_count == 0 and record_event.call_count == 0
+        assert 'secret-one' not in output and 'shared-secret' not in output
+        assert output.count('Password: (hidden)') == 4
+        assert 'Collection: Team' in output
+
+    # Test that a generated password is copied rather than printed when there is a clipboard
+    def test_generated_password_copied(self, vault: Vault, tmp_path, capsys: pytest.CaptureFixture[str]) -> None:
+        backend = FileBackend(str(tmp_path / 'clipboard.txt'))
+        clipboard = Clipboard(backend, clear_after=60)
+
+        vault.show_generated_password('generated-secret', clipboard)
+        vault.show_generated_password('printed-secret', None)
+
+        output = capsys.readouterr().out
+        assert backend.read() == 'generated-secret'
+        assert 'generated-secret' not in output and 'Generated password: printed-secret' in output
+        clipboard.clear()
+
+
+class TestSession:
+    # Test that closing a session wipes its key and drops its Fernet, and evicts the cached user
+    # record holding the key, which is read back from the database intact
+    def test_close_session_wipes_key(self, vault: Vault, test_user: tuple[User, str]) -> None:
+        user, password = test_user
+        _ = vault.add_login(user, 'GitHub', 'user1', 'secret-one')
+        assert vault.database.get_user_from_username(user.username) is not None
+        session = vault.open_session(user)
+
+        assert vault.visible_logins(session)[0][1] == 'secret-one'
+        assert session.master_hash.fernet is not None
+
+        vault.close_session(session)
+
+        assert session.master_hash == bytes(32)
+        assert session.master_hash.fernet is None
+        assert user_cache.get(vault.database.cache_key, user.username) is None
+        cached = vault.database.get_user_from_username(user.username)
+        assert cached is not None and cached.master_hash == user.master_hash != bytes(32)
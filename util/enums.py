@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntFlag
 
 
 class InsertStatus(Enum):
@@ -11,3 +11,34 @@ class InsertStatus(Enum):
 class RemoveStatus(Enum):
     SUCCESS = 0
     ERROR = 1
+
+class SyncStatus(Enum):
+    SUCCESS = 0
+    KEY_MISMATCH = 1
+    ERROR = 2
+
+class HistoryField(IntFlag):
+    SERVICE_NAME = 1
+    USERNAME = 2
+    PASSWORD = 4
+    ALL = 7
+
+class AttachmentKind(Enum):
+    FILE = 1
+    NOTE = 2
+
+class FieldKind(Enum):
+    TEXT = 1
+    # Left encrypted in listings and only decrypted when shown on its own, e.g. PINs and API keys
+    HIDDEN = 2
+
+class AuditEvent(Enum):
+    SIGN_IN = 1
+    SIGN_IN_FAILED = 2
+    REVEAL = 3
+    ADD = 4
+    UPDATE = 5
+    DELETE = 6
+    # Events about an entry of a shared collection; their entry id is the collection entry's, not a login's
+    SHARED_REVEAL = 7
+    SHARED_ADD = 8
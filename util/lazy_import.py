@@ -0,0 +1,82 @@
+import importlib.machinery
+import importlib.util
+import sys
+import threading
+from types import ModuleType
+
+# Specs of the modules made here. Reading any attribute of a lazy module, __spec__ and __path__
+# included, executes it, so the search path of a lazy package is read from its spec here instead
+_specs: dict[str, importlib.machinery.ModuleSpec] = {}
+
+# Locks of the lazy modules that haven't been executed yet, and the modules being executed now
+_locks: dict[str, threading.RLock] = {}
+_executing: set[str] = set()
+
+
+class _LazyModule(ModuleType):
+    # A module that executes itself on the first attribute access, then becomes an ordinary module.
+    # importlib.util.LazyLoader works the same way, but before Python 3.13 a second thread could
+    # read its module while the first was still executing it, and find attributes missing. Here
+    # other threads wait on the module's lock; reads from within its own execution go straight through
+    def __getattribute__(self, attr: str) -> object:
+        name = ModuleType.__getattribute__(self, '__name__')
+        lock = _locks.get(name)
+        if lock is not None:
+            with lock:
+                if type(self) is _LazyModule and name not in _executing:
+                    _execute(self, name)
+        return ModuleType.__getattribute__(self, attr)
+
+
+# Executes a lazy module, after its package as a normal import would
+def _execute(module: ModuleType, name: str) -> None:
+    parent = sys.modules.get(name.rpartition('.')[0])
+    if parent is not None:
+        _ = parent.__name__
+        # The package may have imported the module itself
+        if type(module) is not _LazyModule:
+            return
+
+    _executing.add(name)
+    try:
+        loader = _specs[name].loader
+        assert loader is not None
+        loader.exec_module(module)
+        module.__class__ = ModuleType
+        _ = _locks.pop(name, None)
+    finally:
+        _executing.discard(name)
+
+
+# Returns a module that is only executed when one of its attributes is first used, so importing
+# a heavy dependency at the top of a file costs nothing until it is needed. Once loaded it is an
+# ordinary module, and attribute lookups on it cost the same as on any other
+def lazy_import(name: str) -> ModuleType:
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    # Finding a submodule normally imports every package above it, which for cryptography means its
+    # compiled bindings, so the packages are made lazy as well and the submodule found on their path
+    parent, _, child = name.rpartition('.')
+    if parent:
+        parent_module = lazy_import(parent)
+        parent_spec = _specs.get(parent) or parent_module.__spec__
+        spec = importlib.machinery.PathFinder.find_spec(name, parent_spec.submodule_search_locations)
+    else:
+        spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ImportError(f'No module named \'{name}\'', name=name)
+    # Only Python modules can be set up before they are executed; anything else is imported now
+    if not isinstance(spec.loader, (importlib.machinery.SourceFileLoader, importlib.machinery.SourcelessFileLoader)):
+        return importlib.import_module(name)
+    module = importlib.util.module_from_spec(spec)
+    _specs[name] = spec
+    _locks[name] = threading.RLock()
+    module.__class__ = _LazyModule
+    sys.modules[name] = module
+
+    # A normal import also binds a submodule on its package
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
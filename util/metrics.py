@@ -0,0 +1,163 @@
+import bisect
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+# Upper bounds in seconds for latency histogram buckets, from 50us up to 5s
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+# Observations buffered before they are folded into histograms
+PENDING_LIMIT: int = 4096
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets: tuple[float, ...] = buckets
+        # One extra slot catches everything above the last bound (+Inf)
+        self.counts: list[int] = [0] * (len(buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.max: float = 0.0
+
+    # Records a single observation in seconds
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # Estimates the given quantile (0-1) from the bucket upper bounds
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.enabled: bool = True
+        self._lock: threading.Lock = threading.Lock()
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+        self._counters: dict[tuple[str, Labels], int] = {}
+        # Raw observations are appended here and only bucketed when read, which
+        # keeps the hot path to a list append under the lock
+        self._pending: list[tuple[str, Labels, int]] = []
+
+    # Records a latency in nanoseconds under the metric name and labels
+    def observe_ns(self, name: str, elapsed_ns: int, labels: Labels = ()) -> None:
+        if not self.enabled:
+            return
+        # The append shares the lock with _drain, or it could land in a list that was just swapped out
+        with self._lock:
+            self._pending.append((name, labels, elapsed_ns))
+            if len(self._pending) >= PENDING_LIMIT:
+                self._drain_locked()
+
+    # Adds to a counter
+    def inc(self, name: str, amount: int = 1, labels: Labels = ()) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + amount
+
+    # Times the wrapped block into a latency histogram
+    @contextmanager
+    def timer(self, name: str, labels: Labels = ()) -> Iterator[None]:
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.observe_ns(name, time.perf_counter_ns() - start, labels)
+
+    # Moves pending observations into their histograms
+    def _drain(self) -> None:
+        with self._lock:
+            self._drain_locked()
+
+    def _drain_locked(self) -> None:
+        pending, self._pending = self._pending, []
+        for name, labels, elapsed_ns in pending:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram()
+            histogram.observe(elapsed_ns * 1e-9)
+
+    # Returns every histogram, sorted by name and labels
+    def histograms(self) -> list[tuple[str, Labels, Histogram]]:
+        self._drain()
+        with self._lock:
+            return [(name, labels, histogram) for (name, labels), histogram in sorted(self._histograms.items())]
+
+    # Returns every counter, sorted by name and labels
+    def counters(self) -> list[tuple[str, Labels, int]]:
+        with self._lock:
+            return [(name, labels, value) for (name, labels), value in sorted(self._counters.items())]
+
+    # Drops all recorded metrics
+    def reset(self) -> None:
+        with self._lock:
+            self._pending = []
+            self._histograms.clear()
+            self._counters.clear()
+
+    # Renders all metrics in the Prometheus text exposition format
+    def render_prometheus(self) -> str:
+        lines: list[str] = []
+        typed: set[str] = set()
+
+        for name, labels, value in self.counters():
+            metric = f'pm_{name}_total'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} counter')
+                typed.add(metric)
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+
+        for name, labels, histogram in self.histograms():
+            metric = f'pm_{name}_seconds'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} histogram')
+                typed.add(metric)
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{_format_labels(labels + (("le", repr(bound)),))} {cumulative}')
+            lines.append(f'{metric}_bucket{_format_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {histogram.sum!r}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    # Writes the Prometheus dump atomically so scrapers never see a partial file
+    def write_prometheus(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            _ = f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+# Formats a label set as {key="value",...}
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+# Process-wide registry shared by the encryption, database and CLI layers
+metrics: MetricsRegistry = MetricsRegistry()
@@ -0,0 +1,28 @@
+import os
+
+APP_NAME: str = 'cosmicc'
+
+# Data directory used by checkouts from before the XDG layout, relative to where the program runs
+LEGACY_DATA_DIR: str = 'data'
+
+
+# Returns the directory named by an XDG variable, or the default under the home directory. The
+# spec says relative paths in these variables are invalid, so they are ignored
+def _xdg_dir(variable: str, *default: str) -> str:
+    path = os.environ.get(variable, '')
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.expanduser('~'), *default)
+    return os.path.join(path, APP_NAME)
+
+
+# Returns where the vault, lookup snapshots and backups are kept: $XDG_DATA_HOME/cosmicc,
+# ~/.local/share/cosmicc by default. A checkout that already has data/vault.db keeps using it
+def data_dir() -> str:
+    if os.path.isfile(os.path.join(LEGACY_DATA_DIR, 'vault.db')):
+        return LEGACY_DATA_DIR
+    return _xdg_dir('XDG_DATA_HOME', '.local', 'share')
+
+
+# Returns where logs and profiles are written: $XDG_STATE_HOME/cosmicc, ~/.local/state/cosmicc by default
+def state_dir() -> str:
+    return _xdg_dir('XDG_STATE_HOME', '.local', 'state')
@@ -0,0 +1,59 @@
+import importlib
+import itertools
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from util.lazy_import import lazy_import
+from util.paths import state_dir
+
+# Only needed when profiling is turned on
+cProfile = lazy_import('cProfile')
+
+PROFILERS: tuple[str, ...] = ('cprofile', 'pyinstrument')
+
+
+class ActionProfiler:
+    def __init__(self, kind: str, output_dir: str = os.path.join(state_dir(), 'profiles')) -> None:
+        if kind not in PROFILERS:
+            raise ValueError(f'Unknown profiler \'{kind}\' (expected one of {", ".join(PROFILERS)})')
+
+        # pyinstrument is optional, so only require it when asked for
+        if kind == 'pyinstrument':
+            try:
+                _ = importlib.import_module('pyinstrument')
+            except ImportError as e:
+                raise ValueError('pyinstrument is not installed (pip install pyinstrument)') from e
+
+        self.kind: str = kind
+        self.output_dir: str = output_dir
+        # Numbers this profiler's runs, so runs within the same second get names of their own
+        self._runs: Iterator[int] = itertools.count(1)
+        os.makedirs(output_dir, exist_ok=True)
+
+    # Profiles the wrapped CLI action and writes one report per run
+    @contextmanager
+    def profile(self, action: str) -> Iterator[None]:
+        # The pid keeps concurrent processes sharing the output directory apart too
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        base = os.path.join(self.output_dir, f'{stamp}-{os.getpid()}-{next(self._runs)}-{action}')
+
+        if self.kind == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(f'{base}.prof')
+        else:
+            pyinstrument = importlib.import_module('pyinstrument')
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                _ = profiler.stop()
+                with open(f'{base}.html', 'w') as f:
+                    _ = f.write(profiler.output_html())
@@ -1,21 +1,41 @@
 import logging
 import os
 
-from pythonjsonlogger import jsonlogger
+from util.paths import state_dir
 
 
-def setup_logger():
-    # Makes the log file and directory
-    log_dir = 'logs'
-    os.makedirs(log_dir, exist_ok=True)
-    log_file = os.path.join(log_dir, 'app.log')
+class DeferredFileHandler(logging.Handler):
+    # Opens the JSON log file on the first record rather than at startup, so launching the
+    # program doesn't pay for creating the directory, opening the file and importing the formatter
+    def __init__(self, log_file: str) -> None:
+        super().__init__()
+        self.log_file: str = log_file
+        self._handler: logging.Handler | None = None
 
-    # Creates the logger and handler and formatter
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._handler is None:
+            from pythonjsonlogger import jsonlogger
+
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            self._handler = logging.FileHandler(self.log_file)
+            self._handler.setFormatter(jsonlogger.JsonFormatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+        self._handler.emit(record)
+
+    def flush(self) -> None:
+        if self._handler is not None:
+            self._handler.flush()
+
+    def close(self) -> None:
+        if self._handler is not None:
+            self._handler.close()
+        super().close()
+
+
+def setup_logger(log_dir: str | None = None):
+    # Logs go to app.log in the state directory unless another directory is given
+    log_file = os.path.join(log_dir or state_dir(), 'app.log')
+
+    # Creates the logger and the handler, which sets up its file and formatter when first used
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
-    handler = logging.FileHandler(log_file)
-    formatter = jsonlogger.JsonFormatter('%(asctime)s %(name)s %(levelname)s %(message)s')
-
-    # Sets the handler and formatter
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    logger.addHandler(DeferredFileHandler(log_file))